@@ -0,0 +1,11 @@
+#!/bin/sh
+
+set -e
+
+if [ "$1" = "setup" ]
+then
+  true
+else
+  set -x
+  python3 share/benchmarks/console-replay.py --baseline share/benchmarks/console-replay.yaml --output console-replay.yaml
+fi
@@ -16,14 +16,55 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 
+import contextlib
 import json
 import logging
+import selectors
 import socket
 import time
 
 LOG = logging.getLogger("lava-coordinator")
 
 
+class Responder:
+    """
+    Collects the response written by the request handlers, to be sent by
+    the event loop.
+    """
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+    @property
+    def response(self):
+        if not self.data:
+            return None
+        return json.loads(self.data[8:].decode("utf-8"))
+
+
+class Peer:
+    """
+    Buffers of a non-blocking client connection.
+    """
+
+    def __init__(self):
+        self.inbox = b""
+        self.outbox = b""
+        # close the connection once the outbox is sent
+        self.closing = False
+        self.closed = False
+        # start of the partial request or of the unsent response
+        self.since = None
+
+
 class LavaCoordinator:
 
     running = False
@@ -36,6 +77,11 @@ class LavaCoordinator:
     group = None
     conn = None
     host = "localhost"
+    # seconds to wait for the rest of a request or for the client to read
+    # the response
+    read_timeout = 10
+    # requests answered when the group state allows it, instead of "wait"
+    blocking_requests = ("group_data", "lava_sync", "lava_wait", "lava_wait_all")
 
     def __init__(self, host, port, blocksize):
         """
@@ -50,6 +96,11 @@ class LavaCoordinator:
         self.host = host
         self.group_port = port
         self.blocksize = blocksize
+        self.selector = None
+        # (group_name, client_name) => (connection, request)
+        self.parked = {}
+        # (group_name, client_name) => (requestID, response)
+        self.replies = {}
 
     def run(self):
         s = None
@@ -60,6 +111,8 @@ class LavaCoordinator:
                 # TODO: use self.host
                 LOG.info("[BTSP] binding to %s:%s", "0.0.0.0", self.group_port)
                 s.bind(("0.0.0.0", self.group_port))
+                # port 0 binds to any free port
+                self.group_port = s.getsockname()[1]
                 break
             except socket.error as e:
                 LOG.warning(
@@ -69,34 +122,225 @@ class LavaCoordinator:
                 )
                 time.sleep(self.delay)
                 self.delay *= 2
-        s.listen(1)
+        s.listen(socket.SOMAXCONN)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(s, selectors.EVENT_READ)
         self.running = True
+        LOG.info("Ready to accept new connections")
         while self.running:
-            LOG.info("Ready to accept new connections")
-            self.conn, addr = s.accept()
-            # read the header to get the size of the message to follow
-            data = self.conn.recv(8).decode("utf-8")  # 32bit limit
-            try:
-                count = int(data, 16)
-            except ValueError:
+            for (key, events) in self.selector.select(self.read_timeout):
+                if key.fileobj is s:
+                    (conn, _) = s.accept()
+                    conn.setblocking(False)
+                    self.selector.register(conn, selectors.EVENT_READ, Peer())
+                    continue
+                if events & selectors.EVENT_WRITE:
+                    self._flush(key.fileobj, key.data)
+                if events & selectors.EVENT_READ and not key.data.closed:
+                    self._receive(key.fileobj, key.data)
+            self._expire()
+
+    def _receive(self, conn, peer):
+        """
+        Read the available data and serve the complete requests
+        """
+        try:
+            block = conn.recv(self.blocksize)
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            LOG.warning("Unable to read the request: %s", exc)
+            self._close(conn)
+            return
+        if not block:
+            self._close(conn)
+            return
+        if peer.closing:
+            # The response is already known
+            return
+        peer.inbox += block
+        while not peer.closing and not peer.closed:
+            json_data = self._parse(conn, peer)
+            if json_data is None:
+                break
+            self.serve(conn, json_data)
+        self._update(peer)
+
+    def _parse(self, conn, peer):
+        """
+        Extract one request from the buffered data
+        :return: the JSON request or None if the request is not complete or
+        the connection was closed
+        """
+        # read the header to get the size of the message to follow
+        if len(peer.inbox) < 8:  # 32bit limit
+            return None
+        header = peer.inbox[:8]
+        try:
+            count = int(header.decode("utf-8"), 16)
+        except ValueError:
+            LOG.warning("Invalid message: %s from %s", header, conn.getpeername()[0])
+            self._close(conn)
+            return None
+        if len(peer.inbox) < 8 + count:
+            return None
+        data = peer.inbox[8 : 8 + count]
+        peer.inbox = peer.inbox[8 + count :]
+        try:
+            json_data = json.loads(data.decode("utf-8"))
+        except ValueError:
+            LOG.warning("JSON error for '%s'", data[:100])
+            self._close(conn)
+            return None
+        if not isinstance(json_data, dict):
+            LOG.warning("Invalid request '%s'", data[:100])
+            self._close(conn)
+            return None
+        return json_data
+
+    def _send(self, conn, data):
+        peer = self.selector.get_key(conn).data
+        peer.outbox += data
+        self._flush(conn, peer)
+
+    def _flush(self, conn, peer):
+        """
+        Send as much of the outbox as the connection accepts, the rest being
+        sent when the connection is writable again
+        """
+        try:
+            sent = conn.send(peer.outbox) if peer.outbox else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError as exc:
+            LOG.warning("Unable to send the response: %s", exc)
+            self._close(conn)
+            return
+        peer.outbox = peer.outbox[sent:]
+        if not peer.outbox and peer.closing:
+            self._close(conn)
+            return
+        events = 0 if peer.closing else selectors.EVENT_READ
+        if peer.outbox:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(conn, events, peer)
+        self._update(peer)
+
+    def _update(self, peer):
+        if not peer.inbox and not peer.outbox:
+            peer.since = None
+        elif peer.since is None:
+            peer.since = time.monotonic()
+
+    def _expire(self):
+        """
+        Close the connections that did not send the rest of the request or
+        read the response in time: they would keep their buffers forever
+        """
+        now = time.monotonic()
+        for key in list(self.selector.get_map().values()):
+            peer = key.data
+            if peer is None or peer.since is None:
+                continue
+            if now - peer.since > self.read_timeout:
                 LOG.warning(
-                    "Invalid message: %s from %s", data, self.conn.getpeername()[0]
+                    "Closing the connection %d: no progress for %ds",
+                    key.fd,
+                    self.read_timeout,
                 )
-                self.conn.close()
-                continue
-            c = 0
-            data = ""
-            # get the message itself
-            while c < count:
-                data += self.conn.recv(self.blocksize).decode("utf-8")
-                c += self.blocksize
-            try:
-                json_data = json.loads(data)
-            except ValueError:
-                LOG.warning("JSON error for '%s'", data[:100])
-                self.conn.close()
-                continue
+                self._close(key.fileobj)
+
+    def _process(self, json_data):
+        """
+        Run the handler for this request
+        :return: the response or None if the handler closed the connection
+        without responding
+        """
+        self.conn = Responder()
+        self.dataReceived(json_data)
+        return self.conn.response
+
+    def _close(self, conn):
+        with contextlib.suppress(KeyError, ValueError):
+            self.selector.unregister(conn).data.closed = True
+        conn.close()
+        # Nobody is waiting for these responses anymore
+        for key in [k for (k, v) in self.parked.items() if v[0] is conn]:
+            del self.parked[key]
+
+    def _push(self, conn, request_id, response):
+        response = dict(response, requestID=request_id)
+        msgdata = self._formatMessage(response)
+        if msgdata:
+            self._send(conn, msgdata[0] + msgdata[1])
+
+    def _reply(self, conn, key, request_id, response):
+        if response is None:
+            self._close(conn)
+            return
+        # "wait" is not final: the client will send the request again
+        if response["response"] != "wait":
+            self.replies[key] = (request_id, response)
+        self._push(conn, request_id, response)
+
+    def serve(self, conn, json_data):
+        """
+        Handle one request received on the given connection.
+
+        Requests without a requestID are answered and the connection is
+        closed: the client will poll again.
+        Requests with a requestID come from persistent connections. Blocking
+        requests are parked until the response is not "wait" anymore and the
+        response is pushed to the client.
+        """
+        request_id = json_data.get("requestID")
+        if request_id is None:
+            self.conn = Responder()
             self.dataReceived(json_data)
+            peer = self.selector.get_key(conn).data
+            peer.closing = True
+            self._send(conn, self.conn.data)
+        else:
+            key = (json_data.get("group_name"), json_data.get("client_name"))
+            last = self.replies.get(key)
+            if last is not None and last[0] == request_id:
+                # The client reconnected before receiving the response
+                LOG.debug("Sending the response to %s again", request_id)
+                self._push(conn, request_id, last[1])
+                return
+            # A new request replaces the one parked for this client
+            self.parked.pop(key, None)
+            response = self._process(json_data)
+            if (
+                response is not None
+                and response["response"] == "wait"
+                and json_data.get("request") in self.blocking_requests
+            ):
+                self.parked[key] = (conn, json_data)
+            else:
+                self._reply(conn, key, request_id, response)
+        if json_data.get("request") == "clear_group":
+            for key in [k for k in self.replies if k[0] not in self.all_groups]:
+                del self.replies[key]
+        self._wake(json_data.get("group_name"))
+
+    def _wake(self, group_name):
+        """
+        Run the parked requests of the group again, until none of them can
+        make progress.
+        """
+        progress = True
+        while progress:
+            progress = False
+            for (key, (conn, json_data)) in list(self.parked.items()):
+                if key[0] != group_name or key not in self.parked:
+                    continue
+                response = self._process(json_data)
+                if response is not None and response["response"] == "wait":
+                    continue
+                del self.parked[key]
+                self._reply(conn, key, json_data["requestID"], response)
+                progress = True
 
     def _updateData(self, json_data):
         """
@@ -40,6 +40,12 @@ HTTP_DOWNLOAD_TIMEOUT = 60
 # Size of the chunks when downloading over scp
 SCP_DOWNLOAD_CHUNK_SIZE = 32768
 
+# Maximum number of images downloaded at the same time by a pipelined deploy
+PIPELINED_DOWNLOADS = 4
+
+# Time given to the background downloads to return when they are interrupted
+PIPELINED_DOWNLOADS_GRACE = 30
+
 # dispatcher temporary directory
 # This is distinct from the TFTP daemon directory
 # Files here are for download using the Apache /tmp alias.
@@ -55,9 +61,16 @@ LAVA_MULTINODE_SYSTEM_TIMEOUT = 90
 # Default Action timeout
 ACTION_TIMEOUT = 30
 
+# Number of times the missing chunks of a batch of results are requested
+RESULTS_BATCH_RETRIES = 3
+
 # Max cleanup timeout
 CLEANUP_TIMEOUT = 5 * 60
 
+# Time given to the concurrent namespaces to return after a job timeout or
+# cancellation
+CONCURRENT_NAMESPACES_GRACE = 30
+
 # LXC protocol name
 LXC_PROTOCOL = "lava-lxc"
 
@@ -76,6 +89,15 @@ LXC_DEFAULT_PACKAGES = "systemd,systemd-sysv"
 # LAVA home in LXC
 LAVA_LXC_HOME = "/lava-lxc"
 
+# Prefix of the cached LXC base containers
+LXC_CACHE_PREFIX = "lava-cache-"
+
+# Maximum age of the cached LXC base containers, in seconds
+LXC_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Disk budget of the cached LXC base containers, in bytes
+LXC_CACHE_MAX_SIZE = 20 * 1024 * 1024 * 1024
+
 # mount point for download directory when postprocessing images (e.g. within
 # docker containers)
 LAVA_DOWNLOADS = "/lava-downloads"
@@ -144,3 +166,13 @@ VALID_DISPATCHER_IP_PROTOCOLS = ["http", "nfs", "tftp"]
 # worker daemon data directory
 WORKER_DIR = "/var/lib/lava/dispatcher/worker"
 DOCKER_WORKER_DIR = "/var/lib/lava/dispatcher/docker-worker"
+
+# worker-local docker images cache, shared by lava-worker and lava-run
+DOCKER_IMAGES_CACHE = "/var/lib/lava/dispatcher/worker/docker-images.json"
+# delay before resolving again a docker image tag (in seconds)
+DOCKER_IMAGES_TTL = 5 * 60
+
+# worker-local cache of the extracted rootfs and nfsrootfs, keyed by sha256
+ROOTFS_CACHE_DIR = "/var/lib/lava/dispatcher/rootfs-cache"
+# disk budget of the rootfs cache (in bytes)
+ROOTFS_CACHE_SIZE = 20 * 1024 * 1024 * 1024
@@ -24,6 +24,7 @@ import datetime
 import logging
 import multiprocessing
 import signal
+import threading
 import time
 from typing import Dict, List, Tuple
 
@@ -143,6 +144,9 @@ class YAMLLogger(logging.Logger):
         self.handler = None
         self.markers = {}
         self.line = 0
+        # The concurrent namespaces log from several threads: the line count
+        # should follow the order of the messages
+        self.lock = threading.Lock()
 
     def addHTTPHandler(self, url, token, interval):
         self.handler = HTTPHandler(url, token, interval)
@@ -156,8 +160,6 @@ class YAMLLogger(logging.Logger):
             self.handler = None
 
     def log_message(self, level, level_name, message, *args, **kwargs):
-        # Increment the line count
-        self.line += 1
         # Build the dictionary
         data = {"dt": datetime.datetime.utcnow().isoformat(), "lvl": level_name}
 
@@ -170,7 +172,10 @@ class YAMLLogger(logging.Logger):
             data["ns"] = kwargs["namespace"]
 
         data_str = dump(data)
-        self._log(level, data_str, ())
+        with self.lock:
+            # Increment the line count
+            self.line += 1
+            self._log(level, data_str, ())
 
     def exception(self, exc, *args, **kwargs):
         self.log_message(logging.ERROR, "exception", exc, *args, **kwargs)
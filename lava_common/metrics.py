@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Counters, gauges and histograms recorded by the daemons and the views.
+
+The metrics are kept in the memory of each process and exposed in the
+Prometheus text format by serve().
+"""
+
+import bisect
+import contextlib
+import math
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    labels = []
+    for (name, value) in zip(names, values):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        labels.append('%s="%s"' % (name, value))
+    return "{%s}" % ",".join(labels)
+
+
+##########
+# Values #
+##########
+class CounterValue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, names, values):
+        yield (name, format_labels(names, values), self.value)
+
+
+class GaugeValue(CounterValue):
+    def __init__(self):
+        super().__init__()
+        self.function: Optional[Callable[[], float]] = None
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def samples(self, name, names, values):
+        value = self.value if self.function is None else self.function()
+        yield (name, format_labels(names, values), value)
+
+
+class HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # One more bucket for +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - begin)
+
+    def samples(self, name, names, values):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for (bound, count) in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield (
+                name + "_bucket",
+                format_labels(
+                    list(names) + ["le"], list(values) + [format_value(bound)]
+                ),
+                cumulative,
+            )
+        yield (name + "_sum", format_labels(names, values), total)
+        yield (name + "_count", format_labels(names, values), cumulative)
+
+
+###########
+# Metrics #
+###########
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self.values[()] = self.create()
+
+    def create(self):
+        raise NotImplementedError("Should implement this method")
+
+    def labels(self, *values: str):
+        """
+        Return the value for these label values, to be kept by the caller
+        on hot paths.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError("%s expects %d labels" % (self.name, len(self.labelnames)))
+        values = tuple(str(v) for v in values)
+        with contextlib.suppress(KeyError):
+            return self.values[values]
+        with self.lock:
+            return self.values.setdefault(values, self.create())
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP %s %s" % (self.name, self.documentation),
+            "# TYPE %s %s" % (self.name, self.kind),
+        ]
+        for (values, value) in sorted(self.values.items()):
+            for (name, labels, sample) in value.samples(
+                self.name, self.labelnames, values
+            ):
+                lines.append("%s%s %s" % (name, labels, format_value(sample)))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def create(self):
+        return CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.values[()].inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def create(self):
+        return GaugeValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.values[()].inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.values[()].dec(amount)
+
+    def set(self, value: float) -> None:
+        self.values[()].set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.values[()].set_function(function)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def create(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.values[()].observe(value)
+
+    def time(self):
+        return self.values[()].time()
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError("Metric %r already registered" % metric.name)
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+##########
+# Server #
+##########
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ["/", "/metrics"]:
+            self.send_error(404)
+            return
+        data = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer6(MetricsServer):
+    address_family = socket.AF_INET6
+
+
+def parse_address(address: str) -> Tuple[str, List[int]]:
+    """
+    Parse "host:port" or "host:first-last". With a range, each process binds
+    the first free port (for instance the gunicorn workers).
+    """
+    (host, _, ports) = address.rpartition(":")
+    (first, _, last) = ports.partition("-")
+    host = host.strip("[]") or "127.0.0.1"
+    return (host, list(range(int(first), int(last or first) + 1)))
+
+
+def serve(address: str, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Expose the metrics on http://<address>/metrics from a background thread.
+    """
+    (host, ports) = parse_address(address)
+    klass = MetricsServer6 if ":" in host else MetricsServer
+    error = None
+    for port in ports:
+        try:
+            server = klass((host, port), MetricsHandler)
+            break
+        except OSError as exc:
+            error = exc
+    else:
+        raise error or OSError("No port to bind to in %r" % address)
+    server.registry = registry
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    return server
@@ -220,6 +220,7 @@ def extra_checks(data):
     check_multinode_roles(data)
     check_multinode_extras(data)
     check_namespace(data)
+    check_concurrent_namespaces(data)
 
 
 def check_job_timeouts(data):
@@ -293,6 +294,27 @@ def check_namespace(data):
         raise Invalid("When using namespaces, every action should have a namespace")
 
 
+def check_concurrent_namespaces(data):
+    namespaces = data.get("concurrent_namespaces", [])
+    if not namespaces:
+        return
+    used = set()
+    for action in data["actions"]:
+        action_type = next(iter(action.keys()))
+        ns = action[action_type].get("namespace")
+        used.add(ns)
+        # The concurrent namespaces should not use the connection of each other
+        other = action[action_type].get("connection-namespace")
+        if ns in namespaces and other in namespaces and other != ns:
+            raise Invalid(
+                "Concurrent namespace '%s' cannot use the connection of '%s'"
+                % (ns, other)
+            )
+    for ns in namespaces:
+        if ns not in used:
+            raise Invalid("Concurrent namespace '%s' is not used by any action" % ns)
+
+
 def job(extra_context_variables=[]):
     context_variables = CONTEXT_VARIABLES + extra_context_variables
     lava_lxc = {
@@ -375,6 +397,7 @@ def job(extra_context_variables=[]):
             },
             Optional("notify"): notify(),
             Optional("reboot_to_fastboot"): bool,
+            Optional("concurrent_namespaces"): All([str], Length(min=2)),
             Required("actions"): [{Any("boot", "command", "deploy", "test"): dict}],
         },
         extra_checks,
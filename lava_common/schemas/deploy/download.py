@@ -20,7 +20,7 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-from voluptuous import Required
+from voluptuous import Optional, Required
 
 from lava_common.schemas import deploy
 
@@ -29,5 +29,6 @@ def schema():
     base = {
         Required("to"): "download",
         Required("images"): {Required(str, "'images' is empty"): deploy.url()},
+        Optional("pipelined"): bool,
     }
     return {**deploy.schema(), **base}
@@ -43,5 +43,6 @@ def schema():
         Required("images"): {Required(str, "'images' is empty"): deploy.url(extra)},
         Optional("docker"): docker(),
         Optional("connection"): "lxc",  # FIXME: other possible values?
+        Optional("pipelined"): bool,
     }
     return {**deploy.schema(), **base}
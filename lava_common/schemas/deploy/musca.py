@@ -20,7 +20,7 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-from voluptuous import Required
+from voluptuous import Optional, Required
 
 from lava_common.schemas import deploy
 
@@ -31,5 +31,6 @@ def schema():
         Required("images"): {
             Required("test_binary", "'images' has no 'test_binary' entry"): deploy.url()
         },
+        Optional("pipelined"): bool,
     }
     return {**deploy.schema(), **base}
@@ -40,5 +40,6 @@ def schema():
             },
             Length(min=1),
         ),
+        Optional("pipelined"): bool,
     }
     return {**deploy.schema(), **base}
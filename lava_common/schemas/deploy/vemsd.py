@@ -20,11 +20,15 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-from voluptuous import Required
+from voluptuous import Optional, Required
 
 from lava_common.schemas import deploy
 
 
 def schema():
-    base = {Required("to"): "vemsd", Required("recovery_image"): deploy.url()}
+    base = {
+        Required("to"): "vemsd",
+        Required("recovery_image"): deploy.url(),
+        Optional("pipelined"): bool,
+    }
     return {**deploy.schema(), **base}
@@ -18,8 +18,11 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import ctypes
 import datetime
+import os
 import signal
+import threading
 import time
 from contextlib import contextmanager
 
@@ -27,6 +30,179 @@ from lava_common.constants import ACTION_TIMEOUT
 from lava_common.exceptions import ConfigurationError, JobError
 
 
+class _Expired(BaseException):
+    """
+    Raised in the thread whose deadline has passed.
+    This is a BaseException so that the "except Exception" of the actions do
+    not catch it.
+    """
+
+
+class _Deadline:
+    def __init__(self, end_time):
+        self.end_time = end_time
+        self.fired = False
+        self.delivered = False
+
+
+class DeadlineScheduler:
+    """
+    Monotonic deadlines of every thread.
+
+    Each thread has a stack of deadlines, the innermost one being the
+    earliest. A watcher thread sleeps until the next deadline and interrupts
+    the thread that owns it:
+    * the main thread receives SIGALRM, so that blocking system calls are
+      interrupted like with signal.alarm()
+    * the other threads receive an asynchronous exception, raised as soon as
+      the thread runs python code again.
+    Both are deferred while the thread is in a protect() block.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.stacks = {}
+        self.interrupts = {}
+        # thread ident => depth of the protect() blocks
+        self.protected = {}
+        self.watcher = None
+        self.handler = None
+
+    def push(self, deadline):
+        self.interrupted()
+        ident = threading.get_ident()
+        if threading.current_thread() is threading.main_thread():
+            self._install()
+        with self.cond:
+            self.stacks.setdefault(ident, []).append(deadline)
+            if self.watcher is None:
+                self.watcher = threading.Thread(
+                    target=self._watch, name="deadlines", daemon=True
+                )
+                self.watcher.start()
+            self.cond.notify()
+
+    def pop(self, deadline):
+        ident = threading.get_ident()
+        pending = None
+        while True:
+            try:
+                with self.cond:
+                    stack = self.stacks.get(ident, [])
+                    if deadline in stack:
+                        stack.remove(deadline)
+                    if not stack:
+                        self.stacks.pop(ident, None)
+                    if deadline.delivered and ident != threading.main_thread().ident:
+                        # Drop the asynchronous exception if still pending
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                            ctypes.c_ulong(ident), None
+                        )
+                    self.cond.notify()
+                break
+            except _Expired:
+                # Delivered while leaving the block: deadline.fired is set
+                continue
+            except BaseException as exc:
+                # Raised by another signal handler: the deadline should still
+                # be removed
+                pending = exc
+        if pending is not None:
+            raise pending
+        return deadline.fired
+
+    def interrupt(self, thread, exc_type):
+        """
+        Expire every deadline of the thread: exc_type is raised instead of the
+        timeout exceptions and by the next deadline of this thread, until
+        resume() is called.
+        """
+        with self.cond:
+            self.interrupts[thread.ident] = exc_type
+            for deadline in self.stacks.get(thread.ident, []):
+                deadline.end_time = 0
+            self.cond.notify()
+
+    def interrupted(self):
+        exc_type = self.interrupts.get(threading.get_ident())
+        if exc_type is not None:
+            raise exc_type()
+
+    @contextmanager
+    def protect(self):
+        """
+        Defer the timeouts and the interruptions of the current thread until
+        the end of the block, so that cleanup code is not interrupted halfway.
+        """
+        ident = threading.get_ident()
+        with self.cond:
+            self.protected[ident] = self.protected.get(ident, 0) + 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.protected[ident] -= 1
+                if not self.protected[ident]:
+                    del self.protected[ident]
+                # Deliver the deadlines that expired meanwhile
+                self.cond.notify()
+
+    def resume(self):
+        with self.cond:
+            self.interrupts.pop(threading.get_ident(), None)
+
+    def reset(self):
+        # Called in the child after a fork: only the current thread remains
+        self.__init__()
+
+    def _install(self):
+        if self.handler is None:
+            self.handler = self._alarm
+        if signal.getsignal(signal.SIGALRM) is not self.handler:
+            signal.signal(signal.SIGALRM, self.handler)
+
+    def _alarm(self, signum, frame):
+        # Ignore the signals sent for a deadline that is not the current one
+        # or while protected: the watcher sends it again at the end of the
+        # block
+        main = threading.main_thread().ident
+        if main in self.protected:
+            return
+        stack = self.stacks.get(main)
+        if stack and stack[-1].fired and not stack[-1].delivered:
+            stack[-1].delivered = True
+            raise _Expired()
+
+    def _watch(self):
+        main = threading.main_thread().ident
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                timeout = None
+                for (ident, stack) in self.stacks.items():
+                    for deadline in stack:
+                        if not deadline.fired:
+                            if deadline.end_time <= now:
+                                deadline.fired = True
+                            elif timeout is None or deadline.end_time - now < timeout:
+                                timeout = deadline.end_time - now
+                    top = stack[-1]
+                    if not top.fired or top.delivered or ident in self.protected:
+                        continue
+                    if ident == main:
+                        signal.pthread_kill(ident, signal.SIGALRM)
+                    else:
+                        top.delivered = True
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                            ctypes.c_ulong(ident), ctypes.py_object(_Expired)
+                        )
+                self.cond.wait(timeout)
+
+
+scheduler = DeadlineScheduler()
+os.register_at_fork(after_in_child=scheduler.reset)
+
+
 class Timeout:
     """
     The Timeout class is a declarative base which any actions can use. If an Action has
@@ -71,8 +247,21 @@ class Timeout:
     def can_skip(self, parameters):
         return parameters.get("timeout", {}).get("skip", False)
 
+    def check(self, max_end_time):
+        """
+        Raise the timeout exception if max_end_time has passed.
+        Only needed outside of the main thread: the asynchronous exceptions
+        are not raised while the thread is blocked in a system call.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return
+        if time.monotonic() > max_end_time:
+            self._timed_out(None, None)
+
     def _timed_out(self, signum, frame):
-        duration = int(time.monotonic() - self.start)
+        duration = time.monotonic() - self.start
+        # Do not report the sub-second timeouts as "0 seconds"
+        duration = int(duration) if duration >= 1 else round(duration, 2)
         raise self.exception("%s timed out after %s seconds" % (self.name, duration))
 
     @contextmanager
@@ -84,36 +273,26 @@ class Timeout:
             # action_max_end_time is None when called by the job class directly
             max_end_time = min(action_max_end_time, max_end_time)
 
-        duration = round(max_end_time - self.start)
-        if duration <= 0:
-            # If duration is lower than 0, then the timeout should be raised now.
-            # Calling signal.alarm in this case will only deactivate the alarm
-            # (by passing 0 or the unsigned value).
-            # Deactivate any previous alarm and set elapse_time prior to raise
-            signal.alarm(0)
+        if max_end_time <= self.start:
+            # The timeout should be raised now
             self.elapsed_time = 0
             self._timed_out(None, None)
 
-        signal.signal(signal.SIGALRM, self._timed_out)
-        signal.alarm(duration)
-
+        deadline = _Deadline(max_end_time)
         try:
+            scheduler.push(deadline)
             yield max_end_time
-
-            # Restore the parent handler and timeout
-            # This will be None when called by Job class
-            if parent is None:
-                signal.alarm(0)
-            else:
-                signal.signal(signal.SIGALRM, parent.timeout._timed_out)
-                duration = round(action_max_end_time - time.monotonic())
-                if duration <= 0:
-                    signal.alarm(0)
-                    parent.timeout._timed_out(None, None)
-                signal.alarm(duration)
-        except Exception:
-            # clear the timeout alarm, the action has returned an error
-            signal.alarm(0)
-            raise
+        except _Expired:
+            if not deadline.fired:
+                raise
         finally:
+            fired = scheduler.pop(deadline)
             self.elapsed_time = time.monotonic() - self.start
+        if fired:
+            scheduler.interrupted()
+            self._timed_out(None, None)
+
+        # Check the parent timeout
+        # This will be None when called by Job class
+        if parent is not None and action_max_end_time <= time.monotonic():
+            parent.timeout._timed_out(None, None)
@@ -76,6 +76,12 @@ def get_parser(docker_worker=False) -> argparse.ArgumentParser:
             action="store_true",
             help="Wait for jobs to finish prior to exit",
         )
+        parser.add_argument(
+            "--prefork",
+            action="store_true",
+            default=False,
+            help="Fork lava-run from a warmed interpreter to speed up the job startup",
+        )
 
     storage = parser.add_argument_group("storage")
     storage.add_argument(
@@ -135,4 +141,12 @@ def get_parser(docker_worker=False) -> argparse.ArgumentParser:
         help="Log level, default to INFO",
     )
 
+    mets = parser.add_argument_group("metrics")
+    mets.add_argument(
+        "--metrics-address",
+        type=str,
+        default=None,
+        help="Expose the metrics on http://<address>/metrics, for instance 127.0.0.1:9102",
+    )
+
     return parser
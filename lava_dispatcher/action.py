@@ -18,10 +18,10 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-import copy
 import logging
 import shlex
 import subprocess  # nosec - internal
+import threading
 import time
 import traceback
 import warnings
@@ -29,6 +29,7 @@ from functools import reduce
 
 import pexpect
 
+from lava_common.constants import CONCURRENT_NAMESPACES_GRACE
 from lava_common.decorators import nottest
 from lava_common.exceptions import (
     InfrastructureError,
@@ -39,7 +40,7 @@ from lava_common.exceptions import (
     TestError,
 )
 from lava_common.log import YAMLLogger
-from lava_common.timeout import Timeout
+from lava_common.timeout import Timeout, _Expired, scheduler
 from lava_dispatcher.utils.strings import seconds_to_str
 
 
@@ -52,6 +53,12 @@ class InternalObject:
     pass
 
 
+class _Interrupted(BaseException):
+    """
+    Raised in the namespaces running concurrently when another one failed.
+    """
+
+
 class Pipeline:
     """
     Pipelines ensure that actions are run in the correct sequence whilst
@@ -237,60 +244,169 @@ class Pipeline:
         # Diagnosis is not allowed to alter the connection, do not use the return value.
         return None
 
-    def run_actions(self, connection, max_end_time):
-        for action in self.actions:
-            failed = False
+    def run_actions(self, connection, max_end_time, actions=None):
+        namespaces = []
+        if actions is None:
+            actions = self.actions
+            # Only the top level actions of the job can run concurrently
+            if self.parent is None and self.job is not None:
+                namespaces = self.job.parameters.get("concurrent_namespaces", [])
+        for (lanes, last) in self._segments(actions, namespaces):
+            if len(lanes) > 1:
+                connection = self._run_lanes(connection, max_end_time, lanes, last)
+            else:
+                for action in lanes[last]:
+                    connection = self._run_action(action, connection, max_end_time)
+        return connection
+
+    def _segments(self, actions, namespaces):
+        """
+        Split the actions into segments, as ({namespace: actions}, namespace of
+        the last action).
+        The consecutive actions of the concurrent namespaces are grouped in the
+        same segment, the other actions being alone in their segment.
+        """
+        lanes = {}
+        last = None
+        for action in actions:
             namespace = action.parameters.get("namespace", "common")
-            # Begin the action
+            if namespace not in namespaces:
+                if lanes:
+                    yield (lanes, last)
+                    lanes = {}
+                yield ({namespace: [action]}, namespace)
+                continue
+            lanes.setdefault(namespace, []).append(action)
+            last = namespace
+        if lanes:
+            yield (lanes, last)
+
+    def _run_lanes(self, connection, max_end_time, lanes, last):
+        """
+        Run the actions of each namespace in a thread, the main thread waiting
+        for all of them.
+        The first error interrupts the other namespaces and is raised when all
+        the threads have returned. The connection of the namespace of the last
+        action of the segment is returned.
+        """
+        lock = threading.Lock()
+        running = {}
+        errors = []
+        connections = {}
+
+        def stop():
+            # Called with the lock held
+            for thread in running.values():
+                if thread is not threading.current_thread():
+                    scheduler.interrupt(thread, _Interrupted)
+
+        def run(namespace, actions):
             try:
-                parent = self.parent if self.parent else self.job
-                with action.timeout(parent, max_end_time) as action_max_end_time:
-                    # Add action start timestamp to the log message
-                    # Log in INFO for root actions and in DEBUG for the other actions
-                    timeout = seconds_to_str(action_max_end_time - action.timeout.start)
-                    msg = "start: %s %s (timeout %s) [%s]" % (
-                        action.level,
-                        action.name,
-                        timeout,
-                        namespace,
-                    )
-                    if self.parent is None:
-                        action.logger.info(msg)
-                    else:
-                        action.logger.debug(msg)
-
-                    new_connection = action.run(connection, action_max_end_time)
-            except LAVATimeoutError as exc:
-                action.logger.exception(str(exc))
-                # allows retries without setting errors, which make the job incomplete.
-                failed = True
-                action.results = {"fail": str(exc)}
-                if action.timeout.can_skip(action.parameters):
-                    if self.parent is None:
-                        action.logger.warning(
-                            "skip_timeout is set for %s - continuing to next action block."
-                            % (action.name)
-                        )
-                    else:
-                        raise
-                    new_connection = None
-                else:
-                    raise TestError(str(exc))
-            except LAVAError as exc:
-                action.logger.exception(str(exc))
-                # allows retries without setting errors, which make the job incomplete.
-                failed = True
-                action.results = {"fail": str(exc)}
-                self._diagnose(connection)
+                conn = connection
+                for action in actions:
+                    conn = self._run_action(action, conn, max_end_time)
+                connections[namespace] = conn
+            except _Interrupted:
+                logger.warning(
+                    "[%s] interrupted by the failure of another namespace", namespace
+                )
+            except (_Expired, Exception) as exc:
+                with scheduler.protect(), lock:
+                    errors.append(exc)
+                    stop()
+            except BaseException as exc:
+                with scheduler.protect(), lock:
+                    errors.append(exc)
+                    stop()
                 raise
-            except Exception as exc:
-                action.logger.exception(traceback.format_exc())
-                # allows retries without setting errors, which make the job incomplete.
-                failed = True
-                action.results = {"fail": str(exc)}
-                # Raise a LAVABug that will be correctly classified later
-                raise LAVABug(str(exc))
             finally:
+                with scheduler.protect(), lock:
+                    del running[namespace]
+                    scheduler.resume()
+
+        logger = logging.getLogger("dispatcher")
+        logger.info("Running namespaces concurrently: %s", ", ".join(lanes.keys()))
+        with lock:
+            for (namespace, actions) in lanes.items():
+                running[namespace] = threading.Thread(
+                    target=run, args=(namespace, actions), name=namespace
+                )
+                running[namespace].start()
+            threads = list(running.values())
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            # Only needed when the job timed out or was canceled: the threads
+            # have all returned otherwise
+            with scheduler.protect():
+                with lock:
+                    stop()
+                for thread in threads:
+                    thread.join(CONCURRENT_NAMESPACES_GRACE)
+        if errors:
+            raise errors[0]
+        return connections[last]
+
+    def _run_action(self, action, connection, max_end_time):
+        failed = False
+        namespace = action.parameters.get("namespace", "common")
+        # Begin the action
+        try:
+            parent = self.parent if self.parent else self.job
+            with action.timeout(parent, max_end_time) as action_max_end_time:
+                # Add action start timestamp to the log message
+                # Log in INFO for root actions and in DEBUG for the other actions
+                timeout = seconds_to_str(action_max_end_time - action.timeout.start)
+                msg = "start: %s %s (timeout %s) [%s]" % (
+                    action.level,
+                    action.name,
+                    timeout,
+                    namespace,
+                )
+                if self.parent is None:
+                    action.logger.info(msg)
+                else:
+                    action.logger.debug(msg)
+
+                new_connection = action.run(connection, action_max_end_time)
+        except LAVATimeoutError as exc:
+            action.logger.exception(str(exc))
+            # allows retries without setting errors, which make the job incomplete.
+            failed = True
+            action.results = {"fail": str(exc)}
+            if action.timeout.can_skip(action.parameters):
+                if self.parent is None:
+                    action.logger.warning(
+                        "skip_timeout is set for %s - continuing to next action block."
+                        % (action.name)
+                    )
+                else:
+                    raise
+                new_connection = None
+            else:
+                raise TestError(str(exc))
+        except LAVAError as exc:
+            action.logger.exception(str(exc))
+            # allows retries without setting errors, which make the job incomplete.
+            failed = True
+            action.results = {"fail": str(exc)}
+            self._diagnose(connection)
+            raise
+        except Exception as exc:
+            action.logger.exception(traceback.format_exc())
+            # allows retries without setting errors, which make the job incomplete.
+            failed = True
+            action.results = {"fail": str(exc)}
+            # Raise a LAVABug that will be correctly classified later
+            raise LAVABug(str(exc))
+        except _Interrupted:
+            # Interrupted by the failure of a concurrent namespace
+            failed = True
+            action.results = {"fail": "interrupted"}
+            raise
+        finally:
+            with scheduler.protect():
                 # Add action end timestamp to the log message
                 duration = round(action.timeout.elapsed_time)
                 msg = "end: %s %s (duration %s) [%s]" % (
@@ -306,8 +422,8 @@ class Pipeline:
                 # set results including retries and failed actions
                 action.log_action_results(fail=failed)
 
-            if new_connection:
-                connection = new_connection
+        if new_connection:
+            connection = new_connection
         return connection
 
 
@@ -852,8 +968,9 @@ class Action:
     def get_namespace_data(self, action, label, key, deepcopy=True, parameters=None):
         """
         Get a namespaced data value from dynamic job data using the specified key.
-        By default, returns a deep copy of the value instead of a reference to allow actions to
+        By default, returns a copy of the value instead of a reference to allow actions to
         manipulate lists and dicts based on common data without altering the values used by other actions.
+        Immutable values (strings, numbers, ...) are never copied.
         :param action: Name of the action which set the data or a commonly shared string used to
             correlate disparate actions
         :param label: Arbitrary label used by many actions to sub-divide similar keys with distinct
@@ -868,10 +985,7 @@ class Action:
         """
         params = parameters if parameters else self.parameters
         namespace = params["namespace"]
-        value = self.data.get(namespace, {}).get(action, {}).get(label, {}).get(key)
-        if value is None:
-            return None
-        return copy.deepcopy(value) if deepcopy else value
+        return self.data.get_value(namespace, action, label, key, deepcopy=deepcopy)
 
     def set_namespace_data(self, action, label, key, value, parameters=None):
         """
@@ -891,10 +1005,7 @@ class Action:
         namespace = params["namespace"]
         if not label or not key:
             raise LAVABug("Invalid call to set_namespace_data: %s" % action)
-        self.data.setdefault(namespace, {})
-        self.data[namespace].setdefault(action, {})
-        self.data[namespace][action].setdefault(label, {})
-        self.data[namespace][action][label][key] = value
+        self.data.set_value(namespace, action, label, key, value, writer=self.name)
 
     def wait(self, connection, max_end_time=None):
         if not connection:
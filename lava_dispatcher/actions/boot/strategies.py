@@ -18,35 +18,40 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-# List just the subclasses supported for this base strategy
-# imported by the parser to populate the list of subclasses.
+# Map each value of the boot "method" parameter onto the modules providing the
+# matching strategies. The modules are only imported by Boot.select() when a
+# job needs them.
 
-# pylint: disable=unused-import
-
-from lava_dispatcher.actions.boot.barebox import Barebox
-from lava_dispatcher.actions.boot.bootloader import BootBootloader
-from lava_dispatcher.actions.boot.cmsis_dap import CMSIS
-from lava_dispatcher.actions.boot.depthcharge import Depthcharge
-from lava_dispatcher.actions.boot.dfu import DFU
-from lava_dispatcher.actions.boot.docker import BootDocker
-from lava_dispatcher.actions.boot.fastboot import BootFastboot
-from lava_dispatcher.actions.boot.fvp import BootFVP
-from lava_dispatcher.actions.boot.gdb import GDB
-from lava_dispatcher.actions.boot.grub import Grub, GrubSequence
-from lava_dispatcher.actions.boot.ipxe import IPXE
-from lava_dispatcher.actions.boot.iso import BootIsoInstaller
-from lava_dispatcher.actions.boot.jlink import JLink
-from lava_dispatcher.actions.boot.kexec import BootKExec
-from lava_dispatcher.actions.boot.lxc import BootLxc
-from lava_dispatcher.actions.boot.minimal import Minimal
-from lava_dispatcher.actions.boot.musca import Musca
-from lava_dispatcher.actions.boot.openocd import OpenOCD
-from lava_dispatcher.actions.boot.pyocd import PyOCD
-from lava_dispatcher.actions.boot.qemu import BootQEMU
-from lava_dispatcher.actions.boot.recovery import RecoveryBoot
-from lava_dispatcher.actions.boot.secondary import SecondaryShell
-from lava_dispatcher.actions.boot.ssh import Schroot, SshLogin
-from lava_dispatcher.actions.boot.u_boot import UBoot
-from lava_dispatcher.actions.boot.uefi import UefiShell
-from lava_dispatcher.actions.boot.uefi_menu import UefiMenu
-from lava_dispatcher.actions.boot.uuu import UUUBoot
+STRATEGIES = {
+    "barebox": ["barebox"],
+    "bootloader": ["bootloader"],
+    "cmsis-dap": ["cmsis_dap"],
+    "depthcharge": ["depthcharge"],
+    "dfu": ["dfu"],
+    "docker": ["docker"],
+    "fastboot": ["fastboot"],
+    "fvp": ["fvp"],
+    "gdb": ["gdb"],
+    "grub": ["grub"],
+    "grub-efi": ["grub"],
+    "ipxe": ["ipxe"],
+    "jlink": ["jlink"],
+    "kexec": ["kexec"],
+    "lxc": ["lxc"],
+    "minimal": ["minimal"],
+    "monitor": ["qemu"],
+    "musca": ["musca"],
+    "new_connection": ["secondary"],
+    "openocd": ["openocd"],
+    "pyocd": ["pyocd"],
+    "qemu": ["qemu"],
+    "qemu-iso": ["iso"],
+    "qemu-nfs": ["qemu"],
+    "recovery": ["recovery"],
+    "schroot": ["ssh"],
+    "ssh": ["ssh"],
+    "u-boot": ["u_boot"],
+    "uefi": ["uefi"],
+    "uefi-menu": ["uefi_menu"],
+    "uuu": ["uuu"],
+}
@@ -18,6 +18,7 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import contextlib
 import os
 import shutil
 from functools import partial
@@ -26,7 +27,6 @@ import guestfs
 
 from lava_common.constants import RAMDISK_FNAME, UBOOT_DEFAULT_HEADER_LENGTH
 from lava_common.exceptions import InfrastructureError, JobError, LAVABug
-from lava_common.utils import debian_filename_version
 from lava_dispatcher.action import Action, Pipeline
 from lava_dispatcher.actions.deploy.overlay import OverlayAction
 from lava_dispatcher.actions.deploy.prepare import PrepareKernelAction
@@ -48,7 +48,9 @@ from lava_dispatcher.utils.filesystem import (
 )
 from lava_dispatcher.utils.installers import add_late_command, add_to_kickstart
 from lava_dispatcher.utils.network import dispatcher_ip
+from lava_dispatcher.utils.rootfs import extract_rootfs, rootfs_cache_config
 from lava_dispatcher.utils.shell import which
+from lava_dispatcher.utils.sparse import SparseImage
 from lava_dispatcher.utils.strings import substitute
 
 
@@ -186,12 +188,8 @@ class ApplyOverlaySparseImage(Action):
 
     def validate(self):
         super().validate()
-        binary = which("simg2img")
-        self.logger.info(debian_filename_version(binary))
         which("mount")
         which("umount")
-        binary = which("img2simg")
-        self.logger.info(debian_filename_version(binary))
 
     def run(self, connection, max_end_time):
         overlay_file = self.get_namespace_data(
@@ -211,15 +209,24 @@ class ApplyOverlaySparseImage(Action):
             raise JobError(
                 "Image is not an Android sparse image: %s" % decompressed_image
             )
-        command_list = ["/usr/bin/simg2img", decompressed_image, ext4_img]
-        self.run_cmd(
-            command_list, error_msg="simg2img failed for %s" % decompressed_image
-        )
-        self.logger.debug("Copying overlay")
-        copy_overlay_to_sparse_fs(ext4_img, overlay_file)
-        command_list = ["/usr/bin/img2simg", ext4_img, decompressed_image]
-        self.run_cmd(command_list, error_msg="img2simg failed for %s" % ext4_img)
-        os.remove(ext4_img)
+        sparse = SparseImage(decompressed_image)
+        try:
+            written = sparse.expand(ext4_img)
+            self.logger.debug(
+                "Expanded %s: %d bytes written", decompressed_image, written
+            )
+            self.logger.debug("Copying overlay")
+            copy_overlay_to_sparse_fs(ext4_img, overlay_file)
+            written = sparse.update(ext4_img, decompressed_image + ".sparse")
+            self.logger.debug(
+                "Updated %s: %d bytes written", decompressed_image, written
+            )
+            os.replace(decompressed_image + ".sparse", decompressed_image)
+        finally:
+            # Also remove the temporary images on errors
+            for tmp_image in [ext4_img, decompressed_image + ".sparse"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(tmp_image)
         return connection
 
 
@@ -418,6 +425,7 @@ class ExtractRootfs(Action):
         self.extra_compression = ["xz"]
         self.use_tarfile = True
         self.use_lzma = False
+        self.view = None
 
     def run(self, connection, max_end_time):
         if not self.parameters.get(self.param_key):  # idempotency
@@ -426,14 +434,29 @@ class ExtractRootfs(Action):
         root = self.get_namespace_data(
             action="download-action", label=self.param_key, key="file"
         )
-        root_dir = self.mkdtemp()
-        untar_file(root, root_dir)
+        sha256 = self.get_namespace_data(
+            action="download-action", label=self.param_key, key="sha256"
+        )
+        (root_dir, self.view) = extract_rootfs(
+            root,
+            sha256,
+            self.mkdtemp(),
+            self.logger,
+            nfs=self.file_key == "nfsroot",
+            config=rootfs_cache_config(self.job),
+        )
         self.set_namespace_data(
             action="extract-rootfs", label="file", key=self.file_key, value=root_dir
         )
         self.logger.debug("Extracted %s to %s", self.file_key, root_dir)
         return connection
 
+    def cleanup(self, connection):
+        super().cleanup(connection)
+        if self.view is not None:
+            self.view.remove()
+            self.view = None
+
 
 class ExtractNfsRootfs(ExtractRootfs):
     """
@@ -988,59 +1011,71 @@ class AppendOverlays(Action):
         partition = self.params.get("partition", None)
         self.logger.info("Modifying %r", image)
 
+        # Modify a raw view of the sparse image, then only write back the
+        # changes
+        sparse = None
+        drive = image
         if self.params.get("sparse", False):
-            self.logger.debug("Calling simg2img on %r", image)
-            command_list = ["/usr/bin/simg2img", image, f"{image}.non-sparse"]
-            self.run_cmd(command_list, error_msg="simg2img failed for %s" % image)
-            os.replace(f"{image}.non-sparse", image)
+            self.logger.debug("Expanding sparse image %r", image)
+            sparse = SparseImage(image)
+            drive = f"{image}.non-sparse"
 
-        guest = guestfs.GuestFS(python_return_dict=True)
-        guest.add_drive(image)
         try:
-            guest.launch()
-            if partition is not None:
-                device = guest.list_partitions()[partition]
-            else:
-                device = guest.list_devices()[0]
-            guest.mount(device, "/")
-        except RuntimeError as exc:
-            self.logger.exception(str(exc))
-            raise JobError("Unable to update image %s: %r" % (self.key, str(exc)))
+            if sparse is not None:
+                sparse.expand(drive)
 
-        self.logger.debug("Overlays:")
-        for overlay in self.params["overlays"]:
-            label = "%s.%s" % (self.key, overlay)
-            overlay_image = None
-            if overlay == "lava":
-                overlay_image = self.get_namespace_data(
-                    action="compress-overlay", label="output", key="file"
-                )
-                path = "/"
-                compress = "gzip"
-            else:
-                overlay_image = self.get_namespace_data(
-                    action="download-action", label=label, key="file"
-                )
-                path = self.params["overlays"][overlay]["path"]
-                compress = None
-            if overlay_image:
-                self.logger.debug("- %s: %r to %r", label, overlay_image, path)
-                if (
-                    overlay == "lava"
-                    or self.params["overlays"][overlay]["format"] == "tar"
-                ):
-                    guest.mkdir_p(path)
-                    guest.tar_in(overlay_image, path, compress=compress)
+            guest = guestfs.GuestFS(python_return_dict=True)
+            guest.add_drive(drive)
+            try:
+                guest.launch()
+                if partition is not None:
+                    device = guest.list_partitions()[partition]
                 else:
-                    guest.mkdir_p(os.path.dirname(path))
-                    guest.upload(overlay_image, path)
-            else:
-                self.logger.warning("- %s: <MISSING> to %r", label, path)
-        guest.umount(device)
-        guest.shutdown()
+                    device = guest.list_devices()[0]
+                guest.mount(device, "/")
+            except RuntimeError as exc:
+                self.logger.exception(str(exc))
+                raise JobError("Unable to update image %s: %r" % (self.key, str(exc)))
 
-        if self.params.get("sparse", False):
-            self.logger.debug("Calling img2simg on %r", image)
-            command_list = ["/usr/bin/img2simg", image, f"{image}.sparse"]
-            self.run_cmd(command_list, error_msg="img2simg failed for %s" % image)
-            os.replace(f"{image}.sparse", image)
+            self.logger.debug("Overlays:")
+            for overlay in self.params["overlays"]:
+                label = "%s.%s" % (self.key, overlay)
+                overlay_image = None
+                if overlay == "lava":
+                    overlay_image = self.get_namespace_data(
+                        action="compress-overlay", label="output", key="file"
+                    )
+                    path = "/"
+                    compress = "gzip"
+                else:
+                    overlay_image = self.get_namespace_data(
+                        action="download-action", label=label, key="file"
+                    )
+                    path = self.params["overlays"][overlay]["path"]
+                    compress = None
+                if overlay_image:
+                    self.logger.debug("- %s: %r to %r", label, overlay_image, path)
+                    if (
+                        overlay == "lava"
+                        or self.params["overlays"][overlay]["format"] == "tar"
+                    ):
+                        guest.mkdir_p(path)
+                        guest.tar_in(overlay_image, path, compress=compress)
+                    else:
+                        guest.mkdir_p(os.path.dirname(path))
+                        guest.upload(overlay_image, path)
+                else:
+                    self.logger.warning("- %s: <MISSING> to %r", label, path)
+            guest.umount(device)
+            guest.shutdown()
+
+            if sparse is not None:
+                self.logger.debug("Updating sparse image %r", image)
+                sparse.update(drive, f"{image}.sparse")
+                os.replace(f"{image}.sparse", image)
+        finally:
+            # Also remove the raw view on errors
+            if sparse is not None:
+                for tmp_image in [drive, f"{image}.sparse"]:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(tmp_image)
@@ -31,7 +31,10 @@ import os
 import pathlib
 import shutil
 import subprocess  # nosec - verified.
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
 from urllib.parse import quote_plus, urlparse
 
 import requests
@@ -40,10 +43,13 @@ from lava_common.constants import (
     FILE_DOWNLOAD_CHUNK_SIZE,
     HTTP_DOWNLOAD_CHUNK_SIZE,
     HTTP_DOWNLOAD_TIMEOUT,
+    PIPELINED_DOWNLOADS,
+    PIPELINED_DOWNLOADS_GRACE,
     SCP_DOWNLOAD_CHUNK_SIZE,
 )
 from lava_common.exceptions import InfrastructureError, JobError, LAVABug
-from lava_dispatcher.action import Action, Pipeline
+from lava_common.timeout import scheduler
+from lava_dispatcher.action import Action, Pipeline, _Interrupted
 from lava_dispatcher.actions.boot.fastboot import EnterFastbootAction
 from lava_dispatcher.actions.boot.u_boot import UBootEnterFastbootAction
 from lava_dispatcher.actions.deploy.apply_overlay import AppendOverlays
@@ -123,6 +129,120 @@ class DownloaderAction(RetryAction):
             self.pipeline.add_action(AppendOverlays(self.key, params=self.params))
 
 
+class DownloadQueueAction(Action):
+    """
+    Run the downloads in the background, with bounded parallelism, while the
+    rest of the deploy is running.
+    Each image is downloaded and post-processed by its own group of actions,
+    run in a thread. The actions using an image should be preceded by a
+    WaitDownloadAction for this image.
+    """
+
+    name = "download-queue"
+    description = "download the images in the background"
+    summary = "background downloads"
+
+    def __init__(self, workers=PIPELINED_DOWNLOADS):
+        super().__init__()
+        self.workers = workers
+        self.groups = {}
+        self.executor = None
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.running = {}
+
+    def populate(self, parameters):
+        self.pipeline = Pipeline(parent=self, job=self.job, parameters=parameters)
+
+    def add(self, key, action):
+        """
+        Add the action to the group of the given image.
+        """
+        self.pipeline.add_action(action)
+        self.groups.setdefault(key, []).append(action)
+
+    def run(self, connection, max_end_time):
+        self.call_protocols()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="download"
+        )
+        # The connection is only used by the main thread
+        self.futures = {
+            key: self.executor.submit(self._run_group, key, actions, max_end_time)
+            for (key, actions) in self.groups.items()
+        }
+        self.logger.info(
+            "Downloading %d images in the background (%d at a time)",
+            len(self.futures),
+            self.workers,
+        )
+        return connection
+
+    def _run_group(self, key, actions, max_end_time):
+        with self.lock:
+            self.running[key] = threading.current_thread()
+        try:
+            return self.pipeline.run_actions(None, max_end_time, actions)
+        finally:
+            with self.lock:
+                del self.running[key]
+                # The thread is reused by the next group
+                scheduler.resume()
+
+    def wait(self, key):
+        """
+        Wait for the given image, raising the error of its actions if any.
+        """
+        if key not in self.futures:
+            raise LAVABug("'%s' is not downloaded in the background" % key)
+        future = self.futures[key]
+        if not future.done():
+            self.logger.debug("Waiting for '%s'", key)
+        future.result()
+
+    def cleanup(self, connection):
+        if self.executor is not None:
+            with self.lock:
+                for future in self.futures.values():
+                    future.cancel()
+                # Do not wait for the running downloads to reach their deadline
+                for thread in self.running.values():
+                    scheduler.interrupt(thread, _Interrupted)
+            self.executor.shutdown(wait=False)
+            (_, not_done) = wait_futures(
+                self.futures.values(), timeout=PIPELINED_DOWNLOADS_GRACE
+            )
+            if not_done:
+                self.logger.warning(
+                    "%d background downloads still running", len(not_done)
+                )
+            self.executor = None
+        super().cleanup(connection)
+
+
+class WaitDownloadAction(Action):
+    """
+    Wait for the images downloaded by a DownloadQueueAction. Every image of
+    the queue is waited for when keys is None.
+    """
+
+    name = "wait-download"
+    description = "wait for the images downloaded in the background"
+    summary = "wait for downloads"
+
+    def __init__(self, downloads, keys=None):
+        super().__init__()
+        self.downloads = downloads
+        self.keys = keys
+
+    def run(self, connection, max_end_time):
+        connection = super().run(connection, max_end_time)
+        keys = self.downloads.groups.keys() if self.keys is None else self.keys
+        for key in keys:
+            self.downloads.wait(key)
+        return connection
+
+
 class DownloadHandler(Action):
     """
     The identification of which downloader and whether to
@@ -351,6 +471,7 @@ class DownloadHandler(Action):
 
         def update_progress():
             nonlocal downloaded_size, last_value, md5, sha256, sha512
+            self.timeout.check(max_end_time)
             downloaded_size += len(buff)
             (printing, new_value, msg) = progress(downloaded_size, last_value)
             if printing:
@@ -918,6 +1039,13 @@ class DownloadAction(Action):
         # issuing any fastboot commands on the powered on device.
         #
         # NOTE: Add more power on strategies, if required for specific devices.
+        #
+        # In pipelined mode, the images are downloaded while the device is
+        # powered on.
+        downloads = None
+        if parameters.get("pipelined", False):
+            downloads = DownloadQueueAction()
+            self.pipeline.add_action(downloads)
         if self.job.device.get("fastboot_via_uboot", False):
             self.pipeline.add_action(ConnectDevice())
             self.pipeline.add_action(UBootEnterFastbootAction())
@@ -930,13 +1058,27 @@ class DownloadAction(Action):
 
         self.download_dir = self.mkdtemp()
         for image in sorted(parameters["images"].keys()):
-            self.pipeline.add_action(
-                DownloaderAction(
-                    image, self.download_dir, params=parameters["images"][image]
+            if downloads is None:
+                self.pipeline.add_action(
+                    DownloaderAction(
+                        image, self.download_dir, params=parameters["images"][image]
+                    )
+                )
+            else:
+                # One directory by image: a failed download removes its
+                # directory while the other downloads are running.
+                downloads.add(
+                    image,
+                    DownloaderAction(
+                        image,
+                        os.path.join(self.download_dir, image),
+                        params=parameters["images"][image],
+                    ),
                 )
-            )
         if self.test_needs_overlay(parameters):
             self.pipeline.add_action(OverlayAction())
+        if downloads is not None:
+            self.pipeline.add_action(WaitDownloadAction(downloads))
         self.pipeline.add_action(CopyToLxcAction())
 
 
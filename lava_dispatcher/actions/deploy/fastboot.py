@@ -28,7 +28,11 @@ from lava_dispatcher.actions.deploy.apply_overlay import (
     ApplyOverlayImage,
     ApplyOverlaySparseImage,
 )
-from lava_dispatcher.actions.deploy.download import DownloaderAction
+from lava_dispatcher.actions.deploy.download import (
+    DownloaderAction,
+    DownloadQueueAction,
+    WaitDownloadAction,
+)
 from lava_dispatcher.actions.deploy.environment import DeployDeviceEnvironment
 from lava_dispatcher.actions.deploy.overlay import OverlayAction
 from lava_dispatcher.connections.serial import ConnectDevice
@@ -92,6 +96,12 @@ class FastbootAction(
         self.pipeline = Pipeline(parent=self, job=self.job, parameters=parameters)
         if self.test_needs_overlay(parameters):
             self.pipeline.add_action(OverlayAction())
+        # In pipelined mode, the images are downloaded while the device is
+        # reset and each image is flashed as soon as it's available.
+        downloads = None
+        if parameters.get("pipelined", False):
+            downloads = DownloadQueueAction()
+            self.pipeline.add_action(downloads)
         # Check if the device has a power command such as HiKey, Dragonboard,
         # etc. against device that doesn't like Nexus, etc.
         if self.job.device.get("fastboot_via_uboot", False):
@@ -107,29 +117,41 @@ class FastbootAction(
             self.pipeline.add_action(EnterFastbootAction())
 
         fastboot_dir = self.mkdtemp()
+        needs_environment = self.test_needs_overlay(
+            parameters
+        ) and self.test_needs_deployment(parameters)
         for image in sorted(parameters["images"].keys()):
-            self.pipeline.add_action(
-                DownloaderAction(
-                    image, fastboot_dir, params=parameters["images"][image]
-                )
-            )
+            path = fastboot_dir
+            if downloads is not None:
+                # One directory by image: a failed download removes its
+                # directory while the other downloads are running.
+                path = os.path.join(fastboot_dir, image)
+            actions = [
+                DownloaderAction(image, path, params=parameters["images"][image])
+            ]
             if parameters["images"][image].get("apply-overlay", False):
                 if self.test_needs_overlay(parameters):
                     if parameters["images"][image].get("sparse", True):
-                        self.pipeline.add_action(ApplyOverlaySparseImage(image))
+                        actions.append(ApplyOverlaySparseImage(image))
                     else:
                         use_root_part = parameters["images"][image].get(
                             "root_partition", False
                         )
-                        self.pipeline.add_action(
+                        actions.append(
                             ApplyOverlayImage(image, use_root_partition=use_root_part)
                         )
 
-            if self.test_needs_overlay(parameters) and self.test_needs_deployment(
-                parameters
-            ):
-                self.pipeline.add_action(DeployDeviceEnvironment())
-        self.pipeline.add_action(FastbootFlashOrderAction())
+            if downloads is None:
+                for action in actions:
+                    self.pipeline.add_action(action)
+                if needs_environment:
+                    self.pipeline.add_action(DeployDeviceEnvironment())
+            else:
+                for action in actions:
+                    downloads.add(image, action)
+        if downloads is not None and needs_environment:
+            self.pipeline.add_action(DeployDeviceEnvironment())
+        self.pipeline.add_action(FastbootFlashOrderAction(downloads))
 
 
 class FastbootFlashOrderAction(OptionalContainerFastbootAction):
@@ -141,13 +163,14 @@ class FastbootFlashOrderAction(OptionalContainerFastbootAction):
     description = "Determine support for each flash operation"
     summary = "Handle reset and options for each flash url."
 
-    def __init__(self):
+    def __init__(self, downloads=None):
         super().__init__()
         self.retries = 3
         self.sleep = 10
         self.interrupt_prompt = None
         self.interrupt_string = None
         self.reboot = None
+        self.downloads = downloads
 
     def populate(self, parameters):
         self.pipeline = Pipeline(parent=self, job=self.job, parameters=parameters)
@@ -160,6 +183,11 @@ class FastbootFlashOrderAction(OptionalContainerFastbootAction):
         for flash_cmd in flash_cmds:
             if flash_cmd not in parameters["images"]:
                 continue
+            if self.downloads is not None:
+                # The previous images in the flash order are already flashed
+                self.pipeline.add_action(
+                    WaitDownloadAction(self.downloads, [flash_cmd])
+                )
             self.pipeline.add_action(WaitDeviceBoardID(board_id))
             self.pipeline.add_action(FastbootFlashAction(cmd=flash_cmd))
             self.reboot = parameters["images"][flash_cmd].get("reboot")
@@ -32,7 +32,7 @@ from lava_dispatcher.actions.deploy.download import (
 from lava_dispatcher.actions.deploy.environment import DeployDeviceEnvironment
 from lava_dispatcher.actions.deploy.overlay import OverlayAction
 from lava_dispatcher.logical import Deployment
-from lava_dispatcher.utils.compression import untar_file
+from lava_dispatcher.utils.rootfs import extract_rootfs, rootfs_cache_config
 
 
 class DeployImagesAction(Action):  # FIXME: Rename to DeployPosixImages
@@ -156,6 +156,7 @@ class ExtractNfsAction(Action):
         self.extra_compression = ["xz"]
         self.use_tarfile = True
         self.use_lzma = False
+        self.view = None
 
     def validate(self):
         super().validate()
@@ -181,8 +182,17 @@ class ExtractNfsAction(Action):
         root = self.get_namespace_data(
             action="download-action", label=self.param_key, key="file"
         )
-        root_dir = self.mkdtemp()
-        untar_file(root, root_dir)
+        sha256 = self.get_namespace_data(
+            action="download-action", label=self.param_key, key="sha256"
+        )
+        (root_dir, self.view) = extract_rootfs(
+            root,
+            sha256,
+            self.mkdtemp(),
+            self.logger,
+            nfs=True,
+            config=rootfs_cache_config(self.job),
+        )
         self.set_namespace_data(
             action="extract-rootfs", label="file", key=self.file_key, value=root_dir
         )
@@ -206,6 +216,12 @@ class ExtractNfsAction(Action):
             )
         return connection
 
+    def cleanup(self, connection):
+        super().cleanup(connection)
+        if self.view is not None:
+            self.view.remove()
+            self.view = None
+
 
 # FIXME: needs to be renamed to DeployPosixImages
 class DeployImages(Deployment):
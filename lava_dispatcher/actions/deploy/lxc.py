@@ -19,6 +19,7 @@
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
 import os
+import time
 
 from lava_common.constants import (
     LXC_DEFAULT_PACKAGES,
@@ -35,6 +36,8 @@ from lava_dispatcher.actions.deploy.overlay import OverlayAction
 from lava_dispatcher.logical import Deployment
 from lava_dispatcher.protocols.lxc import LxcProtocol
 from lava_dispatcher.utils.filesystem import lxc_path
+from lava_dispatcher.utils.lxc import LxcCache, lxc_cache_config
+from lava_dispatcher.utils.rootfs import disk_usage
 from lava_dispatcher.utils.shell import which
 from lava_dispatcher.utils.udev import allow_fs_label
 from lava_dispatcher_host.action import DeviceContainerMappingMixin
@@ -96,7 +99,8 @@ class LxcAction(Action):
         self.pipeline = Pipeline(parent=self, job=self.job, parameters=parameters)
         self.pipeline.add_action(LxcCreateAction())
         self.pipeline.add_action(LxcCreateUdevRuleAction())
-        if "packages" in parameters:
+        # The cached base containers are already provisioned
+        if "packages" in parameters and lxc_cache_config(self.job) is None:
             self.pipeline.add_action(LxcStartAction())
             self.pipeline.add_action(LxcAptUpdateAction())
             self.pipeline.add_action(LxcAptInstallAction())
@@ -150,8 +154,19 @@ class LxcCreateAction(Action):
         # set lxc_data
         self._set_lxc_data()
 
-    def run(self, connection, max_end_time):
-        connection = super().run(connection, max_end_time)
+    def _lxc(self, command, name):
+        # The cached base containers are not linked in LXC_PATH
+        if self.lxc_data["custom_lxc_path"]:
+            return [
+                command,
+                "-P",
+                lxc_path(self.job.parameters["dispatcher"]),
+                "-n",
+                name,
+            ]
+        return [command, "-n", name]
+
+    def _create_cmd(self, name):
         verbose = "" if self.lxc_data["verbose"] else "-q"
         lxc_default_path = lxc_path(self.job.parameters["dispatcher"])
         if self.lxc_data["custom_lxc_path"]:
@@ -164,7 +179,7 @@ class LxcCreateAction(Action):
                 "-t",
                 self.lxc_data["lxc_template"],
                 "-n",
-                self.lxc_data["lxc_name"],
+                name,
                 "--",
                 "--release",
                 self.lxc_data["lxc_release"],
@@ -182,7 +197,7 @@ class LxcCreateAction(Action):
                 "-t",
                 self.lxc_data["lxc_template"],
                 "-n",
-                self.lxc_data["lxc_name"],
+                name,
                 "--",
                 "--dist",
                 self.lxc_data["lxc_distribution"],
@@ -191,6 +206,112 @@ class LxcCreateAction(Action):
             ]
         if self.lxc_data["lxc_arch"]:
             lxc_cmd += ["--arch", self.lxc_data["lxc_arch"]]
+        return lxc_cmd
+
+    def provision(self, name, packages):
+        """
+        Create the base container and install the packages.
+        """
+        try:
+            self.run_cmd(
+                self._create_cmd(name), error_msg="Unable to create lxc container"
+            )
+            if packages:
+                self.run_cmd(
+                    self._lxc("lxc-start", name) + ["-d"],
+                    error_msg="Unable to start lxc container",
+                )
+                self.run_cmd(
+                    self._lxc("lxc-wait", name) + ["-s", "RUNNING"],
+                    error_msg="Unable to start lxc container",
+                )
+                # The network is needed to install the packages
+                while not self.parsed_command(
+                    self._lxc("lxc-info", name) + ["-iH"], allow_fail=True
+                ).strip():
+                    time.sleep(self.sleep)
+                self.run_cmd(
+                    self._lxc("lxc-attach", name)
+                    + ["--", "apt-get", "-y", "-q", "update"],
+                    error_msg="Unable to apt-get update in lxc container",
+                )
+                self.run_cmd(
+                    self._lxc("lxc-attach", name)
+                    + ["-v", "DEBIAN_FRONTEND=noninteractive"]
+                    + ["--", "apt-get", "-y", "-q", "install"]
+                    + packages,
+                    error_msg="Unable to install using apt-get in lxc container",
+                )
+                self.run_cmd(
+                    self._lxc("lxc-stop", name) + ["-k"],
+                    error_msg="Unable to stop lxc container",
+                )
+        except Exception:
+            # Never cache a partially provisioned container
+            self.run_cmd(self._lxc("lxc-stop", name) + ["-k"], allow_fail=True)
+            self.run_cmd(self._lxc("lxc-destroy", name) + ["-f"], allow_fail=True)
+            raise
+
+    def destroy(self, name):
+        # lxc refuses to destroy a base container that still has clones
+        if self.run_cmd(self._lxc("lxc-destroy", name), allow_fail=True):
+            self.logger.info("Cached container %r is still in use", name)
+            return False
+        return True
+
+    def clone(self, cache):
+        """
+        Create the container as a copy-on-write clone of a cached base
+        container, provisioning the base on the first use.
+        """
+        packages = self.parameters.get("packages", [])
+        base = cache.name(cache.key(self.lxc_data, packages))
+        with cache.lock(base):
+            now = time.time()
+            metadata = cache.metadata(base)
+            if metadata is not None and cache.expired(metadata, now):
+                self.logger.info("Cached container %r expired", base)
+                if self.destroy(base):
+                    metadata = None
+            if metadata is None:
+                if cache.exists(base):
+                    # Left by an interrupted provisioning
+                    self.run_cmd(self._lxc("lxc-destroy", base) + ["-f"])
+                self.logger.info("Provisioning cached container %r", base)
+                self.provision(base, packages)
+                cache.save(
+                    base,
+                    {
+                        "created": now,
+                        "used": now,
+                        "size": disk_usage(os.path.join(cache.path, base)),
+                        "template": self.lxc_data["lxc_template"],
+                        "release": self.lxc_data["lxc_release"],
+                        "arch": self.lxc_data["lxc_arch"],
+                        "packages": sorted(packages),
+                    },
+                )
+                self.results = {"cache": "miss"}
+            else:
+                self.logger.info("Using cached container %r", base)
+                self.results = {"cache": "hit"}
+
+            cmd = self._lxc("lxc-copy", base) + ["-N", self.lxc_data["lxc_name"], "-s"]
+            if cache.backing_store:
+                cmd += ["-B", cache.backing_store]
+            self.run_cmd(cmd, error_msg="Unable to clone lxc container")
+            cache.touch(base)
+
+        for name in cache.evictions(time.time(), keep=base):
+            with cache.lock(name, blocking=False) as locked:
+                if locked:
+                    self.logger.info("Evicting cached container %r", name)
+                    self.destroy(name)
+
+    def run(self, connection, max_end_time):
+        connection = super().run(connection, max_end_time)
+        lxc_default_path = lxc_path(self.job.parameters["dispatcher"])
+        cache_config = lxc_cache_config(self.job)
 
         # Check if the container already exists. If this is a persistent that's
         # ok, otherwise, raise an error.
@@ -202,9 +323,15 @@ class LxcCreateAction(Action):
                     "lxc container %r already exists" % self.lxc_data["lxc_name"]
                 )
             self.logger.debug("Persistent container exists")
+        elif cache_config is not None:
+            self.clone(LxcCache(lxc_default_path, cache_config))
+            self.logger.debug("Container cloned successfully")
         else:
             # The container does not exists, just create it
-            self.run_cmd(lxc_cmd, error_msg="Unable to create lxc container")
+            self.run_cmd(
+                self._create_cmd(self.lxc_data["lxc_name"]),
+                error_msg="Unable to create lxc container",
+            )
             self.logger.debug("Container created successfully")
         self.results = {"status": self.lxc_data["lxc_name"]}
 
@@ -26,7 +26,11 @@ import shutil
 
 from lava_common.exceptions import InfrastructureError
 from lava_dispatcher.action import Action, Pipeline
-from lava_dispatcher.actions.deploy.download import DownloaderAction
+from lava_dispatcher.actions.deploy.download import (
+    DownloaderAction,
+    DownloadQueueAction,
+    WaitDownloadAction,
+)
 from lava_dispatcher.actions.deploy.vemsd import (
     MountDeviceMassStorageDevice,
     UnmountVExpressMassStorageDevice,
@@ -91,16 +95,27 @@ class MuscaAction(RetryAction):
         # even without the required 'test_binary' field.
         # Therefore, ensure the DownloaderAction.populate does not fail, and catch this at validate step.
         image_params = parameters.get("images", {}).get("test_binary")
+        # In pipelined mode, the test binary is downloaded while the board
+        # is turned on.
+        downloads = None
         if image_params:
-            self.pipeline.add_action(
-                DownloaderAction("test_binary", path=download_dir, params=image_params)
+            download = DownloaderAction(
+                "test_binary", path=download_dir, params=image_params
             )
+            if parameters.get("pipelined", False):
+                downloads = DownloadQueueAction()
+                self.pipeline.add_action(downloads)
+                downloads.add("test_binary", download)
+            else:
+                self.pipeline.add_action(download)
         # Turn on
         self.pipeline.add_action(ResetDevice())
         # Wait for storage
         self.pipeline.add_action(WaitMuscaMassStorageAction())
 
         # Deploy test binary
+        if downloads is not None:
+            self.pipeline.add_action(WaitDownloadAction(downloads))
         self.pipeline.add_action(MountMuscaMassStorageDevice())
         self.pipeline.add_action(DeployMuscaTestBinary())
         self.pipeline.add_action(UnmountMuscaMassStorageDevice())
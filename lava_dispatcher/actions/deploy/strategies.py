@@ -18,29 +18,32 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-# List just the subclasses supported for this base strategy
-# imported by the parser to populate the list of subclasses.
+# Map each value of the deploy "to" parameter onto the modules providing the
+# matching strategies. The modules are only imported by Deployment.select()
+# when a job needs them.
 
-# pylint: disable=unused-import
-
-from lava_dispatcher.actions.deploy.docker import Docker
-from lava_dispatcher.actions.deploy.download import Download
-from lava_dispatcher.actions.deploy.downloads import Downloads
-from lava_dispatcher.actions.deploy.fastboot import Fastboot
-from lava_dispatcher.actions.deploy.flasher import Flasher
-from lava_dispatcher.actions.deploy.fvp import FVP
-from lava_dispatcher.actions.deploy.image import DeployImages
-from lava_dispatcher.actions.deploy.iso import DeployIso
-from lava_dispatcher.actions.deploy.lxc import Lxc
-from lava_dispatcher.actions.deploy.mps import Mps
-from lava_dispatcher.actions.deploy.musca import Musca
-from lava_dispatcher.actions.deploy.nbd import Nbd
-from lava_dispatcher.actions.deploy.nfs import Nfs
-from lava_dispatcher.actions.deploy.overlay import Overlay
-from lava_dispatcher.actions.deploy.recovery import RecoveryMode
-from lava_dispatcher.actions.deploy.removable import MassStorage
-from lava_dispatcher.actions.deploy.ssh import Ssh
-from lava_dispatcher.actions.deploy.tftp import Tftp
-from lava_dispatcher.actions.deploy.uboot_ums import UBootUMS
-from lava_dispatcher.actions.deploy.uuu import UUU
-from lava_dispatcher.actions.deploy.vemsd import VExpressMsd
+STRATEGIES = {
+    "docker": ["docker"],
+    "download": ["download"],
+    "downloads": ["downloads"],
+    "fastboot": ["fastboot"],
+    "flasher": ["flasher"],
+    "fvp": ["fvp"],
+    "iso-installer": ["iso"],
+    "lxc": ["lxc"],
+    "mps": ["mps"],
+    "musca": ["musca"],
+    "nbd": ["nbd"],
+    "nfs": ["image", "nfs"],
+    "overlay": ["overlay"],
+    "recovery": ["recovery"],
+    "sata": ["removable"],
+    "sd": ["removable"],
+    "ssh": ["ssh"],
+    "tftp": ["tftp"],
+    "tmpfs": ["image"],
+    "u-boot-ums": ["uboot_ums"],
+    "usb": ["removable"],
+    "uuu": ["uuu"],
+    "vemsd": ["vemsd"],
+}
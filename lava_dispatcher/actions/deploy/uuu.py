@@ -19,12 +19,18 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import os
+
 from lava_dispatcher.action import Action, Pipeline
 from lava_dispatcher.actions.deploy.apply_overlay import (
     ApplyOverlayImage,
     ApplyOverlaySparseImage,
 )
-from lava_dispatcher.actions.deploy.download import DownloaderAction
+from lava_dispatcher.actions.deploy.download import (
+    DownloaderAction,
+    DownloadQueueAction,
+    WaitDownloadAction,
+)
 from lava_dispatcher.actions.deploy.overlay import OverlayAction
 from lava_dispatcher.logical import Deployment
 
@@ -81,22 +87,42 @@ class UUUAction(Action):
             action="uuu-deploy", label="uuu-images", key="images_names", value=images
         )
 
+        # In pipelined mode, the images are downloaded and post-processed
+        # concurrently. The uuu boot action only starts when all of them
+        # are ready.
+        downloads = None
+        if parameters.get("pipelined", False):
+            downloads = DownloadQueueAction()
+            self.pipeline.add_action(downloads)
+
         for image in images:
-            self.pipeline.add_action(
-                DownloaderAction(image, path=path, params=parameters["images"][image])
-            )
+            image_path = path
+            if downloads is not None:
+                # One directory by image: a failed download removes its
+                # directory while the other downloads are running.
+                image_path = os.path.join(path, image)
+            actions = [
+                DownloaderAction(
+                    image, path=image_path, params=parameters["images"][image]
+                )
+            ]
             if images_param[image].get("apply-overlay", False):
                 if self.test_needs_overlay(parameters):
                     use_root_part = (
                         images_param[image].get("root_partition") is not None
                     )
                     if images_param[image].get("sparse", False):
-                        self.pipeline.add_action(
-                            ApplyOverlaySparseImage(image_key=image)
-                        )
+                        actions.append(ApplyOverlaySparseImage(image_key=image))
                     else:
-                        self.pipeline.add_action(
+                        actions.append(
                             ApplyOverlayImage(
                                 image_key=image, use_root_partition=use_root_part
                             )
                         )
+            for action in actions:
+                if downloads is None:
+                    self.pipeline.add_action(action)
+                else:
+                    downloads.add(image, action)
+        if downloads is not None:
+            self.pipeline.add_action(WaitDownloadAction(downloads))
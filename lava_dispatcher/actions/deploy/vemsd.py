@@ -27,7 +27,11 @@ import shutil
 from lava_common.constants import VEXPRESS_AUTORUN_INTERRUPT_CHARACTER
 from lava_common.exceptions import InfrastructureError, LAVABug
 from lava_dispatcher.action import Action, Pipeline
-from lava_dispatcher.actions.deploy.download import DownloaderAction
+from lava_dispatcher.actions.deploy.download import (
+    DownloaderAction,
+    DownloadQueueAction,
+    WaitDownloadAction,
+)
 from lava_dispatcher.actions.deploy.lxc import LxcCreateUdevRuleAction
 from lava_dispatcher.connections.serial import ConnectDevice
 from lava_dispatcher.logical import Deployment, RetryAction
@@ -99,15 +103,24 @@ class VExpressMsdAction(Action):
     def populate(self, parameters):
         download_dir = self.mkdtemp()
         self.pipeline = Pipeline(parent=self, job=self.job, parameters=parameters)
-        self.pipeline.add_action(
-            DownloaderAction(
-                "recovery_image", path=download_dir, params=parameters["recovery_image"]
-            )
+        download = DownloaderAction(
+            "recovery_image", path=download_dir, params=parameters["recovery_image"]
         )
+        # In pipelined mode, the recovery image is downloaded while the board
+        # is reset.
+        downloads = None
+        if parameters.get("pipelined", False):
+            downloads = DownloadQueueAction()
+            self.pipeline.add_action(downloads)
+            downloads.add("recovery_image", download)
+        else:
+            self.pipeline.add_action(download)
         self.pipeline.add_action(LxcCreateUdevRuleAction())
         self.force_prompt = True
         self.pipeline.add_action(ConnectDevice())
         self.pipeline.add_action(ResetDevice())
+        if downloads is not None:
+            self.pipeline.add_action(WaitDownloadAction(downloads))
         self.pipeline.add_action(ExtractVExpressRecoveryImage())
         self.pipeline.add_action(EnterVExpressMCC())
         self.pipeline.add_action(EnableVExpressMassStorage())
@@ -27,6 +27,7 @@ from lava_common.decorators import nottest
 from lava_common.exceptions import ConnectionClosedError, LAVATimeoutError
 from lava_dispatcher.action import Action, Pipeline
 from lava_dispatcher.logical import LavaTest, RetryAction
+from lava_dispatcher.utils.matcher import compile_patterns
 
 
 @nottest
@@ -128,7 +129,8 @@ class TestMonitorAction(Action):
 
     def _keep_running(self, test_connection, timeout=120):
         self.logger.debug("test monitoring timeout: %d seconds", timeout)
-        retval = test_connection.expect(list(self.patterns.values()), timeout=timeout)
+        matcher = compile_patterns(list(self.patterns.values()))
+        retval = test_connection.expect(matcher, timeout=timeout)
         return self.check_patterns(list(self.patterns.keys())[retval], test_connection)
 
     def check_patterns(self, event, test_connection):
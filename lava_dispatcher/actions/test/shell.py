@@ -25,6 +25,7 @@ import time
 
 import pexpect
 
+from lava_common.constants import RESULTS_BATCH_RETRIES
 from lava_common.decorators import nottest
 from lava_common.exceptions import (
     ConnectionClosedError,
@@ -36,6 +37,8 @@ from lava_common.yaml import yaml_safe_dump
 from lava_dispatcher.action import Action, Pipeline
 from lava_dispatcher.connection import SignalMatch
 from lava_dispatcher.logical import LavaTest, RetryAction
+from lava_dispatcher.utils.matcher import compile_patterns
+from lava_dispatcher.utils.results import ResultsBatch
 
 
 def handle_testcase(params):
@@ -176,6 +179,7 @@ class TestShellAction(Action):
         # noinspection PyTypeChecker
         self.pattern = PatternFixup(testdef=None, count=0)
         self.current_run = None
+        self.batches = {}
 
     def _reset_patterns(self):
         # Extend the list of patterns when creating subclasses.
@@ -494,6 +498,9 @@ class TestShellAction(Action):
             self.logger.error(str(exc))
             return True
 
+        self._record_test_case(res, self.testset_name)
+
+    def _record_test_case(self, res, testset_name=None):
         # turn the result dict inside out to get the unique
         # test_case_id/testset_name as key and result as value
         res_data = {
@@ -511,10 +518,10 @@ class TestShellAction(Action):
             if "units" in res:
                 res_data["units"] = res["units"]
 
-        if self.testset_name:
-            res_data["set"] = self.testset_name
+        if testset_name:
+            res_data["set"] = testset_name
             self.report[res["test_case_id"]] = {
-                "set": self.testset_name,
+                "set": testset_name,
                 "result": res["result"],
             }
         else:
@@ -522,6 +529,82 @@ class TestShellAction(Action):
         # Send the results back
         self.logger.results(res_data)
 
+    @nottest
+    def signal_results(self, params, test_connection):
+        """
+        Batch of results sent by lava-test-results, see
+        lava_dispatcher.utils.results.
+        """
+        if self.signal_director.test_uuid is None:
+            self.logger.error(
+                "Unknown test uuid. The STARTRUN signal for this test action was not received correctly."
+            )
+            raise TestError("Invalid RESULTS signal")
+        try:
+            (kind, ident) = params[:2]
+            if kind == "START":
+                self.batches[ident] = ResultsBatch(params[2], params[3], int(params[4]))
+                self.logger.info(
+                    "Receiving %s results in %s chunks (%s)",
+                    params[2],
+                    params[4],
+                    ident,
+                )
+            elif kind == "CHUNK":
+                if not self.batches[ident].add(
+                    int(params[2]), int(params[3]), params[4]
+                ):
+                    self.logger.warning("Invalid chunk %s (%s)", params[2], ident)
+        except (IndexError, KeyError, ValueError):
+            # Serial corruption: the missing chunks will be sent again
+            self.logger.warning("Malformed RESULTS signal")
+            return
+        except JobError as exc:
+            self.logger.error(str(exc))
+            return
+        if kind != "END":
+            return
+
+        batch = self.batches.get(ident)
+        if batch is not None and not batch.done and not batch.missing():
+            try:
+                results = batch.results()
+            except JobError as exc:
+                self.logger.error(str(exc))
+                batch = None
+            else:
+                self.logger.info("Received %d test cases (%s)", len(results), ident)
+                for data in results:
+                    try:
+                        res = self.signal_match.match(
+                            data, fixupdict=self.pattern.fixupdict()
+                        )
+                        self._record_test_case(res, res.get("set", self.testset_name))
+                    except (JobError, TestError) as exc:
+                        self.logger.error(str(exc))
+                batch.done = True
+
+        if batch is not None and not batch.done:
+            batch.attempts += 1
+            if batch.attempts > RESULTS_BATCH_RETRIES:
+                batch = None
+        if batch is None:
+            self.logger.error("Unable to receive the results (%s)", ident)
+            reply = "<LAVA_RESULTS_NACK %s>" % ident
+        elif batch.done:
+            reply = "<LAVA_RESULTS_ACK %s>" % ident
+        else:
+            missing = batch.missing()
+            self.logger.warning(
+                "Requesting %d missing chunks (%s)", len(missing), ident
+            )
+            # Keep the reply shorter than the line limit of the terminal
+            reply = "<LAVA_RESULTS_RESEND %s %s>" % (
+                ident,
+                " ".join(str(index) for index in missing[:200]),
+            )
+        test_connection.sendline(reply, delay=self.character_delay)
+
     @nottest
     def signal_test_reference(self, params):
         if len(params) != 3:
@@ -662,6 +745,8 @@ class TestShellAction(Action):
                 self.signal_test_feedback(params)
             elif name == "TESTREFERENCE":
                 self.signal_test_reference(params)
+            elif name == "RESULTS":
+                self.signal_results(params, test_connection)
             elif name == "TESTSET":
                 ret = self.signal_test_set(params)
                 if ret:
@@ -685,7 +770,8 @@ class TestShellAction(Action):
             self.logger.info(
                 "Test case result pattern: %r" % self.patterns["test_case_results"]
             )
-        retval = test_connection.expect(list(self.patterns.values()), timeout=timeout)
+        matcher = compile_patterns(list(self.patterns.values()))
+        retval = test_connection.expect(matcher, timeout=timeout)
         return self.check_patterns(
             list(self.patterns.keys())[retval], test_connection, check_char
         )
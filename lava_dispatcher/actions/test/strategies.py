@@ -18,13 +18,14 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-# List just the subclasses supported for this base strategy
-# imported by the parser to populate the list of subclasses.
+# Map the test parameters onto the modules providing the strategies accepting
+# them. The modules are only imported by LavaTest.select() when a job needs
+# them.
 
-# pylint: disable=unused-import
-
-from lava_dispatcher.actions.test.docker import DockerTestShell
-from lava_dispatcher.actions.test.interactive import TestInteractive
-from lava_dispatcher.actions.test.monitor import TestMonitor
-from lava_dispatcher.actions.test.multinode import MultinodeTestShell
-from lava_dispatcher.actions.test.shell import TestShell
+STRATEGIES = {
+    "definitions": ["shell"],
+    "docker": ["docker"],
+    "interactive": ["interactive"],
+    "monitors": ["monitor"],
+    "role": ["multinode"],
+}
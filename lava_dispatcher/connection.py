@@ -26,6 +26,7 @@ import signal
 from lava_common.exceptions import LAVABug, TestError
 from lava_common.timeout import Timeout
 from lava_dispatcher.action import InternalObject
+from lava_dispatcher.logical import load_strategies
 
 RECOGNIZED_TAGS = ("telnet", "ssh", "shell")
 
@@ -203,6 +204,7 @@ class Protocol:
 
     name = "protocol"
     level = 0
+    strategies = "lava_dispatcher.protocols.strategies"
 
     def __init__(self, parameters, job_id):
         self.logger = logging.getLogger("dispatcher")
@@ -218,6 +220,8 @@ class Protocol:
         Multiple protocols can apply to the same job, each with their own parameters.
         Jobs may have zero or more protocols selected.
         """
+        if parameters.get("protocols"):
+            load_strategies(cls.strategies, list(parameters["protocols"]))
         candidates = cls.__subclasses__()
         return [(c, c.level) for c in candidates if c.accepts(parameters)]
 
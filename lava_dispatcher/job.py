@@ -244,9 +244,9 @@ class Job:
     def run(self):
         """
         Top level routine for the entire life of the Job, using the job level timeout.
-        Python only supports one alarm on SIGALRM - any Action without a connection
-        will have a default timeout which will use SIGALRM. So the overarching Job timeout
-        can only stop processing actions if the job wide timeout is exceeded.
+        Every timeout is a deadline of lava_common.timeout.scheduler: the Job timeout
+        interrupts the running actions, including the concurrent namespaces, when the
+        job wide timeout is exceeded.
         """
         try:
             self._run()
@@ -18,6 +18,10 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import collections
+import copy
+import importlib
+import threading
 import time
 
 from lava_common.exceptions import (
@@ -31,6 +35,56 @@ from lava_dispatcher.action import Action
 from lava_dispatcher.utils.strings import seconds_to_str
 
 
+def load_strategies(registry, keys=None):
+    """
+    Import the modules providing the strategies registered for the given keys.
+
+    registry is the name of a strategies module mapping each key (the deploy
+    "to", the boot "method", ...) onto modules of the same package. Every
+    registered module is imported when keys is None or not known.
+    """
+    strategies = importlib.import_module(registry).STRATEGIES
+    package = registry.rpartition(".")[0]
+    modules = set()
+    for key in keys or []:
+        modules.update(strategies.get(key, []))
+    if not modules:
+        modules = {module for names in strategies.values() for module in names}
+    for module in sorted(modules):
+        importlib.import_module("%s.%s" % (package, module))
+
+
+def select_strategies(cls, device, parameters, keys):
+    """
+    Return the subclasses of cls accepting the parameters, along with the
+    reasons given by the others.
+
+    Only the strategies registered for the keys are imported, unless none of
+    them accepts the parameters: every strategy is then loaded so that all the
+    reasons can be reported.
+    """
+    load_strategies(cls.strategies, keys)
+    for retry in [False, True]:
+        if retry:
+            load_strategies(cls.strategies)
+        replies = {}
+        willing = []
+        for c in cls.__subclasses__():
+            res = c.accepts(device, parameters)
+            if not isinstance(res, tuple):
+                raise LAVABug(
+                    "class %s accept function did not return a tuple" % c.__name__
+                )
+            if res[0]:
+                willing.append(c)
+            else:
+                class_name = c.name if hasattr(c, "name") else c.__name__
+                replies[class_name] = res[1]
+        if willing:
+            break
+    return (willing, replies)
+
+
 class RetryAction(Action):
     """
     RetryAction support failure_retry and repeat.
@@ -153,6 +207,7 @@ class Deployment:
     any Actions.
     """
 
+    strategies = "lava_dispatcher.actions.deploy.strategies"
     priority = 0
     section = "deploy"
     compatibility = 0
@@ -214,19 +269,9 @@ class Deployment:
     @classmethod
     def select(cls, device, parameters):
         cls.deploy_check(device, parameters)
-        candidates = cls.__subclasses__()
-        replies = {}
-        willing = []
-        for c in candidates:
-            res = c.accepts(device, parameters)
-            if not isinstance(res, tuple):
-                raise LAVABug(
-                    "class %s accept function did not return a tuple" % c.__name__
-                )
-            if res[0]:
-                willing.append(c)
-            else:
-                replies[c.name] = res[1]
+        (willing, replies) = select_strategies(
+            cls, device, parameters, [parameters["to"]]
+        )
 
         if not willing:
             replies_string = ""
@@ -246,6 +291,7 @@ class Boot:
     Allows selection of the boot method for this job within the parser.
     """
 
+    strategies = "lava_dispatcher.actions.boot.strategies"
     priority = 0
     section = "boot"
     compatibility = 0
@@ -282,20 +328,9 @@ class Boot:
     @classmethod
     def select(cls, device, parameters):
         cls.boot_check(device, parameters)
-        candidates = cls.__subclasses__()
-        replies = {}
-        willing = []
-        for c in candidates:
-            res = c.accepts(device, parameters)
-            if not isinstance(res, tuple):
-                raise LAVABug(
-                    "class %s accept function did not return a tuple" % c.__name__
-                )
-            if res[0]:
-                willing.append(c)
-            else:
-                class_name = c.name if hasattr(c, "name") else c.__name__
-                replies[class_name] = res[1]
+        (willing, replies) = select_strategies(
+            cls, device, parameters, [parameters["method"]]
+        )
 
         if not willing:
             replies_string = ""
@@ -315,6 +350,7 @@ class LavaTest:
     Allows selection of the LAVA test method for this job within the parser.
     """
 
+    strategies = "lava_dispatcher.actions.test.strategies"
     priority = 1
     section = "test"
     compatibility = 1  # used directly
@@ -331,20 +367,9 @@ class LavaTest:
 
     @classmethod
     def select(cls, device, parameters):
-        candidates = cls.__subclasses__()
-        replies = {}
-        willing = []
-        for c in candidates:
-            res = c.accepts(device, parameters)
-            if not isinstance(res, tuple):
-                raise LAVABug(
-                    "class %s accept function did not return a tuple" % c.__name__
-                )
-            if res[0]:
-                willing.append(c)
-            else:
-                class_name = c.name if hasattr(c, "name") else c.__name__
-                replies[class_name] = res[1]
+        (willing, replies) = select_strategies(
+            cls, device, parameters, list(parameters)
+        )
 
         if not willing:
             replies_string = ""
@@ -395,4 +420,123 @@ class PipelineContext:
 
     # FIXME: needs to pick up minimal general purpose config, e.g. proxy or cookies
     def __init__(self):
-        self.pipeline_data = {}
+        self.pipeline_data = NamespaceData()
+
+
+IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def is_immutable(value):
+    if type(value) in IMMUTABLE_TYPES:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(is_immutable(item) for item in value)
+    return False
+
+
+def copy_value(value):
+    """
+    Copy the value, sharing the immutable parts. Faster than copy.deepcopy for
+    the plain dicts and lists stored in the namespace data.
+    """
+    cls = type(value)
+    if cls in IMMUTABLE_TYPES:
+        return value
+    if cls is dict:
+        return {k: copy_value(v) for (k, v) in value.items()}
+    if cls is list:
+        return [copy_value(v) for v in value]
+    if cls is tuple and is_immutable(value):
+        return value
+    return copy.deepcopy(value)
+
+
+class NamespaceData(dict):
+    """
+    Storage of the namespace data, as data[namespace][action][label][key].
+
+    Values are only copied when needed: immutable values are shared with the
+    readers while lists and dicts are copied so that actions can modify them
+    without altering the values used by other actions.
+
+    For debugging, the store tracks which action wrote each key and keeps a
+    journal of the last changes of every key.
+    """
+
+    # Number of changes kept in the journal for each key
+    JOURNAL_LENGTH = 32
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__journal__ = {}
+        # Protect the journal from the concurrent namespaces
+        self.__lock__ = threading.Lock()
+
+    def get_value(self, namespace, action, label, key, deepcopy=True):
+        value = self.get(namespace, {}).get(action, {}).get(label, {}).get(key)
+        if value is None or not deepcopy:
+            return value
+        return copy_value(value)
+
+    def set_value(self, namespace, action, label, key, value, writer=None):
+        (
+            self.setdefault(namespace, {})
+            .setdefault(action, {})
+            .setdefault(label, {})[key]
+        ) = value
+        with self.__lock__:
+            entries = self.__journal__.get((namespace, action, label, key))
+            if entries is None:
+                entries = self.__journal__[
+                    (namespace, action, label, key)
+                ] = collections.deque(maxlen=self.JOURNAL_LENGTH)
+            # Mutable values are not copied: the journal shows them as they
+            # are now, including any later modification made in place.
+            entries.append((writer, time.monotonic(), value))
+
+    def writer(self, namespace, action, label, key):
+        """
+        Return the name of the last action which set the key.
+        """
+        entries = self.__journal__.get((namespace, action, label, key))
+        return entries[-1][0] if entries else None
+
+    def journal(self, namespace, action, label, key):
+        """
+        Return the changes of the key, oldest first, as a list of dicts.
+        """
+        with self.__lock__:
+            entries = list(self.__journal__.get((namespace, action, label, key), []))
+        return [
+            {"writer": writer, "time": timestamp, "value": value}
+            for (writer, timestamp, value) in entries
+        ]
+
+    def dump(self):
+        """
+        Return the journal of every key, as a list of dicts that can be
+        serialized in yaml.
+        """
+        ret = []
+        with self.__lock__:
+            keys = list(self.__journal__)
+        for (namespace, action, label, key) in keys:
+            ret.append(
+                {
+                    "namespace": namespace,
+                    "action": action,
+                    "label": label,
+                    "key": key,
+                    "changes": [
+                        {
+                            "writer": change["writer"],
+                            "time": round(change["time"], 6),
+                            "value": change["value"]
+                            if type(change["value"]) in IMMUTABLE_TYPES
+                            else str(change["value"]),
+                        }
+                        for change in self.journal(namespace, action, label, key)
+                    ],
+                }
+            )
+        return ret
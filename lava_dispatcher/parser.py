@@ -18,12 +18,6 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-# Bring in the strategy subclass lists, ignore pylint warnings.
-# pylint: disable=unused-import
-import lava_dispatcher.actions.boot.strategies
-import lava_dispatcher.actions.deploy.strategies
-import lava_dispatcher.actions.test.strategies
-import lava_dispatcher.protocols.strategies
 from lava_common.yaml import yaml_safe_load
 from lava_dispatcher.action import JobError, Pipeline, Timeout
 from lava_dispatcher.actions.commands import CommandAction
@@ -0,0 +1,131 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Pre-forked lava-run.
+
+"lava-run --prefork" imports the dispatcher once and then waits for job
+requests on stdin, one json object per line:
+
+    {"args": [...], "env": {...}, "stdout": "path", "stderr": "path"}
+
+For each request, a child is forked and runs lava-run main() with the given
+arguments and environment. The pid of the child is written back on stdout, as
+a json object, so lava-worker can monitor and cancel the job like any other
+lava-run process.
+"""
+
+import json
+import logging
+import os
+import signal
+import sys
+import traceback
+
+from lava_common.log import YAMLLogger
+
+REGISTRIES = [
+    "lava_dispatcher.actions.boot.strategies",
+    "lava_dispatcher.actions.deploy.strategies",
+    "lava_dispatcher.actions.test.strategies",
+    "lava_dispatcher.protocols.strategies",
+]
+
+
+def warm_up():
+    """
+    Import every strategy so that the forked children only have to parse and
+    run the job.
+    """
+    # Every logger created while importing should be a YAMLLogger, like in
+    # lava-run.
+    logging.setLoggerClass(YAMLLogger)
+
+    from lava_dispatcher.logical import load_strategies
+
+    for registry in REGISTRIES:
+        load_strategies(registry)
+
+
+def child(main, request):
+    """
+    Setup the forked process like subprocess.Popen would do in lava-worker and
+    call main(). Never returns.
+    """
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setpgrp()
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        stdout = os.open(request["stdout"], flags, 0o644)
+        stderr = os.open(request["stderr"], flags, 0o644)
+        for (fd, target) in [(stdin, 0), (stdout, 1), (stderr, 2)]:
+            os.dup2(fd, target)
+            os.close(fd)
+        # The standard streams were the pipes to lava-worker
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = ["lava-run"] + request["args"]
+        code = main()
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code or 0)
+
+
+def serve(main, rfile=sys.stdin, wfile=sys.stdout):
+    """
+    Fork a process calling main() for each request until stdin is closed.
+    """
+    warm_up()
+    # The children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    for line in rfile:
+        try:
+            request = json.loads(line)
+            for key in ["args", "env", "stdout", "stderr"]:
+                if key not in request:
+                    raise ValueError("missing %r" % key)
+        except ValueError as exc:
+            wfile.write(json.dumps({"error": str(exc)}) + "\n")
+            wfile.flush()
+            continue
+
+        try:
+            pid = os.fork()
+        except OSError as exc:
+            wfile.write(json.dumps({"error": str(exc)}) + "\n")
+            wfile.flush()
+            continue
+
+        if pid == 0:
+            child(main, request)
+        wfile.write(json.dumps({"pid": pid}) + "\n")
+        wfile.flush()
+    return 0
@@ -56,6 +56,9 @@ class MultinodeProtocol(Protocol):
         self.system_timeout = Timeout("system", LAVA_MULTINODE_SYSTEM_TIMEOUT)
         self.settings = None
         self.sock = None
+        # persistent connection to the coordinator, see poll()
+        self.connection = None
+        self.request_id = 0
         self.base_message = None
         self.logger = logging.getLogger("dispatcher")
         self.delayed_start = False
@@ -94,6 +97,7 @@ class MultinodeProtocol(Protocol):
             "blocksize": 4 * 1024,
             "poll_delay": 1,
             "coordinator_hostname": "localhost",
+            "persistent": True,
         }
         self.logger = logging.getLogger("dispatcher")
         json_default = {}
@@ -113,6 +117,8 @@ class MultinodeProtocol(Protocol):
             settings["poll_delay"] = json_default["poll_delay"]
         if "coordinator_hostname" in json_default:
             settings["coordinator_hostname"] = json_default["coordinator_hostname"]
+        if "persistent" in json_default:
+            settings["persistent"] = json_default["persistent"]
         return settings
 
     def _connect(self, delay):
@@ -192,6 +198,12 @@ class MultinodeProtocol(Protocol):
         msg_len = len(message)
         if msg_len > 0xFFFE:
             raise JobError("Message was too long to send!")
+        if self.settings.get("persistent"):
+            response = self._poll_persistent(message, timeout)
+            if response is not None:
+                return response
+            self.logger.debug("The coordinator does not keep the connection open")
+            self.settings["persistent"] = False
         c_iter = 0
         response = None
         delay = self.settings["poll_delay"]
@@ -237,6 +249,84 @@ class MultinodeProtocol(Protocol):
                 raise MultinodeProtocolTimeoutError("protocol %s timed out" % self.name)
         return response
 
+    def _recv_exactly(self, count):
+        data = b""
+        while len(data) < count:
+            block = self.connection.recv(min(count - len(data), self.blocks))
+            if not block:
+                raise ConnectionResetError("connection closed by the coordinator")
+            data += block
+        return data
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _poll_persistent(self, message, timeout):
+        """
+        Send the request over the persistent connection and wait for the
+        coordinator to push the response: blocking requests are answered only
+        when the group reaches the expected state.
+        The request is sent again with the same requestID after a
+        reconnection, so the coordinator does not run it twice.
+        :return: a JSON string of the response or None if the coordinator
+        does not support persistent connections.
+        """
+        self.request_id += 1
+        request = json.loads(message)
+        request["requestID"] = "%s.%d" % (self.job_id, self.request_id)
+        data = json.dumps(request).encode("utf-8")
+        data = ("%08X" % len(data)).encode("utf-8") + data
+        deadline = time.monotonic() + timeout
+        send = True
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._disconnect()
+                self.finalise_protocol()
+                raise MultinodeProtocolTimeoutError("protocol %s timed out" % self.name)
+            try:
+                if self.connection is None:
+                    self.connection = socket.create_connection(
+                        (self.settings["coordinator_hostname"], self.settings["port"]),
+                        timeout=min(remaining, 10),
+                    )
+                    self.connection.setsockopt(
+                        socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1
+                    )
+                    send = True
+                if send:
+                    self.connection.sendall(data)
+                    send = False
+                self.connection.settimeout(remaining)
+                header = self._recv_exactly(8)
+                response = self._recv_exactly(int(header, 16)).decode("utf-8")
+            except socket.timeout:
+                continue
+            except (OSError, ValueError) as exc:
+                self.logger.warning(
+                    "Connection to the coordinator lost (%s), reconnecting", exc
+                )
+                self._disconnect()
+                time.sleep(self.settings["poll_delay"])
+                continue
+            reply = json.loads(response)
+            if "requestID" not in reply:
+                # The coordinator answers and closes the connection
+                self._disconnect()
+                return None if reply["response"] == "wait" else response
+            if reply["requestID"] != request["requestID"]:
+                self.logger.debug("Ignoring the response to %s", reply["requestID"])
+                continue
+            if reply["response"] == "wait":
+                # Not a blocking request: ask again later
+                time.sleep(self.settings["poll_delay"])
+                send = True
+                continue
+            del reply["requestID"]
+            return json.dumps(reply)
+
     def configure(self, device, job):
         """
         Called by job.validate() to populate internal data
@@ -303,6 +393,7 @@ class MultinodeProtocol(Protocol):
             "port": 3179,  # debug port
             "coordinator_hostname": "localhost",
             "poll_delay": 3,
+            "persistent": False,
         }
 
         self.base_message = {
@@ -346,6 +437,7 @@ class MultinodeProtocol(Protocol):
                 "group_size": self.parameters["protocols"][self.name]["group_size"],
             }
             self._send(fin_msg, True)
+        self._disconnect()
         self.logger.debug("%s protocol finalised.", self.name)
 
     def _check_data(self, data):
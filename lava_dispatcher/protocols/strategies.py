@@ -18,9 +18,12 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-# pylint: disable=unused-import
+# Map each protocol name onto the module implementing it. The modules are only
+# imported by Protocol.select_all() when a job needs them.
 
-from lava_dispatcher.protocols.lxc import LxcProtocol
-from lava_dispatcher.protocols.multinode import MultinodeProtocol
-from lava_dispatcher.protocols.vland import VlandProtocol
-from lava_dispatcher.protocols.xnbd import XnbdProtocol
+STRATEGIES = {
+    "lava-lxc": ["lxc"],
+    "lava-multinode": ["multinode"],
+    "lava-vland": ["vland"],
+    "lava-xnbd": ["xnbd"],
+}
@@ -24,6 +24,7 @@ import sre_constants
 import time
 
 import pexpect
+from pexpect.expect import Expecter
 
 from lava_common.constants import LINE_SEPARATOR
 from lava_common.exceptions import (
@@ -36,6 +37,7 @@ from lava_common.exceptions import (
 from lava_common.timeout import Timeout
 from lava_dispatcher.action import Action
 from lava_dispatcher.connection import Connection
+from lava_dispatcher.utils.matcher import PatternMatcher, compile_patterns
 from lava_dispatcher.utils.strings import seconds_to_str
 
 
@@ -170,9 +172,14 @@ class ShellCommand(pexpect.spawn):
         """
         No point doing explicit logging here, the SignalDirector can help
         the TestShellAction make much more useful reports of what was matched
+
+        The pattern can be a PatternMatcher, pre-compiled by the caller.
         """
         try:
-            proc = super().expect(*args, **kw)
+            if args and isinstance(args[0], PatternMatcher):
+                proc = self.expect_matcher(*args, **kw)
+            else:
+                proc = super().expect(*args, **kw)
         except sre_constants.error as exc:
             msg = "Invalid regular expression '%s': %s" % (exc.pattern, exc.msg)
             raise TestError(msg)
@@ -185,11 +192,25 @@ class ShellCommand(pexpect.spawn):
             raise ConnectionClosedError("Connection closed")
         return proc
 
+    def expect_matcher(self, matcher, timeout=-1, searchwindowsize=-1):
+        """
+        Same as pexpect.spawn.expect_list but using a PatternMatcher.
+
+        Unless searchwindowsize is set, the fresh data is always searched
+        entirely, along with the lookback of the matcher.
+        """
+        if timeout == -1:
+            timeout = self.timeout
+        if searchwindowsize == -1:
+            searchwindowsize = None
+        return Expecter(self, matcher, searchwindowsize).expect_loop(timeout)
+
     def empty_buffer(self):
         """Make sure there is nothing in the pexpect buffer."""
         index = 0
+        matcher = compile_patterns([".+", pexpect.EOF, pexpect.TIMEOUT])
         while index == 0:
-            index = self.expect([".+", pexpect.EOF, pexpect.TIMEOUT], timeout=1)
+            index = self.expect(matcher, timeout=1)
 
     def flush(self):
         """Will be called by pexpect itself when closing the connection"""
@@ -258,15 +279,14 @@ class ShellSession(Connection):
             return self.wait()
         # connection_prompt_limit
         partial_timeout = remaining / 2.0
+        matcher = compile_patterns(self.prompt_str)
         self.logger.debug(
             "Waiting using forced prompt support (timeout %s)"
             % seconds_to_str(partial_timeout)
         )
         while True:
             try:
-                return self.raw_connection.expect(
-                    self.prompt_str, timeout=partial_timeout
-                )
+                return self.raw_connection.expect(matcher, timeout=partial_timeout)
             except (pexpect.TIMEOUT, TestError) as exc:
                 if prompt_wait_count < 6:
                     self.logger.warning(
@@ -302,11 +322,10 @@ class ShellSession(Connection):
             raise LAVABug("Invalid max_end_time value passed to wait()")
         try:
             if max_searchwindowsize:
-                return self.raw_connection.expect(
-                    self.prompt_str, timeout=timeout, searchwindowsize=None
-                )
+                matcher = compile_patterns(self.prompt_str, lookback=None)
             else:
-                return self.raw_connection.expect(self.prompt_str, timeout=timeout)
+                matcher = compile_patterns(self.prompt_str)
+            return self.raw_connection.expect(matcher, timeout=timeout)
         except (TestError, pexpect.TIMEOUT):
             raise JobError("wait for prompt timed out")
         except ConnectionClosedError as exc:
@@ -328,7 +347,7 @@ class ShellSession(Connection):
             self.raw_connection.logfile.is_feedback = True
             self.raw_connection.logfile.namespace = namespace
             index = self.raw_connection.expect(
-                [".+", pexpect.EOF, pexpect.TIMEOUT], timeout=timeout
+                compile_patterns([".+", pexpect.EOF, pexpect.TIMEOUT]), timeout=timeout
             )
         finally:
             self.raw_connection.logfile.is_feedback = False
@@ -17,18 +17,168 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses>.
 
+import contextlib
+import fcntl
+import json
 import logging
 import random
+import select
 import subprocess
+import threading
 import time
 from pathlib import Path
 
+from lava_common.constants import DOCKER_IMAGES_CACHE, DOCKER_IMAGES_TTL
 from lava_common.exceptions import InfrastructureError
 
 
+class DockerImages:
+    """
+    Worker-local cache of the docker images, shared by lava-worker and every
+    lava-run.
+
+    For each image, the cache records the digest (image id) the tag was
+    resolved to, when, and the jobs using it. A tag is only pulled again once
+    the ttl has expired.
+    """
+
+    def __init__(self, path=DOCKER_IMAGES_CACHE, ttl=DOCKER_IMAGES_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.__prefetching__ = set()
+
+    @classmethod
+    def get(cls):
+        """
+        Return the worker cache or None when not running on a worker.
+        """
+        if DOCKER_IMAGES_CACHE is None or not Path(DOCKER_IMAGES_CACHE).parent.is_dir():
+            return None
+        return cls(DOCKER_IMAGES_CACHE, DOCKER_IMAGES_TTL)
+
+    @contextlib.contextmanager
+    def __data__(self, write=True):
+        with open(str(self.path) + ".lock", "w") as f_lock:
+            fcntl.flock(f_lock, fcntl.LOCK_EX)
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            yield data
+            if write:
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(data), encoding="utf-8")
+                tmp.replace(self.path)
+
+    def digest(self, image):
+        """
+        Return the digest of the image if resolved during the last ttl seconds.
+        """
+        with self.__data__(write=False) as data:
+            entry = data.get(image)
+        if entry is None or time.time() - entry["resolved"] > self.ttl:
+            return None
+        return entry["digest"]
+
+    def resolved(self, image, digest):
+        with self.__data__() as data:
+            entry = data.setdefault(image, {"jobs": []})
+            entry["digest"] = digest
+            entry["resolved"] = time.time()
+
+    def use(self, image, job_id):
+        with self.__data__() as data:
+            entry = data.setdefault(image, {"jobs": [], "resolved": 0})
+            if str(job_id) not in entry["jobs"]:
+                entry["jobs"].append(str(job_id))
+
+    def release(self, job_id):
+        with self.__data__() as data:
+            for entry in data.values():
+                if str(job_id) in entry["jobs"]:
+                    entry["jobs"].remove(str(job_id))
+
+    def in_use(self):
+        with self.__data__(write=False) as data:
+            return sorted(image for image, entry in data.items() if entry["jobs"])
+
+    def pull(self, image):
+        """
+        Pull the image and record the resulting digest.
+        """
+        subprocess.check_call(
+            ["docker", "pull", image],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        digest = image_id(image)
+        self.resolved(image, digest)
+        return digest
+
+    def prefetch(self, images):
+        """
+        Pull, in the background, the images that are not already fresh in the
+        cache. Return the threads that were started.
+        """
+        threads = []
+        for image in images:
+            if image in self.__prefetching__ or self.digest(image) is not None:
+                continue
+            self.__prefetching__.add(image)
+            thread = threading.Thread(
+                target=self.__prefetch__, args=(image,), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def __prefetch__(self, image):
+        logger = logging.getLogger("lava-worker")
+        try:
+            logger.info("[DOCKER] Prefetching %s", image)
+            digest = self.pull(image)
+            logger.info("[DOCKER] Prefetched %s (%s)", image, digest)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            logger.warning("[DOCKER] Unable to prefetch %s: %s", image, exc)
+        finally:
+            self.__prefetching__.discard(image)
+
+
+def image_id(image):
+    return subprocess.check_output(
+        ["docker", "image", "inspect", "--format={{.Id}}", image],
+        stderr=subprocess.DEVNULL,
+        text=True,
+    ).strip()
+
+
+def images_from_definition(definition):
+    """
+    Return the docker images used by DockerRun in the job definition.
+    """
+    images = set()
+
+    def walk(data):
+        if isinstance(data, dict):
+            docker = data.get("docker")
+            if isinstance(docker, dict) and isinstance(docker.get("image"), str):
+                if not docker.get("local", False):
+                    images.add(docker["image"])
+            for value in data.values():
+                walk(value)
+        elif isinstance(data, list):
+            for value in data:
+                walk(value)
+
+    walk(definition)
+    return sorted(images)
+
+
 class DockerRun:
     def __init__(self, image):
         self.image = image
+        self.__digest__ = None
+        self.__job_id__ = None
         self.__local__ = False
         self.__name__ = None
         self.__network__ = None
@@ -47,6 +197,7 @@ class DockerRun:
     def from_parameters(cls, params, job):
         image = params["image"]
         run = cls(image)
+        run.__job_id__ = job.job_id
         suffix = "-lava-" + str(job.job_id)
         if "container_name" in params:
             run.name(params["container_name"] + suffix)
@@ -110,10 +261,17 @@ class DockerRun:
         )
         cmd += self.interaction_options()
         cmd += self.start_options()
-        cmd.append(self.image)
+        cmd.append(self.pinned_image())
         cmd += args
         return cmd
 
+    def pinned_image(self):
+        """
+        The digest the image was resolved to by prepare(), if any, so that all
+        the containers of a job use the same image.
+        """
+        return self.__digest__ or self.image
+
     def interaction_options(self):
         cmd = []
         if self.__interactive__:
@@ -170,26 +328,84 @@ class DockerRun:
                 action=action,
             )
         else:
-            self.run_cmd(["docker", "pull", self.image], action=action)
+            images = DockerImages.get()
+            digest = images.digest(self.image) if images else None
+            if digest is not None and self.__image_exists__(digest):
+                logger = logging.getLogger("dispatcher")
+                logger.debug("Using %s from the worker cache (%s)", self.image, digest)
+            else:
+                self.run_cmd(["docker", "pull", self.image], action=action)
+                if images:
+                    digest = image_id(self.image)
+                    images.resolved(self.image, digest)
+            if images:
+                self.__digest__ = digest
+                if self.__job_id__ is not None:
+                    images.use(self.image, self.__job_id__)
         self.__check_image_arch__()
 
+    def __image_exists__(self, image):
+        return (
+            subprocess.call(
+                ["docker", "image", "inspect", "--format=.", image],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            == 0
+        )
+
+    def __container_exists__(self):
+        try:
+            subprocess.check_call(
+                ["docker", "inspect", "--format=.", self.__name__],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
     def wait(self, shell=None):
-        delay = 1
-        while True:
-            try:
+        """
+        Wait for the container to be created, as reported by "docker events".
+        Fallback to polling "docker inspect" when the events are not available.
+        """
+        try:
+            events = subprocess.Popen(
+                [
+                    "docker",
+                    "events",
+                    f"--filter=container={self.__name__}",
+                    "--filter=event=create",
+                    "--filter=event=start",
+                    "--format={{.Status}}",
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            events = None
+
+        try:
+            delay = 1
+            # The container might have been created before listening to the
+            # events
+            while not self.__container_exists__():
                 # If possible, check that docker's shell command didn't exit
                 # yet.
                 if shell and not shell.isalive():
                     raise InfrastructureError("Docker container unexpectedly exited")
-                subprocess.check_call(
-                    ["docker", "inspect", "--format=.", self.__name__],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-                return
-            except subprocess.CalledProcessError:
-                time.sleep(delay)
-                delay = delay * 2  # exponential backoff
+                if events is not None and events.poll() is None:
+                    (ready, _, _) = select.select([events.stdout], [], [], 1)
+                    if ready and events.stdout.readline():
+                        return
+                else:
+                    time.sleep(delay)
+                    delay = delay * 2  # exponential backoff
+        finally:
+            if events is not None:
+                events.kill()
+                events.wait()
 
     def wait_file(self, filename):
         delay = 1
@@ -216,7 +432,7 @@ class DockerRun:
     def __check_image_arch__(self):
         host = subprocess.check_output(["arch"], text=True).strip()
         container = subprocess.check_output(
-            ["docker", "inspect", "--format", "{{.Architecture}}", self.image],
+            ["docker", "inspect", "--format", "{{.Architecture}}", self.pinned_image()],
             text=True,
         ).strip()
         # amd64 = x86_64
@@ -263,7 +479,7 @@ class DockerContainer(DockerRun):
 
         cmd = ["docker", "run", "--detach"]
         cmd += self.start_options()
-        cmd.append(self.image)
+        cmd.append(self.pinned_image())
         cmd += ["sleep", "infinity"]
         self.run_cmd(cmd, action)
         self.wait()
@@ -18,7 +18,19 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
-from lava_common.constants import LXC_PROTOCOL
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+from lava_common.constants import (
+    LXC_CACHE_MAX_AGE,
+    LXC_CACHE_MAX_SIZE,
+    LXC_CACHE_PREFIX,
+    LXC_PROTOCOL,
+)
 
 
 def is_lxc_requested(job):
@@ -38,3 +50,138 @@ def lxc_cmd_prefix(job):
     if not name:
         return []
     return ["lxc-attach", "-n", name, "--"]
+
+
+def lxc_cache_config(job):
+    """Returns the configuration of the cache of base containers.
+
+    Returns None when the dispatcher does not enable the cache or when the
+    job requests a persistent container.
+    """
+    config = job.parameters.get("dispatcher", {}).get("lxc_cache")
+    if not config:
+        return None
+    if job.parameters.get("protocols", {}).get(LXC_PROTOCOL, {}).get("persist"):
+        return None
+    return config if isinstance(config, dict) else {}
+
+
+class LxcCache:
+    """
+    Worker-local cache of provisioned base containers.
+
+    A base container is created from the template and provisioned with the
+    packages once, the jobs then get copy-on-write clones of it. The bases are
+    named after a hash of the parameters that define their content and their
+    metadata is saved in the container directory once provisioned.
+    """
+
+    METADATA = "lava-cache.json"
+
+    def __init__(self, path, config):
+        self.path = path
+        self.max_age = config.get("max_age", LXC_CACHE_MAX_AGE)
+        # In GB in the dispatcher configuration
+        self.max_size = (
+            config["max_size"] * 1024**3
+            if "max_size" in config
+            else LXC_CACHE_MAX_SIZE
+        )
+        self.backing_store = config.get("backing_store")
+
+    @staticmethod
+    def key(lxc_data, packages):
+        data = [
+            lxc_data["lxc_template"],
+            lxc_data["lxc_distribution"],
+            lxc_data["lxc_release"],
+            lxc_data["lxc_arch"],
+            lxc_data["lxc_mirror"],
+            lxc_data["lxc_security_mirror"],
+            sorted(packages),
+        ]
+        return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def name(key):
+        return LXC_CACHE_PREFIX + key[:16]
+
+    def exists(self, name):
+        return os.path.isdir(os.path.join(self.path, name))
+
+    def metadata(self, name):
+        with contextlib.suppress(FileNotFoundError, ValueError):
+            with open(
+                os.path.join(self.path, name, self.METADATA), encoding="utf-8"
+            ) as f_in:
+                return json.load(f_in)
+        return None
+
+    def save(self, name, metadata):
+        filename = os.path.join(self.path, name, self.METADATA)
+        with open(filename + ".tmp", "w", encoding="utf-8") as f_out:
+            json.dump(metadata, f_out)
+        os.replace(filename + ".tmp", filename)
+
+    def entries(self):
+        """
+        Returns the metadata of the provisioned base containers.
+        """
+        entries = {}
+        with contextlib.suppress(FileNotFoundError):
+            for name in os.listdir(self.path):
+                if not name.startswith(LXC_CACHE_PREFIX) or not self.exists(name):
+                    continue
+                metadata = self.metadata(name)
+                if metadata is not None:
+                    entries[name] = metadata
+        return entries
+
+    def expired(self, metadata, now):
+        return now - metadata["created"] > self.max_age
+
+    def evictions(self, now, keep=None):
+        """
+        Returns the base containers to destroy: the expired ones, then the
+        least recently used until the cache fits in its disk budget.
+        """
+        entries = sorted(self.entries().items(), key=lambda e: e[1]["used"])
+        names = [
+            name
+            for (name, metadata) in entries
+            if name != keep and self.expired(metadata, now)
+        ]
+        size = sum(m["size"] for (name, m) in entries if name not in names)
+        for (name, metadata) in entries:
+            if size <= self.max_size:
+                break
+            if name == keep or name in names:
+                continue
+            names.append(name)
+            size -= metadata["size"]
+        return names
+
+    @contextlib.contextmanager
+    def lock(self, name, blocking=True):
+        """
+        Lock the base container against the other jobs of the worker.
+        Yields False when not blocking and the lock is already taken.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, name + ".lock"), "w") as f_lock:
+            try:
+                fcntl.flock(
+                    f_lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                )
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f_lock, fcntl.LOCK_UN)
+
+    def touch(self, name, now=None):
+        metadata = self.metadata(name)
+        metadata["used"] = time.time() if now is None else now
+        self.save(name, metadata)
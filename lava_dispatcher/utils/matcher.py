@@ -0,0 +1,237 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import copy
+import functools
+import re
+
+import pexpect
+
+from lava_common.exceptions import TestError
+
+# Flags that can be expressed as a scoped inline group "(?ims:...)"
+SCOPED_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+# Back references are numbered relatively to the original pattern and would be
+# wrong once the pattern is embedded into the combined expression.
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+SPECIAL_CHARS = "\\.^$*+?{}[]|()"
+# Size of the already scanned data that is searched again with the fresh data.
+# Along with the maximum size of a read (maxread), this is the pexpect
+# searchwindowsize used by ShellCommand.
+LOOKBACK = 2000
+
+
+def has_literal_prefix(compiled):
+    """
+    Return True when the regular expression starts with a mandatory literal
+    character. The re module then uses a fast search for the prefix, which is
+    quicker than any combined expression.
+    """
+    if compiled.flags & re.IGNORECASE:
+        return False
+    pattern = compiled.pattern
+    if not isinstance(pattern, str) or not pattern or pattern[0] in SPECIAL_CHARS:
+        return False
+    return len(pattern) == 1 or pattern[1] not in "*?{"
+
+
+class PatternMatcher:
+    """
+    A pre-compiled list of pexpect patterns.
+
+    The patterns are accepted in the same form as pexpect.spawn.expect: strings
+    (compiled with re.DOTALL like pexpect does), compiled regular expressions,
+    pexpect.EOF and pexpect.TIMEOUT.
+
+    Patterns starting with a literal (like the LAVA signals or the kernel
+    messages) are searched one by one as the re module skips quickly to the
+    occurrences of the prefix. All the other patterns are merged into a single
+    alternation so that the buffer is scanned once for all of them. The
+    leftmost match wins and ties are resolved by the lowest index, which are
+    the pexpect semantics. The match of the winning pattern is computed again
+    with the original regular expression so that match.group() and
+    match.groupdict() are identical to pexpect.
+
+    The matcher implements the pexpect searcher interface and is used by
+    ShellCommand.expect. Only the fresh data and the last `lookback`
+    characters of the already scanned data are searched: data before the
+    previous match is never scanned again.
+    """
+
+    def __init__(self, patterns, lookback=LOOKBACK):
+        if patterns is None:
+            patterns = []
+        elif not isinstance(patterns, (list, tuple)):
+            patterns = [patterns]
+        self.patterns = list(patterns)
+        self.lookback = lookback
+        self.eof_index = -1
+        self.timeout_index = -1
+        self.start = None
+        self.end = None
+        self.match = None
+
+        compiled_patterns = []
+        for index, pattern in enumerate(self.patterns):
+            if pattern is pexpect.EOF:
+                self.eof_index = index
+            elif pattern is pexpect.TIMEOUT:
+                self.timeout_index = index
+            elif isinstance(pattern, str):
+                try:
+                    compiled_patterns.append((index, re.compile(pattern, re.DOTALL)))
+                except re.error as exc:
+                    raise TestError(
+                        "Invalid regular expression '%s': %s" % (exc.pattern, exc.msg)
+                    )
+            elif isinstance(pattern, re.Pattern):
+                compiled_patterns.append((index, pattern))
+            else:
+                raise TypeError(
+                    "Unsupported pattern type %s: %r"
+                    % (type(pattern).__name__, pattern)
+                )
+
+        self._all = compiled_patterns
+        self._searches = [p for p in compiled_patterns if has_literal_prefix(p[1])]
+        others = [p for p in compiled_patterns if not has_literal_prefix(p[1])]
+        self._combined, self._groups = self._combine(others)
+        if self._combined is None:
+            self._searches = compiled_patterns
+
+    @property
+    def longest_string(self):
+        # pexpect.Expecter keeps this many characters of the buffer between
+        # two reads when no searchwindowsize is given.
+        return self.lookback
+
+    def _combine(self, patterns):
+        """
+        Build the single regular expression matching every given pattern.
+        Returns (None, None) when the patterns cannot be merged safely; the
+        patterns are then searched one by one.
+        """
+        if len(patterns) < 2:
+            return None, None
+        parts = []
+        groups = {}
+        group = 1
+        for index, compiled in patterns:
+            if not isinstance(compiled.pattern, str):
+                return None, None
+            flags = compiled.flags & ~re.UNICODE
+            letters = ""
+            for flag, letter in SCOPED_FLAGS:
+                if flags & flag:
+                    letters += letter
+                    flags &= ~flag
+            if flags or (compiled.groups and BACKREFERENCE.search(compiled.pattern)):
+                return None, None
+            parts.append("((?%s:%s))" % (letters, compiled.pattern))
+            groups[group] = (index, compiled)
+            group += compiled.groups + 1
+        try:
+            return re.compile("|".join(parts)), groups
+        except re.error:
+            # inline global flags or duplicated group names
+            return None, None
+
+    def search(self, buffer, freshlen, searchwindowsize=None):
+        """
+        Search the buffer for the first occurrence of one of the patterns.
+        'freshlen' is the number of characters at the end of 'buffer' which
+        have not been searched before.
+
+        If there is a match, returns the index of the pattern and sets
+        'start', 'end' and 'match'. Otherwise, returns -1.
+        """
+        if searchwindowsize is not None:
+            searchstart = max(0, len(buffer) - searchwindowsize)
+        elif self.lookback is not None:
+            searchstart = max(0, len(buffer) - freshlen - self.lookback)
+        else:
+            searchstart = 0
+
+        best = None
+        best_index = -1
+        for index, compiled in self._searches:
+            match = compiled.search(buffer, searchstart)
+            if match is not None and (
+                best is None
+                or match.start() < best.start()
+                or (match.start() == best.start() and index < best_index)
+            ):
+                best = match
+                best_index = index
+
+        if self._combined is not None:
+            match = self._combined.search(buffer, searchstart)
+            if match is not None:
+                index, compiled = self._groups[match.lastindex]
+                if (
+                    best is None
+                    or match.start() < best.start()
+                    or (match.start() == best.start() and index < best_index)
+                ):
+                    best = compiled.match(buffer, match.start())
+                    best_index = index
+
+        if best is None:
+            return -1
+        self.match = best
+        self.start = best.start()
+        self.end = best.end()
+        return best_index
+
+    def __str__(self):
+        lines = ["searcher_re:"]
+        for index, compiled in self._all:
+            lines.append("    %d: re.compile(%r)" % (index, compiled.pattern))
+        if self.eof_index >= 0:
+            lines.append("    %d: EOF" % self.eof_index)
+        if self.timeout_index >= 0:
+            lines.append("    %d: TIMEOUT" % self.timeout_index)
+        return "\n".join(lines)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_patterns(patterns, lookback):
+    return PatternMatcher(list(patterns), lookback=lookback)
+
+
+def compile_patterns(patterns, lookback=LOOKBACK):
+    """
+    Return a PatternMatcher for the given patterns.
+
+    Matchers are cached so that actions switching between a few sets of
+    patterns (like the test shell or the kernel messages) only compile each
+    set once. With lookback=None, the whole buffer is searched.
+
+    The cached matchers are never searched: each call returns a copy sharing
+    the compiled expressions, with its own match state, so that connections
+    running in different threads do not read the match of each other.
+    """
+    if patterns is None:
+        patterns = []
+    elif not isinstance(patterns, (list, tuple)):
+        patterns = [patterns]
+    try:
+        return copy.copy(_compile_patterns(tuple(patterns), lookback))
+    except TypeError:
+        # unhashable pattern: do not cache
+        return PatternMatcher(patterns, lookback=lookback)
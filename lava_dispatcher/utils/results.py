@@ -0,0 +1,187 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Results sent in one batch by lava-test-results.
+
+The file of results is compressed with gzip when available, encoded in base64
+and split into chunks, each one sent in a signal with its POSIX cksum:
+
+    <LAVA_SIGNAL_RESULTS START id format encoding count>
+    <LAVA_SIGNAL_RESULTS CHUNK id index cksum data>
+    <LAVA_SIGNAL_RESULTS END id>
+
+The chunks are numbered from 1. When some chunks are missing or corrupted,
+the dispatcher asks for them again instead of dropping the whole batch.
+"""
+
+import base64
+import binascii
+import gzip
+import re
+import xml.etree.ElementTree as ET  # nosec - results produced by the test job
+import zlib
+
+from lava_common.exceptions import JobError
+
+ENCODINGS = ("base64", "gzip+base64")
+
+
+def _cksum_table():
+    table = []
+    for index in range(256):
+        crc = index << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+CKSUM_TABLE = _cksum_table()
+
+
+def cksum(data: bytes) -> int:
+    """
+    CRC computed by the POSIX cksum utility.
+    """
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CKSUM_TABLE[(crc >> 24) ^ byte]
+    length = len(data)
+    while length:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CKSUM_TABLE[(crc >> 24) ^ (length & 0xFF)]
+        length >>= 8
+    return ~crc & 0xFFFFFFFF
+
+
+def case_id(name):
+    # Whitespaces and slashes are not allowed in test case names
+    return re.sub(r"[\s/]+", "_", name.strip())
+
+
+def parse_lava(text):
+    """
+    One test case by line: TEST_CASE_ID RESULT [MEASUREMENT [UNITS]]
+    """
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        data = {"test_case_id": case_id(fields[0])}
+        for (key, value) in zip(["result", "measurement", "units"], fields[1:]):
+            data[key] = value
+        yield data
+
+
+TAP_PATTERN = re.compile(
+    r"^(?P<not>not )?ok\b\s*(?P<number>\d+)?\s*-?\s*(?P<description>[^#]*)"
+    r"(?:#\s*(?P<directive>\S+))?",
+    re.IGNORECASE,
+)
+
+
+def parse_tap(text):
+    """
+    Test points of the Test Anything Protocol. The indented subtests are not
+    reported.
+    """
+    for line in text.splitlines():
+        match = TAP_PATTERN.match(line)
+        if match is None:
+            continue
+        name = case_id(match["description"]) or match["number"]
+        if not name:
+            continue
+        directive = (match["directive"] or "").upper()
+        if directive.startswith("SKIP"):
+            result = "skip"
+        elif directive.startswith("TODO"):
+            result = "unknown"
+        else:
+            result = "fail" if match["not"] else "pass"
+        yield {"test_case_id": name, "result": result}
+
+
+def parse_junit(text):
+    """
+    Test cases of a JUnit XML report, the class name being used as test set.
+    """
+    try:
+        root = ET.fromstring(text)  # nosec - results produced by the test job
+    except ET.ParseError as exc:
+        raise JobError("Invalid JUnit report: %s" % exc)
+    for suite in root.iter("testsuite"):
+        for case in suite.findall("testcase"):
+            name = case_id(case.get("name", ""))
+            if not name:
+                continue
+            if case.find("failure") is not None or case.find("error") is not None:
+                result = "fail"
+            elif case.find("skipped") is not None:
+                result = "skip"
+            else:
+                result = "pass"
+            data = {"test_case_id": name, "result": result}
+            test_set = case_id(case.get("classname") or suite.get("name", ""))
+            if test_set:
+                data["set"] = test_set
+            yield data
+
+
+PARSERS = {"lava": parse_lava, "tap": parse_tap, "junit": parse_junit}
+
+
+class ResultsBatch:
+    def __init__(self, fmt, encoding, count):
+        if fmt not in PARSERS:
+            raise JobError("Unknown results format '%s'" % fmt)
+        if encoding not in ENCODINGS:
+            raise JobError("Unknown results encoding '%s'" % encoding)
+        self.format = fmt
+        self.encoding = encoding
+        self.count = count
+        self.chunks = {}
+        self.attempts = 0
+        self.done = False
+
+    def add(self, index, checksum, data):
+        """
+        Store the chunk if valid, return False otherwise.
+        """
+        if not 1 <= index <= self.count:
+            return False
+        if cksum(data.encode()) != checksum:
+            return False
+        self.chunks[index] = data
+        return True
+
+    def missing(self):
+        return [index for index in range(1, self.count + 1) if index not in self.chunks]
+
+    def decode(self):
+        data = "".join(self.chunks[index] for index in range(1, self.count + 1))
+        try:
+            payload = base64.b64decode(data, validate=True)
+            if self.encoding == "gzip+base64":
+                payload = gzip.decompress(payload)
+        except (binascii.Error, EOFError, OSError, zlib.error) as exc:
+            raise JobError("Unable to decode the results: %s" % exc)
+        return payload.decode("utf-8", errors="replace")
+
+    def results(self):
+        return list(PARSERS[self.format](self.decode()))
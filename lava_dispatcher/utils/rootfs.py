@@ -0,0 +1,304 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import contextlib
+import fcntl
+import logging
+import os
+import shutil
+import subprocess  # nosec - internal use.
+from pathlib import Path
+
+from lava_common.constants import ROOTFS_CACHE_DIR, ROOTFS_CACHE_SIZE
+from lava_common.exceptions import InfrastructureError
+from lava_dispatcher.utils.compression import untar_file
+
+
+def disk_usage(path):
+    """
+    Return the number of bytes allocated to the files under path.
+    """
+    seen = set()
+    total = 0
+    for (root, dirs, files) in os.walk(str(path)):
+        for name in dirs + files:
+            st = os.lstat(os.path.join(root, name))
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_blocks * 512
+    return total
+
+
+def rootfs_cache_config(job):
+    """
+    Return the configuration of the rootfs cache or None when the dispatcher
+    does not enable the cache.
+    """
+    config = job.parameters.get("dispatcher", {}).get("rootfs_cache")
+    if not config:
+        return None
+    return config if isinstance(config, dict) else {}
+
+
+class RootfsCache:
+    """
+    Worker-local cache of the extracted rootfs, shared by every lava-run.
+
+    Each archive is extracted once in a directory named after its sha256. A
+    shared lock is held on the entry while a job is using it, so that the
+    least recently used entries can be evicted when the cache is larger than
+    the disk budget.
+    """
+
+    def __init__(self, path=ROOTFS_CACHE_DIR, size=ROOTFS_CACHE_SIZE):
+        self.path = Path(path)
+        self.size = size
+        self.logger = logging.getLogger("dispatcher")
+
+    @classmethod
+    def get(cls, config):
+        """
+        Return the worker cache or None when the dispatcher does not enable it
+        or when not running on a worker.
+        """
+        if config is None:
+            return None
+        if ROOTFS_CACHE_DIR is None or not Path(ROOTFS_CACHE_DIR).parent.is_dir():
+            return None
+        Path(ROOTFS_CACHE_DIR).mkdir(mode=0o755, exist_ok=True)
+        # In GB in the dispatcher configuration
+        size = (
+            config["max_size"] * 1024**3
+            if "max_size" in config
+            else ROOTFS_CACHE_SIZE
+        )
+        return cls(ROOTFS_CACHE_DIR, size)
+
+    def _lock(self, name, operation):
+        """
+        Lock the given lock file. As the lock files are removed on eviction,
+        check that the locked file is still the current one.
+        """
+        path = self.path / (name + ".lock")
+        while True:
+            f_lock = open(str(path), "a")
+            try:
+                fcntl.flock(f_lock, operation)
+            except OSError:
+                f_lock.close()
+                raise
+            if self._current(f_lock, name):
+                return f_lock
+            f_lock.close()
+
+    def _current(self, f_lock, name):
+        try:
+            st = (self.path / (name + ".lock")).stat()
+        except FileNotFoundError:
+            return False
+        return st.st_ino == os.fstat(f_lock.fileno()).st_ino
+
+    def fetch(self, archive, sha256):
+        """
+        Return the path to the extracted archive, the lock protecting it from
+        eviction (to be closed when the tree is not used anymore) and whether
+        the archive was already in the cache.
+        """
+        entry = self.path / sha256
+        hit = True
+        while True:
+            f_lock = self._lock(sha256, fcntl.LOCK_SH)
+            if (entry / "size").exists():
+                break
+            # Converting the lock is not atomic: check the entry again
+            fcntl.flock(f_lock, fcntl.LOCK_EX)
+            if self._current(f_lock, sha256) and not (entry / "size").exists():
+                hit = False
+                self.logger.debug("Extracting %s into the rootfs cache", sha256)
+                try:
+                    shutil.rmtree(str(entry), ignore_errors=True)
+                    entry.mkdir(mode=0o755)
+                    untar_file(archive, str(entry / "root"))
+                    (entry / "size").write_text(
+                        str(disk_usage(entry / "root")), encoding="utf-8"
+                    )
+                except Exception:
+                    shutil.rmtree(str(entry), ignore_errors=True)
+                    f_lock.close()
+                    raise
+            fcntl.flock(f_lock, fcntl.LOCK_SH)
+            if self._current(f_lock, sha256) and (entry / "size").exists():
+                break
+            f_lock.close()
+
+        # The modification time of the size file is the last use
+        os.utime(str(entry / "size"))
+        if not hit:
+            self.evict()
+        return (entry / "root", f_lock, hit)
+
+    def entries(self):
+        """
+        Return the complete entries, least recently used first, as a list of
+        (sha256, size).
+        """
+        entries = []
+        for entry in self.path.iterdir():
+            with contextlib.suppress(OSError, ValueError):
+                size = entry / "size"
+                entries.append(
+                    (
+                        size.stat().st_mtime,
+                        entry.name,
+                        int(size.read_text(encoding="utf-8")),
+                    )
+                )
+        return [(name, size) for (_, name, size) in sorted(entries)]
+
+    def evict(self):
+        """
+        Remove the least recently used entries, not used by any job, until the
+        cache fits in the disk budget.
+        """
+        with open(str(self.path / ".lock"), "a") as f_global:
+            fcntl.flock(f_global, fcntl.LOCK_EX)
+            entries = self.entries()
+            total = sum(size for (_, size) in entries)
+            for (name, size) in entries:
+                if total <= self.size:
+                    break
+                try:
+                    f_lock = self._lock(name, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                with f_lock:
+                    self.logger.debug("Evicting %s from the rootfs cache", name)
+                    shutil.rmtree(str(self.path / name), ignore_errors=True)
+                    os.unlink(str(self.path / (name + ".lock")))
+                total -= size
+
+
+class RootfsView:
+    """
+    Job private and writable view of a cached rootfs.
+
+    When possible, the cached tree is the lower layer of an overlayfs mount
+    and every change made by the job goes to the upper layer. Otherwise, the
+    tree is copied, using reflinks when the filesystem supports them.
+    """
+
+    def __init__(self, cache, logger):
+        self.cache = cache
+        self.logger = logger
+        self.f_lock = None
+        self.mountpoint = None
+
+    def create(self, archive, sha256, base_dir, nfs=False):
+        """
+        Return the path to a writable copy of the extracted archive, inside
+        base_dir.
+        """
+        (lower, self.f_lock, hit) = self.cache.fetch(archive, sha256)
+        self.logger.debug(
+            "rootfs cache %s for %s",
+            "hit" if hit else "miss",
+            os.path.basename(archive),
+        )
+        root_dir = os.path.join(base_dir, "root")
+        upper_dir = os.path.join(base_dir, "upper")
+        work_dir = os.path.join(base_dir, "work")
+        for path in [root_dir, upper_dir, work_dir]:
+            os.mkdir(path, 0o755)
+
+        options = "lowerdir=%s,upperdir=%s,workdir=%s" % (lower, upper_dir, work_dir)
+        if nfs:
+            # Required to export the overlay over NFS
+            options += ",index=on,nfs_export=on"
+        try:
+            subprocess.run(  # nosec - internal use.
+                ["mount", "-t", "overlay", "overlay", "-o", options, root_dir],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                check=True,
+            )
+            self.mountpoint = root_dir
+            self.logger.debug("Mounted an overlay of %s at %s", lower, root_dir)
+            return root_dir
+        except (OSError, subprocess.CalledProcessError) as exc:
+            output = getattr(exc, "output", None) or b""
+            self.logger.debug(
+                "Unable to mount an overlay (%s), copying the tree instead",
+                output.decode("utf-8", errors="replace").strip() or exc,
+            )
+
+        os.rmdir(upper_dir)
+        os.rmdir(work_dir)
+        try:
+            subprocess.run(  # nosec - internal use.
+                ["cp", "-a", "--reflink=auto", "%s/." % lower, root_dir],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as exc:
+            raise InfrastructureError("Unable to copy %s: %s" % (lower, str(exc)))
+        finally:
+            # The copy does not depend on the cache anymore
+            self.release()
+        return root_dir
+
+    def release(self):
+        if self.f_lock is not None:
+            self.f_lock.close()
+            self.f_lock = None
+
+    def remove(self):
+        """
+        Unmount the overlay and release the cache entry.
+        """
+        if self.mountpoint is not None:
+            try:
+                subprocess.run(  # nosec - internal use.
+                    ["umount", self.mountpoint],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    check=True,
+                )
+            except subprocess.CalledProcessError:
+                # Still exported over NFS
+                subprocess.run(["umount", "--lazy", self.mountpoint])  # nosec
+            self.mountpoint = None
+        self.release()
+
+
+def extract_rootfs(archive, sha256, base_dir, logger, nfs=False, config=None):
+    """
+    Unpack the archive inside base_dir and return the path to the tree and the
+    RootfsView to remove at the end of the job (or None).
+
+    When the cache is enabled (see rootfs_cache_config) and the checksum of
+    the download is known, the archive is only extracted once per worker and
+    the job gets a copy-on-write view of the cached tree.
+    """
+    cache = RootfsCache.get(config)
+    if cache is None or not sha256 or not os.path.isfile(archive):
+        untar_file(archive, base_dir)
+        return (base_dir, None)
+    view = RootfsView(cache, logger)
+    return (view.create(archive, sha256, base_dir, nfs=nfs), view)
@@ -0,0 +1,385 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Android sparse images, without simg2img and img2simg.
+
+The image is expanded into a raw file with holes: only the raw chunks and the
+non-zero fill chunks are written. Once modified, the raw file is converted back
+by comparing it with the original image: the holes are not read, the unchanged
+chunks are copied from the original image and only the changed blocks are
+written from the raw file.
+"""
+
+import errno
+import os
+import struct
+from dataclasses import dataclass
+
+from lava_common.exceptions import JobError
+
+SPARSE_HEADER_MAGIC = 0xED26FF3A
+HEADER = struct.Struct("<IHHHHIIII")
+CHUNK_HEADER = struct.Struct("<HHII")
+
+CHUNK_TYPE_RAW = 0xCAC1
+CHUNK_TYPE_FILL = 0xCAC2
+CHUNK_TYPE_DONT_CARE = 0xCAC3
+CHUNK_TYPE_CRC32 = 0xCAC4
+
+# Size of the reads and of the largest raw chunk written
+BUFFER_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+ZERO = bytes(4)
+
+
+@dataclass
+class Chunk:
+    kind: int
+    start: int
+    blocks: int
+    # Offset of the data in the sparse image, for the raw chunks
+    offset: int = 0
+    # Fill value, for the fill chunks
+    fill: bytes = ZERO
+
+
+def copy_range(fd_in, fd_out, length, offset_in, offset_out):
+    """
+    Copy a range between two files, in the kernel when possible.
+    """
+    while length:
+        try:
+            count = os.copy_file_range(
+                fd_in, fd_out, min(length, MAX_CHUNK_SIZE), offset_in, offset_out
+            )
+        except OSError as exc:
+            if exc.errno not in [errno.EXDEV, errno.ENOSYS, errno.EINVAL]:
+                raise
+            count = os.pwrite(
+                fd_out, os.pread(fd_in, min(length, BUFFER_SIZE), offset_in), offset_out
+            )
+        if count == 0:
+            raise JobError("Truncated sparse image")
+        length -= count
+        offset_in += count
+        offset_out += count
+
+
+def data_ranges(fd, size):
+    """
+    Yield the (start, end) offsets of the data of the file, skipping the holes.
+    """
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+        except OSError as exc:
+            # ENXIO: no data after offset
+            if exc.errno == errno.ENXIO:
+                return
+            # Holes are not supported: the whole file is data
+            yield (offset, size)
+            return
+        yield (start, min(end, size))
+        offset = end
+
+
+class SparseWriter:
+    """
+    Write a sparse image, merging the consecutive chunks of the same kind.
+    """
+
+    def __init__(self, fd, source_fd, block_size, total_blocks):
+        self.fd = fd
+        self.source_fd = source_fd
+        self.block_size = block_size
+        self.total_blocks = total_blocks
+        self.chunks = 0
+        self.position = HEADER.size
+        self.written = 0
+        # Pending chunk: kind, blocks, fill value and the raw data, as bytes
+        # or (offset, length) in the source image
+        self.kind = None
+        self.blocks = 0
+        self.fill = ZERO
+        self.data = []
+
+    def _write(self, data):
+        os.pwrite(self.fd, data, self.position)
+        self.position += len(data)
+        self.written += len(data)
+
+    def flush(self):
+        if self.kind is None:
+            return
+        if self.kind == CHUNK_TYPE_RAW:
+            size = self.blocks * self.block_size
+        elif self.kind == CHUNK_TYPE_FILL:
+            size = len(self.fill)
+        else:
+            size = 0
+        self._write(
+            CHUNK_HEADER.pack(self.kind, 0, self.blocks, CHUNK_HEADER.size + size)
+        )
+        if self.kind == CHUNK_TYPE_FILL:
+            self._write(self.fill)
+        for data in self.data:
+            if isinstance(data, bytes):
+                self._write(data)
+            else:
+                (offset, length) = data
+                copy_range(self.source_fd, self.fd, length, offset, self.position)
+                self.position += length
+                self.written += length
+        self.chunks += 1
+        self.kind = None
+        self.blocks = 0
+        self.data = []
+
+    def add(self, kind, blocks, data=None, fill=ZERO):
+        """
+        Append blocks to the image. For raw blocks, data is the content or the
+        (offset, length) of the content in the source image.
+        """
+        if blocks == 0:
+            return
+        if (
+            kind != self.kind
+            or (kind == CHUNK_TYPE_FILL and fill != self.fill)
+            or (
+                kind == CHUNK_TYPE_RAW
+                and (self.blocks + blocks) * self.block_size > MAX_CHUNK_SIZE
+            )
+        ):
+            self.flush()
+            self.kind = kind
+            self.fill = fill
+        self.blocks += blocks
+        if data is None:
+            return
+        # Merge the contiguous copies
+        if (
+            not isinstance(data, bytes)
+            and self.data
+            and not isinstance(self.data[-1], bytes)
+            and sum(self.data[-1]) == data[0]
+        ):
+            self.data[-1] = (self.data[-1][0], self.data[-1][1] + data[1])
+        else:
+            self.data.append(data)
+
+    def close(self):
+        self.flush()
+        os.pwrite(
+            self.fd,
+            HEADER.pack(
+                SPARSE_HEADER_MAGIC,
+                1,
+                0,
+                HEADER.size,
+                CHUNK_HEADER.size,
+                self.block_size,
+                self.total_blocks,
+                self.chunks,
+                0,
+            ),
+            0,
+        )
+        self.written += HEADER.size
+        os.ftruncate(self.fd, self.position)
+
+
+class SparseImage:
+    """
+    An Android sparse image.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []
+        with open(path, "rb") as f_in:
+            data = f_in.read(HEADER.size)
+            if len(data) < HEADER.size:
+                raise JobError("Image is not an Android sparse image: %s" % path)
+            (
+                magic,
+                major,
+                _,
+                header_size,
+                chunk_header_size,
+                self.block_size,
+                self.total_blocks,
+                total_chunks,
+                _,
+            ) = HEADER.unpack(data)
+            if magic != SPARSE_HEADER_MAGIC or major != 1:
+                raise JobError("Image is not an Android sparse image: %s" % path)
+
+            offset = header_size
+            block = 0
+            for _ in range(total_chunks):
+                f_in.seek(offset)
+                data = f_in.read(CHUNK_HEADER.size)
+                if len(data) < CHUNK_HEADER.size:
+                    raise JobError("Truncated sparse image: %s" % path)
+                (kind, _, blocks, total_size) = CHUNK_HEADER.unpack(data)
+                data_offset = offset + chunk_header_size
+                if kind == CHUNK_TYPE_RAW:
+                    if total_size - chunk_header_size != blocks * self.block_size:
+                        raise JobError("Invalid raw chunk in %s" % path)
+                    self.chunks.append(Chunk(kind, block, blocks, offset=data_offset))
+                elif kind == CHUNK_TYPE_FILL:
+                    f_in.seek(data_offset)
+                    self.chunks.append(Chunk(kind, block, blocks, fill=f_in.read(4)))
+                elif kind == CHUNK_TYPE_DONT_CARE:
+                    self.chunks.append(Chunk(kind, block, blocks))
+                elif kind == CHUNK_TYPE_CRC32:
+                    blocks = 0
+                else:
+                    raise JobError("Unknown chunk type %#x in %s" % (kind, path))
+                block += blocks
+                offset += total_size
+            if block != self.total_blocks:
+                raise JobError("Truncated sparse image: %s" % path)
+
+    @property
+    def size(self):
+        return self.block_size * self.total_blocks
+
+    def expand(self, dst):
+        """
+        Write the raw image, leaving holes for the empty chunks.
+        Return the number of bytes written.
+        """
+        written = 0
+        with open(self.path, "rb") as f_in, open(dst, "wb") as f_out:
+            f_out.truncate(self.size)
+            for chunk in self.chunks:
+                position = chunk.start * self.block_size
+                length = chunk.blocks * self.block_size
+                if chunk.kind == CHUNK_TYPE_RAW:
+                    copy_range(
+                        f_in.fileno(), f_out.fileno(), length, chunk.offset, position
+                    )
+                elif chunk.kind == CHUNK_TYPE_FILL and chunk.fill != ZERO:
+                    data = chunk.fill * (BUFFER_SIZE // 4)
+                    for start in range(0, length, BUFFER_SIZE):
+                        count = min(BUFFER_SIZE, length - start)
+                        os.pwrite(f_out.fileno(), data[:count], position + start)
+                else:
+                    continue
+                written += length
+        return written
+
+    def _add_hole(self, writer, chunk, blocks):
+        # Keep the "don't care" blocks, the other ones are now zeros
+        if chunk.kind == CHUNK_TYPE_DONT_CARE:
+            writer.add(CHUNK_TYPE_DONT_CARE, blocks)
+        else:
+            writer.add(CHUNK_TYPE_FILL, blocks, fill=ZERO)
+
+    def _add_blocks(self, writer, data):
+        # Each block is either a fill block or raw data
+        size = self.block_size
+        for index in range(0, len(data), size):
+            block = data[index : index + size]
+            fill = block[:4]
+            if block == fill * (size // 4):
+                writer.add(CHUNK_TYPE_FILL, 1, fill=fill)
+            else:
+                writer.add(CHUNK_TYPE_RAW, 1, block)
+
+    def _add_data(self, writer, f_raw, f_sparse, chunk, first, blocks):
+        """
+        Add the blocks [first, first + blocks) of the raw file, inside the
+        given chunk, copying from the original image the unchanged parts.
+        """
+        size = self.block_size
+        step = BUFFER_SIZE // size
+        for start in range(first, first + blocks, step):
+            count = min(step, first + blocks - start)
+            data = os.pread(f_raw, count * size, start * size)
+            data += bytes(count * size - len(data))
+            if chunk.kind == CHUNK_TYPE_RAW:
+                offset = chunk.offset + (start - chunk.start) * size
+                original = os.pread(f_sparse, count * size, offset)
+                if data == original:
+                    writer.add(CHUNK_TYPE_RAW, count, (offset, count * size))
+                    continue
+                # Only the changed blocks are written
+                for index in range(count):
+                    block = data[index * size : (index + 1) * size]
+                    if block == original[index * size : (index + 1) * size]:
+                        writer.add(CHUNK_TYPE_RAW, 1, (offset + index * size, size))
+                    else:
+                        self._add_blocks(writer, block)
+            elif chunk.kind == CHUNK_TYPE_FILL and data == chunk.fill * (
+                count * size // 4
+            ):
+                writer.add(CHUNK_TYPE_FILL, count, fill=chunk.fill)
+            else:
+                self._add_blocks(writer, data)
+
+    def update(self, raw, dst):
+        """
+        Write the sparse image of the modified raw file, based on this image.
+        Return the number of bytes written.
+        """
+        with open(raw, "rb") as f_raw, open(self.path, "rb") as f_sparse, open(
+            dst, "wb"
+        ) as f_out:
+            if os.fstat(f_raw.fileno()).st_size != self.size:
+                raise JobError("The size of %s changed" % raw)
+            writer = SparseWriter(
+                f_out.fileno(), f_sparse.fileno(), self.block_size, self.total_blocks
+            )
+            # The data ranges, in blocks
+            ranges = [
+                (start // self.block_size, -(-end // self.block_size))
+                for (start, end) in data_ranges(f_raw.fileno(), self.size)
+            ]
+            index = 0
+            for chunk in self.chunks:
+                block = chunk.start
+                end = chunk.start + chunk.blocks
+                while block < end:
+                    # Skip the data ranges before this block
+                    while index < len(ranges) and ranges[index][1] <= block:
+                        index += 1
+                    if index == len(ranges) or ranges[index][0] >= end:
+                        self._add_hole(writer, chunk, end - block)
+                        break
+                    (start, stop) = ranges[index]
+                    if start > block:
+                        self._add_hole(writer, chunk, start - block)
+                        block = start
+                    stop = min(stop, end)
+                    self._add_data(
+                        writer,
+                        f_raw.fileno(),
+                        f_sparse.fileno(),
+                        chunk,
+                        block,
+                        stop - block,
+                    )
+                    block = stop
+            writer.close()
+        return writer.written
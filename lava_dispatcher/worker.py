@@ -34,6 +34,7 @@ import subprocess
 import sys
 import time
 import traceback
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Iterator, List, Optional, Union
@@ -42,11 +43,13 @@ import aiohttp
 import requests
 import yaml
 
+from lava_common import metrics
 from lava_common.constants import DISPATCHER_DOWNLOAD_DIR, WORKER_DIR
 from lava_common.exceptions import LAVABug
 from lava_common.version import __version__
 from lava_common.worker import get_parser
 from lava_common.yaml import yaml_safe_load
+from lava_dispatcher.utils.docker import DockerImages, images_from_definition
 
 ###########
 # Constants
@@ -55,6 +58,12 @@ FINISH_MAX_DURATION = 120
 JOBS_CHECK_INTERVAL = 5
 
 TIMEOUT = 60 * 10  # http timeout to 10 minutes
+
+# Parts of the job start bundle that are shared by the jobs of a device or
+# of the worker, cached by etag
+BUNDLE_CACHE_SIZE = 32
+BUNDLE_SHARED_PARTS = ["device", "dispatcher", "env", "env-dut"]
+
 WORKER_DIR = Path(WORKER_DIR)
 HEADERS = {"User-Agent": f"lava-worker {__version__}"}
 
@@ -68,9 +77,12 @@ LOG = logging.getLogger("lava-worker")
 FORMAT = "%(asctime)-15s %(levelname)7s %(message)s"
 
 SESSION = requests.Session()
+BUNDLE_CACHE: "OrderedDict[str, str]" = OrderedDict()
 
 ping_interval = 20
 debug = False
+prefork = None
+docker_images = None
 tmp_dir = WORKER_DIR / "tmp"
 
 # Stale configuration
@@ -79,6 +91,19 @@ STALE_CONFIG = {
     tmp_dir: "{prefix}{job_id}",
 }
 
+# Metrics
+PING_DURATION = metrics.histogram(
+    "lava_worker_ping_seconds", "Duration of the ping cycles"
+)
+PING_ERRORS = metrics.counter(
+    "lava_worker_ping_errors_total", "Ping cycles failing to reach the server"
+)
+JOB_START_DURATION = metrics.histogram(
+    "lava_worker_job_start_seconds",
+    "Time to start a job, from the request of the server to the RUNNING state",
+)
+JOBS_RUNNING = metrics.gauge("lava_worker_jobs_running", "Jobs running on the worker")
+
 # URLs
 URL_JOBS = "/scheduler/internal/v1/jobs/"
 URL_WORKERS = "/scheduler/internal/v1/workers/"
@@ -121,13 +146,13 @@ class Response:
 
 
 def requests_get(
-    url: str, token: str, params: Dict[str, str] = None
+    url: str, token: str, params: Dict[str, str] = None, headers: Dict[str, str] = None
 ) -> Union[requests.Response, Response]:
     if params is None:
         params = {}
 
     try:
-        headers = {**HEADERS, "LAVA-Token": token}
+        headers = {**HEADERS, **(headers or {}), "LAVA-Token": token}
         return SESSION.get(url, params=params, headers=headers, timeout=TIMEOUT)
     except requests.RequestException as exc:
         return Response(503, str(exc))
@@ -146,6 +171,37 @@ def requests_post(
 ###############
 # job helpers #
 ###############
+def get_job_bundle(url: str, job_id: int, token: str):
+    """
+    Fetch the job start bundle. The etags of the cached parts are sent to
+    the server that only sends the parts that are not already cached.
+    """
+    headers = {}
+    if BUNDLE_CACHE:
+        headers["If-None-Match"] = ", ".join(BUNDLE_CACHE)
+    return requests_get(f"{url}{URL_JOBS}{job_id}/", token, headers=headers)
+
+
+def bundle_parts(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fill the parts omitted by the server from the cache and cache the parts
+    that are shared with other jobs.
+    """
+    # Older servers do not send the etags
+    etags = data.get("etags", {})
+    for part in BUNDLE_SHARED_PARTS:
+        etag = etags.get(part)
+        if etag is None:
+            continue
+        if data[part] is None:
+            data[part] = BUNDLE_CACHE[etag]
+        BUNDLE_CACHE[etag] = data[part]
+        BUNDLE_CACHE.move_to_end(etag)
+    while len(BUNDLE_CACHE) > BUNDLE_CACHE_SIZE:
+        BUNDLE_CACHE.popitem(last=False)
+    return data
+
+
 def start_job(
     url: str,
     token: str,
@@ -201,6 +257,14 @@ def start_job(
         if env_dut:
             args.append("--env-dut=%s" % (base_dir / "env-dut.yaml"))
 
+        if prefork is not None and not debug:
+            pid = prefork.run(
+                args[2:], env, str(base_dir / "stdout"), str(base_dir / "stderr")
+            )
+            out_file.close()
+            err_file.close()
+            return pid
+
         proc = subprocess.Popen(
             args, stdout=out_file, stderr=err_file, env=env, preexec_fn=os.setpgrp
         )
@@ -222,6 +286,50 @@ def start_job(
 #########
 # Classes
 #########
+class PreforkRunner:
+    """
+    Warmed "lava-run --prefork" process forking a lava-run for each job.
+
+    The process is restarted when it dies.
+    """
+
+    def __init__(self):
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        LOG.info("[INIT] Starting the pre-forked lava-run")
+        self.proc = subprocess.Popen(
+            ["nice", "lava-run", "--prefork"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+        )
+
+    def stop(self) -> None:
+        if self.proc is not None:
+            with contextlib.suppress(OSError):
+                self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def run(
+        self, args: List[str], env: Dict[str, str], stdout: str, stderr: str
+    ) -> int:
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        request = {"args": args, "env": env, "stdout": stdout, "stderr": stderr}
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+            reply = json.loads(self.proc.stdout.readline())
+        except (OSError, ValueError) as exc:
+            self.stop()
+            raise LAVABug("pre-forked lava-run is not responding: %s" % exc)
+        if "error" in reply:
+            raise LAVABug("pre-forked lava-run failed: %s" % reply["error"])
+        return reply["pid"]
+
+
 class Job:
     """Wrapper around a job process."""
 
@@ -430,6 +538,8 @@ def check(url: str, jobs: JobsDB) -> None:
                 )
             LOG.info("[%d] running -> finished", job.job_id)
             jobs.update(job.job_id, Job.FINISHED)
+            if docker_images is not None:
+                docker_images.release(job.job_id)
 
     # Loop on canceling jobs
     for job in jobs.canceling():
@@ -443,6 +553,8 @@ def check(url: str, jobs: JobsDB) -> None:
                 )
             LOG.info("[%d] canceling -> finished", job.job_id)
             jobs.update(job.job_id, Job.FINISHED)
+            if docker_images is not None:
+                docker_images.release(job.job_id)
 
         elif time.monotonic() - job.last_update > FINISH_MAX_DURATION:
             LOG.info("[%d] not finishing => killing", job.job_id)
@@ -546,19 +658,20 @@ def start(
     url: str, jobs: JobsDB, job_id: int, token: str, job_log_interval: int
 ) -> None:
     LOG.info("[%d] server => START", job_id)
+    begin = time.monotonic()
     # Was the job already started?
     job = jobs.get(job_id)
 
     # Start the job
     if job is None:
-        ret = requests_get(f"{url}{URL_JOBS}{job_id}/", token)
+        ret = get_job_bundle(url, job_id, token)
         if ret.status_code != 200:
             LOG.error("[%d] -> server error: code %d", job_id, ret.status_code)
             LOG.debug("[%d] --> %s", job_id, ret.text)
             return
 
         try:
-            data = ret.json()
+            data = bundle_parts(ret.json())
             definition = data["definition"]
             device = data["device"]
             dispatcher = data["dispatcher"]
@@ -568,6 +681,13 @@ def start(
             LOG.error("[%d] -> invalid response: %r", job_id, str(exc))
             return
 
+        # Pull the docker images in the background while the job is starting
+        if docker_images is not None:
+            with contextlib.suppress(yaml.YAMLError):
+                docker_images.prefetch(
+                    images_from_definition(yaml_safe_load(definition))
+                )
+
         LOG.info("[%d] Starting job", job_id)
         LOG.debug("[%d]         : %s", job_id, yaml_safe_load(definition))
         LOG.debug("[%d] device  : %s", job_id, yaml_safe_load(device))
@@ -603,12 +723,19 @@ def start(
     if ret.status_code != 200:
         LOG.error("[%d] -> server error: code %d", job_id, ret.status_code)
         LOG.debug("[%d] --> %s", job_id, ret.text)
+    else:
+        JOB_START_DURATION.observe(time.monotonic() - begin)
 
 
 ###############
 # Entrypoints #
 ###############
 def handle(options, jobs: JobsDB) -> float:
+    with PING_DURATION.time():
+        return handle_ping(options, jobs)
+
+
+def handle_ping(options, jobs: JobsDB) -> float:
     begin: float = time.monotonic()
 
     name: str = options.name
@@ -620,6 +747,7 @@ def handle(options, jobs: JobsDB) -> float:
         data = ping(url, token, name)
     except ServerUnavailable:
         LOG.error("-> server unavailable")
+        PING_ERRORS.inc()
         return max(1 - (time.monotonic() - begin), 0)
     except VersionMismatch as exc:
         if options.exit_on_version_mismatch:
@@ -641,6 +769,7 @@ def handle(options, jobs: JobsDB) -> float:
     # Check job status
     # TODO: store the token and reuse it
     check(url, jobs)
+    JOBS_RUNNING.set(sum(1 for _ in jobs.running()))
 
     # Compute the sleep duration
     return max(ping_interval - (time.monotonic() - begin), 0)
@@ -700,6 +829,13 @@ async def main() -> int:
     LOG.info("[INIT] Name   : %r", options.name)
     LOG.info("[INIT] Server : %r", options.url)
     LOG.info("[INIT] Version: %r", __version__)
+    if options.metrics_address is not None:
+        try:
+            metrics.serve(options.metrics_address)
+            LOG.info("[INIT] Metrics: http://%s/metrics", options.metrics_address)
+        except (OSError, ValueError) as exc:
+            LOG.error("[INIT] Unable to expose the metrics: %s", exc)
+            return 1
 
     # Set ping interval
     global ping_interval
@@ -707,6 +843,11 @@ async def main() -> int:
     # Setup debugging if needed
     global debug
     debug = options.debug
+    # Keep a warmed lava-run ready to fork the jobs
+    global prefork
+    if options.prefork and not options.debug:
+        prefork = PreforkRunner()
+        prefork.start()
 
     # Setup timeout
     global TIMEOUT
@@ -719,6 +860,10 @@ async def main() -> int:
         global tmp_dir
         tmp_dir = worker_dir / "tmp"
 
+    # Share the docker images cache with lava-run
+    global docker_images
+    docker_images = DockerImages.get()
+
     try:
         if options.username is not None:
             LOG.info("[INIT] Token  : '<auto register with %s>'", options.username)
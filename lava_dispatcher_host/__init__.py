@@ -19,6 +19,7 @@ import logging.handlers
 import os
 import stat
 import subprocess
+import time
 from pathlib import Path
 
 import pyudev
@@ -35,10 +36,157 @@ logger.addHandler(logging.handlers.SysLogHandler(address="/dev/log"))
 logger.setLevel(logging.INFO)
 
 
+# Duplicated udev events for the same device are ignored during this time
+COALESCE_TIME = 10
+
+
 def get_mapping_path(job_id):
     return os.path.join(JOBS_DIR, job_id, "usbmap.yaml")
 
 
+class MappingRegistry:
+    """
+    In-memory copy of the device/container mappings of every job, indexed by
+    the device_info values (serial number, vendor and product ids, fs label).
+
+    The usbmap.yaml files written by the jobs are the reference: jobs ask the
+    server to reload their mappings after a change, the file of the matching
+    job is checked before using its mappings and the files that changed are
+    reloaded when no mapping matches an event.
+    """
+
+    def __init__(self):
+        # job_id => (mtime, mappings)
+        self.jobs = {}
+        self.items = []
+        # (key, value) => indexes in self.items
+        self.index = {}
+        # (device, inode, job_id, container) => time of the last share
+        self.shared = {}
+
+    def _reindex(self):
+        self.items = []
+        self.index = {}
+        for (job_id, (_, data)) in self.jobs.items():
+            for item in data:
+                keys = [
+                    (k, v)
+                    for (k, v) in item["device_info"].items()
+                    if v and isinstance(v, (str, int))
+                ]
+                # Mappings without values match every device
+                for key in keys or [None]:
+                    self.index.setdefault(key, []).append(len(self.items))
+                self.items.append((job_id, item))
+
+    def _forget(self, job_id):
+        for key in [k for k in self.shared if k[2] == job_id]:
+            del self.shared[key]
+
+    def load(self, job_id):
+        """
+        Reload the mappings of the given job.
+        """
+        path = get_mapping_path(job_id)
+        self._forget(job_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.jobs.pop(job_id, None)
+        else:
+            self.jobs[job_id] = (mtime, load_mapping_data(path))
+        self._reindex()
+
+    def refresh(self):
+        """
+        Reload the mapping files that changed since they were loaded.
+        Return True if any mapping was added or removed.
+        """
+        seen = set()
+        changed = False
+        for mapping in glob.glob(get_mapping_path("*")):
+            job_id = str(Path(mapping).parent.name)
+            seen.add(job_id)
+            try:
+                mtime = os.stat(mapping).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if job_id not in self.jobs or self.jobs[job_id][0] != mtime:
+                self._forget(job_id)
+                self.jobs[job_id] = (mtime, load_mapping_data(mapping))
+                changed = True
+        for job_id in set(self.jobs) - seen:
+            self._forget(job_id)
+            del self.jobs[job_id]
+            changed = True
+        if changed:
+            self._reindex()
+        return changed
+
+    def is_current(self, job_id):
+        """
+        Return True if the mappings of the job did not change since they
+        were loaded.
+        """
+        try:
+            mtime = os.stat(get_mapping_path(job_id)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        return job_id in self.jobs and self.jobs[job_id][0] == mtime
+
+    def lookup(self, options):
+        candidates = set(self.index.get(None, []))
+        for (k, v) in vars(options).items():
+            if v and isinstance(v, (str, int)):
+                candidates.update(self.index.get((k, v), []))
+        for position in sorted(candidates):
+            (job_id, item) = self.items[position]
+            if match_mapping(item["device_info"], options):
+                return item, job_id
+        return None, None
+
+    def find(self, options):
+        while True:
+            (item, job_id) = self.lookup(options)
+            # The notification of a change can be lost (lava-docker-worker):
+            # never return the mappings of a job that were removed or updated
+            # since they were loaded.
+            if item is None or self.is_current(job_id):
+                return item, job_id
+            self.load(job_id)
+
+    def first_share(self, device, job_id, container):
+        """
+        Return False if the device node was shared with the container
+        recently: udev sends several events for each device.
+        """
+        try:
+            inode = os.stat(device).st_ino
+        except FileNotFoundError:
+            return True
+        now = time.monotonic()
+        for key in [k for (k, v) in self.shared.items() if now - v > COALESCE_TIME]:
+            del self.shared[key]
+        key = (device, inode, job_id, container)
+        if key in self.shared:
+            return False
+        self.shared[key] = now
+        return True
+
+
+def notify_mapping_change(job_id):
+    # The server module imports this one
+    from lava_dispatcher_host import server
+
+    try:
+        server.Client(server.SOCKET, timeout=5).send_request(
+            {"command": "reload", "job_id": job_id}
+        )
+    except OSError:
+        # Server not running: the file is read when no mapping matches
+        pass
+
+
 def add_device_container_mapping(job_id, device_info, container, container_type="lxc"):
     validate_device_info(device_info)
     item = {
@@ -57,10 +205,12 @@ def add_device_container_mapping(job_id, device_info, container, container_type=
     os.makedirs(os.path.dirname(mapping_path), exist_ok=True)
     with open(mapping_path, "w") as f:
         f.write(yaml_safe_dump(newdata))
+    notify_mapping_change(job_id)
 
 
 def remove_device_container_mappings(job_id):
     os.unlink(get_mapping_path(job_id))
+    notify_mapping_change(job_id)
 
 
 def validate_device_info(device_info):
@@ -72,8 +222,8 @@ def validate_device_info(device_info):
         )
 
 
-def share_device_with_container(options):
-    data, job_id = find_mapping(options)
+def share_device_with_container(options, registry=None):
+    data, job_id = find_mapping(options, registry)
     if not data:
         return
     container = data["container"]
@@ -83,6 +233,9 @@ def share_device_with_container(options):
     if not os.path.exists(device):
         logger.warning("Can't share {device}: file not found".format(device=device))
         return
+    if registry is not None and not registry.first_share(device, job_id, container):
+        logger.debug(f"{device} already shared with {container}")
+        return
 
     container_type = data["container_type"]
     if container_type == "lxc":
@@ -93,7 +246,12 @@ def share_device_with_container(options):
         raise InfrastructureError('Unsupported container type: "%s"' % container_type)
 
 
-def find_mapping(options):
+def find_mapping(options, registry=None):
+    if registry is not None:
+        data, job_id = registry.find(options)
+        if data is None and registry.refresh():
+            data, job_id = registry.find(options)
+        return data, job_id
     for mapping in glob.glob(get_mapping_path("*")):
         data = load_mapping_data(mapping)
         for item in data:
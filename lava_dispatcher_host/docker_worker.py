@@ -77,6 +77,8 @@ def filter_options(options):
         ret.extend(["--token", options.token])
     if options.token_file:
         ret.extend(["--token-file", options.token_file])
+    if options.metrics_address:
+        ret.extend(["--metrics-address", options.metrics_address])
     return ret
 
 
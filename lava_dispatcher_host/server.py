@@ -26,7 +26,7 @@ import os
 import socket
 from argparse import Namespace
 
-from lava_dispatcher_host import share_device_with_container
+from lava_dispatcher_host import MappingRegistry, share_device_with_container
 
 SOCKET = "/run/lava-dispatcher-host.sock"
 
@@ -38,14 +38,28 @@ class ShareCommand:
         self.options = Namespace(**options)
 
 
+class ReloadCommand:
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+
 class CommandHandler:
-    def handle(self, command: ShareCommand):
-        share_device_with_container(command.options)
+    def __init__(self, registry=None):
+        self.registry = registry
+
+    def handle(self, command):
+        if isinstance(command, ReloadCommand):
+            if self.registry is not None:
+                self.registry.load(command.job_id)
+            return
+        share_device_with_container(command.options, self.registry)
 
 
 class ServerWrapper:
     def __init__(self, socket=SOCKET):
         self.socket = socket
+        self.registry = MappingRegistry()
+        self.handler = CommandHandler(self.registry)
 
     def exit(self, signal):
         logger.info(f"Exiting due to {signal}")
@@ -53,6 +67,7 @@ class ServerWrapper:
     async def start(self):
         logger.info(f"Starting")
         loop = asyncio.get_running_loop()
+        self.registry.refresh()
 
         sd_sockets = os.getenv("LISTEN_FDS")
         if sd_sockets and int(os.getenv("LISTEN_PID")) == os.getpid():
@@ -77,13 +92,16 @@ class ServerWrapper:
         result = None
 
         try:
-            command = ShareCommand(**json.loads(request))
-        except (TypeError, json.decoder.JSONDecodeError):
+            data = json.loads(request)
+            if data.pop("command", "share") == "reload":
+                command = ReloadCommand(**data)
+            else:
+                command = ShareCommand(**data)
+        except (AttributeError, TypeError, json.decoder.JSONDecodeError):
             result = b'{"result": "INVALID_REQUEST"}\n'
 
         if not result:
-            handler = CommandHandler()
-            handler.handle(command)
+            self.handler.handle(command)
             result = b'{"result": "OK"}\n'
 
         writer.write(result)
@@ -93,11 +111,13 @@ class ServerWrapper:
 
 
 class Client:
-    def __init__(self, socket=SOCKET):
+    def __init__(self, socket=SOCKET, timeout=None):
         self.socket = socket
+        self.timeout = timeout
 
     def send_request(self, request):
         with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(self.timeout)
             s.connect(self.socket)
             s.sendall(bytes(json.dumps(request), "utf-8"))
             s.shutdown(socket.SHUT_WR)
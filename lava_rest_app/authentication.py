@@ -27,10 +27,8 @@ class LavaTokenAuthentication(authentication.TokenAuthentication):
     model = AuthToken
 
     def authenticate_credentials(self, key):
-        model = self.get_model()
-        try:
-            token = model.objects.select_related("user").get(secret=key)
-        except model.DoesNotExist:
+        token = self.get_model().get_for_secret(key)
+        if token is None:
             raise exceptions.AuthenticationFailed("Invalid token.")
 
         if not token.user.is_active:
@@ -27,6 +27,7 @@ from rest_framework.permissions import BasePermission
 
 import lava_server.compat  # pylint: disable=unused-import
 from lava_results_app.models import TestCase
+from lava_scheduler_app import timing
 from lava_scheduler_app.dbutils import testjob_submission
 from lava_scheduler_app.logutils import logs_instance
 from lava_scheduler_app.models import (
@@ -227,6 +228,28 @@ class TestJobViewSet(viewsets.ModelViewSet):
         except FileNotFoundError:
             raise NotFound()
 
+    @detail_route(methods=["get"], suffix="timing")
+    def timing(self, request, **kwargs):
+        try:
+            data = timing.report(timing.load(self.get_object()))
+        except OSError:
+            raise NotFound()
+        data["pipeline"] = [
+            {
+                "level": level,
+                "name": name,
+                "duration": duration,
+                "timeout": timeout,
+                "close_to_timeout": close,
+            }
+            for (level, name, duration, timeout, close) in data["pipeline"]
+        ]
+        data["summary"] = [
+            {"name": name, "duration": duration, "percentage": percentage}
+            for (name, duration, percentage) in data["summary"]
+        ]
+        return Response(data)
+
     @detail_route(methods=["get"], suffix="suites")
     def suites(self, request, **kwargs):
         suites = self.get_object().testsuite_set.all().order_by("id")
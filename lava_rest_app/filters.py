@@ -22,7 +22,7 @@ from django.contrib.auth.models import Group, Permission, User
 from django.core.exceptions import ValidationError
 from django_filters.filters import CharFilter
 
-from lava_results_app.models import TestCase, TestSet, TestSuite
+from lava_results_app.models import MeasurementRollup, TestCase, TestSet, TestSuite
 from lava_scheduler_app.models import (
     Alias,
     Architecture,
@@ -523,6 +523,21 @@ class TestCaseFilter(filters.FilterSet):
         }
 
 
+class MeasurementRollupFilter(filters.FilterSet):
+    device_type = RelatedFilter(
+        DeviceTypeFilter, name="device_type", queryset=DeviceType.objects.all()
+    )
+
+    class Meta:
+        model = MeasurementRollup
+        fields = {
+            "suite": ["exact", "in", "contains", "icontains", "startswith", "endswith"],
+            "name": ["exact", "in", "contains", "icontains", "startswith", "endswith"],
+            "units": ["exact", "in"],
+            "bucket": ["exact", "lt", "lte", "gt", "gte"],
+        }
+
+
 class GroupDeviceTypePermissionFilter(filters.FilterSet):
     device_type = RelatedFilter(
         DeviceTypeFilter, name="devicetype", queryset=DeviceType.objects.all()
@@ -43,6 +43,7 @@ jobs_router.register(
     parents_query_lookups=["suite__job_id", "suite_id"],
     basename="suites-test",
 )
+router.register(r"measurements", views.MeasurementRollupViewSet)
 router.register(r"permissions/devicetypes", views.GroupDeviceTypePermissionViewSet)
 router.register(r"permissions/devices", views.GroupDevicePermissionViewSet)
 router.register(r"system", views.SystemViewSet, basename="system")
@@ -24,6 +24,7 @@ from rest_framework.reverse import reverse as rest_reverse
 from rest_framework_extensions.fields import ResourceUriField
 
 from lava_rest_app.base import serializers as base_serializers
+from lava_results_app.models import MeasurementRollup
 from lava_scheduler_app.models import (
     Alias,
     Device,
@@ -91,6 +92,15 @@ class TestCaseSerializer(base_serializers.TestCaseSerializer):
         fields = None
 
 
+class MeasurementRollupSerializer(serializers.ModelSerializer):
+    mean = serializers.FloatField(read_only=True)
+    percentiles = serializers.DictField(read_only=True)
+
+    class Meta:
+        model = MeasurementRollup
+        exclude = ("total", "histogram")
+
+
 class DeviceTypeSerializer(base_serializers.DeviceTypeSerializer):
     pass
 
@@ -47,7 +47,7 @@ from lava_common.yaml import yaml_safe_dump, yaml_safe_load
 from lava_rest_app import filters
 from lava_rest_app.base import views as base_views
 from lava_rest_app.base.pasers import PlainTextParser
-from lava_results_app.models import TestCase, TestSuite
+from lava_results_app.models import MeasurementRollup, TestCase, TestSuite
 from lava_results_app.utils import (
     export_testcase,
     get_testcases_with_limit,
@@ -325,6 +325,27 @@ class TestCaseViewSet(NestedViewSetMixin, viewsets.ReadOnlyModelViewSet):
     filterset_class = filters.TestCaseFilter
 
 
+class MeasurementRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Measurements of the test cases, aggregated by suite, test case name,
+    device type and day, with the count, minimum, maximum, mean and
+    percentiles of the measurements.
+
+    Only the device types visible to the current user are listed. The
+    measurements of the private jobs, or of the jobs restricted to some
+    groups or devices, are only listed for the users allowed to see every
+    job.
+    """
+
+    queryset = MeasurementRollup.objects
+    serializer_class = serializers.MeasurementRollupSerializer
+    filterset_class = filters.MeasurementRollupFilter
+    ordering_fields = ("bucket", "suite", "name", "device_type")
+
+    def get_queryset(self):
+        return self.queryset.visible_by_user(self.request.user).order_by("bucket", "id")
+
+
 class DeviceTypeViewSet(base_views.DeviceTypeViewSet):
     @detail_route(methods=["get", "post"], suffix="health-check")
     def health_check(self, request, **kwargs):
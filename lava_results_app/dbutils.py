@@ -23,9 +23,12 @@ import logging
 import os
 from urllib.parse import quote
 
+from django.db import transaction
+
 from lava_common.version import __version__
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
-from lava_results_app.models import TestCase, TestSet, TestSuite
+from lava_results_app.models import MeasurementRollup, TestCase, TestSet, TestSuite
+from lava_scheduler_app.models import TestJob
 
 
 def _check_for_testset(result_dict, suite):
@@ -198,6 +201,43 @@ def map_scanned_results(results, job, starttc, endtc, meta_filename):
     return test_case
 
 
+def update_measurement_rollups(job, test_cases):
+    """
+    Add the measurements of the saved test cases to the rollups
+    :param job: the current test job
+    :param test_cases: TestCase objects returned by map_scanned_results, only
+                       for the lines received for the first time
+    """
+    measurements = {}
+    for test_case in test_cases:
+        if test_case.pk is None or test_case.measurement is None:
+            continue
+        try:
+            value = float(test_case.measurement)
+        except (TypeError, ValueError):
+            continue
+        key = (test_case.suite.name or "", test_case.name, test_case.units)
+        measurements.setdefault(key, []).append(value)
+    if not measurements:
+        return
+
+    bucket = (job.start_time or job.submit_time).date()
+    is_public = TestJob.objects.filter(pk=job.pk).visible_by_device_type().exists()
+    with transaction.atomic():
+        # Always lock the rows in the same order
+        for ((suite, name, units), values) in sorted(measurements.items()):
+            rollup, _ = MeasurementRollup.objects.select_for_update().get_or_create(
+                suite=suite,
+                name=name,
+                device_type_id=job.requested_device_type_id,
+                is_public=is_public,
+                units=units,
+                bucket=bucket,
+            )
+            rollup.add(values)
+            rollup.save()
+
+
 def testsuite_export_fields():
     """
     Keep this list in sync with the keys in export_testsuite
@@ -0,0 +1,129 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+
+from lava_results_app.models import MeasurementRollup, TestCase
+from lava_scheduler_app.models import TestJob
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the measurement rollups from the test cases
+    """
+
+    help = "Rebuild the measurement rollups from the test cases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="First day to rebuild (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--until",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Last day to rebuild (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Number of test cases fetched at once",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        until = options["until"]
+        if since and until and since > until:
+            raise CommandError("--since should be before --until")
+
+        # Same time bucket and visibility as update_measurement_rollups()
+        test_cases = TestCase.objects.filter(measurement__isnull=False).annotate(
+            day=Coalesce("suite__job__start_time", "suite__job__submit_time"),
+            is_public=Exists(
+                TestJob.objects.filter(
+                    pk=OuterRef("suite__job")
+                ).visible_by_device_type()
+            ),
+        )
+        rollups = MeasurementRollup.objects.all()
+        if since:
+            test_cases = test_cases.filter(day__date__gte=since)
+            rollups = rollups.filter(bucket__gte=since)
+        if until:
+            test_cases = test_cases.filter(day__date__lte=until)
+            rollups = rollups.filter(bucket__lte=until)
+
+        values = test_cases.values_list(
+            "suite__name",
+            "name",
+            "suite__job__requested_device_type_id",
+            "is_public",
+            "units",
+            "day",
+            "measurement",
+        )
+        with transaction.atomic():
+            # The log ingestion saves the test cases and updates the rollups
+            # in one transaction: block it until the rollups are rewritten so
+            # that the measurements are neither lost nor counted twice.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOCK TABLE %s IN EXCLUSIVE MODE"
+                    % connection.ops.quote_name(MeasurementRollup._meta.db_table)
+                )
+
+            aggregated = {}
+            count = 0
+            for (
+                suite,
+                name,
+                device_type,
+                is_public,
+                units,
+                day,
+                measurement,
+            ) in values.iterator(chunk_size=options["chunk_size"]):
+                key = (suite or "", name, device_type, is_public, units, day.date())
+                rollup = aggregated.get(key)
+                if rollup is None:
+                    rollup = aggregated[key] = MeasurementRollup(
+                        suite=key[0],
+                        name=name,
+                        device_type_id=device_type,
+                        is_public=is_public,
+                        units=units,
+                        bucket=key[5],
+                    )
+                rollup.add([measurement])
+                count += 1
+                if count % 100000 == 0:
+                    self.stdout.write("* %d measurements" % count)
+
+            deleted, _ = rollups.delete()
+            MeasurementRollup.objects.bulk_create(aggregated.values(), batch_size=1000)
+        self.stdout.write(
+            "Rebuilt %d rollups (%d removed) from %d measurements"
+            % (len(aggregated), deleted, count)
+        )
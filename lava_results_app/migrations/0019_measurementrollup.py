@@ -0,0 +1,50 @@
+# Generated by Django 3.2.19 on 2023-06-12 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lava_scheduler_app", "0058_notificationdelivery"),
+        ("lava_results_app", "0018_drop_buglink"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MeasurementRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("suite", models.CharField(max_length=200, verbose_name="Suite name")),
+                ("name", models.TextField(verbose_name="Name")),
+                ("units", models.TextField(blank=True, verbose_name="Units")),
+                ("bucket", models.DateField(verbose_name="Day")),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total", models.FloatField(default=0)),
+                ("minimum", models.FloatField(blank=True, null=True)),
+                ("maximum", models.FloatField(blank=True, null=True)),
+                ("histogram", models.JSONField(default=dict)),
+                (
+                    "device_type",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="lava_scheduler_app.devicetype",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("suite", "name", "device_type", "units", "bucket")}
+            },
+        )
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lava_results_app", "0019_measurementrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="measurementrollup",
+            name="is_public",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name="measurementrollup",
+            unique_together={
+                ("suite", "name", "device_type", "is_public", "units", "bucket")
+            },
+        ),
+    ]
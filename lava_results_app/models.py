@@ -30,6 +30,7 @@ TestCase is a single lava-test-case record or Action result.
 
 import contextlib
 import logging
+import math
 from datetime import timedelta
 from urllib.parse import quote
 
@@ -52,11 +53,12 @@ from lava_common.decorators import nottest
 from lava_common.yaml import yaml_safe_load
 from lava_results_app.utils import help_max_length
 from lava_scheduler_app.managers import (
+    RestrictedMeasurementRollupQuerySet,
     RestrictedTestCaseQuerySet,
     RestrictedTestJobQuerySet,
     RestrictedTestSuiteQuerySet,
 )
-from lava_scheduler_app.models import Device, TestJob
+from lava_scheduler_app.models import Device, DeviceType, TestJob
 from lava_server.managers import MaterializedView
 
 
@@ -465,6 +467,115 @@ class TestCase(models.Model, Queryable):
         return self.RESULT_REVERSE[self.result]
 
 
+class MeasurementRollup(models.Model):
+    """
+    Measurements of the test cases, aggregated by suite, test case name,
+    device type, visibility of the jobs and day.
+    The percentiles are estimated from a histogram with logarithmic buckets,
+    with a relative error of at most ACCURACY.
+    """
+
+    ACCURACY = 0.01
+    GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+    PERCENTILES = [50, 90, 95, 99]
+
+    class Meta:
+        unique_together = (
+            "suite",
+            "name",
+            "device_type",
+            "is_public",
+            "units",
+            "bucket",
+        )
+
+    objects = models.Manager.from_queryset(RestrictedMeasurementRollupQuerySet)()
+
+    suite = models.CharField(max_length=200, verbose_name="Suite name")
+    name = models.TextField(verbose_name=_("Name"))
+    device_type = models.ForeignKey(
+        DeviceType, null=True, blank=True, on_delete=models.CASCADE
+    )
+    # Whether the jobs are visible to every user who can see the device type
+    # (see TestJob.objects.visible_by_device_type())
+    is_public = models.BooleanField(default=True)
+    units = models.TextField(blank=True, verbose_name=_("Units"))
+    bucket = models.DateField(verbose_name=_("Day"))
+
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    # Number of measurements in each logarithmic bucket (see key())
+    histogram = models.JSONField(default=dict)
+
+    @classmethod
+    def key(cls, value):
+        if value == 0:
+            return "0"
+        index = math.ceil(math.log(abs(value), cls.GAMMA))
+        return "%s%d" % ("-" if value < 0 else "+", index)
+
+    @classmethod
+    def value(cls, key):
+        if key == "0":
+            return 0.0
+        value = 2 * cls.GAMMA ** int(key[1:]) / (cls.GAMMA + 1)
+        return -value if key[0] == "-" else value
+
+    def add(self, values):
+        for value in values:
+            value = float(value)
+            key = self.key(value)
+            self.histogram[key] = self.histogram.get(key, 0) + 1
+            self.count += 1
+            self.total += value
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    def merge(self, other):
+        for (key, count) in other.histogram.items():
+            self.histogram[key] = self.histogram.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in [other.minimum, other.maximum]:
+            if value is None:
+                continue
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        if percent <= 0:
+            return self.minimum
+        if percent >= 100:
+            return self.maximum
+        rank = percent / 100 * (self.count - 1)
+        seen = 0
+        for key in sorted(self.histogram, key=self.value):
+            seen += self.histogram[key]
+            if seen > rank:
+                return min(max(self.value(key), self.minimum), self.maximum)
+        return self.maximum
+
+    def percentiles(self):
+        return {str(p): self.percentile(p) for p in self.PERCENTILES}
+
+    def __str__(self):
+        return "%s/%s %s (%d)" % (self.suite, self.name, self.bucket, self.count)
+
+
 class NamedTestAttribute(models.Model):
     """
     Model for adding named test attributes to arbitrary other model instances.
@@ -751,6 +862,16 @@ class Query(models.Model):
 
                 filters[filter_key] = condition.value
 
+                # The test cases are logged after the submission of their job:
+                # the lower bound lets postgresql skip the older partitions.
+                if (
+                    content_type.model_class() == TestCase
+                    and condition.table.model_class() == TestJob
+                    and condition.field == "submit_time"
+                    and condition.operator in [QueryCondition.EXACT, QueryCondition.GT]
+                ):
+                    filters["logged__gte"] = condition.value
+
         query_results = (
             content_type.model_class()
             .objects.filter(**filters)
@@ -976,6 +1097,7 @@ class QueryCondition(models.Model):
     FIELD_CHOICES = {
         TestJob: [
             "submitter",
+            "submit_time",
             "start_time",
             "end_time",
             "state",
@@ -987,7 +1109,7 @@ class QueryCondition(models.Model):
             "description",
         ],
         TestSuite: ["name"],
-        TestCase: ["name", "result", "measurement"],
+        TestCase: ["name", "result", "measurement", "logged"],
         NamedTestAttribute: [],
     }
 
@@ -47,6 +47,7 @@ from lava_results_app.views.chart.views import (
     chart_edit,
     chart_group_list,
     chart_list,
+    chart_measurements,
     chart_omit_result,
     chart_query_add,
     chart_query_edit,
@@ -204,6 +205,11 @@ urlpatterns = [
     url(r"^chart$", chart_list, name="lava.results.chart_list"),
     url(r"^chart/\+add$", chart_add, name="lava.results.chart_add"),
     url(r"^chart/\+custom$", chart_custom, name="lava.results.chart_custom"),
+    url(
+        r"^chart/\+measurements$",
+        chart_measurements,
+        name="lava.results.chart_measurements",
+    ),
     url(
         r"^chart/(?P<name>[a-zA-Z0-9-_]+)$",
         chart_display,
@@ -92,14 +92,13 @@ def check_request_auth(request, job):
 
 def get_testcases_with_limit(testsuite, limit=None, offset=None):
     logger = logging.getLogger("lava_results_app")
+    testcases = testsuite.testcase_set.logged_since(testsuite.job).order_by("id")
     if limit:
         try:
             if not offset:
-                testcases = list(testsuite.testcase_set.all().order_by("id")[:limit])
+                testcases = list(testcases[:limit])
             else:
-                testcases = list(
-                    testsuite.testcase_set.all().order_by("id")[offset:][:limit]
-                )
+                testcases = list(testcases[offset:][:limit])
         except ValueError as e:
             logger.warning("Offset and limit must be integers: %s", str(e))
             return []
@@ -107,7 +106,7 @@ def get_testcases_with_limit(testsuite, limit=None, offset=None):
             logger.warning("Offset must be positive integer: %s", str(e))
             return []
     else:
-        testcases = list(testsuite.testcase_set.all().order_by("id"))
+        testcases = list(testcases)
 
     return testcases
 
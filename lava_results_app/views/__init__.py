@@ -179,7 +179,7 @@ def testjob_csv(request, job):
         yield writer.writerow(dict(zip(fieldnames, fieldnames)))
 
         for test_suite in suites:
-            for test_case in test_suite.testcase_set.all():
+            for test_case in test_suite.testcase_set.logged_since(job):
                 yield writer.writerow(export_testcase(test_case))
 
     suites = job.testsuite_set.all().prefetch_related(
@@ -203,7 +203,7 @@ def testjob_yaml(request, job):
 
     def test_case_stream():
         for test_suite in suites:
-            for test_case in test_suite.testcase_set.all():
+            for test_case in test_suite.testcase_set.logged_since(job):
                 yield yaml_safe_dump([export_testcase(test_case)])
 
     response = StreamingHttpResponse(test_case_stream(), content_type="text/yaml")
@@ -233,7 +233,8 @@ def suite(request, job, pk):
     test_suite = get_object_or_404(TestSuite, name=pk, job=job)
     data = SuiteView(request, model=TestCase, table_class=SuiteTable)
     suite_table = SuiteTable(
-        data.get_table_data().filter(suite=test_suite), request=request
+        data.get_table_data().filter(suite=test_suite).logged_since(job),
+        request=request,
     )
     RequestConfig(request, paginate={"per_page": suite_table.length}).configure(
         suite_table
@@ -333,7 +334,7 @@ def suite_testcase_count(request, job, pk):
     job = get_object_or_404(TestJob, pk=job)
     check_request_auth(request, job)
     test_suite = get_object_or_404(TestSuite, name=pk, job=job)
-    test_case_count = test_suite.testcase_set.all().count()
+    test_case_count = test_suite.testcase_set.logged_since(job).count()
     return HttpResponse(test_case_count, content_type="text/plain")
 
 
@@ -26,6 +26,7 @@ from django.db import IntegrityError
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, loader
 from django.urls import reverse
+from django.utils.dateparse import parse_date
 from django_tables2 import RequestConfig
 
 from lava_results_app.models import (
@@ -34,6 +35,7 @@ from lava_results_app.models import (
     ChartQuery,
     ChartQueryUser,
     InvalidContentTypeError,
+    MeasurementRollup,
     Query,
     QueryCondition,
     QueryOmitResult,
@@ -159,6 +161,60 @@ def chart_list(request):
     )
 
 
+@login_required
+def chart_measurements(request):
+    """
+    Trend of the measurements of a test case, read from the rollups: one
+    point per day and units, for the visible device types and jobs.
+    """
+    suite = request.GET.get("suite")
+    name = request.GET.get("case")
+    if not suite or not name:
+        return HttpResponseBadRequest("Missing 'suite' or 'case' parameter.")
+
+    rollups = MeasurementRollup.objects.visible_by_user(request.user).filter(
+        suite=suite, name=name
+    )
+    if request.GET.get("device_types"):
+        rollups = rollups.filter(
+            device_type__in=request.GET["device_types"].split(CONDITIONS_SEPARATOR)
+        )
+    for (param, lookup) in [("since", "bucket__gte"), ("until", "bucket__lte")]:
+        if request.GET.get(param):
+            try:
+                day = parse_date(request.GET[param])
+            except ValueError:
+                day = None
+            if day is None:
+                return HttpResponseBadRequest("Invalid '%s' parameter." % param)
+            rollups = rollups.filter(**{lookup: day})
+
+    points = {}
+    for rollup in rollups.order_by("bucket", "units"):
+        key = (rollup.bucket, rollup.units)
+        if key in points:
+            points[key].merge(rollup)
+        else:
+            points[key] = rollup
+
+    data = [
+        {
+            "day": str(rollup.bucket),
+            "units": rollup.units,
+            "count": rollup.count,
+            "min": rollup.minimum,
+            "max": rollup.maximum,
+            "mean": rollup.mean,
+            "percentiles": rollup.percentiles(),
+        }
+        for rollup in points.values()
+    ]
+    return HttpResponse(
+        simplejson.dumps({"suite": suite, "case": name, "data": data}),
+        content_type="application/json",
+    )
+
+
 @BreadCrumb("Chart {name}", parent=chart_list, needs=["name"])
 @login_required
 def chart_display(request, name):
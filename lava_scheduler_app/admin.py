@@ -40,6 +40,7 @@ from lava_scheduler_app.models import (
     GroupDeviceTypePermission,
     GroupWorkerPermission,
     JobFailureTag,
+    NotificationDelivery,
     NotificationRecipient,
     ProcessorFamily,
     RemoteArtifactsAuth,
@@ -680,6 +681,18 @@ class NotificationRecipientAdmin(admin.ModelAdmin):
         return settings.ALLOW_ADMIN_DELETE
 
 
+class NotificationDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "host", "state", "attempts", "next_attempt")
+    list_filter = ("state",)
+    raw_id_fields = ("callback", "recipient")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return settings.ALLOW_ADMIN_DELETE
+
+
 admin.site.register(Alias, AliasAdmin)
 admin.site.register(Architecture, ArchitectureAdmin)
 admin.site.register(BitWidth, BitWidthAdmin)
@@ -687,6 +700,7 @@ admin.site.register(Core, CoreAdmin)
 admin.site.register(Device, DeviceAdmin)
 admin.site.register(DeviceType, DeviceTypeAdmin)
 admin.site.register(JobFailureTag)
+admin.site.register(NotificationDelivery, NotificationDeliveryAdmin)
 admin.site.register(NotificationRecipient, NotificationRecipientAdmin)
 admin.site.register(ProcessorFamily)
 admin.site.register(TestJob, TestJobAdmin)
@@ -19,15 +19,17 @@
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import annotations
 
+import hashlib
 import os
 import xmlrpc.client
 from functools import wraps
 
 import yaml
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Prefetch, Q
 
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
 from lava_scheduler_app.dbutils import (
@@ -73,6 +75,33 @@ def check_perm(perm):
     return decorator
 
 
+def cache_response(f):
+    """
+    decorator caching the result of a listing for each user and arguments
+
+    The result is kept for settings.XMLRPC_CACHE_TIMEOUT seconds so that
+    dashboards polling the same listing do not hit the database each time.
+    """
+
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if not settings.XMLRPC_CACHE_TIMEOUT:
+            return f(self, *args, **kwargs)
+        arguments = repr((args, sorted(kwargs.items()))).encode("utf-8")
+        key = "xmlrpc-%s-%s-%s" % (
+            f.__qualname__,
+            self.user.pk,
+            hashlib.sha256(arguments).hexdigest(),
+        )
+        ret = cache.get(key)
+        if ret is None:
+            ret = f(self, *args, **kwargs)
+            cache.set(key, ret, settings.XMLRPC_CACHE_TIMEOUT)
+        return ret
+
+    return wrapper
+
+
 def build_device_status_display(state, health):
     if state == Device.STATE_IDLE:
         if health in [Device.HEALTH_GOOD, Device.HEALTH_UNKNOWN]:
@@ -284,6 +313,7 @@ class SchedulerAPI(ExposedV2API):
         except OSError:
             raise xmlrpc.client.Fault(404, "Job output not found.")
 
+    @cache_response
     def all_devices(self):
         """
         Name
@@ -310,18 +340,27 @@ class SchedulerAPI(ExposedV2API):
         ]
         """
 
-        devices_list = Device.objects.visible_by_user(self.user).exclude(
-            health=Device.HEALTH_RETIRED
+        devices_list = (
+            Device.objects.visible_by_user(self.user)
+            .exclude(health=Device.HEALTH_RETIRED)
+            .prefetch_related(
+                Prefetch(
+                    "testjobs",
+                    queryset=TestJob.objects.filter(~Q(state=TestJob.STATE_FINISHED)),
+                    to_attr="running_jobs",
+                )
+            )
         )
 
         def job_pk(device):
             job = device.current_job()
             return job.pk if job else None
 
+        # The device type name is the primary key
         return [
             [
                 dev.hostname,
-                dev.device_type.name,
+                dev.device_type_id,
                 build_device_status_display(dev.state, dev.health),
                 job_pk(dev),
                 True,
@@ -367,6 +406,7 @@ class SchedulerAPI(ExposedV2API):
 
         return all_device_types
 
+    @cache_response
     def get_recent_jobs_for_device_type(
         self, device_type, count=1, restrict_to_user=False
     ):
@@ -440,9 +480,8 @@ class SchedulerAPI(ExposedV2API):
             job_qs = job_qs.filter(submitter=self.user)
         job_list = []
         for job in job_qs.all()[:count]:
-            hostname = ""
-            if job.actual_device:
-                hostname = job.actual_device.hostname
+            # The hostname is the primary key
+            hostname = job.actual_device_id or ""
             job_dict = {
                 "id": job.id,
                 "description": job.description,
@@ -452,6 +491,7 @@ class SchedulerAPI(ExposedV2API):
             job_list.append(job_dict)
         return job_list
 
+    @cache_response
     def get_recent_jobs_for_device(self, device, count=1, restrict_to_user=False):
         """
         Name
@@ -714,6 +754,7 @@ class SchedulerAPI(ExposedV2API):
                     "Permission denied for user to put %s into online mode." % hostname,
                 )
 
+    @cache_response
     def pending_jobs_by_device_type(self, all=False):
         """
         Name
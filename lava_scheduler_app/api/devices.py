@@ -25,7 +25,7 @@ from django.db import IntegrityError, transaction
 from django.db.models import Prefetch, Q
 
 from lava_common.yaml import yaml_safe_load
-from lava_scheduler_app.api import check_perm
+from lava_scheduler_app.api import cache_response, check_perm
 from lava_scheduler_app.models import Device, DeviceType, Tag, TestJob, Worker
 from linaro_django_xmlrpc.models import ExposedV2API
 
@@ -203,6 +203,7 @@ class SchedulerDevicesAPI(ExposedV2API):
 
         return device.save_configuration(dictionary)
 
+    @cache_response
     def list(self, show_all=False, offline_info=False):
         """
         Name
@@ -22,18 +22,29 @@ import xmlrpc.client
 from datetime import timedelta
 
 import voluptuous
+import yaml
 from django.conf import settings
 from django.utils import timezone
 
 from lava_common import schemas
 from lava_common.yaml import yaml_safe_load
 from lava_results_app.models import TestCase
-from lava_scheduler_app.api import SchedulerAPI
+from lava_scheduler_app.api import SchedulerAPI, cache_response
 from lava_scheduler_app.logutils import logs_instance
 from lava_scheduler_app.models import TestJob
 from linaro_django_xmlrpc.models import ExposedV2API
 
 
+def load_metadata(metadata):
+    # Same as TestCase.action_metadata but never returns None
+    if not metadata:
+        return {}
+    try:
+        return yaml_safe_load(metadata) or {}
+    except yaml.YAMLError:
+        return {}
+
+
 def load_optional_file(filename):
     try:
         with open(filename, "r") as f_in:
@@ -148,6 +159,7 @@ class SchedulerJobsAPI(ExposedV2API):
             return job.multinode_definition
         return job.original_definition
 
+    @cache_response
     def list(self, state=None, health=None, start=0, limit=25, since=0, verbose=False):
         """
         Name
@@ -216,7 +228,17 @@ class SchedulerJobsAPI(ExposedV2API):
             start_time = end_time - timedelta(minutes=since)
             jobs = jobs.filter(end_time__range=[start_time, end_time])
 
-        for job in jobs.order_by("-id")[start : start + limit]:
+        jobs = list(jobs.order_by("-id")[start : start + limit])
+        metadata = {}
+        if verbose:
+            # Fetch the metadata of every job in one query
+            cases = TestCase.objects.filter(
+                suite__job__in=jobs, suite__name="lava", name="job"
+            ).values_list("suite__job_id", "metadata")
+            for (job_id, case_metadata) in cases:
+                metadata.setdefault(job_id, case_metadata)
+
+        for job in jobs:
             device_type = None
             if job.requested_device_type is not None:
                 device_type = job.requested_device_type.name
@@ -229,34 +251,21 @@ class SchedulerJobsAPI(ExposedV2API):
                 "submitter": job.submitter.username,
             }
             if verbose:
-                actual_device = None
                 # Neither dynamic connections
                 # nor jobs cancelled in submitted state
-                # will have an actual_device
-                if job.actual_device:
-                    actual_device = job.actual_device.hostname
+                # will have an actual_device (the hostname is the primary key)
+                actual_device = job.actual_device_id
                 # cancelled jobs might not have start or end time
                 end_time = str(job.end_time) if job.end_time else None
                 start_time = str(job.start_time) if job.start_time else None
-                metadata = None
-                try:
-                    job_case = TestCase.objects.get(
-                        suite__job=job, suite__name="lava", name="job"
-                    )
-                except TestCase.DoesNotExist:
-                    job_case = None
-                if job_case:
-                    metadata = job_case.action_metadata
-                if not metadata:
-                    # if job_case exists but metadata is still None due to job error
-                    metadata = {}
+                job_metadata = load_metadata(metadata.get(job.id))
                 data.update(
                     {
                         "actual_device": actual_device,
                         "start_time": start_time,
                         "end_time": end_time,
-                        "error_msg": metadata.get("error_msg"),
-                        "error_type": metadata.get("error_type"),
+                        "error_msg": job_metadata.get("error_msg"),
+                        "error_type": job_metadata.get("error_type"),
                     }
                 )
 
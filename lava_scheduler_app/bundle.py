@@ -0,0 +1,260 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import yaml
+
+from lava_common.yaml import yaml_safe_dump, yaml_safe_load
+from lava_scheduler_app import environment
+from lava_server.files import File
+
+# Parts of the bundle and the files where they are saved, in the job output
+# directory
+PARTS = {
+    "definition": "job.yaml",
+    "device": "device.yaml",
+    "dispatcher": "dispatcher.yaml",
+    "env": "env.yaml",
+    "env-dut": "env-dut.yaml",
+}
+# The parts that do not depend on the job, cached by the workers
+SHARED_PARTS = ["device", "dispatcher", "env", "env-dut"]
+WORKER_PARTS = ["dispatcher", "env", "env-dut"]
+INDEX = "start.yaml"
+
+RENDER_CACHE_SIZE = 256
+_rendered = OrderedDict()
+# The requests are served by many threads
+_rendered_lock = threading.Lock()
+_rendered_env = None
+_worker_configs = {}
+
+
+def etag(data):
+    return '"%s"' % hashlib.sha256((data or "").encode("utf-8")).hexdigest()
+
+
+def render_device(device, job_ctx):
+    """
+    Render the device configuration for this job context.
+    The rendering is reused for the same device and job context as long as
+    the templates loaded by the jinja2 environment are unchanged.
+    """
+    global _rendered_env
+    env = environment.devices()
+    up_to_date = all(template.is_up_to_date for template in list(env.cache.values()))
+    key = (device.hostname, json.dumps(job_ctx, sort_keys=True, default=str))
+    with _rendered_lock:
+        if env is not _rendered_env or not up_to_date:
+            _rendered.clear()
+            _rendered_env = env
+        with contextlib.suppress(KeyError):
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    # Rendered without the lock: the other devices are not delayed
+    data = device.load_configuration(job_ctx, output_format="yaml")
+    if data is not None:
+        with _rendered_lock:
+            if _rendered_env is env:
+                _rendered[key] = data
+                if len(_rendered) > RENDER_CACHE_SIZE:
+                    _rendered.popitem(last=False)
+    return data
+
+
+def worker_config(kind, hostname):
+    """
+    Return the content of the worker configuration file, only read again
+    when the file changed.
+    """
+    config = File(kind, hostname)
+    state = []
+    for path in config.files:
+        try:
+            st = path.stat()
+            state.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append(None)
+    cached = _worker_configs.get((kind, hostname))
+    if cached is not None and cached[0] == state:
+        return cached[1]
+
+    data = config.read(raising=False)
+    try:
+        yaml_safe_load(data)
+    except yaml.YAMLError:
+        # Raise an OSError because the caller uses yaml.YAMLError for a
+        # specific usage. Allows here to specify the faulty filename.
+        raise OSError("", f"Invalid YAML file for {hostname}: {kind} file")
+    _worker_configs[(kind, hostname)] = (state, data)
+    return data
+
+
+def has_tokens(job_def):
+    """
+    Return True if the definition references user tokens.
+    """
+    if "secrets" in job_def:
+        return True
+    for action in job_def.get("actions", []):
+        deploy = action.get("deploy") if isinstance(action, dict) else None
+        if not isinstance(deploy, dict):
+            continue
+        for value in deploy.values():
+            if not isinstance(value, dict):
+                continue
+            if "url" in value and "headers" in value:
+                return True
+            for sub in value.values():
+                if isinstance(sub, dict) and "url" in sub and "headers" in sub:
+                    return True
+    return False
+
+
+def replace_tokens(job_def, tokens):
+    def update_token(headers_dict):
+        for key in headers_dict["headers"]:
+            token_name = headers_dict["headers"][key]
+            if token_name in tokens.keys():
+                headers_dict["headers"][key] = tokens[token_name]
+
+    if "actions" in job_def:
+        for action in job_def["actions"]:
+            for k, v in action.items():
+                if k == "deploy":
+                    for a, b in v.items():
+                        if isinstance(b, dict):
+                            if "url" in b and "headers" in b:
+                                update_token(b)
+                            for i, j in b.items():
+                                if isinstance(j, dict):
+                                    if "url" in j and "headers" in j:
+                                        update_token(j)
+
+    if "secrets" in job_def:
+        for k, v in job_def["secrets"].items():
+            if v in tokens.keys():
+                job_def["secrets"][k] = tokens[v]
+
+
+class StartBundle:
+    """
+    Everything lava-worker needs to start a job.
+
+    The bundle is rendered when the job is scheduled and saved in the job
+    output directory, with an index of the content hashes. The device
+    configuration is rendered once for each device and job context, and the
+    worker configuration files are only read again when they change.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.path = Path(job.output_dir)
+
+    def checksum(self):
+        data = "%s\n%s" % (self.job.definition, self.job.pipeline_compatibility)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def worker(self):
+        if self.job.dynamic_connection:
+            return self.job.dynamic_host().actual_device.worker_host
+        return self.job.actual_device.worker_host
+
+    def build(self):
+        """
+        Render and save the bundle. Return the parts and whether the
+        definition references user tokens.
+        """
+        job = self.job
+        job_def = yaml_safe_load(job.definition)
+        job_def["compatibility"] = job.pipeline_compatibility
+        parts = {"definition": yaml_safe_dump(job_def)}
+        job_ctx = job_def.get("context", {})
+
+        if job.dynamic_connection:
+            device = job.dynamic_host().actual_device
+            host_device_cfg = yaml_safe_load(render_device(device, job_ctx))
+            parts["device"] = yaml_safe_dump(
+                device.minimise_configuration(host_device_cfg)
+            )
+        else:
+            device = job.actual_device
+            parts["device"] = render_device(device, job_ctx)
+
+        for kind in WORKER_PARTS:
+            parts[kind] = worker_config(kind, device.worker_host.hostname)
+
+        tokens = has_tokens(job_def)
+        self.save(parts, tokens)
+        return (parts, tokens)
+
+    def save(self, parts, tokens):
+        self.path.mkdir(mode=0o755, parents=True, exist_ok=True)
+        for (name, filename) in PARTS.items():
+            if parts[name] or name in ["definition", "device"]:
+                (self.path / filename).write_text(parts[name], encoding="utf-8")
+        index = {
+            "checksum": self.checksum(),
+            "tokens": tokens,
+            "etags": {name: etag(value) for (name, value) in parts.items()},
+        }
+        (self.path / INDEX).write_text(yaml_safe_dump(index), encoding="utf-8")
+
+    def load(self):
+        """
+        Return the saved parts and whether the definition references user
+        tokens, or None if the bundle is missing or outdated.
+        """
+        try:
+            index = yaml_safe_load((self.path / INDEX).read_text(encoding="utf-8"))
+            if index["checksum"] != self.checksum():
+                return None
+            parts = {}
+            for name in ["definition", "device"]:
+                parts[name] = (self.path / PARTS[name]).read_text(encoding="utf-8")
+                if etag(parts[name]) != index["etags"][name]:
+                    return None
+        except (OSError, KeyError, TypeError, yaml.YAMLError):
+            return None
+
+        # The worker configuration might have changed since the job was
+        # scheduled
+        hostname = self.worker().hostname
+        for kind in WORKER_PARTS:
+            parts[kind] = worker_config(kind, hostname)
+        if any(etag(parts[k]) != index["etags"].get(k) for k in WORKER_PARTS):
+            self.save(parts, index["tokens"])
+        return (parts, index["tokens"])
+
+    def get(self, tokens):
+        """
+        Return the parts of the bundle to send to the worker, with the user
+        tokens replaced in the definition.
+        """
+        bundle = self.load()
+        (parts, has_tokens) = bundle if bundle is not None else self.build()
+        if has_tokens:
+            job_def = yaml_safe_load(parts["definition"])
+            replace_tokens(job_def, tokens())
+            parts = dict(parts, definition=yaml_safe_dump(job_def))
+        return parts
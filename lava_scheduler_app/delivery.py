@@ -0,0 +1,378 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import contextlib
+import datetime
+import gzip
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlencode
+
+import requests
+import simplejson
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from requests.models import RequestEncodingMixin
+
+from lava_common.yaml import yaml_safe_dump
+from lava_results_app.utils import export_testcase
+from lava_scheduler_app import utils
+from lava_scheduler_app.logutils import logs_instance
+from lava_scheduler_app.models import (
+    NotificationCallback,
+    NotificationDelivery,
+    NotificationRecipient,
+)
+from lava_scheduler_app.notifications import (
+    get_notification_args,
+    send_email,
+    send_irc,
+)
+
+CHUNK_SIZE = 64 * 1024
+RETRY_MAX_DELAY = 3600
+# Time after which a delivery that did not complete (lava-scheduler was
+# stopped) is attempted again
+LEASE = datetime.timedelta(minutes=10)
+
+
+def retry_delay(attempts):
+    return min(settings.NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+###########
+# Payload #
+###########
+def open_logs(job):
+    try:
+        return logs_instance.open(job)
+    except NotImplementedError:
+        return io.BytesIO(logs_instance.read(job).encode("utf-8"))
+
+
+def job_results(job):
+    for test_suite in job.testsuite_set.all():
+        yield (
+            test_suite.name,
+            yaml_safe_dump(
+                [
+                    export_testcase(test_case)
+                    for test_case in test_suite.testcase_set.all()
+                ]
+            ),
+        )
+
+
+def json_chunks(data, log=None, results=None):
+    """
+    Encode the job data in JSON, like simplejson.dumps(), reading the logs and
+    the results while encoding.
+    """
+    yield simplejson.dumps(data)[:-1]
+    if log is not None:
+        yield ', "log": "'
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in iter(lambda: log.read(CHUNK_SIZE), b""):
+            yield simplejson.dumps(decoder.decode(chunk))[1:-1]
+        yield simplejson.dumps(decoder.decode(b"", final=True))[1:-1] + '"'
+    if results is not None:
+        yield ', "results": {'
+        for (index, (name, value)) in enumerate(results):
+            yield "%s%s: %s" % (
+                ", " if index else "",
+                simplejson.dumps(name),
+                simplejson.dumps(value),
+            )
+        yield "}"
+    yield "}"
+
+
+def form_chunks(data, log=None, results=None):
+    """
+    Encode the job data like requests does for "application/x-www-form-urlencoded",
+    reading the logs while encoding.
+    """
+    yield RequestEncodingMixin._encode_params(data)
+    if log is not None:
+        yield "&log="
+        for chunk in iter(lambda: log.read(CHUNK_SIZE), b""):
+            yield quote_plus(chunk)
+    if results is not None:
+        # requests only sends the keys of the dictionaries
+        for (name, _) in results:
+            yield "&" + urlencode({"results": name})
+
+
+def write_chunks(chunks, *outputs):
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        for output in outputs:
+            output.write(data)
+
+
+def callback_payload(callback, job):
+    """
+    Return the body of the callback request in a temporary file. The logs and
+    the results are streamed from the stores instead of being loaded in
+    memory.
+    """
+    output = callback.dataset in [NotificationCallback.LOGS, NotificationCallback.ALL]
+    results = callback.dataset in [
+        NotificationCallback.RESULTS,
+        NotificationCallback.ALL,
+    ]
+    data = job.create_job_data(token=callback.token)
+    is_json = callback.content_type == NotificationCallback.JSON
+
+    def payload(encode):
+        with contextlib.ExitStack() as stack:
+            log = None
+            if output:
+                with contextlib.suppress(OSError):
+                    log = stack.enter_context(open_logs(job))
+            yield from encode(data, log, job_results(job) if results else None)
+
+    body = tempfile.TemporaryFile()
+    # store callback_data for later retrieval & triage, only once
+    job_data_file = os.path.join(job.output_dir, "job_data.gz")
+    with contextlib.ExitStack() as stack:
+        job_data = None
+        if not os.path.exists(job_data_file):
+            # allow for jobs cancelled in submitted state
+            utils.mkdir(job.output_dir)
+            job_data = stack.enter_context(gzip.open(job_data_file + ".tmp", "wb"))
+        if is_json:
+            outputs = [body] if job_data is None else [body, job_data]
+            write_chunks(payload(json_chunks), *outputs)
+        else:
+            write_chunks(payload(form_chunks), body)
+            if job_data is not None:
+                write_chunks(payload(json_chunks), job_data)
+    if job_data is not None:
+        os.replace(job_data_file + ".tmp", job_data_file)
+    body.seek(0)
+    return body
+
+
+def deliver_callback(callback, job):
+    headers = {}
+    if callback.token is not None:
+        headers[callback.header] = callback.token
+
+    if callback.method == NotificationCallback.GET:
+        ret = requests.get(
+            callback.url, headers=headers, timeout=settings.CALLBACK_TIMEOUT
+        )
+    else:
+        if callback.content_type == NotificationCallback.JSON:
+            headers["Content-Type"] = "application/json"
+        else:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        with callback_payload(callback, job) as body:
+            ret = requests.post(
+                callback.url,
+                data=body,
+                headers=headers,
+                timeout=settings.CALLBACK_TIMEOUT,
+            )
+    ret.raise_for_status()
+
+
+def deliver_recipients(job, notification, recipients):
+    """
+    Send the emails and IRC messages, rendering the notification data once.
+    Return the error for each recipient (None when sent).
+    """
+    kwargs = None
+    errors = {}
+    for recipient in recipients:
+        try:
+            if recipient.method == NotificationRecipient.EMAIL:
+                if kwargs is None:
+                    kwargs = get_notification_args(job)
+                send_email(job, notification, recipient, kwargs)
+            else:
+                send_irc(job, recipient)
+            errors[recipient.id] = None
+        except Exception as exc:
+            errors[recipient.id] = exc
+    return errors
+
+
+########
+# Pool #
+########
+class DeliveryPool:
+    """
+    Run the deliveries in a pool of threads, with a limit of concurrent
+    deliveries for each host.
+    """
+
+    def __init__(self, workers, per_host):
+        self.workers = workers
+        self.per_host = per_host
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="delivery"
+        )
+        self.running = {}
+
+    def available(self, host):
+        if len(self.running) >= self.workers:
+            return False
+        running = sum(1 for (h, _) in self.running.values() if h == host)
+        return running < self.per_host
+
+    def submit(self, host, key, func, *args):
+        self.running[self.executor.submit(func, *args)] = (host, key)
+
+    def done(self):
+        """
+        Return the key and the future of the finished deliveries.
+        """
+        finished = []
+        for future in [f for f in self.running if f.done()]:
+            finished.append((self.running.pop(future)[1], future))
+        return finished
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def run_delivery(deliveries):
+    """
+    Deliver the notifications in a thread of the pool. Return the error for
+    each delivery (None when delivered).
+    """
+    try:
+        first = deliveries[0]
+        target = first.callback or first.recipient
+        job = target.notification.test_job
+        # Set state and health as the delivery can run later while the job
+        # state and health already changed.
+        # The job is *not* saved.
+        if first.job_state is not None:
+            job.state = first.job_state
+        if first.job_health is not None:
+            job.health = first.job_health
+
+        if first.callback is not None:
+            deliver_callback(first.callback, job)
+            return {first.id: None}
+        errors = deliver_recipients(
+            job, target.notification, [d.recipient for d in deliveries]
+        )
+        return {d.id: errors[d.recipient.id] for d in deliveries}
+    finally:
+        connections.close_all()
+
+
+class Outbox:
+    """
+    Deliver the notifications queued in the NotificationDelivery table.
+
+    Failed deliveries are attempted again with an exponential delay, up to
+    NOTIFICATION_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, logger, workers=None, per_host=None):
+        self.logger = logger
+        self.pool = DeliveryPool(
+            workers or settings.NOTIFICATION_WORKERS,
+            per_host or settings.NOTIFICATION_HOST_CONCURRENCY,
+        )
+
+    def dispatch(self):
+        now = timezone.now()
+        with transaction.atomic():
+            query = NotificationDelivery.objects.select_for_update(
+                skip_locked=True, of=("self",)
+            )
+            query = query.filter(
+                state=NotificationDelivery.STATE_PENDING, next_attempt__lte=now
+            )
+            query = query.select_related(
+                "callback__notification__test_job",
+                "recipient__notification__test_job",
+            ).order_by("next_attempt", "id")
+
+            # The emails and IRC messages of a notification are sent together
+            groups = {}
+            for delivery in query[: self.pool.workers * self.pool.per_host * 4]:
+                if delivery.callback is not None:
+                    key = ("callback", delivery.id)
+                else:
+                    key = ("recipients", delivery.recipient.notification_id)
+                groups.setdefault(key + (delivery.host,), []).append(delivery)
+
+            claimed = []
+            for deliveries in groups.values():
+                host = deliveries[0].host
+                if not self.pool.available(host):
+                    continue
+                self.pool.submit(host, deliveries, run_delivery, deliveries)
+                claimed.extend(d.id for d in deliveries)
+
+            NotificationDelivery.objects.filter(id__in=claimed).update(
+                next_attempt=now + LEASE
+            )
+        return len(claimed)
+
+    def complete(self):
+        for (deliveries, future) in self.pool.done():
+            try:
+                errors = future.result()
+            except Exception as exc:
+                errors = {d.id: exc for d in deliveries}
+            for delivery in deliveries:
+                self.update(delivery, errors.get(delivery.id))
+
+    def update(self, delivery, error):
+        if error is None:
+            delivery.state = NotificationDelivery.STATE_SENT
+            delivery.last_error = ""
+        else:
+            delivery.attempts += 1
+            delivery.last_error = str(error)
+            if delivery.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                self.logger.warning(
+                    "Unable to deliver the notification to %s: %s",
+                    delivery.host,
+                    error,
+                )
+                delivery.state = NotificationDelivery.STATE_FAILED
+            else:
+                self.logger.info(
+                    "Problem delivering the notification to %s (attempt %d): %s",
+                    delivery.host,
+                    delivery.attempts,
+                    error,
+                )
+                delivery.next_attempt = timezone.now() + datetime.timedelta(
+                    seconds=retry_delay(delivery.attempts)
+                )
+        delivery.save(update_fields=["state", "attempts", "next_attempt", "last_error"])
+
+    def step(self):
+        self.complete()
+        self.dispatch()
+
+    def close(self):
+        self.pool.shutdown()
+        self.complete()
@@ -0,0 +1,288 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Copy the logs of the jobs from one log backend to another.
+
+The job ids are split in ranges that are copied by a pool of processes. The
+finished ranges are saved in a checkpoint file, so an interrupted copy can be
+resumed. Inside a job, the copy restarts after the lines already saved in the
+target.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from importlib import import_module
+from typing import Dict, List
+
+from lava_common.log import dump
+from lava_common.yaml import yaml_safe_load
+from lava_scheduler_app.logutils import LogsBackPressure, LogsFilesystem
+
+BACKENDS = ["LogsFilesystem", "LogsMongo", "LogsElasticsearch", "LogsFirestore"]
+# Attempts to copy a job when the target is failing
+ATTEMPTS = 3
+# Seconds to wait before the first retry, doubled for each retry
+BACKOFF = 1
+BACKOFF_MAX = 30
+
+
+def logs_backend(name):
+    return getattr(import_module("lava_scheduler_app.logutils"), name)()
+
+
+##############
+# Checkpoint #
+##############
+class Checkpoint:
+    """
+    The finished ranges and the failed jobs, saved in a json file.
+    """
+
+    def __init__(self, path, source, target, chunk_size):
+        self.path = path
+        self.source = source
+        self.target = target
+        self.chunk_size = chunk_size
+        self.done = set()
+        self.failed = {}
+
+    @classmethod
+    def load(cls, path, source, target, chunk_size):
+        checkpoint = cls(path, source, target, chunk_size)
+        with contextlib.suppress(FileNotFoundError):
+            with open(path, encoding="utf-8") as f_in:
+                data = json.load(f_in)
+            if (data["source"], data["target"], data["chunk_size"]) != (
+                source,
+                target,
+                chunk_size,
+            ):
+                raise ValueError(
+                    "Checkpoint %r was created for %s -> %s with chunks of %d jobs"
+                    % (path, data["source"], data["target"], data["chunk_size"])
+                )
+            checkpoint.done = set(data["done"])
+            checkpoint.failed = {int(k): v for (k, v) in data["failed"].items()}
+        return checkpoint
+
+    def save(self):
+        data = {
+            "source": self.source,
+            "target": self.target,
+            "chunk_size": self.chunk_size,
+            "done": sorted(self.done),
+            "failed": {str(k): v for (k, v) in sorted(self.failed.items())},
+        }
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f_out:
+            json.dump(data, f_out)
+        os.replace(self.path + ".tmp", self.path)
+
+    def update(self, result):
+        if result.start is not None:
+            self.done.add(result.start)
+        for job_id in result.copied:
+            self.failed.pop(job_id, None)
+        self.failed.update(result.failed)
+        self.save()
+
+
+##########
+# Copier #
+##########
+@dataclass
+class RangeResult:
+    start: int
+    jobs: int = 0
+    skipped: int = 0
+    lines: int = 0
+    size: int = 0
+    duration: float = 0.0
+    copied: List[int] = field(default_factory=list)
+    failed: Dict[int, str] = field(default_factory=dict)
+
+
+def parse_line(line):
+    """
+    Return the document of a line that the target backends can save, None
+    otherwise.
+    """
+    try:
+        doc = yaml_safe_load(line)[0]
+        if {"dt", "lvl", "msg"} <= doc.keys():
+            return doc
+    except Exception:
+        pass
+    return None
+
+
+def line_digest(checksum, doc):
+    # Only compare the level and the message: the backends can store the
+    # date with a lower precision
+    checksum.update(
+        json.dumps([doc["lvl"], doc["msg"]], sort_keys=True, default=str).encode(
+            "utf-8"
+        )
+    )
+
+
+class LogsCopier:
+    def __init__(self, source, target, batch_size=5000, verify="count"):
+        self.source = source
+        self.target = target
+        self.batch_size = batch_size
+        self.verify = verify
+        # Larger bulk writes than during the ingestion
+        self.target.BULK_LINES = batch_size
+        self.target.BULK_SIZE = batch_size * 1024
+
+    def lines(self, job):
+        """
+        Stream the lines of the job from the source, without loading the
+        whole log in memory.
+        """
+        if isinstance(self.source, LogsFilesystem):
+            with self.source.open(job) as f_in:
+                for line in f_in:
+                    yield line.decode("utf-8").rstrip("\n")
+            return
+        start = 0
+        while True:
+            docs = yaml_safe_load(
+                self.source.read(job, start, start + self.batch_size) or "[]"
+            )
+            for doc in docs:
+                yield "- " + dump(doc)
+            if len(docs) < self.batch_size:
+                return
+            start += len(docs)
+
+    def target_checksum(self, job, count):
+        checksum = hashlib.sha256()
+        for start in range(0, count, self.batch_size):
+            docs = yaml_safe_load(self.target.read(job, start, start + self.batch_size))
+            for doc in docs or []:
+                line_digest(checksum, doc)
+        return checksum.hexdigest()
+
+    def copy(self, job, dry_run=False):
+        """
+        Copy the logs of the job, after the lines already saved in the target.
+        Return the number of lines and bytes read from the source.
+        """
+        skip = 0 if dry_run else self.target.line_count(job)
+        checksum = hashlib.sha256()
+        count = 0
+        size = 0
+        for line in self.lines(job):
+            size += len(line) + 1
+            if not line:
+                continue
+            if skip > 0 or dry_run or self.verify == "checksum":
+                doc = parse_line(line)
+                if doc is None:
+                    continue
+                if self.verify == "checksum":
+                    line_digest(checksum, doc)
+                if skip > 0 or dry_run:
+                    skip -= 1
+                    count += 1
+                    continue
+            try:
+                self.target.write(job, line)
+            except LogsBackPressure:
+                raise
+            except Exception:
+                # Invalid line
+                continue
+            count += 1
+        if dry_run:
+            return (count, size)
+        self.target.flush(job)
+
+        # Verify the copy
+        saved = self.target.line_count(job)
+        if saved != count:
+            raise ValueError("%d lines in the target, expected %d" % (saved, count))
+        if self.verify == "checksum":
+            if self.target_checksum(job, count) != checksum.hexdigest():
+                raise ValueError("Checksum mismatch")
+        return (count, size)
+
+    def copy_range(self, start, jobs, dry_run=False):
+        """
+        Copy the logs of the jobs of one range.
+        """
+        begin = time.monotonic()
+        result = RangeResult(start=start)
+        for job in jobs:
+            for attempt in range(1, ATTEMPTS + 1):
+                try:
+                    (lines, size) = self.copy(job, dry_run)
+                    result.jobs += 1
+                    result.lines += lines
+                    result.size += size
+                    result.copied.append(job.id)
+                    break
+                except FileNotFoundError:
+                    result.skipped += 1
+                    break
+                except LogsBackPressure as exc:
+                    if attempt == ATTEMPTS:
+                        result.failed[job.id] = "Giving up after %d attempts: %s" % (
+                            ATTEMPTS,
+                            exc,
+                        )
+                        break
+                    # Let the target recover then resume after the lines
+                    # it saved
+                    time.sleep(min(BACKOFF * 2 ** (attempt - 1), BACKOFF_MAX))
+                except Exception as exc:
+                    result.failed[job.id] = str(exc)
+                    break
+        result.duration = time.monotonic() - begin
+        return result
+
+
+###########
+# Workers #
+###########
+copier = None
+
+
+def init_worker(source, target, batch_size, verify):
+    # Also called in the main process with --jobs 1: the connections are
+    # closed by the command before forking the workers
+    global copier
+    copier = LogsCopier(logs_backend(source), logs_backend(target), batch_size, verify)
+
+
+def range_jobs(start, end, job_ids=None):
+    from lava_scheduler_app.models import TestJob
+
+    jobs = TestJob.objects.only("id", "submit_time").order_by("id")
+    if job_ids is None:
+        return jobs.filter(id__gte=start, id__lt=end).iterator()
+    return jobs.filter(id__in=job_ids).iterator()
+
+
+def run_range(args):
+    (start, end, job_ids, dry_run) = args
+    return copier.copy_range(start, range_jobs(start, end, job_ids), dry_run)
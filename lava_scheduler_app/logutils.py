@@ -25,6 +25,7 @@ import lzma
 import os
 import pathlib
 import struct
+import time
 from importlib import import_module
 
 import requests
@@ -35,7 +36,21 @@ from lava_common.exceptions import ConfigurationError
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
 
 
+class LogsBackPressure(Exception):
+    """
+    Raised when the buffered lines of a job cannot be saved. The lines are
+    dropped and should be sent again.
+    """
+
+    def __init__(self, lines):
+        super().__init__("Unable to save %d log lines" % lines)
+        self.lines = lines
+
+
 class Logs:
+    def flush(self, job):
+        pass
+
     def line_count(self, job):
         raise NotImplementedError("Should implement this method")
 
@@ -134,7 +149,77 @@ class LogsFilesystem(Logs):
         output.flush()
 
 
-class LogsMongo(Logs):
+class LogsBuffer:
+    def __init__(self, index):
+        self.index = index
+        self.docs = []
+        self.size = 0
+        self.since = time.monotonic()
+
+
+class LogsBulk(Logs):
+    """
+    Remote backends: the lines are buffered for each job and saved in bulk
+    when the buffer is large or old enough, and when flushed at the end of
+    each request.
+    """
+
+    BULK_LINES = 500
+    BULK_SIZE = 1024 * 1024
+    BULK_TIME = 1.0
+
+    def __init__(self):
+        self.buffers = {}
+        super().__init__()
+
+    def _bulk_write(self, job, docs):
+        raise NotImplementedError("Should implement this method")
+
+    def _document(self, job, index, line):
+        raise NotImplementedError("Should implement this method")
+
+    def _line_count(self, job):
+        raise NotImplementedError("Should implement this method")
+
+    def _save(self, job, buf):
+        docs = buf.docs
+        buf.docs = []
+        buf.size = 0
+        buf.since = time.monotonic()
+        try:
+            self._bulk_write(job, docs)
+        except Exception as exc:
+            # The line numbers are now unknown
+            self.buffers.pop(job.id, None)
+            raise LogsBackPressure(len(docs)) from exc
+
+    def flush(self, job):
+        buf = self.buffers.pop(job.id, None)
+        if buf is not None and buf.docs:
+            self._save(job, buf)
+
+    def line_count(self, job):
+        buf = self.buffers.get(job.id)
+        return self._line_count(job) + (len(buf.docs) if buf is not None else 0)
+
+    def write(self, job, line, output=None, idx=None):
+        buf = self.buffers.get(job.id)
+        if buf is None:
+            buf = self.buffers[job.id] = LogsBuffer(self._line_count(job))
+        elif (
+            len(buf.docs) >= self.BULK_LINES
+            or buf.size >= self.BULK_SIZE
+            or time.monotonic() - buf.since >= self.BULK_TIME
+        ):
+            # Save the previous lines before buffering this one, so that on
+            # failure the current line is not lost
+            self._save(job, buf)
+        buf.docs.append(self._document(job, buf.index, yaml_safe_load(line)[0]))
+        buf.index += 1
+        buf.size += len(line)
+
+
+class LogsMongo(LogsBulk):
     def __init__(self):
         import pymongo
 
@@ -150,26 +235,57 @@ class LogsMongo(Logs):
 
         self.db = self.client[settings.MONGO_DB_DATABASE]
         self.db.logs.create_index([("job_id", 1), ("dt", 1)])
+        self.db.logs.create_index([("job_id", 1), ("idx", 1), ("dt", 1)])
         super().__init__()
 
-    def _get_docs(self, job, start=0, end=None):
-        import pymongo
+    def _indexed(self, job):
+        # Lines saved by older versions do not have a line number
+        doc = self.db.logs.find_one(
+            filter={"job_id": job.id},
+            projection={"_id": False, "idx": True},
+            sort=[("dt", 1)],
+        )
+        return doc is None or "idx" in doc
 
+    def _get_docs(self, job, start=0, end=None):
         limit = 0
         if end:
             limit = end - start
         if limit < 0:
             return []
 
+        projection = {"_id": False, "job_id": False, "idx": False}
+        if (start or end) and self._indexed(job):
+            query = {"$gte": start}
+            if end:
+                query["$lt"] = end
+            return self.db.logs.find(
+                filter={"job_id": job.id, "idx": query},
+                projection=projection,
+                sort=[("idx", 1)],
+            )
+
         return self.db.logs.find(
             filter={"job_id": job.id},
-            projection={"_id": False, "job_id": False},
-            sort=[("dt", pymongo.ASCENDING)],
+            projection=projection,
+            sort=[("idx", 1), ("dt", 1)],
             skip=start,
             limit=limit,
         )
 
-    def line_count(self, job):
+    def _bulk_write(self, job, docs):
+        self.db.logs.insert_many(docs)
+
+    def _document(self, job, index, line):
+        return {
+            "job_id": job.id,
+            "idx": index,
+            "dt": line["dt"],
+            "lvl": line["lvl"],
+            "msg": line["msg"],
+        }
+
+    def _line_count(self, job):
         return self.db.logs.count_documents({"job_id": job.id})
 
     def open(self, job):
@@ -188,15 +304,8 @@ class LogsMongo(Logs):
         docs = self._get_docs(job, start, end)
         return len(yaml_safe_dump(list(docs)).encode("utf-8"))
 
-    def write(self, job, line, output=None, idx=None):
-        line = yaml_safe_load(line)[0]
-
-        self.db.logs.insert_one(
-            {"job_id": job.id, "dt": line["dt"], "lvl": line["lvl"], "msg": line["msg"]}
-        )
-
 
-class LogsElasticsearch(Logs):
+class LogsElasticsearch(LogsBulk):
 
     MAX_RESULTS = 1000000
 
@@ -212,11 +321,35 @@ class LogsElasticsearch(Logs):
             )
         params = {
             "settings": {"index": {"max_result_window": self.MAX_RESULTS}},
-            "mappings": {"properties": {"dt": {"type": "date"}}},
+            "mappings": {
+                "properties": {"dt": {"type": "date"}, "idx": {"type": "long"}}
+            },
         }
         requests.put(self.api_url, simplejson.dumps(params), headers=self.headers)
         super().__init__()
 
+    def _search(self, params):
+        response = requests.get(
+            "%s_search/" % self.api_url,
+            data=simplejson.dumps(params),
+            headers=self.headers,
+        )
+        return simplejson.loads(response.text)
+
+    def _indexed(self, job):
+        # Lines saved by older versions do not have a line number
+        response = self._search(
+            {
+                "query": {"match": {"job_id": job.id}},
+                "size": 1,
+                "sort": [{"dt": {"order": "asc"}}],
+                "_source": ["idx"],
+            }
+        )
+        with contextlib.suppress(KeyError, IndexError):
+            return "idx" in response["hits"]["hits"][0]["_source"]
+        return True
+
     def _get_docs(self, job, start=0, end=None):
 
         if not end:
@@ -227,19 +360,28 @@ class LogsElasticsearch(Logs):
             return []
 
         params = {
+            "_source": {"excludes": ["job_id", "idx"]},
             "query": {"match": {"job_id": job.id}},
             "from": start,
             "size": limit,
-            "sort": [{"dt": {"order": "asc"}}],
+            "sort": [
+                {"idx": {"order": "asc", "unmapped_type": "long"}},
+                {"dt": {"order": "asc"}},
+            ],
         }
-
-        response = requests.get(
-            "%s_search/" % self.api_url,
-            data=simplejson.dumps(params),
-            headers=self.headers,
-        )
-
-        response = simplejson.loads(response.text)
+        if start and self._indexed(job):
+            # Let the store select the lines
+            params["query"] = {
+                "bool": {
+                    "filter": [
+                        {"match": {"job_id": job.id}},
+                        {"range": {"idx": {"gte": start, "lt": end}}},
+                    ]
+                }
+            }
+            params["from"] = 0
+
+        response = self._search(params)
         if not "hits" in response:
             return []
         result = []
@@ -253,13 +395,34 @@ class LogsElasticsearch(Logs):
             result.append(doc)
         return result
 
-    def line_count(self, job):
+    def _bulk_write(self, job, docs):
+        data = "".join('{"index": {}}\n%s\n' % simplejson.dumps(doc) for doc in docs)
+        # Wait for the lines to be searchable, so that the next call to
+        # _line_count() sees them
+        response = requests.post(
+            "%s_bulk?refresh=wait_for" % self.api_url,
+            data=data.encode("utf-8"),
+            headers={**self.headers, "Content-type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+        if simplejson.loads(response.text).get("errors"):
+            raise requests.RequestException("Some lines were not indexed")
+
+    def _document(self, job, index, line):
+        dt = datetime.datetime.fromisoformat(line["dt"])
+        line.update({"job_id": job.id, "idx": index, "dt": int(dt.timestamp() * 1000)})
+        if line["lvl"] == "results":
+            line.update({"msg": str(line["msg"])})
+        return line
+
+    def _line_count(self, job):
         response = requests.get(
-            "%s_search/" % self.api_url,
-            params={"query": {"match": {"job_id": job.id}}, "_source": False},
+            "%s_count/" % self.api_url,
+            data=simplejson.dumps({"query": {"match": {"job_id": job.id}}}),
+            headers=self.headers,
         )
         with contextlib.suppress(Exception):
-            return response["hits"]["total"]["value"]
+            return simplejson.loads(response.text)["count"]
         return 0
 
     def open(self, job):
@@ -278,18 +441,11 @@ class LogsElasticsearch(Logs):
         docs = self._get_docs(job, start, end)
         return len(yaml_safe_dump(docs).encode("utf-8"))
 
-    def write(self, job, line, output=None, idx=None):
-        line = yaml_safe_load(line)[0]
-        dt = datetime.datetime.strptime(line["dt"], "%Y-%m-%dT%H:%M:%S.%f")
-        line.update({"job_id": job.id, "dt": int(dt.timestamp() * 1000)})
-        if line["lvl"] == "results":
-            line.update({"msg": str(line["msg"])})
-        data = simplejson.dumps(line)
 
-        requests.post("%s_doc/" % self.api_url, data=data, headers=self.headers)
+class LogsFirestore(LogsBulk):
 
+    MAX_BATCH = 500
 
-class LogsFirestore(Logs):
     def __init__(self):
         from google.cloud import firestore
 
@@ -301,34 +457,63 @@ class LogsFirestore(Logs):
         self.root_collection = "logs"
         super().__init__()
 
-    def line_count(self, job):
-        doc_ref = (
+    def _collection(self, job):
+        return (
             self.db.collection(self.root_collection)
             .document(
                 "%02d-%02d-%02d"
-                % (self.submit_time.year, self.submit_time.month, self.submit_time.day)
+                % (job.submit_time.year, job.submit_time.month, job.submit_time.day)
             )
             .collection(str(job.id))
         )
-        return len(doc_ref.stream())
+
+    def _indexed(self, job):
+        # Lines saved by older versions do not have a line number
+        for doc in self._collection(job).limit(1).stream():
+            return "idx" in doc.to_dict()
+        return True
+
+    def _counter(self, job):
+        return self.db.collection(self.root_collection + "-count").document(str(job.id))
+
+    def _bulk_write(self, job, docs):
+        collection = self._collection(job)
+        for index in range(0, len(docs), self.MAX_BATCH):
+            batch = self.db.batch()
+            for (dt, doc) in docs[index : index + self.MAX_BATCH]:
+                batch.set(collection.document(dt), doc)
+            # Committed with the lines
+            batch.set(self._counter(job), {"count": doc["idx"] + 1})
+            batch.commit()
+
+    def _document(self, job, index, line):
+        return (line["dt"], {"idx": index, "lvl": line["lvl"], "msg": line["msg"]})
+
+    def _line_count(self, job):
+        counter = self._counter(job).get()
+        if counter.exists:
+            return counter.to_dict()["count"]
+        # No counter for the jobs started with older versions
+        return len(list(self._collection(job).select([]).stream()))
 
     def open(self, job):
         raise NotImplementedError("Should implement this method")
 
     def read(self, job, start=0, end=None):
-        # TODO: read() method should utilize start and end numbers.
-        docs = (
-            self.db.collection(self.root_collection)
-            .document(
-                "%02d-%02d-%02d"
-                % (job.submit_time.year, job.submit_time.month, job.submit_time.day)
-            )
-            .collection(str(job.id))
-            .limit(end)
-            .stream()
-        )
+        query = self._collection(job)
+        if start or end is not None:
+            if self._indexed(job):
+                # Let the store select the lines
+                query = query.where("idx", ">=", start)
+                if end is not None:
+                    query = query.where("idx", "<", end)
+                query = query.order_by("idx")
+            else:
+                query = query.offset(start)
+                if end is not None:
+                    query = query.limit(max(end - start, 0))
         result = []
-        for doc in docs:
+        for doc in query.stream():
             doc_dict = doc.to_dict()
             result.append(
                 json.dumps(
@@ -341,19 +526,6 @@ class LogsFirestore(Logs):
         # TODO: should be implemented.
         return None
 
-    def write(self, job, line, output=None, idx=None):
-        line = yaml_safe_load(line)[0]
-        doc_ref = (
-            self.db.collection(self.root_collection)
-            .document(
-                "%02d-%02d-%02d"
-                % (job.submit_time.year, job.submit_time.month, job.submit_time.day)
-            )
-            .collection(str(job.id))
-            .document(line["dt"])
-        )
-        doc_ref.set({"lvl": line["lvl"], "msg": line["msg"]})
-
 
 logs_backend_str = settings.LAVA_LOG_BACKEND.rsplit(".", 1)
 try:
@@ -274,6 +274,21 @@ class RestrictedTestJobQuerySet(RestrictedObjectQuerySet):
 
             return self.filter(filters)
 
+    def visible_by_device_type(self):
+        """
+        Jobs visible to every user who can see their device type: public,
+        without viewing groups and not run on a device restricting its
+        visibility.
+        """
+        from lava_scheduler_app.models import Device
+
+        restricted_devices = Device.objects.restricted_by_perm(
+            Device.VIEW_PERMISSION
+        ).filter(existing_permissions__gt=0)
+        return self.filter(is_public=True, viewing_groups__isnull=True).exclude(
+            actual_device__in=restricted_devices
+        )
+
 
 class RestrictedTestCaseQuerySet(QuerySet):
     def visible_by_user(self, user):
@@ -285,6 +300,24 @@ class RestrictedTestCaseQuerySet(QuerySet):
         )
         return self.filter(suite__job__in=jobs)
 
+    def logged_since(self, job):
+        # The test cases are logged after the submission of their job: the
+        # lower bound lets postgresql skip the older partitions of the table.
+        return self.filter(logged__gte=job.submit_time)
+
+
+class RestrictedMeasurementRollupQuerySet(QuerySet):
+    def visible_by_user(self, user):
+
+        from lava_scheduler_app.models import DeviceType, TestJob
+
+        rollups = self.filter(device_type__in=DeviceType.objects.visible_by_user(user))
+        # The measurements of the jobs with a restricted visibility are only
+        # shown to the users allowed to see every job.
+        if user.is_superuser or TestJob.VIEW_PERMISSION in user.get_all_permissions():
+            return rollups
+        return rollups.filter(is_public=True)
+
 
 class RestrictedTestSuiteQuerySet(QuerySet):
     def visible_by_user(self, user):
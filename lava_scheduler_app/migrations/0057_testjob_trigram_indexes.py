@@ -0,0 +1,54 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The indexes are created concurrently to avoid locking the table
+    atomic = False
+
+    dependencies = [
+        ("lava_scheduler_app", "0056_testjob_queue_timeout"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="testjob",
+            index=GinIndex(
+                fields=["description"],
+                name="testjob_description_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="testjob",
+            index=GinIndex(
+                fields=["definition"],
+                name="testjob_definition_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="testjob",
+            index=GinIndex(
+                fields=["failure_comment"],
+                name="testjob_failure_comment_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="testjob",
+            index=GinIndex(
+                fields=["sub_id"],
+                name="testjob_sub_id_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        # "id__contains" is translated to "id::text LIKE"
+        migrations.RunSQL(
+            sql="CREATE INDEX CONCURRENTLY IF NOT EXISTS testjob_id_text_trgm "
+            "ON lava_scheduler_app_testjob USING gin ((id::text) gin_trgm_ops)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS testjob_id_text_trgm",
+        ),
+    ]
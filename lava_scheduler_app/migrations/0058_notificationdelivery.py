@@ -0,0 +1,69 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lava_scheduler_app", "0057_testjob_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationDelivery",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("job_state", models.IntegerField(blank=True, null=True)),
+                ("job_health", models.IntegerField(blank=True, null=True)),
+                ("host", models.CharField(blank=True, default="", max_length=256)),
+                (
+                    "state",
+                    models.IntegerField(
+                        choices=[(0, "Pending"), (1, "Sent"), (2, "Failed")],
+                        default=0,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "callback",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="lava_scheduler_app.notificationcallback",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="lava_scheduler_app.notificationrecipient",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["state", "next_attempt"],
+                        name="notificationdelivery_due",
+                    )
+                ],
+            },
+        ),
+    ]
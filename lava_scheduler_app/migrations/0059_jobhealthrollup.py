@@ -0,0 +1,75 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lava_scheduler_app", "0058_notificationdelivery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobHealthRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateField(verbose_name="Day")),
+                ("health_check", models.BooleanField(default=False)),
+                ("pass_count", models.PositiveIntegerField(default=0)),
+                ("fail_count", models.PositiveIntegerField(default=0)),
+                (
+                    "device",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="lava_scheduler_app.device",
+                    ),
+                ),
+                (
+                    "device_type",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="lava_scheduler_app.devicetype",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["device_type", "bucket"], name="jobhealthrollup_type"
+                    ),
+                    models.Index(
+                        fields=["device", "bucket"], name="jobhealthrollup_dev"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="jobhealthrollup",
+            constraint=models.UniqueConstraint(
+                fields=("bucket", "device", "health_check"),
+                name="jobhealthrollup_device",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="jobhealthrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(device__isnull=True),
+                fields=("bucket", "health_check"),
+                name="jobhealthrollup_no_device",
+            ),
+        ),
+    ]
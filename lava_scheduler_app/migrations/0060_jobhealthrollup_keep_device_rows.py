@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lava_scheduler_app", "0059_jobhealthrollup"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="jobhealthrollup",
+            name="jobhealthrollup_no_device",
+        ),
+        migrations.AlterField(
+            model_name="jobhealthrollup",
+            name="device",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="lava_scheduler_app.device",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="jobhealthrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(device__isnull=True, device_type__isnull=True),
+                fields=("bucket", "health_check"),
+                name="jobhealthrollup_no_device",
+            ),
+        ),
+    ]
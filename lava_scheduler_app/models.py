@@ -21,19 +21,17 @@
 
 import contextlib
 import datetime
-import gzip
 import logging
 import os
 import uuid
 
-import requests
-import simplejson
 import yaml
 from django.conf import settings
 from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.sites.models import Site
 from django.core.exceptions import (
     ImproperlyConfigured,
@@ -41,7 +39,7 @@ from django.core.exceptions import (
     ValidationError,
 )
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import F, Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.crypto import get_random_string
@@ -1332,6 +1330,29 @@ class TestJob(models.Model):
 
     class Meta:
         index_together = ["health", "state", "requested_device_type"]
+        indexes = [
+            # Trigram indexes for the "contains" text searches
+            GinIndex(
+                name="testjob_description_trgm",
+                fields=["description"],
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                name="testjob_definition_trgm",
+                fields=["definition"],
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                name="testjob_failure_comment_trgm",
+                fields=["failure_comment"],
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                name="testjob_sub_id_trgm",
+                fields=["sub_id"],
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         default_permissions = ("change", "delete")
 
     # Permission strings. Not real permissions.
@@ -2135,6 +2156,86 @@ class TestJob(models.Model):
             self.save()
 
 
+class JobHealthRollup(models.Model):
+    """
+    Number of finished jobs and health checks that passed or failed, by day
+    (of the start time), device and health check flag.
+    Updated when the jobs finish and used by the reports.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket", "device", "health_check"],
+                name="jobhealthrollup_device",
+            ),
+            models.UniqueConstraint(
+                fields=["bucket", "health_check"],
+                condition=Q(device__isnull=True, device_type__isnull=True),
+                name="jobhealthrollup_no_device",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["device_type", "bucket"], name="jobhealthrollup_type"),
+            models.Index(fields=["device", "bucket"], name="jobhealthrollup_dev"),
+        ]
+
+    bucket = models.DateField(verbose_name=_("Day"))
+    # Jobs that finished without running on a device are not attached to any
+    # device or device type. The rows of a removed device are kept for its
+    # device type.
+    device = models.ForeignKey(
+        Device, null=True, blank=True, related_name="+", on_delete=models.SET_NULL
+    )
+    device_type = models.ForeignKey(
+        DeviceType, null=True, blank=True, related_name="+", on_delete=models.CASCADE
+    )
+    health_check = models.BooleanField(default=False)
+
+    pass_count = models.PositiveIntegerField(default=0)
+    fail_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def record(cls, job, count=1):
+        """
+        Add (or remove with a negative count) the finished job.
+        """
+        if job.start_time is None:
+            return
+        if job.health == TestJob.HEALTH_COMPLETE:
+            field = "pass_count"
+        elif job.health in [TestJob.HEALTH_INCOMPLETE, TestJob.HEALTH_CANCELED]:
+            field = "fail_count"
+        else:
+            return
+
+        keys = {
+            "bucket": job.start_time.date(),
+            "device_id": job.actual_device_id,
+            "health_check": job.health_check,
+        }
+        if job.actual_device_id is None:
+            # Not the rows kept for the removed devices
+            keys["device_type_id"] = None
+        if count > 0:
+            rollup = cls(**keys)
+            if job.actual_device_id is not None:
+                rollup.device_type_id = job.actual_device.device_type_id
+            # Concurrent jobs should not fail on the creation of the same row
+            cls.objects.bulk_create([rollup], ignore_conflicts=True)
+        # The jobs removed with their device do not match the rows of this
+        # device anymore: the counts are kept
+        cls.objects.filter(**keys).update(**{field: F(field) + count})
+
+    def __str__(self):
+        return "%s %s (%d/%d)" % (
+            self.bucket,
+            self.device_id or "-",
+            self.pass_count,
+            self.fail_count,
+        )
+
+
 class Notification(models.Model):
 
     TEMPLATES_DIR = os.path.join(
@@ -2369,61 +2470,51 @@ class NotificationCallback(models.Model):
         verbose_name=_("Callback content-type"),
     )
 
-    def invoke_callback(self):
-        logger = logging.getLogger("lava-scheduler")
-        data = None
-
-        if self.method != NotificationCallback.GET:
-            output = self.dataset in [
-                NotificationCallback.LOGS,
-                NotificationCallback.ALL,
-            ]
-            results = self.dataset in [
-                NotificationCallback.RESULTS,
-                NotificationCallback.ALL,
-            ]
-            data = self.notification.test_job.create_job_data(
-                token=self.token, output=output, results=results
-            )
-            # store callback_data for later retrieval & triage
-            job_data_file = os.path.join(
-                self.notification.test_job.output_dir, "job_data.gz"
+
+class NotificationDelivery(models.Model):
+    """
+    Outbox of the notification callbacks, emails and IRC messages, delivered
+    by lava-scheduler.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["state", "next_attempt"], name="notificationdelivery_due"
             )
-            if data:
-                # allow for jobs cancelled in submitted state
-                utils.mkdir(self.notification.test_job.output_dir)
-                # only write the file once
-                if not os.path.exists(job_data_file):
-                    with gzip.open(job_data_file, "wb") as output:
-                        output.write(simplejson.dumps(data).encode("utf-8"))
-        try:
-            logger.info("Sending request to callback url %s" % self.url)
-            headers = {}
-            if self.token is not None:
-                headers[self.header] = self.token
-
-            if self.method == NotificationCallback.GET:
-                ret = requests.get(
-                    self.url, headers=headers, timeout=settings.CALLBACK_TIMEOUT
-                )
-            elif self.content_type == NotificationCallback.JSON:
-                ret = requests.post(
-                    self.url,
-                    json=data,
-                    headers=headers,
-                    timeout=settings.CALLBACK_TIMEOUT,
-                )
-            else:
-                ret = requests.post(
-                    self.url,
-                    data=data,
-                    headers=headers,
-                    timeout=settings.CALLBACK_TIMEOUT,
-                )
-            ret.raise_for_status()
+        ]
+
+    callback = models.ForeignKey(
+        NotificationCallback, null=True, blank=True, on_delete=models.CASCADE
+    )
+    recipient = models.ForeignKey(
+        NotificationRecipient, null=True, blank=True, on_delete=models.CASCADE
+    )
+
+    # Delivered with the job state and health when it was queued
+    job_state = models.IntegerField(null=True, blank=True)
+    job_health = models.IntegerField(null=True, blank=True)
 
-        except Exception as ex:
-            logger.warning("Problem sending request to %s: %s" % (self.url, ex))
+    # Callback host, email or IRC server: used to limit the concurrency
+    host = models.CharField(max_length=256, blank=True, default="")
+
+    STATE_PENDING = 0
+    STATE_SENT = 1
+    STATE_FAILED = 2
+    STATE_CHOICES = (
+        (STATE_PENDING, "Pending"),
+        (STATE_SENT, "Sent"),
+        (STATE_FAILED, "Failed"),
+    )
+    state = models.IntegerField(choices=STATE_CHOICES, default=STATE_PENDING)
+
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        target = self.callback.url if self.callback else str(self.recipient)
+        return "%s (%s)" % (target, self.get_state_display())
 
 
 @nottest
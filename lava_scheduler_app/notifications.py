@@ -20,6 +20,7 @@
 import contextlib
 import logging
 import re
+from urllib.parse import urlparse
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -34,6 +35,7 @@ from lava_scheduler_app import dbutils, utils
 from lava_scheduler_app.models import (
     Notification,
     NotificationCallback,
+    NotificationDelivery,
     NotificationRecipient,
     TestJob,
 )
@@ -277,76 +279,81 @@ def get_recipient_args(recipient):
     return user_data
 
 
-def send_notifications(job):
+def send_email(job, notification, recipient, kwargs):
     logger = logging.getLogger("lava-scheduler")
+    logger.info(
+        "[%d] sending email notification to %s", job.id, recipient.email_address
+    )
+    title = "LAVA notification for Test Job %s %s" % (job.id, job.description[:200])
+    kwargs["user"] = get_recipient_args(recipient)
+    body = create_notification_body(notification.template, **kwargs)
+    if not send_mail(title, body, settings.SERVER_EMAIL, [recipient.email_address]):
+        raise Exception("email not sent to %s" % recipient.email_address)
+    recipient.status = NotificationRecipient.SENT
+    recipient.save()
+
+
+def send_irc(job, recipient):
+    logger = logging.getLogger("lava-scheduler")
+    logger.info(
+        "[%d] sending IRC notification to %s on %s",
+        job.id,
+        recipient.irc_handle_name,
+        recipient.irc_server_name,
+    )
+    irc_message = create_irc_notification(job)
+    utils.send_irc_notification(
+        Notification.DEFAULT_IRC_HANDLE,
+        recipient=recipient.irc_handle_name,
+        message=irc_message,
+        server=recipient.irc_server_name,
+    )
+    recipient.status = NotificationRecipient.SENT
+    recipient.save()
+    logger.info("[%d] IRC notification sent to %s", job.id, recipient.irc_handle_name)
+
+
+def send_notifications(job):
+    """
+    Queue the callbacks, emails and IRC messages of the job notification.
+    They are delivered by lava-scheduler.
+    """
     notification = job.notification
-    # Prep template args.
-    kwargs = get_notification_args(job)
-    # Process notification callback.
+    deliveries = []
     for callback in notification.notificationcallback_set.all():
-        callback.invoke_callback()
+        deliveries.append(
+            NotificationDelivery(
+                callback=callback,
+                job_state=job.state,
+                job_health=job.health,
+                host=urlparse(callback.url or "").netloc,
+            )
+        )
 
-    for recipient in notification.notificationrecipient_set.all():
+    # Recipients with a pending delivery will be notified once
+    pending = NotificationDelivery.objects.filter(
+        recipient__notification=notification,
+        state=NotificationDelivery.STATE_PENDING,
+    ).values_list("recipient_id", flat=True)
+    recipients = notification.notificationrecipient_set.filter(
+        status=NotificationRecipient.NOT_SENT
+    ).exclude(id__in=pending)
+    for recipient in recipients:
         if recipient.method == NotificationRecipient.EMAIL:
-            if recipient.status == NotificationRecipient.NOT_SENT:
-                try:
-                    logger.info(
-                        "[%d] sending email notification to %s",
-                        job.id,
-                        recipient.email_address,
-                    )
-                    title = "LAVA notification for Test Job %s %s" % (
-                        job.id,
-                        job.description[:200],
-                    )
-                    kwargs["user"] = get_recipient_args(recipient)
-                    body = create_notification_body(notification.template, **kwargs)
-                    result = send_mail(
-                        title, body, settings.SERVER_EMAIL, [recipient.email_address]
-                    )
-                    if result:
-                        recipient.status = NotificationRecipient.SENT
-                        recipient.save()
-                except Exception as exc:
-                    logger.exception(exc)
-                    logger.warning(
-                        "[%d] failed to send email notification to %s",
-                        job.id,
-                        recipient.email_address,
-                    )
-        else:  # IRC method
-            if recipient.status == NotificationRecipient.NOT_SENT:
-                if recipient.irc_server_name:
-
-                    logger.info(
-                        "[%d] sending IRC notification to %s on %s",
-                        job.id,
-                        recipient.irc_handle_name,
-                        recipient.irc_server_name,
-                    )
-                    try:
-                        irc_message = create_irc_notification(job)
-                        utils.send_irc_notification(
-                            Notification.DEFAULT_IRC_HANDLE,
-                            recipient=recipient.irc_handle_name,
-                            message=irc_message,
-                            server=recipient.irc_server_name,
-                        )
-                        recipient.status = NotificationRecipient.SENT
-                        recipient.save()
-                        logger.info(
-                            "[%d] IRC notification sent to %s",
-                            job.id,
-                            recipient.irc_handle_name,
-                        )
-                    # FIXME: this bare except should be constrained
-                    except Exception as e:
-                        logger.warning(
-                            "[%d] IRC notification not sent. Reason: %s - %s",
-                            job.id,
-                            e.__class__.__name__,
-                            str(e),
-                        )
+            host = "email"
+        elif recipient.irc_server_name:
+            host = recipient.irc_server_name
+        else:
+            continue
+        deliveries.append(
+            NotificationDelivery(
+                recipient=recipient,
+                job_state=job.state,
+                job_health=job.health,
+                host=host,
+            )
+        )
+    NotificationDelivery.objects.bulk_create(deliveries)
 
 
 def notification_criteria(job_id, criteria, state, health, old_health):
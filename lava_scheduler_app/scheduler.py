@@ -25,7 +25,9 @@ from django.db import transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 
+from lava_common import metrics
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
+from lava_scheduler_app.bundle import StartBundle
 from lava_scheduler_app.dbutils import match_vlan_interface
 from lava_scheduler_app.models import (
     Device,
@@ -35,6 +37,19 @@ from lava_scheduler_app.models import (
     _create_pipeline_job,
 )
 
+PASS_DURATION = metrics.histogram(
+    "lava_scheduler_pass_seconds", "Duration of the scheduling passes"
+)
+JOBS_CONSIDERED = metrics.counter(
+    "lava_scheduler_jobs_considered_total",
+    "Queued jobs considered for the available devices",
+)
+JOBS_SCHEDULED = metrics.counter(
+    "lava_scheduler_jobs_scheduled_total", "Jobs scheduled", ["kind"]
+)
+HEALTH_CHECKS_SCHEDULED = JOBS_SCHEDULED.labels("health-check")
+TEST_JOBS_SCHEDULED = JOBS_SCHEDULED.labels("job")
+
 
 @dataclass
 class WorkerSummary:
@@ -64,6 +79,17 @@ def worker_summary():
     return ret
 
 
+def prepare_start_bundle(logger, job):
+    """
+    Render the bundle sent to the worker when the job starts.
+    """
+    try:
+        StartBundle(job).build()
+    except Exception as exc:
+        # Rendered again, and errors reported, when the worker starts the job
+        logger.warning("  |--> [%d] unable to render the start bundle: %s", job.id, exc)
+
+
 def check_queue_timeout(logger):
     logger.info("Check queue timeouts:")
     jobs = TestJob.objects.filter(
@@ -86,9 +112,10 @@ def check_queue_timeout(logger):
 
 
 def schedule(logger, available_dt, workers):
-    available_devices = schedule_health_checks(logger, available_dt, workers)
-    schedule_jobs(logger, available_devices, workers)
-    check_queue_timeout(logger)
+    with PASS_DURATION.time():
+        available_devices = schedule_health_checks(logger, available_dt, workers)
+        schedule_jobs(logger, available_devices, workers)
+        check_queue_timeout(logger)
 
 
 def schedule_health_checks(logger, available_dt, workers):
@@ -208,7 +235,7 @@ def schedule_health_checks_for_device_type(logger, dt, workers):
             continue
         logger.debug("  |--> scheduling health check")
         try:
-            schedule_health_check(device, health_check)
+            schedule_health_check(logger, device, health_check)
             workers_limit[device.worker_host.hostname].busy += 1
         except Exception as exc:
             # If the health check cannot be schedule, set health to BAD to exclude the device
@@ -226,7 +253,7 @@ def schedule_health_checks_for_device_type(logger, dt, workers):
     return available_devices
 
 
-def schedule_health_check(device, definition):
+def schedule_health_check(logger, device, definition):
     user = User.objects.get(username="lava-health")
     job = _create_pipeline_job(
         yaml_safe_load(definition),
@@ -239,6 +266,8 @@ def schedule_health_check(device, definition):
     )
     job.go_state_scheduled(device)
     job.save()
+    prepare_start_bundle(logger, job)
+    HEALTH_CHECKS_SCHEDULED.inc()
 
 
 def schedule_jobs(logger, available_devices, workers):
@@ -319,6 +348,7 @@ def schedule_jobs_for_device(logger, device, print_header):
 
     device_tags = set(device.tags.all())
     for job in jobs:
+        JOBS_CONSIDERED.inc()
         if not device.can_submit(job.submitter):
             continue
 
@@ -347,6 +377,9 @@ def schedule_jobs_for_device(logger, device, print_header):
         else:
             job.go_state_scheduled(device)
         job.save()
+        if not job.is_multinode:
+            prepare_start_bundle(logger, job)
+        TEST_JOBS_SCHEDULED.inc()
         return job.id
     return None
 
@@ -390,4 +423,5 @@ def transition_multinode_jobs(logger):
             # transition the job and device
             sub_job.go_state_scheduled()
             sub_job.save()
+            prepare_start_bundle(logger, sub_job)
             logger.debug("--> %d", sub_job.id)
@@ -28,10 +28,16 @@ import simplejson
 import zmq
 from django.conf import settings
 from django.db import transaction
-from django.db.models.signals import post_init, post_save, pre_delete, pre_save
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from zmq.utils.strtypes import b
 
-from lava_scheduler_app.models import Device, TestJob, Worker
+from lava_scheduler_app.models import Device, JobHealthRollup, TestJob, Worker
 from lava_scheduler_app.tasks import async_send_notifications
 
 
@@ -202,6 +208,30 @@ def testjob_post_handler(sender, **kwargs):
         send_event(".testjob", str(instance.submitter), data)
 
 
+@log_exception
+def testjob_rollup_handler(sender, **kwargs):
+    # Count the jobs in the rollups once, when they finish
+    instance = kwargs["instance"]
+    if instance.state != TestJob.STATE_FINISHED:
+        return
+    if instance._old_state == TestJob.STATE_FINISHED and not kwargs["created"]:
+        return
+    if getattr(instance, "_rollup_recorded", False):
+        return
+    JobHealthRollup.record(instance)
+    instance._rollup_recorded = True
+
+
+@log_exception
+def testjob_rollup_delete_handler(sender, **kwargs):
+    instance = kwargs["instance"]
+    # Only the jobs that were finished in the database were counted
+    if instance._old_state == TestJob.STATE_FINISHED or getattr(
+        instance, "_rollup_recorded", False
+    ):
+        JobHealthRollup.record(instance, -1)
+
+
 @log_exception
 def testjob_pre_delete_handler(sender, **kwargs):
     instance = kwargs["instance"]
@@ -262,6 +292,19 @@ pre_save.connect(
     weak=False,
     dispatch_uid="testjob_notifications",
 )
+# Connected before testjob_post_handler that resets the old states
+post_save.connect(
+    testjob_rollup_handler,
+    sender=TestJob,
+    weak=False,
+    dispatch_uid="testjob_rollup_handler",
+)
+post_delete.connect(
+    testjob_rollup_delete_handler,
+    sender=TestJob,
+    weak=False,
+    dispatch_uid="testjob_rollup_delete_handler",
+)
 
 # Only activate these signals when EVENT_NOTIFICATION is in use
 if settings.EVENT_NOTIFICATION:
@@ -0,0 +1,186 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Timing index of the jobs.
+
+The start and end lines of the actions are extracted from the logs when they
+are ingested and appended to "output.timing" in the job output directory, one
+json list by line:
+
+    ["start", "1.2", "deploy-device-env", 232.0]
+    ["end", "1.2", "deploy-device-env", 10.0]
+
+The index of the jobs that finished before the upgrade is built from the logs
+the first time it's needed.
+"""
+
+import contextlib
+import json
+import os
+import pathlib
+import re
+
+from lava_common.yaml import yaml_safe_load
+from lava_scheduler_app.logutils import LogsFilesystem, logs_instance
+
+FILENAME = "output.timing"
+
+PATTERN_START = re.compile(
+    r"^start: (?P<level>[\d.]+) (?P<action>[\w_-]+) "
+    r"\(timeout (?P<timeout>\d+:\d+:\d+)\)"
+)
+PATTERN_END = re.compile(
+    r"^end: (?P<level>[\d.]+) (?P<action>[\w_-]+) "
+    r"\(duration (?P<duration>\d+:\d+:\d+)\)"
+)
+
+
+def _seconds(value):
+    parts = value.split(":")
+    return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
+
+
+def parse(line):
+    """
+    Return the timing record of a log line, None otherwise.
+    """
+    # Only parse debug and info levels
+    if line.get("lvl") not in ["debug", "info"]:
+        return None
+    msg = line.get("msg")
+    # The message can be a python object
+    if not isinstance(msg, str) or not msg.startswith(("start: ", "end: ")):
+        return None
+
+    match = PATTERN_START.match(msg)
+    if match is not None:
+        d = match.groupdict()
+        return ["start", d["level"], d["action"], _seconds(d["timeout"])]
+    match = PATTERN_END.match(msg)
+    if match is not None:
+        d = match.groupdict()
+        return ["end", d["level"], d["action"], _seconds(d["duration"])]
+    return None
+
+
+def _path(job):
+    return pathlib.Path(job.output_dir) / FILENAME
+
+
+def append(job, records, create=False):
+    """
+    Append the records to the index.
+    The index is only created with the first lines of the job: otherwise it
+    will be built from the logs when needed.
+    """
+    path = _path(job)
+    if not create and not path.exists():
+        return
+    with path.open("a", encoding="utf-8") as f_out:
+        f_out.write("".join(json.dumps(r) + "\n" for r in records))
+
+
+def build(job):
+    """
+    Extract the records from the logs of the job.
+    """
+    data = logs_instance.read(job)
+    if isinstance(logs_instance, LogsFilesystem):
+        # One log line by line of the file: only parse the candidates
+        lines = []
+        for line in data.split("\n"):
+            if "start: " in line or "end: " in line:
+                with contextlib.suppress(Exception):
+                    lines.append(yaml_safe_load(line)[0])
+    else:
+        lines = yaml_safe_load(data) or []
+
+    records = []
+    for line in lines:
+        with contextlib.suppress(AttributeError):
+            record = parse(line)
+            if record is not None:
+                records.append(record)
+    return records
+
+
+def load(job):
+    """
+    Return the records of the job, building the index when it's missing.
+    """
+    path = _path(job)
+    with contextlib.suppress(FileNotFoundError):
+        with path.open(encoding="utf-8") as f_in:
+            return [json.loads(line) for line in f_in if line.strip()]
+
+    records = build(job)
+    # Only save the index of finished jobs: the running jobs will be
+    # ingesting more lines
+    if job.state == job.STATE_FINISHED:
+        with contextlib.suppress(OSError):
+            with open(str(path) + ".tmp", "w", encoding="utf-8") as f_out:
+                f_out.write("".join(json.dumps(r) + "\n" for r in records))
+            os.replace(str(path) + ".tmp", str(path))
+    return records
+
+
+def report(records):
+    """
+    Compute the timing of each action and the summary of the top level
+    actions.
+    """
+    timings = {}
+    total_duration = 0
+    max_duration = 0
+    summary = []
+    for (kind, level, action, value) in records:
+        if kind == "start":
+            timings[level] = {"name": action, "timeout": value}
+            continue
+        # TODO: validate does not have a proper start line
+        if action == "validate":
+            continue
+        # We create the entry because with some timeout, the start line
+        # might be missing.
+        timings.setdefault(level, {})["duration"] = value
+
+        max_duration = max(max_duration, value)
+        if "." not in level:
+            total_duration += value
+            summary.append([action, value, 0])
+
+    pipeline = []
+    for lvl in sorted(timings.keys()):
+        duration = timings[lvl].get("duration", 0.0)
+        timeout = timings[lvl].get("timeout", 0.0)
+        name = timings[lvl].get("name", "???")
+        pipeline.append(
+            (lvl, name, duration, timeout, bool(duration >= (timeout * 0.85)))
+        )
+
+    # Compute the percentage
+    if total_duration:
+        for index, action in enumerate(summary):
+            summary[index][2] = action[1] / total_duration * 100
+
+    return {
+        "pipeline": pipeline,
+        "summary": summary,
+        "total_duration": total_duration,
+        "mean_duration": total_duration / len(pipeline) if pipeline else 0,
+        "max_duration": max_duration,
+    }
@@ -22,10 +22,11 @@
 import contextlib
 import datetime
 import io
+import json
 import logging
 import os
-import re
 import tarfile
+import time
 from pathlib import Path
 
 import simplejson
@@ -48,6 +49,7 @@ from django.db.models import (
     Prefetch,
     Q,
     Subquery,
+    Sum,
     TextField,
     Value,
     When,
@@ -59,6 +61,7 @@ from django.http import (
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseForbidden,
+    HttpResponseNotModified,
     HttpResponseRedirect,
     JsonResponse,
 )
@@ -68,16 +71,22 @@ from django.urls import reverse
 from django.utils import timezone
 from django.utils.crypto import constant_time_compare
 from django.utils.html import escape
+from django.utils.http import parse_etags
 from django.utils.timesince import timeuntil
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods, require_POST
 from django_tables2 import RequestConfig
 
+from lava_common import metrics
 from lava_common.log import dump
 from lava_common.schemas import validate
 from lava_common.version import __version__
-from lava_common.yaml import yaml_safe_dump, yaml_safe_load
-from lava_results_app.dbutils import create_metadata_store, map_scanned_results
+from lava_common.yaml import yaml_safe_load
+from lava_results_app.dbutils import (
+    create_metadata_store,
+    map_scanned_results,
+    update_measurement_rollups,
+)
 from lava_results_app.models import (
     NamedTestAttribute,
     Query,
@@ -90,6 +99,8 @@ from lava_results_app.utils import (
     description_data,
     description_filename,
 )
+from lava_scheduler_app import timing
+from lava_scheduler_app.bundle import SHARED_PARTS, StartBundle, etag
 from lava_scheduler_app.dbutils import (
     device_type_summary,
     invalid_template,
@@ -97,10 +108,11 @@ from lava_scheduler_app.dbutils import (
     testjob_submission,
     validate_job,
 )
-from lava_scheduler_app.logutils import logs_instance
+from lava_scheduler_app.logutils import LogsBackPressure, logs_instance
 from lava_scheduler_app.models import (
     Device,
     DeviceType,
+    JobHealthRollup,
     RemoteArtifactsAuth,
     Tag,
     TestJob,
@@ -132,14 +144,27 @@ from lava_scheduler_app.tables import (
 from lava_scheduler_app.templatetags.utils import udecode
 from lava_scheduler_app.utils import get_user_ip, is_ip_allowed
 from lava_server.bread_crumbs import BreadCrumb, BreadCrumbTrail
-from lava_server.compat import djt2_paginator_class, is_ajax
-from lava_server.files import File
-from lava_server.lavatable import LavaView
+from lava_server.compat import is_ajax
+from lava_server.lavatable import KeysetPaginator, LavaRequestConfig, LavaView
 from lava_server.views import index as lava_index
 
+LOGS_LINES = metrics.counter(
+    "lava_logs_lines_total", "Log lines received from the dispatchers"
+)
+LOGS_BATCH = metrics.histogram(
+    "lava_logs_batch_lines",
+    "Log lines received by request",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000),
+)
+LOGS_DURATION = metrics.histogram(
+    "lava_logs_request_seconds", "Duration of the log ingestion requests"
+)
+
 
 def request_config(request, paginate):
-    return RequestConfig(request, paginate={**paginate, **djt2_paginator_class()})
+    return LavaRequestConfig(
+        request, paginate={**paginate, "paginator_class": KeysetPaginator}
+    )
 
 
 # The only functions which need to go in this file are those directly
@@ -223,15 +248,24 @@ class FailureTableView(JobTableView):
         if device:
             jobs = jobs.filter(actual_device__hostname=device)
 
+        # Same days as the reports: from start (excluded) to end, relative to
+        # today
         start = self.request.GET.get("start")
         if start:
-            now = timezone.now()
-            start = now + datetime.timedelta(int(start))
+            today = timezone.now().date()
+            start = today + datetime.timedelta(int(start) + 1)
 
             end = self.request.GET.get("end")
             if end:
-                end = now + datetime.timedelta(int(end))
-                jobs = jobs.filter(start_time__range=(start, end))
+                end = today + datetime.timedelta(int(end) + 1)
+                jobs = jobs.filter(
+                    start_time__gte=datetime.datetime.combine(
+                        start, datetime.time.min, tzinfo=datetime.timezone.utc
+                    ),
+                    start_time__lt=datetime.datetime.combine(
+                        end, datetime.time.min, tzinfo=datetime.timezone.utc
+                    ),
+                )
         return jobs
 
 
@@ -434,54 +468,53 @@ def workers(request):
     )
 
 
-def report_data(start_day, end_day, devices, url_param):
-    now = timezone.now()
-    start_date = now + datetime.timedelta(start_day)
-    end_date = now + datetime.timedelta(end_day)
-
-    res = TestJob.objects.filter(state=TestJob.STATE_FINISHED)
-    res = res.filter(start_time__range=(start_date, end_date))
-    if devices is not None:
-        res = res.filter(actual_device__in=devices)
-
-    res = res.values("health", "health_check")
-    res = res.aggregate(
-        health_pass=Count(
-            "pk",
-            filter=Q(health=TestJob.HEALTH_COMPLETE, health_check=True),
-        ),
-        job_pass=Count(
-            "pk",
-            filter=Q(health=TestJob.HEALTH_COMPLETE, health_check=False),
-        ),
-        health_fail=Count(
-            "pk",
-            filter=Q(
-                health__in=(TestJob.HEALTH_CANCELED, TestJob.HEALTH_INCOMPLETE),
-                health_check=True,
-            ),
-        ),
-        job_fail=Count(
-            "pk",
-            filter=Q(
-                health__in=(TestJob.HEALTH_CANCELED, TestJob.HEALTH_INCOMPLETE),
-                health_check=False,
-            ),
-        ),
+def report_days(rollups, start_day, end_day):
+    """
+    Sum the rollups by day and health check flag, for the days between
+    start_day (excluded) and end_day relative to today.
+    """
+    today = timezone.now().date()
+    rows = (
+        rollups.filter(
+            bucket__range=(
+                today + datetime.timedelta(start_day + 1),
+                today + datetime.timedelta(end_day),
+            )
+        )
+        .values("bucket", "health_check")
+        .annotate(passed=Sum("pass_count"), failed=Sum("fail_count"))
     )
+    return {
+        (row["bucket"], row["health_check"]): (row["passed"], row["failed"])
+        for row in rows
+    }
+
+
+def report_data(start_day, end_day, rollups, url_param, days=None):
+    today = timezone.now().date()
+    start_date = today + datetime.timedelta(start_day + 1)
+    end_date = today + datetime.timedelta(end_day)
+    if days is None:
+        days = report_days(rollups, start_day, end_day)
+
+    res = {True: [0, 0], False: [0, 0]}
+    for ((bucket, health_check), (passed, failed)) in days.items():
+        if start_date <= bucket <= end_date:
+            res[health_check][0] += passed
+            res[health_check][1] += failed
 
     url = reverse("lava.scheduler.failure_report")
     params = "start=%s&end=%s%s" % (start_day, end_day, url_param)
     return (
         {
-            "pass": res["health_pass"] or 0,
-            "fail": res["health_fail"] or 0,
+            "pass": res[True][0],
+            "fail": res[True][1],
             "date": start_date.strftime("%m-%d"),
             "failure_url": "%s?%s&health_check=1" % (url, params),
         },
         {
-            "pass": res["job_pass"] or 0,
-            "fail": res["job_fail"] or 0,
+            "pass": res[False][0],
+            "fail": res[False][1],
             "date": start_date.strftime("%m-%d"),
             "failure_url": "%s?%s&health_check=0" % (url, params),
         },
@@ -489,42 +522,50 @@ def report_data(start_day, end_day, devices, url_param):
 
 
 def type_report_data(start_day, end_day, dt):
-    devices = Device.objects.filter(device_type=dt)
-    return report_data(start_day, end_day, devices, f"&device_type={dt}")
+    rollups = JobHealthRollup.objects.filter(device_type=dt)
+    return report_data(start_day, end_day, rollups, f"&device_type={dt}")
 
 
 def device_report_data(start_day, end_day, device):
-    return report_data(start_day, end_day, [device], f"&device={device}")
+    rollups = JobHealthRollup.objects.filter(device=device)
+    return report_data(start_day, end_day, rollups, f"&device={device}")
 
 
 def job_report_data(start_day, end_day):
-    return report_data(start_day, end_day, None, "")
+    return report_data(start_day, end_day, JobHealthRollup.objects.all(), "")
 
 
-@BreadCrumb("Reports", parent=index)
-def reports(request):
-    health_day_report = []
-    health_week_report = []
-    job_day_report = []
-    job_week_report = []
+def reports_data(rollups, url_param):
+    """
+    Daily reports of the last 7 days and weekly reports of the last 10 weeks,
+    computed from a single query.
+    """
+    days = report_days(rollups, -70, 0)
+    reports = {
+        "health_day_report": [],
+        "health_week_report": [],
+        "job_day_report": [],
+        "job_week_report": [],
+    }
     for day in reversed(range(7)):
-        data = job_report_data(day * -1 - 1, day * -1)
-        health_day_report.append(data[0])
-        job_day_report.append(data[1])
+        data = report_data(day * -1 - 1, day * -1, rollups, url_param, days)
+        reports["health_day_report"].append(data[0])
+        reports["job_day_report"].append(data[1])
 
     for week in reversed(range(10)):
-        data = job_report_data(week * -7 - 7, week * -7)
-        health_week_report.append(data[0])
-        job_week_report.append(data[1])
+        data = report_data(week * -7 - 7, week * -7, rollups, url_param, days)
+        reports["health_week_report"].append(data[0])
+        reports["job_week_report"].append(data[1])
+    return reports
 
+
+@BreadCrumb("Reports", parent=index)
+def reports(request):
     return render(
         request,
         "lava_scheduler_app/reports.html",
         {
-            "health_week_report": health_week_report,
-            "health_day_report": health_day_report,
-            "job_week_report": job_week_report,
-            "job_day_report": job_day_report,
+            **reports_data(JobHealthRollup.objects.all(), ""),
             "bread_crumb_trail": BreadCrumbTrail.leading_to(index),
         },
     )
@@ -1087,20 +1128,6 @@ def device_type_reports(request, pk):
     if not device_type.can_view(request.user):
         raise PermissionDenied()
 
-    health_day_report = []
-    health_week_report = []
-    job_day_report = []
-    job_week_report = []
-    for day in reversed(range(7)):
-        data = type_report_data(day * -1 - 1, day * -1, device_type)
-        health_day_report.append(data[0])
-        job_day_report.append(data[1])
-
-    for week in reversed(range(10)):
-        data = type_report_data(week * -7 - 7, week * -7, device_type)
-        health_week_report.append(data[0])
-        job_week_report.append(data[1])
-
     long_running = (
         TestJob.objects.filter(
             actual_device__in=Device.objects.filter(device_type=device_type),
@@ -1114,10 +1141,10 @@ def device_type_reports(request, pk):
         "lava_scheduler_app/devicetype_reports.html",
         {
             "device_type": device_type,
-            "health_week_report": health_week_report,
-            "health_day_report": health_day_report,
-            "job_week_report": job_week_report,
-            "job_day_report": job_day_report,
+            **reports_data(
+                JobHealthRollup.objects.filter(device_type=device_type),
+                f"&device_type={device_type}",
+            ),
             "long_running": long_running,
             "bread_crumb_trail": BreadCrumbTrail.leading_to(device_type_reports, pk=pk),
         },
@@ -1191,94 +1218,32 @@ def internal_v1_jobs(request, pk):
         return JsonResponse({"error": "Invalid 'token'"}, status=400)
 
     if request.method == "GET":
-        job_def = yaml_safe_load(job.definition)
-        job_def["compatibility"] = job.pipeline_compatibility
-        job_def_str_safe = yaml_safe_dump(job_def)
-
-        tokens = {
-            x["name"]: x["token"]
-            for x in RemoteArtifactsAuth.objects.filter(user=job.submitter).values(
-                "name", "token"
-            )
-        }
 
-        def update_token(headers_dict):
-            for key in headers_dict["headers"]:
-                token_name = headers_dict["headers"][key]
-                if token_name in tokens.keys():
-                    headers_dict["headers"][key] = tokens[token_name]
-
-        if "actions" in job_def:
-            for action in job_def["actions"]:
-                for k, v in action.items():
-                    if k == "deploy":
-                        for a, b in v.items():
-                            if isinstance(b, dict):
-                                if "url" in b and "headers" in b:
-                                    update_token(b)
-                                for i, j in b.items():
-                                    if isinstance(j, dict):
-                                        if "url" in j and "headers" in j:
-                                            update_token(j)
-
-        if "secrets" in job_def:
-            for k, v in job_def["secrets"].items():
-                if v in tokens.keys():
-                    job_def["secrets"][k] = tokens[v]
-
-        job_def_str = yaml_safe_dump(job_def)
-        job_ctx = job_def.get("context", {})
-
-        if job.dynamic_connection:
-            host = job.dynamic_host()
-            device = host.actual_device
-            worker = device.worker_host
-            host_device_cfg = device.load_configuration(job_ctx)
-            device_cfg_str = yaml_safe_dump(
-                device.minimise_configuration(host_device_cfg)
-            )
-        else:
-            device = job.actual_device
-            worker = device.worker_host
-            device_cfg_str = device.load_configuration(job_ctx, output_format="yaml")
-
-        def config(kind):
-            try:
-                data = File(kind, worker.hostname).read(raising=False)
-                yaml_safe_load(data)
-                return data
-            except yaml.YAMLError:
-                # Raise an OSError because the caller uses yaml.YAMLError for a
-                # specific usage. Allows here to specify the faulty filename.
-                raise OSError(
-                    "", f"Invalid YAML file for {worker.hostname}: {kind} file"
+        def tokens():
+            return {
+                x["name"]: x["token"]
+                for x in RemoteArtifactsAuth.objects.filter(user=job.submitter).values(
+                    "name", "token"
                 )
+            }
+
+        parts = StartBundle(job).get(tokens)
+        etags = {name: etag(value) for (name, value) in parts.items()}
+        bundle_etag = etag(json.dumps(etags, sort_keys=True))
 
-        env_str = config("env")
-        env_dut_str = config("env-dut")
-        dispatcher_cfg = config("dispatcher")
-
-        # Save the configuration
-        path = Path(job.output_dir)
-        path.mkdir(mode=0o755, parents=True, exist_ok=True)
-        (path / "job.yaml").write_text(job_def_str_safe, encoding="utf-8")
-        (path / "device.yaml").write_text(device_cfg_str, encoding="utf-8")
-        if dispatcher_cfg:
-            (path / "dispatcher.yaml").write_text(dispatcher_cfg, encoding="utf-8")
-        if env_str:
-            (path / "env.yaml").write_text(env_str)
-        if env_dut_str:
-            (path / "env-dut.yaml").write_text(env_dut_str, encoding="utf-8")
-
-        return JsonResponse(
-            {
-                "definition": job_def_str,
-                "device": device_cfg_str,
-                "dispatcher": dispatcher_cfg,
-                "env": env_str,
-                "env-dut": env_dut_str,
+        # The worker sends the etags of the parts it already has
+        cached = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if bundle_etag in cached:
+            response = HttpResponseNotModified()
+        else:
+            data = {
+                name: None if name in SHARED_PARTS and etags[name] in cached else value
+                for (name, value) in parts.items()
             }
-        )
+            data["etags"] = {name: etags[name] for name in SHARED_PARTS}
+            response = JsonResponse(data)
+        response["ETag"] = bundle_etag
+        return response
     else:
         # POST request
         state = request.POST.get("state", "").capitalize()
@@ -1365,54 +1330,92 @@ def internal_v1_jobs_logs(request, pk):
     # TODO: use a database transaction so all or none objects are saved
     # TODO: except exceptions and return the number
     #       of lines that where actually parsed !!
+    begin = time.perf_counter()
     test_cases = []
+    timings = []
     line_count = 0
-    for (line, string) in zip(yaml_safe_load(lines), lines.split("\n")):
-        # skip lines that where already saved to disk
-        if line_skip > 0:
-            line_skip -= 1
-        else:
-            # Handle lava-event
-            if line["lvl"] == "event":
-                send_event(
-                    ".event", "lavaserver", {"message": line["msg"], "job": job.id}
+    try:
+        for (line, string) in zip(yaml_safe_load(lines), lines.split("\n")):
+            # skip lines that where already saved to disk
+            resent = line_skip > 0
+            if resent:
+                line_skip -= 1
+            else:
+                # Handle lava-event
+                if line["lvl"] == "event":
+                    send_event(
+                        ".event", "lavaserver", {"message": line["msg"], "job": job.id}
+                    )
+                    line["lvl"] = "debug"
+                    string = "- " + dump(line)
+
+                # Save the log line
+                logs_instance.write(job, (string + "\n").encode("utf-8"), output, index)
+
+                # Index the start and end of the actions
+                record = timing.parse(line)
+                if record is not None:
+                    timings.append((line_count, record))
+
+            # handle test case results
+            if line["lvl"] == "results":
+                starttc = endtc = None
+                with contextlib.suppress(KeyError):
+                    starttc = line["msg"]["starttc"]
+                    del line["msg"]["starttc"]
+                with contextlib.suppress(KeyError):
+                    endtc = line["msg"]["endtc"]
+                    del line["msg"]["endtc"]
+                meta_filename = create_metadata_store(line["msg"], job)
+                new_test_case = map_scanned_results(
+                    results=line["msg"],
+                    job=job,
+                    starttc=starttc,
+                    endtc=endtc,
+                    meta_filename=meta_filename,
                 )
-                line["lvl"] = "debug"
-                string = "- " + dump(line)
-
-            # Save the log line
-            logs_instance.write(job, (string + "\n").encode("utf-8"), output, index)
-
-        # handle test case results
-        if line["lvl"] == "results":
-            starttc = endtc = None
-            with contextlib.suppress(KeyError):
-                starttc = line["msg"]["starttc"]
-                del line["msg"]["starttc"]
-            with contextlib.suppress(KeyError):
-                endtc = line["msg"]["endtc"]
-                del line["msg"]["endtc"]
-            meta_filename = create_metadata_store(line["msg"], job)
-            new_test_case = map_scanned_results(
-                results=line["msg"],
-                job=job,
-                starttc=starttc,
-                endtc=endtc,
-                meta_filename=meta_filename,
-            )
 
-            if new_test_case is not None:
-                test_cases.append(new_test_case)
-        line_count += 1
+                if new_test_case is not None:
+                    test_cases.append((line_count, new_test_case, resent))
+            line_count += 1
+        logs_instance.flush(job)
+    except LogsBackPressure as exc:
+        # Only acknowledge the lines that were saved: lava-run will send the
+        # other ones again
+        line_count -= exc.lines
+    finally:
+        # On other errors, do not leave the lines buffered in this process
+        with contextlib.suppress(LogsBackPressure):
+            logs_instance.flush(job)
+    test_cases = [(tc, resent) for (idx, tc, resent) in test_cases if idx < line_count]
+    with contextlib.suppress(OSError):
+        timing.append(
+            job,
+            [r for (idx, r) in timings if idx < line_count],
+            create=(line_idx == 0),
+        )
 
-    # Save the new test cases
-    try:
-        TestCase.objects.bulk_create(test_cases)
-    except (DatabaseError, ValueError):
-        for tc in test_cases:
-            with contextlib.suppress(DatabaseError, ValueError):
-                tc.save()
+    # Save the new test cases and add their measurements to the rollups in
+    # the same transaction: backfill_measurement_rollups rebuilds the rollups
+    # from the committed test cases.
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                TestCase.objects.bulk_create([tc for (tc, _) in test_cases])
+        except (DatabaseError, ValueError):
+            for (tc, _) in test_cases:
+                with contextlib.suppress(DatabaseError, ValueError):
+                    with transaction.atomic():
+                        tc.save()
+        # The resent lines were already counted
+        with contextlib.suppress(DatabaseError):
+            update_measurement_rollups(
+                job, [tc for (tc, resent) in test_cases if not resent]
+            )
 
+    LOGS_LINES.inc(line_count)
+    LOGS_BATCH.observe(line_count)
+    LOGS_DURATION.observe(time.perf_counter() - begin)
     return JsonResponse({"line_count": line_count})
 
 
@@ -2111,99 +2114,17 @@ def job_status(request, pk):
 def job_timing(request, pk):
     job = get_restricted_job(request.user, pk, request=request)
     try:
-        data = logs_instance.read(job)
-        logs = yaml_safe_load(data)
+        data = timing.report(timing.load(job))
     except OSError:
         raise Http404
 
-    # start and end patterns
-    pattern_start = re.compile(
-        (
-            "^start: (?P<level>[\\d.]+) (?P<action>[\\w_-]+) "
-            "\\(timeout (?P<timeout>\\d+:\\d+:\\d+)\\)"
-        )
-    )
-    pattern_end = re.compile(
-        (
-            "^end: (?P<level>[\\d.]+) (?P<action>[\\w_-]+) "
-            "\\(duration (?P<duration>\\d+:\\d+:\\d+)\\)"
-        )
-    )
-
-    timings = {}
-    total_duration = 0
-    max_duration = 0
-    summary = []
-    for line in logs:
-        # Only parse debug and info levels
-        if line["lvl"] not in ["debug", "info"]:
-            continue
-
-        # Will raise if the log message is a python object
-        try:
-            match = pattern_start.match(line["msg"])
-        except TypeError:
-            continue
-
-        if match is not None:
-            d = match.groupdict()
-            parts = d["timeout"].split(":")
-            timeout = float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-            timings[d["level"]] = {"name": d["action"], "timeout": float(timeout)}
-            continue
-
-        # No need to catch TypeError here as we know it's a string
-        match = pattern_end.match(line["msg"])
-        if match is not None:
-            d = match.groupdict()
-            # TODO: validate does not have a proper start line
-            if d["action"] == "validate":
-                continue
-            level = d["level"]
-            parts = d["duration"].split(":")
-            duration = float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-            # We create the entry because with some timeout, the start line
-            # might be missing.
-            timings.setdefault(level, {})["duration"] = duration
-
-            max_duration = max(max_duration, duration)
-            if "." not in level:
-                total_duration += duration
-                summary.append([d["action"], duration, 0])
-
-    levels = sorted(timings.keys())
-
-    # Construct the report
-    pipeline = []
-    for lvl in levels:
-        duration = timings[lvl].get("duration", 0.0)
-        timeout = timings[lvl].get("timeout", 0.0)
-        name = timings[lvl].get("name", "???")
-        pipeline.append(
-            (lvl, name, duration, timeout, bool(duration >= (timeout * 0.85)))
-        )
-
-    # Compute the percentage
-    if total_duration:
-        for index, action in enumerate(summary):
-            summary[index][2] = action[1] / total_duration * 100
-
-    if not pipeline:
+    if not data["pipeline"]:
         response_dict = {"timing": "", "graph": []}
     else:
-        timing = render_to_string(
-            "lava_scheduler_app/job_timing.html",
-            {
-                "job": job,
-                "pipeline": pipeline,
-                "summary": summary,
-                "total_duration": total_duration,
-                "mean_duration": total_duration / len(pipeline),
-                "max_duration": max_duration,
-            },
+        html = render_to_string(
+            "lava_scheduler_app/job_timing.html", {"job": job, **data}
         )
-
-        response_dict = {"timing": timing, "graph": pipeline}
+        response_dict = {"timing": html, "graph": data["pipeline"]}
 
     return HttpResponse(simplejson.dumps(response_dict), content_type="text/json")
 
@@ -2576,20 +2497,6 @@ def device_reports(request, pk):
     if not device.can_view(request.user):
         raise PermissionDenied()
 
-    health_day_report = []
-    health_week_report = []
-    job_day_report = []
-    job_week_report = []
-    for day in reversed(range(7)):
-        data = device_report_data(day * -1 - 1, day * -1, device)
-        health_day_report.append(data[0])
-        job_day_report.append(data[1])
-
-    for week in reversed(range(10)):
-        data = device_report_data(week * -7 - 7, week * -7, device)
-        health_week_report.append(data[0])
-        job_week_report.append(data[1])
-
     long_running = (
         TestJob.objects.filter(
             actual_device=device,
@@ -2603,10 +2510,9 @@ def device_reports(request, pk):
         "lava_scheduler_app/device_reports.html",
         {
             "device": device,
-            "health_week_report": health_week_report,
-            "health_day_report": health_day_report,
-            "job_week_report": job_week_report,
-            "job_day_report": job_day_report,
+            **reports_data(
+                JobHealthRollup.objects.filter(device=device), f"&device={device}"
+            ),
             "long_running": long_running,
             "bread_crumb_trail": BreadCrumbTrail.leading_to(device_reports, pk=pk),
         },
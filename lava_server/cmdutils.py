@@ -26,6 +26,8 @@ import pwd
 
 from django.core.management.base import BaseCommand
 
+from lava_common import metrics
+
 
 class LAVADaemonCommand(BaseCommand):
     def add_arguments(self, parser):
@@ -59,6 +61,14 @@ class LAVADaemonCommand(BaseCommand):
             "be the same group as the gunicorn process.",
         )
 
+        mets = parser.add_argument_group("metrics")
+        mets.add_argument(
+            "--metrics-address",
+            default=None,
+            help="Expose the metrics on http://<address>/metrics, "
+            "for instance 127.0.0.1:9101. Default: disabled",
+        )
+
     def drop_privileges(self, user, group):
         try:
             user_id = pwd.getpwnam(user)[2]
@@ -84,6 +94,17 @@ class LAVADaemonCommand(BaseCommand):
 
         return True
 
+    def serve_metrics(self, address):
+        if address is None:
+            return True
+        try:
+            metrics.serve(address)
+        except (OSError, ValueError) as exc:
+            self.logger.error("[INIT] Unable to expose the metrics: %s", exc)
+            return False
+        self.logger.info("[INIT] Metrics exposed on http://%s/metrics", address)
+        return True
+
     def setup_logging(self, logger_name, level, log_file, log_format):
         del logging.root.handlers[:]
         del logging.root.filters[:]
@@ -18,13 +18,255 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
 from datetime import timedelta  # pylint: disable=unused-import
 
 import django_tables2 as tables
+import simplejson
 from django.conf import settings
-from django.db.models import Q
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.core.paginator import EmptyPage, Page
+from django.db import connection
+from django.db.models import F, Q
 from django.utils import timezone  # pylint: disable=unused-import
 from django.utils.html import escape
+from django_tables2.data import TableQuerysetData
+from django_tables2.paginators import LazyPaginator
+from django_tables2.rows import BoundRows
+
+# Below this estimated number of rows, the tables run an exact count
+EXACT_COUNT_THRESHOLD = 10000
+COUNT_CACHE_TIMEOUT = 300
+
+
+def estimate_count(queryset):
+    """
+    Return a tuple (count, exact) for the given queryset.
+
+    On PostgreSQL, the number of rows is first estimated by the query planner
+    and the exact count is only computed for small results. The result is
+    cached as counting millions of jobs takes seconds.
+    """
+    queryset = queryset.order_by()
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return (0, True)
+    key = "lava-table-count-%s" % hashlib.sha256(sql.encode("utf-8")).hexdigest()
+    ret = cache.get(key)
+    if ret is not None:
+        return tuple(ret)
+
+    ret = None
+    if connection.vendor == "postgresql":
+        # QuerySet.explain() returns the repr of the plan with some versions
+        # of Django: run the query directly
+        (query, params) = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                connection.ops.explain_query_prefix(format="json") + " " + query,
+                params,
+            )
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = simplejson.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            ret = (estimate, False)
+    if ret is None:
+        ret = (queryset.count(), True)
+    cache.set(key, ret, COUNT_CACHE_TIMEOUT)
+    return ret
+
+
+class KeysetPaginator(LazyPaginator):
+    """
+    Lazy paginator using keyset (seek) pagination when possible.
+
+    The values of the ordering fields of the last row of a page are signed
+    and given to the next page as a cursor. The next page is then selected
+    with a "WHERE (fields) < (values)" clause that uses the indexes instead
+    of an OFFSET that scans and drops every previous rows.
+    NULLs are sorted like in the PostgreSQL indexes, as if they were greater
+    than any value: last when sorting forward, first when sorting backward.
+
+    Without a valid cursor (first page, previous page, page given by hand,
+    ordering by a relation...), the OFFSET pagination is used.
+    """
+
+    def __init__(self, object_list, per_page, cursor=None, **kwargs):
+        self.cursor = cursor
+        self.keys = None
+        self.queryset = None
+        self._estimate = None
+        if isinstance(object_list, BoundRows) and isinstance(
+            object_list.data, TableQuerysetData
+        ):
+            self.keys = self._keys(object_list.data.data)
+            if self.keys:
+                # The primary key is added to make the ordering total
+                self.queryset = object_list.data.data.order_by(
+                    *[
+                        F(name).desc(nulls_first=True)
+                        if desc
+                        else F(name).asc(nulls_last=True)
+                        for (name, desc) in self.keys
+                    ]
+                )
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _rows(self, queryset):
+        return BoundRows(
+            data=queryset,
+            table=self.object_list.table,
+            pinned_data=self.object_list.pinned_data,
+        )
+
+    def _keys(self, queryset):
+        ordering = queryset.query.order_by or queryset.query.get_meta().ordering
+        if not ordering:
+            return None
+        model = queryset.model
+        keys = []
+        for order in ordering:
+            if not isinstance(order, str) or order == "?":
+                return None
+            desc = order.startswith("-")
+            name = order.lstrip("-")
+            if name == "pk":
+                name = model._meta.pk.name
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.is_relation:
+                return None
+            keys.append((field.attname, desc))
+        if model._meta.pk.attname not in [name for (name, _) in keys]:
+            keys.append((model._meta.pk.attname, keys[-1][1]))
+        return keys
+
+    def _keyset_rows(self, number):
+        if self.queryset is None or not self.cursor or number == 1:
+            return None
+        try:
+            (page, names, values) = signing.loads(self.cursor, salt="lava-table")
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if page != number or names != [name for (name, _) in self.keys]:
+            return None
+
+        query = Q()
+        for index, (name, desc) in enumerate(self.keys):
+            lookup = self._after(name, desc, values[index])
+            if lookup is None:
+                continue
+            for (previous, _), value in zip(self.keys[:index], values):
+                lookup &= self._equal(previous, value)
+            query |= lookup
+        try:
+            return self._rows(self.queryset.filter(query))
+        except (ValidationError, ValueError):
+            return None
+
+    def _equal(self, name, value):
+        if value is None:
+            return Q(**{name + "__isnull": True})
+        return Q(**{name: value})
+
+    def _after(self, name, desc, value):
+        """
+        The rows after the value of this field, NULLs being greater than any
+        value
+        """
+        if desc:
+            if value is None:
+                return Q(**{name + "__isnull": False})
+            return Q(**{name + "__lt": value})
+        if value is None:
+            return None
+        return Q(**{name + "__gt": value}) | Q(**{name + "__isnull": True})
+
+    def _next_cursor(self, number, row):
+        values = []
+        for (name, _) in self.keys:
+            value = getattr(row.record, name, None)
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            if value is not None and not isinstance(value, (int, float, str)):
+                return None
+            values.append(value)
+        return signing.dumps(
+            [number + 1, [name for (name, _) in self.keys], values],
+            salt="lava-table",
+            compress=True,
+        )
+
+    def page(self, number):
+        number = self.validate_number(number or 1)
+        rows = self._keyset_rows(number)
+        if rows is None:
+            rows = (
+                self.object_list if self.queryset is None else self._rows(self.queryset)
+            )
+            bottom = (number - 1) * self.per_page
+        else:
+            bottom = 0
+        top = bottom + self.per_page
+        look_ahead_items = (self.look_ahead - 1) * self.per_page + 1
+        objects = list(rows[bottom : top + self.orphans + look_ahead_items])
+        objects_count = len(objects)
+        next_cursor = None
+        if objects_count > (self.per_page + self.orphans):
+            self._num_pages = number + (objects_count // self.per_page)
+            objects = objects[: self.per_page]
+            if self.queryset is not None:
+                next_cursor = self._next_cursor(number, objects[-1])
+        elif (number != 1) and (objects_count <= self.orphans):
+            raise EmptyPage("That page contains no results")
+        else:
+            self._num_pages = number
+            self._final_num_pages = number
+        page = Page(objects, number, self)
+        page.next_cursor = next_cursor
+        return page
+
+    def _get_estimate(self):
+        if self._estimate is None:
+            if not isinstance(self.object_list.data, TableQuerysetData):
+                self._estimate = (len(self.object_list), True)
+            else:
+                self._estimate = estimate_count(self.object_list.data.data)
+        return self._estimate
+
+    @property
+    def estimated_count(self):
+        return self._get_estimate()[0]
+
+    @property
+    def count_is_exact(self):
+        return self._get_estimate()[1]
+
+
+class LavaRequestConfig(tables.RequestConfig):
+    """
+    RequestConfig giving the cursor from the request to the KeysetPaginator.
+    """
+
+    def configure(self, table):
+        if isinstance(self.paginate, dict) and issubclass(
+            self.paginate.get("paginator_class", object), KeysetPaginator
+        ):
+            cursor_field = getattr(table, "prefixed_cursor_field", "cursor")
+            self.paginate = dict(self.paginate)
+            self.paginate["cursor"] = self.request.GET.get(cursor_field)
+        return super().configure(table)
 
 
 class LavaView(tables.SingleTableView):
@@ -197,6 +439,10 @@ class LavaTable(tables.Table):
             self.length = settings.DEFAULT_TABLE_LENGTH
         self.empty_text = "No data available in table"
 
+    @property
+    def prefixed_cursor_field(self):
+        return "%scursor" % (self.prefix or "")
+
     def prepare_search_data(self, data):
         if not hasattr(data, "search"):
             return {}
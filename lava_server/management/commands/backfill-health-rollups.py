@@ -0,0 +1,102 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+from lava_scheduler_app.models import JobHealthRollup, TestJob
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the job health rollups from the finished jobs
+    """
+
+    help = "Rebuild the job health rollups from the finished jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="First day to rebuild (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--until",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Last day to rebuild (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        until = options["until"]
+        if since and until and since > until:
+            raise CommandError("--since should be before --until")
+
+        # Same buckets as JobHealthRollup.record()
+        jobs = TestJob.objects.filter(
+            state=TestJob.STATE_FINISHED, start_time__isnull=False
+        ).annotate(bucket=TruncDate("start_time"))
+        # The rows kept for the removed devices can not be rebuilt
+        rollups = JobHealthRollup.objects.exclude(
+            device__isnull=True, device_type__isnull=False
+        )
+        if since:
+            jobs = jobs.filter(bucket__gte=since)
+            rollups = rollups.filter(bucket__gte=since)
+        if until:
+            jobs = jobs.filter(bucket__lte=until)
+            rollups = rollups.filter(bucket__lte=until)
+
+        failures = (TestJob.HEALTH_INCOMPLETE, TestJob.HEALTH_CANCELED)
+        rows = (
+            jobs.values(
+                "bucket",
+                "actual_device",
+                "actual_device__device_type",
+                "health_check",
+            )
+            .annotate(
+                passed=Count("pk", filter=Q(health=TestJob.HEALTH_COMPLETE)),
+                failed=Count("pk", filter=Q(health__in=failures)),
+            )
+            .order_by()
+        )
+        aggregated = [
+            JobHealthRollup(
+                bucket=row["bucket"],
+                device_id=row["actual_device"],
+                device_type_id=row["actual_device__device_type"],
+                health_check=row["health_check"],
+                pass_count=row["passed"],
+                fail_count=row["failed"],
+            )
+            for row in rows
+        ]
+        count = sum(r.pass_count + r.fail_count for r in aggregated)
+
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            JobHealthRollup.objects.bulk_create(aggregated, batch_size=1000)
+        self.stdout.write(
+            "Rebuilt %d rollups (%d removed) from %d jobs"
+            % (len(aggregated), deleted, count)
+        )
@@ -17,12 +17,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 
-from importlib import import_module
+import contextlib
+import multiprocessing
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
 
 from lava_common.exceptions import ConfigurationError
-from lava_scheduler_app.logutils import LogsFilesystem
+from lava_scheduler_app import logmigration
+from lava_scheduler_app.logmigration import BACKENDS, Checkpoint
 from lava_scheduler_app.models import TestJob
 
 
@@ -40,54 +47,170 @@ class Command(BaseCommand):
             "db",
             type=str,
             default="LogsMongo",
-            choices=["LogsMongo", "LogsElasticsearch"],
+            choices=BACKENDS[1:],
             nargs="?",
-            help="Database storage choice. Options: LogsMongo, LogsElasticsearch.",
+            help="Database storage choice. Options: LogsMongo, LogsElasticsearch, LogsFirestore.",
+        )
+        parser.add_argument(
+            "--source",
+            type=str,
+            default="LogsFilesystem",
+            choices=BACKENDS,
+            help="Backend to copy the logs from. Default: LogsFilesystem",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=4,
+            help="Number of processes copying the logs. Default: 4",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of job ids in each range given to the processes. Default: 1000",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of lines saved in the target at once. Default: 5000",
+        )
+        parser.add_argument(
+            "--verify",
+            type=str,
+            default="count",
+            choices=["count", "checksum"],
+            help="Compare the number of lines (count) or also read the lines back "
+            "from the target to compare a checksum (checksum). Default: count",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            default=None,
+            help="File to save the progress to. Default: <MEDIA_ROOT>/copy-logs.json",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            default=False,
+            help="Ignore the progress saved in the checkpoint",
         )
 
     def handle(self, *_, **options):
+        source = options["source"]
+        target = options["db"]
+        if source == target:
+            raise CommandError("Cannot copy the logs to the same backend.")
 
-        backend_str = "lava_scheduler_app.logutils"
-        if options["db"] == "LogsFilesystem":
-            self.stdout.write("Cannot move logs from filesystem to filesystem.")
-
+        # Check the configuration before starting the processes
         try:
-            logs_class = getattr(import_module(backend_str), options["db"])
-        except (AttributeError, ModuleNotFoundError) as exc:
-            self.stdout.write("Please provide a valid database backend.")
-
-        try:
-            logs_db = logs_class()
+            logmigration.logs_backend(source)
+            logmigration.logs_backend(target)
         except ConfigurationError as e:
             self.stdout.write(str(e))
             return
 
-        self.stdout.write("Copying logs:")
-        # Read from filesystem.
-        logs_filesystem = LogsFilesystem()
+        path = options["checkpoint"] or os.path.join(
+            settings.MEDIA_ROOT, "copy-logs.json"
+        )
+        if options["restart"]:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+        try:
+            checkpoint = Checkpoint.load(path, source, target, options["chunk_size"])
+        except ValueError as exc:
+            raise CommandError("%s, use --restart to start again" % exc)
+
+        # Split the job ids in ranges, the jobs that failed are attempted
+        # again first
+        chunk_size = options["chunk_size"]
+        ids = TestJob.objects.aggregate(first=Min("id"), last=Max("id"))
+        tasks = []
+        if checkpoint.failed:
+            tasks.append((None, None, sorted(checkpoint.failed), options["dry_run"]))
+        if ids["first"] is not None:
+            first = ids["first"] - ids["first"] % chunk_size
+            for start in range(first, ids["last"] + 1, chunk_size):
+                if start not in checkpoint.done:
+                    tasks.append((start, start + chunk_size, None, options["dry_run"]))
+
+        self.stdout.write(
+            "Copying logs from %s to %s: %d ranges of %d jobs (%d done)"
+            % (source, target, len(tasks), chunk_size, len(checkpoint.done))
+        )
+        initargs = (source, target, options["batch_size"], options["verify"])
+        pool = None
+        if options["jobs"] > 1:
+            # Each process opens its own database connection
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(
+                options["jobs"], logmigration.init_worker, initargs
+            )
+            results = pool.imap_unordered(logmigration.run_range, tasks)
+        else:
+            logmigration.init_worker(*initargs)
+            results = map(logmigration.run_range, tasks)
 
-        for job in TestJob.objects.all().order_by("id"):
-            if logs_db.line_count(job) > 0:
-                # We already have logs for the given job.
+        begin = time.monotonic()
+        totals = {"jobs": 0, "lines": 0, "size": 0, "failed": 0}
+        try:
+            for (index, result) in enumerate(results, start=1):
+                if not options["dry_run"]:
+                    checkpoint.update(result)
+                totals["jobs"] += result.jobs
+                totals["lines"] += result.lines
+                totals["size"] += result.size
+                totals["failed"] += len(result.failed)
+                self.report(chunk_size, result)
+                elapsed = time.monotonic() - begin
                 self.stdout.write(
-                    f"* {job.id} [SKIP] - Logs already present for this job."
+                    "  -> %d/%d: %d jobs, %d lines, %.0f lines/s, %.1f MB/s"
+                    % (
+                        index,
+                        len(tasks),
+                        totals["jobs"],
+                        totals["lines"],
+                        totals["lines"] / elapsed,
+                        totals["size"] / elapsed / 1024 / 1024,
+                    )
                 )
-                continue
-            try:
-                lines = logs_filesystem.read(job)
-            except FileNotFoundError:
-                self.stdout.write(f"* {job.id} [SKIP] - Log file not found")
-                continue
-            except Exception as e:
-                self.stdout.write(f"* {job.id} [SKIP] - {str(e)}")
-                continue
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted, run the command again to resume.")
+            if pool is not None:
+                pool.terminate()
+            return
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(
+            "Done: %d jobs, %d lines in %.1fs, %d failures"
+            % (
+                totals["jobs"],
+                totals["lines"],
+                time.monotonic() - begin,
+                totals["failed"],
+            )
+        )
 
-            self.stdout.write(f"* {job.id}")
-            if not options["dry_run"]:
-                for (index, line) in enumerate(lines.strip("\n").split("\n")):
-                    if line:
-                        try:
-                            logs_db.write(job, line)
-                        except Exception:
-                            self.stdout.write(f"  -> Invalid line {index}")
-        self.stdout.write("Done.")
+    def report(self, chunk_size, result):
+        if result.start is None:
+            name = "failed jobs"
+        else:
+            name = "jobs %d-%d" % (result.start, result.start + chunk_size - 1)
+        self.stdout.write(
+            "* %s: %d copied, %d skipped, %d failed (%d lines in %.1fs)"
+            % (
+                name,
+                result.jobs,
+                result.skipped,
+                len(result.failed),
+                result.lines,
+                result.duration,
+            )
+        )
+        for (job_id, error) in sorted(result.failed.items()):
+            self.stdout.write("  -> %d: %s" % (job_id, error))
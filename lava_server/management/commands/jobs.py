@@ -36,6 +36,7 @@ from django.utils import timezone
 
 from lava_common.schemas import validate
 from lava_common.yaml import yaml_safe_load
+from lava_scheduler_app import timing
 from lava_scheduler_app.models import TestJob
 
 
@@ -200,6 +201,32 @@ class Command(BaseCommand):
             help="Be nice with the system by sleeping regularly",
         )
 
+        tim = sub.add_parser(
+            "timing", help="Build the timing index of the corresponding jobs"
+        )
+        tim.add_argument(
+            "--newer-than",
+            default=None,
+            type=str,
+            help="Index jobs newer than this. The time is of the "
+            "form: 1h (one hour) or 2d (two days). "
+            "By default, all jobs will be indexed.",
+        )
+        tim.add_argument(
+            "--older-than",
+            default=None,
+            type=str,
+            help="Index jobs older than this. The time is of the "
+            "form: 1h (one hour) or 2d (two days). "
+            "By default, all jobs will be indexed.",
+        )
+        tim.add_argument(
+            "--slow",
+            default=False,
+            action="store_true",
+            help="Be nice with the system by sleeping regularly",
+        )
+
     def handle(self, *_, **options):
         """forward to the right sub-handler"""
         if options["sub_command"] == "list":
@@ -234,6 +261,10 @@ class Command(BaseCommand):
                 options["dry_run"],
                 options["slow"],
             )
+        elif options["sub_command"] == "timing":
+            self.handle_timing(
+                options["older_than"], options["newer_than"], options["slow"]
+            )
 
     def handle_fail(self, job_id):
         try:
@@ -488,3 +519,41 @@ class Command(BaseCommand):
             if slow and index % 100 == 99:
                 self.stdout.write("sleeping 2s...")
                 time.sleep(2)
+
+    def handle_timing(self, older_than, newer_than, slow):
+        jobs = TestJob.objects.all().order_by("id").filter(state=TestJob.STATE_FINISHED)
+        for (option, lookup) in [
+            (older_than, "end_time__lt"),
+            (newer_than, "end_time__gt"),
+        ]:
+            if option is None:
+                continue
+            match = re.match(r"^(?P<time>\d+)(?P<unit>(h|d))$", option)
+            if match is None:
+                raise CommandError("Invalid time format '%s'" % option)
+            if match.groupdict()["unit"] == "d":
+                delta = datetime.timedelta(days=int(match.groupdict()["time"]))
+            else:
+                delta = datetime.timedelta(hours=int(match.groupdict()["time"]))
+            jobs = jobs.filter(**{lookup: timezone.now() - delta})
+
+        self.stdout.write("Indexing %d jobs:" % jobs.count())
+        for (index, job) in enumerate(jobs.iterator()):
+            if (pathlib.Path(job.output_dir) / timing.FILENAME).exists():
+                continue
+            self.stdout.write("* %d (%s): %s" % (job.id, job.end_time, job.output_dir))
+            try:
+                records = timing.load(job)
+                self.stdout.write("  -> %d actions" % len(records))
+                with contextlib.suppress(FileNotFoundError, PermissionError):
+                    chown(
+                        str(pathlib.Path(job.output_dir) / timing.FILENAME),
+                        "lavaserver",
+                        "lavaserver",
+                    )
+            except OSError as exc:
+                self.stderr.write("  -> Unable to read the logs: %s" % str(exc))
+
+            if slow and index % 100 == 99:
+                self.stdout.write("sleeping 2s...")
+                time.sleep(2)
@@ -37,6 +37,7 @@ from django.contrib.auth.models import AnonymousUser, User
 from django.utils.crypto import constant_time_compare
 from zmq.utils.strtypes import u
 
+from lava_common import metrics
 from lava_common.version import __version__
 from lava_scheduler_app.models import Device, TestJob, Worker
 from lava_server.cmdutils import LAVADaemonCommand
@@ -45,6 +46,19 @@ from linaro_django_xmlrpc.models import AuthToken
 TIMEOUT = 5
 FORMAT = "%(asctime)-15s %(levelname)7s %(message)s"
 
+EVENTS = metrics.counter(
+    "lava_publisher_events_total", "Events forwarded by the publisher", ["kind"]
+)
+QUEUE_DEPTH = metrics.gauge(
+    "lava_publisher_queue_depth", "Messages waiting to be sent to the subscribers"
+)
+FORWARD_DURATION = metrics.histogram(
+    "lava_publisher_forward_seconds", "Duration of the forwarding of an event"
+)
+WEBSOCKETS = metrics.gauge(
+    "lava_publisher_websockets", "Connected websockets", ["kind"]
+)
+
 
 @dataclass
 class Websocket:
@@ -90,6 +104,7 @@ async def zmq_proxy(app):
         additional_sockets.append(sock)
 
     async def forward_event(msg):
+        begin = time.perf_counter()
         app["logger"].debug("[PROXY] Forwarding: %s", msg)
         data = [s.decode("utf-8") for s in msg]
         futures = [
@@ -147,7 +162,13 @@ async def zmq_proxy(app):
                 ]
             )
 
-        await asyncio.gather(*futures)
+        EVENTS.labels(topic.rpartition(".")[2]).inc()
+        QUEUE_DEPTH.inc(len(futures))
+        try:
+            await asyncio.gather(*futures)
+        finally:
+            QUEUE_DEPTH.dec(len(futures))
+            FORWARD_DURATION.observe(time.perf_counter() - begin)
 
     with contextlib.suppress(asyncio.CancelledError):
         logger.info("[PROXY] waiting for events")
@@ -246,6 +267,7 @@ async def websocket_handler(request):
 
     obj = Websocket(kind=kind, name=name, socket=ws)
     request.app["websockets"].add(obj)
+    WEBSOCKETS.labels(kind).inc()
 
     try:
         async for msg in ws:
@@ -253,6 +275,7 @@ async def websocket_handler(request):
                 logger.exception(ws.exception())
     finally:
         request.app["websockets"].discard(obj)
+        WEBSOCKETS.labels(kind).dec()
 
     if obj.name:
         logger.info(
@@ -305,6 +328,9 @@ class Command(LAVADaemonCommand):
             self.logger.error("[INIT] Unable to drop privileges")
             return
 
+        if not self.serve_metrics(options["metrics_address"]):
+            return
+
         if not settings.EVENT_NOTIFICATION:
             self.logger.error(
                 "[INIT] 'EVENT_NOTIFICATION' is set to False, "
@@ -32,6 +32,7 @@ from django.utils import timezone
 from zmq.utils.strtypes import b, u
 
 from lava_common.version import __version__
+from lava_scheduler_app.delivery import Outbox
 from lava_scheduler_app.models import Worker
 from lava_scheduler_app.scheduler import schedule
 from lava_server.cmdutils import LAVADaemonCommand
@@ -42,6 +43,8 @@ from lava_server.cmdutils import LAVADaemonCommand
 
 INTERVAL = 20
 PING_TIMEOUT = 3 * INTERVAL
+# Interval between two checks of the notification outbox
+DELIVERY_INTERVAL = 1
 
 # Log format
 FORMAT = "%(asctime)-15s %(levelname)7s %(message)s"
@@ -97,6 +100,9 @@ class Command(LAVADaemonCommand):
             self.logger.error("[INIT] Unable to drop privileges")
             return
 
+        if not self.serve_metrics(options["metrics_address"]):
+            return
+
         self.logger.info("[INIT] Connect to event stream")
         self.logger.debug("[INIT] -> %r", options["event_url"])
         self.context = zmq.Context()
@@ -118,6 +124,9 @@ class Command(LAVADaemonCommand):
         self.poller = zmq.Poller()
         self.poller.register(self.sub, zmq.POLLIN)
 
+        # Notifications are delivered in a pool of threads
+        self.outbox = Outbox(self.logger)
+
         # Main loop
         self.logger.info("[INIT] Starting main loop")
         try:
@@ -127,6 +136,8 @@ class Command(LAVADaemonCommand):
         except Exception as exc:
             self.logger.error("[CLOSE] Unknown exception raised, leaving!")
             self.logger.exception(exc)
+        with contextlib.suppress(OperationalError, InterfaceError):
+            self.outbox.close()
         self.sub.close(linger=0)
         self.context.term()
 
@@ -173,7 +184,10 @@ class Command(LAVADaemonCommand):
 
                 # Wait for events
                 while not dts and (time.monotonic() - begin) < INTERVAL:
+                    # Deliver the notifications
+                    self.outbox.step()
                     timeout = max(INTERVAL - (time.monotonic() - begin), 0)
+                    timeout = min(timeout, DELIVERY_INTERVAL)
                     with contextlib.suppress(zmq.ZMQError):
                         self.poller.poll(max(timeout * 1000, 1))
                     dts = self.get_available_dts()
@@ -0,0 +1,403 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from lava_results_app.models import Query, QueryMaterializedView, TestCase
+
+# "FOR VALUES FROM ('2023-01-01 00:00:00+00') TO ('2023-02-01 00:00:00+00')"
+BOUNDS = re.compile(r"^FOR VALUES FROM \((?P<start>.+)\) TO \((?P<end>.+)\)$")
+
+
+def _month(date, delta=0):
+    """
+    First instant of the month of the date, shifted by delta months
+    """
+    index = date.year * 12 + date.month - 1 + delta
+    return datetime.datetime(
+        index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc
+    )
+
+
+def _timestamp(value):
+    if value in ["MINVALUE", "MAXVALUE"]:
+        return None
+    value = value.strip("'")
+    # postgresql only prints the hours of the offset
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"
+    return datetime.datetime.fromisoformat(value)
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+class Command(BaseCommand):
+    """
+    Partition the test cases table by month of the logged time.
+
+    Old results are then removed by dropping whole partitions and the queries
+    bounded in time only read the matching partitions.
+    """
+
+    help = "Manage the monthly partitions of the test cases table"
+
+    table = TestCase._meta.db_table
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(
+            dest="sub_command",
+            help="Sub commands",
+        )
+        sub.required = True
+
+        enable = sub.add_parser(
+            "enable",
+            help="Partition the test cases table. The existing rows are kept "
+            "in a single partition that is removed when all its rows are "
+            "expired. The table is locked while the partition is validated.",
+        )
+        enable.add_argument(
+            "--months",
+            type=int,
+            default=3,
+            help="Number of monthly partitions to create ahead",
+        )
+
+        create = sub.add_parser("create", help="Create the partitions ahead of time")
+        create.add_argument(
+            "--months",
+            type=int,
+            default=3,
+            help="Number of monthly partitions to create ahead",
+        )
+
+        sub.add_parser("list", help="List the partitions")
+
+        purge = sub.add_parser(
+            "purge", help="Remove the partitions of the expired test cases"
+        )
+        purge.add_argument(
+            "--older-than",
+            required=True,
+            type=str,
+            help="Remove the partitions older than this. The time is of the "
+            "form: 1h (one hour) or 2d (two days).",
+        )
+        purge.add_argument(
+            "--detach",
+            default=False,
+            action="store_true",
+            help="Detach the partitions without dropping the tables",
+        )
+        purge.add_argument(
+            "--dry-run",
+            default=False,
+            action="store_true",
+            help="Do not remove any partition, simulate the output",
+        )
+
+    def handle(self, *_, **options):
+        """forward to the right sub-handler"""
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on postgresql")
+
+        if options["sub_command"] == "enable":
+            self.handle_enable(options["months"])
+        elif options["sub_command"] == "create":
+            self.handle_create(options["months"])
+        elif options["sub_command"] == "list":
+            self.handle_list()
+        elif options["sub_command"] == "purge":
+            self.handle_purge(
+                options["older_than"], options["detach"], options["dry_run"]
+            )
+
+    def ddl_cursor(self):
+        # The tables can not be altered with pending foreign key checks
+        cursor = connection.cursor()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        return cursor
+
+    def is_partitioned(self, cursor):
+        cursor.execute(
+            "SELECT EXISTS(SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = %s::regclass)",
+            [self.table],
+        )
+        return cursor.fetchone()[0]
+
+    def partitions(self, cursor):
+        """
+        Return the (name, start, end, rows, size) of the partitions, sorted by
+        start. start and end are None for unbounded ranges and for the
+        default partition.
+        """
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, "
+            "pg_total_relation_size(c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [self.table],
+        )
+        ret = []
+        for (name, bound, rows, size) in cursor.fetchall():
+            match = BOUNDS.match(bound)
+            if match is None:
+                ret.append((name, None, None, int(rows), size))
+            else:
+                ret.append(
+                    (
+                        name,
+                        _timestamp(match["start"]),
+                        _timestamp(match["end"]),
+                        int(rows),
+                        size,
+                    )
+                )
+        minimum = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        return sorted(ret, key=lambda p: (p[1] or minimum, p[0]))
+
+    def create_partitions(self, cursor, months):
+        now = timezone.now()
+        ranges = [
+            (start, end)
+            for (_, start, end, _, _) in self.partitions(cursor)
+            if (start, end) != (None, None)
+        ]
+        default = self.table + "_default"
+        created = []
+        for delta in range(months + 1):
+            start = _month(now, delta)
+            end = _month(now, delta + 1)
+            # Skip the months covered by an existing partition
+            if any(
+                (s is None or s < end) and (e is None or start < e) for (s, e) in ranges
+            ):
+                continue
+            name = "%s_y%04dm%02d" % (self.table, start.year, start.month)
+            # The rows of the month already stored in the default partition
+            # are moved to the new partition.
+            cursor.execute(
+                "CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                % (_quote(name), _quote(self.table))
+            )
+            cursor.execute(
+                "WITH moved AS (DELETE FROM %s WHERE logged >= %%s AND logged < %%s "
+                "RETURNING *) INSERT INTO %s SELECT * FROM moved"
+                % (_quote(default), _quote(name)),
+                [start, end],
+            )
+            cursor.execute(
+                "ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM ('%s') TO ('%s')"
+                % (_quote(self.table), _quote(name), start.isoformat(), end.isoformat())
+            )
+            created.append(name)
+        return created
+
+    def handle_enable(self, months):
+        legacy = self.table + "_legacy"
+        with transaction.atomic():
+            cursor = self.ddl_cursor()
+            if self.is_partitioned(cursor):
+                raise CommandError("The test cases table is already partitioned")
+
+            # The materialized views would keep reading the legacy table:
+            # they are created again on the next refresh.
+            for query in Query.objects.all().filter(is_live=False):
+                QueryMaterializedView.drop(query.id)
+
+            cursor.execute(
+                "LOCK TABLE %s IN ACCESS EXCLUSIVE MODE" % _quote(self.table)
+            )
+            cursor.execute(
+                "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary, "
+                "i.indisunique FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = %s::regclass",
+                [self.table],
+            )
+            indexes = cursor.fetchall()
+            if any(unique and not primary for (_, _, primary, unique) in indexes):
+                raise CommandError("Unique indexes can not be partitioned")
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [self.table],
+            )
+            foreign_keys = cursor.fetchall()
+            # A partitioned table can only be referenced by its whole primary
+            # key, including the partition key
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                "WHERE confrelid = %s::regclass AND contype = 'f'",
+                [self.table],
+            )
+            references = cursor.fetchall()
+            tables = connection.introspection.django_table_names()
+            for (table, _) in references:
+                if table in tables:
+                    raise CommandError(
+                        "The test cases table is referenced by %s" % table
+                    )
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [self.table])
+            sequence = cursor.fetchone()[0]
+            cursor.execute("SELECT max(logged) FROM %s" % _quote(self.table))
+            last = cursor.fetchone()[0]
+            # The legacy partition holds the current month
+            upper = _month(max(last, timezone.now()) if last else timezone.now(), 1)
+
+            # Left by the models removed from older versions
+            for (table, name) in references:
+                self.stdout.write(
+                    "Dropping the foreign key of the unused table %s" % table
+                )
+                cursor.execute(
+                    "ALTER TABLE %s DROP CONSTRAINT %s" % (_quote(table), _quote(name))
+                )
+
+            # Keep the names of the constraints and indexes for the new table
+            cursor.execute(
+                "ALTER TABLE %s RENAME TO %s" % (_quote(self.table), _quote(legacy))
+            )
+            for (name, _, primary, _) in indexes:
+                new_name = name[:56] + "_legacy"
+                if primary:
+                    # The primary key of the partition should match the one of
+                    # the partitioned table
+                    cursor.execute(
+                        "CREATE UNIQUE INDEX %s ON %s (id, logged)"
+                        % (_quote(new_name), _quote(legacy))
+                    )
+                    cursor.execute(
+                        "ALTER TABLE %s DROP CONSTRAINT %s"
+                        % (_quote(legacy), _quote(name))
+                    )
+                    cursor.execute(
+                        "ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY USING INDEX %s"
+                        % (_quote(legacy), _quote(new_name), _quote(new_name))
+                    )
+                else:
+                    cursor.execute(
+                        "ALTER INDEX %s RENAME TO %s" % (_quote(name), _quote(new_name))
+                    )
+
+            cursor.execute(
+                "CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                "PARTITION BY RANGE (logged)" % (_quote(self.table), _quote(legacy))
+            )
+            # The partition key is part of the primary key
+            for (name, definition, primary, _) in indexes:
+                if primary:
+                    cursor.execute(
+                        "ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY (id, logged)"
+                        % (_quote(self.table), _quote(name))
+                    )
+                else:
+                    cursor.execute(definition)
+            for (name, definition) in foreign_keys:
+                cursor.execute(
+                    "ALTER TABLE %s ADD CONSTRAINT %s %s"
+                    % (_quote(self.table), _quote(name), definition)
+                )
+            if sequence:
+                cursor.execute(
+                    "ALTER SEQUENCE %s OWNED BY %s.id" % (sequence, _quote(self.table))
+                )
+
+            cursor.execute(
+                "ALTER TABLE %s ATTACH PARTITION %s "
+                "FOR VALUES FROM (MINVALUE) TO ('%s')"
+                % (_quote(self.table), _quote(legacy), upper.isoformat())
+            )
+            cursor.execute(
+                "CREATE TABLE %s PARTITION OF %s DEFAULT"
+                % (_quote(self.table + "_default"), _quote(self.table))
+            )
+            created = self.create_partitions(cursor, months)
+        self.stdout.write("Partitioned %s" % self.table)
+        self.stdout.write("* %s: until %s" % (legacy, upper.isoformat()))
+        for name in created:
+            self.stdout.write("* %s" % name)
+
+    def handle_create(self, months):
+        with transaction.atomic():
+            cursor = self.ddl_cursor()
+            if not self.is_partitioned(cursor):
+                raise CommandError("The test cases table is not partitioned")
+            created = self.create_partitions(cursor, months)
+        self.stdout.write("Created %d partitions" % len(created))
+        for name in created:
+            self.stdout.write("* %s" % name)
+
+    def handle_list(self):
+        cursor = connection.cursor()
+        if not self.is_partitioned(cursor):
+            raise CommandError("The test cases table is not partitioned")
+        for (name, start, end, rows, size) in self.partitions(cursor):
+            if start is None and end is None:
+                bounds = "default"
+            else:
+                bounds = "%s -> %s" % (
+                    start.isoformat() if start else "...",
+                    end.isoformat() if end else "...",
+                )
+            self.stdout.write(
+                "* %s: %s (%d rows, %d MB)" % (name, bounds, rows, size // 1024**2)
+            )
+
+    def handle_purge(self, older_than, detach, simulate):
+        pattern = re.compile(r"^(?P<time>\d+)(?P<unit>(h|d))$")
+        match = pattern.match(older_than)
+        if match is None:
+            raise CommandError("Invalid older-than format")
+
+        if match.groupdict()["unit"] == "d":
+            delta = datetime.timedelta(days=int(match.groupdict()["time"]))
+        else:
+            delta = datetime.timedelta(hours=int(match.groupdict()["time"]))
+        limit = timezone.now() - delta
+
+        with transaction.atomic():
+            cursor = self.ddl_cursor()
+            if not self.is_partitioned(cursor):
+                raise CommandError("The test cases table is not partitioned")
+            # Only the partitions where every row is expired
+            expired = [
+                (name, rows)
+                for (name, _, end, rows, _) in self.partitions(cursor)
+                if end is not None and end <= limit
+            ]
+            self.stdout.write(
+                "%s %d partitions:"
+                % ("Detaching" if detach else "Removing", len(expired))
+            )
+            for (name, rows) in expired:
+                self.stdout.write("* %s (%d rows)" % (name, rows))
+                if simulate:
+                    continue
+                cursor.execute(
+                    "ALTER TABLE %s DETACH PARTITION %s"
+                    % (_quote(self.table), _quote(name))
+                )
+                if not detach:
+                    cursor.execute("DROP TABLE %s" % _quote(name))
@@ -112,11 +112,8 @@ class LavaRequireLoginMiddleware:
         else:
             return False
 
-        try:
-            token_object = AuthToken.objects.select_related("user").get(
-                secret=token_str
-            )
-        except AuthToken.DoesNotExist:
+        token_object = AuthToken.get_for_secret(token_str)
+        if token_object is None:
             return False
 
         if not token_object.user.is_active:
@@ -242,12 +242,38 @@ ALLOW_ADMIN_DELETE = True
 # Default callback http timeout in seconds
 CALLBACK_TIMEOUT = 5
 
+# Notifications (callbacks, emails and IRC messages) are delivered by
+# lava-scheduler with a pool of threads, a limit of concurrent deliveries for
+# each host and an exponential delay between attempts (in seconds)
+NOTIFICATION_WORKERS = 8
+NOTIFICATION_HOST_CONCURRENCY = 2
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_RETRY_DELAY = 30
+
+# Expose the metrics of each gunicorn worker on http://<address>/metrics.
+# With a range of ports ("127.0.0.1:9110-9119"), each worker binds the first
+# free port.
+METRICS_ADDRESS = None
+
 # Default statement timeout in milliseconds
 STATEMENT_TIMEOUT = 30000
 
 # Default length value for all tables
 DEFAULT_TABLE_LENGTH = 25
 
+# Time to live, in seconds, of the cached authentication tokens. The tokens
+# are only cached when the default cache is shared by all the processes (not
+# LocMemCache), so that revoking a token is seen by every process. Changes
+# that do not send the post_save signal (like QuerySet.update()) are seen
+# after this delay. Set to 0 to disable the cache.
+# The last use of the tokens is saved at most every
+# AUTH_TOKEN_LAST_USED_INTERVAL seconds.
+AUTH_TOKEN_CACHE_TIMEOUT = 10
+AUTH_TOKEN_LAST_USED_INTERVAL = 60
+
+# Time to live, in seconds, of the per-user cache of the XML-RPC listings
+XMLRPC_CACHE_TIMEOUT = 5
+
 # Extra context variables when validating the job definition schema
 EXTRA_CONTEXT_VARIABLES = []
 
@@ -17,12 +17,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
 import os
 
 from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 from django.db.backends.signals import connection_created
 
+from lava_common import metrics
+
 # Set the environment variables for Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lava_server.settings.prod")
 
@@ -42,3 +45,19 @@ connection_created.connect(setup_postgres, dispatch_uid="setup_postgres")
 
 # Create the application
 application = get_wsgi_application()
+
+
+# Expose the metrics of this worker
+def serve_metrics(address):
+    if not address:
+        return
+    try:
+        metrics.serve(address)
+    except (OSError, ValueError) as exc:
+        # Only the metrics are missing: keep serving the web UI and the API
+        logging.getLogger("django").error(
+            "Unable to expose the metrics on %r: %s", address, exc
+        )
+
+
+serve_metrics(settings.METRICS_ADDRESS)
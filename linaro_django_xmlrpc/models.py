@@ -20,14 +20,23 @@
 Empty module for Django to pick up this package as Django application
 """
 
+import hashlib
 import inspect
 import logging
 import pydoc
 import random
+import threading
+import time
 import xmlrpc.client
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 
@@ -61,6 +70,34 @@ def _make_secret():
     return "".join((random.SystemRandom().choice(_SECRET_CHARS) for i in range(128)))
 
 
+class TokenUses:
+    """
+    Last use of the tokens, saved in batches instead of one UPDATE by call.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.uses = {}
+        self.flushed = time.monotonic()
+
+    def add(self, token, now):
+        """
+        Record the use of the token. Return the uses to save when the
+        batch is due, or when the token was never used.
+        """
+        with self.lock:
+            self.uses[token.pk] = now
+            if (
+                token.last_used_on is not None
+                and time.monotonic() - self.flushed
+                < settings.AUTH_TOKEN_LAST_USED_INTERVAL
+            ):
+                return {}
+            (uses, self.uses) = (self.uses, {})
+            self.flushed = time.monotonic()
+            return uses
+
+
 class AuthToken(models.Model):
     """
     Authentication token.
@@ -99,9 +136,52 @@ class AuthToken(models.Model):
 
     user = models.ForeignKey(User, related_name="auth_tokens", on_delete=models.CASCADE)
 
+    uses = TokenUses()
+
     def __str__(self):
         return "security token {pk}".format(pk=self.pk)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        token = super().from_db(db, field_names, values)
+        # Keep the secret to invalidate the cache when it's modified
+        token._loaded_secret = token.__dict__.get("secret")
+        return token
+
+    @staticmethod
+    def cache_key(secret):
+        # Do not store the secrets in the cache
+        return "auth-token:" + hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def cache_enabled():
+        # A per-process cache can't be invalidated in the other processes
+        return settings.AUTH_TOKEN_CACHE_TIMEOUT > 0 and not isinstance(
+            caches["default"], (DummyCache, LocMemCache)
+        )
+
+    @classmethod
+    def get_for_secret(cls, secret):
+        """
+        Lookup the token (with its user) for this secret, returns None on
+        failure.
+
+        With a cache shared by all the processes, the tokens are cached for
+        AUTH_TOKEN_CACHE_TIMEOUT seconds and removed from the cache when the
+        token or the user is saved or deleted.
+        """
+        cached = cls.cache_enabled()
+        key = cls.cache_key(secret)
+        token = cache.get(key) if cached else None
+        if token is None:
+            try:
+                token = cls.objects.select_related("user").get(secret=secret)
+            except cls.DoesNotExist:
+                return None
+            if cached:
+                cache.set(key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return token
+
     @classmethod
     def get_user_for_secret(cls, username, secret):
         """
@@ -109,13 +189,47 @@ class AuthToken(models.Model):
 
         This also bumps last_used_on if successful
         """
-        try:
-            token = cls.objects.get(user__username=username, secret=secret)
-            token.last_used_on = timezone.now()
-            token.save()
-            return token.user
-        except cls.DoesNotExist:
+        token = cls.get_for_secret(secret)
+        if token is None or token.user.username != username:
             return None
+        cls.record_use(token)
+        return token.user
+
+    @classmethod
+    def record_use(cls, token):
+        now = timezone.now()
+        uses = cls.uses.add(token, now)
+        if not uses:
+            return
+        cls.objects.bulk_update(
+            [cls(pk=pk, last_used_on=dt) for (pk, dt) in uses.items()],
+            ["last_used_on"],
+        )
+        if token.last_used_on is None:
+            token.last_used_on = now
+            if cls.cache_enabled():
+                cache.set(
+                    cls.cache_key(token.secret),
+                    token,
+                    settings.AUTH_TOKEN_CACHE_TIMEOUT,
+                )
+
+
+@receiver(post_save, sender=AuthToken)
+@receiver(post_delete, sender=AuthToken)
+def invalidate_token(sender, instance, **kwargs):
+    if not AuthToken.cache_enabled():
+        return
+    secrets = {instance.secret, getattr(instance, "_loaded_secret", None)}
+    cache.delete_many([AuthToken.cache_key(s) for s in secrets if s])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if created or not AuthToken.cache_enabled():
+        return
+    secrets = AuthToken.objects.filter(user=instance).values_list("secret", flat=True)
+    cache.delete_many([AuthToken.cache_key(s) for s in secrets])
 
 
 def xml_rpc_signature(*sig):
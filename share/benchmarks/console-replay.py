@@ -0,0 +1,464 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Replay a serial console through the dispatcher boot and test actions.
+
+The console is either extracted from a job log (the target and feedback
+lines of an output.yaml) or generated. It is written by a child process, at
+the given baud rate, into a ShellCommand/ShellSession, like a serial
+connection would. The output is then parsed by:
+
+* boot: LinuxKernelMessages.parse_failures, as called by the AutoLoginAction
+* test-shell: the TestShellAction pattern loop
+* monitor: the TestMonitorAction
+
+For each scenario, the number of lines per second, the dispatcher CPU time per
+MB of console output, the cost of the YAMLLogger and the missed or late
+signals are reported.
+
+With --baseline, the results are compared with the thresholds from the given
+file and the script exits with a non-zero status on regression.
+"""
+
+import argparse
+import logging
+import pathlib
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava_common.exceptions import ConnectionClosedError  # noqa: E402
+from lava_common.log import YAMLLogger  # noqa: E402
+from lava_common.timeout import Timeout  # noqa: E402
+from lava_common.yaml import yaml_safe_dump, yaml_safe_load  # noqa: E402
+from lava_dispatcher.action import Action  # noqa: E402
+from lava_dispatcher.actions.test.monitor import TestMonitorAction  # noqa: E402
+from lava_dispatcher.actions.test.shell import TestShellAction  # noqa: E402
+from lava_dispatcher.job import Job  # noqa: E402
+from lava_dispatcher.shell import ShellCommand, ShellSession  # noqa: E402
+from lava_dispatcher.utils.messages import (  # noqa: E402
+    KERNEL_MESSAGES,
+    LinuxKernelMessages,
+)
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = 0
+        self.size = 0
+
+    def emit(self, record):
+        self.records += 1
+        self.size += len(record.getMessage())
+
+
+class BenchmarkLogger(YAMLLogger):
+    """
+    Measure the time spent in the YAMLLogger and record when the test results
+    are received.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.counter = CountingHandler()
+        self.addHandler(self.counter)
+        self.propagate = False
+        self.reset()
+
+    def reset(self):
+        self.log_time = 0
+        self.target_lines = 0
+        self.target_size = 0
+        self.received = {}
+        self.counter.records = 0
+        self.counter.size = 0
+
+    def log_message(self, level, level_name, message, *args, **kwargs):
+        if level_name in ["target", "feedback"]:
+            self.target_lines += 1
+            self.target_size += len(message) + 1
+        start = time.perf_counter()
+        super().log_message(level, level_name, message, *args, **kwargs)
+        self.log_time += time.perf_counter() - start
+
+    def results(self, results, *args, **kwargs):
+        if results.get("definition") != "lava":
+            self.received.setdefault(results["case"], time.monotonic())
+        super().results(results, *args, **kwargs)
+
+
+LOGIN_PROMPT = "login:"
+MONITOR = {
+    "name": "replay-monitor",
+    "start": "Running test suite",
+    "end": "Test suite (finished|aborted)",
+    "pattern": r"(?P<test_case_id>case-\d+): (?P<result>PASS|FAIL)",
+    "fixupdict": {"PASS": "pass", "FAIL": "fail"},
+}
+TESTCASE = re.compile(r"<LAVA_SIGNAL_TESTCASE TEST_CASE_ID=(\S+)[^>]*>")
+
+# Written by the child process: the content of the console is written to the
+# pty at the given baud rate (8N1 so 10 bits per byte).
+REPLAYER = """
+import os
+import sys
+import time
+
+data = open(sys.argv[1], "rb").read()
+baud = int(sys.argv[2])
+start = time.monotonic()
+with open(sys.argv[3], "w") as f_stamp:
+    f_stamp.write(repr(start))
+
+rate = baud / 10
+chunk = max(1, int(rate / 100)) if baud > 0 else 4096
+offset = 0
+while offset < len(data):
+    if baud > 0:
+        delay = start + offset / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    offset += os.write(1, data[offset : offset + chunk])
+"""
+
+
+class ReplayCommand(ShellCommand):
+    """
+    A ShellCommand reading from the replayed console instead of a device.
+    """
+
+    def __init__(self, tmpdir, console, baud, logger):
+        replayer = tmpdir / "replayer.py"
+        replayer.write_text(REPLAYER, encoding="utf-8")
+        self.stamp = tmpdir / "start"
+        if self.stamp.exists():
+            self.stamp.unlink()
+        super().__init__(
+            "%s %s %s %d %s" % (sys.executable, replayer, console, baud, self.stamp),
+            Timeout("replay", duration=30),
+            logger=logger,
+        )
+        self.setecho(False)
+
+    def started(self):
+        while not self.stamp.exists():
+            time.sleep(0.001)
+        return float(self.stamp.read_text(encoding="utf-8") or 0)
+
+
+class ReplayAction(Action):
+    name = "console-replay"
+    description = "replay a console"
+    summary = "replay a console"
+
+
+def load_console(path):
+    if path is None:
+        return None
+    if path.suffix != ".yaml":
+        return path.read_text(encoding="utf-8", errors="replace")
+    lines = []
+    for line in yaml_safe_load(path.read_text(encoding="utf-8", errors="replace")):
+        if line.get("lvl") in ["target", "feedback"] and isinstance(
+            line.get("msg"), str
+        ):
+            lines.append(line["msg"])
+    return "\n".join(lines) + "\n"
+
+
+def generate_console(test_cases, noise):
+    lines = ["[    0.000000] Booting Linux on physical CPU 0x0"]
+    for index in range(noise * 10):
+        lines.append("[%5d.%06d] random: crng init %d done" % (index, index, index))
+    lines.extend(
+        [
+            "[   12.000000] ------------[ cut here ]------------",
+            "[   12.000001] WARNING: CPU: 0 PID: 1 at drivers/fake.c:42 probe+0x4/0x8",
+            "[   12.000002] ---[ end trace 0123456789abcdef ]---",
+            "debian %s root" % LOGIN_PROMPT,
+            "root@debian:~# /lava-1234/bin/lava-test-runner /lava-1234/0",
+            "<LAVA_SIGNAL_STARTRUN 0_replay 1234_1.1.1>",
+            "Running test suite",
+        ]
+    )
+    for index in range(test_cases):
+        for line in range(noise):
+            lines.append("some output from case-%d: line %d" % (index, line))
+        lines.append("case-%d: PASS" % index)
+        lines.append("<LAVA_SIGNAL_TESTCASE TEST_CASE_ID=case-%d RESULT=pass>" % index)
+    lines.extend(
+        [
+            "Test suite finished",
+            "<LAVA_SIGNAL_ENDRUN 0_replay 1234_1.1.1>",
+            "<LAVA_TEST_RUNNER EXIT>",
+            "root@debian:~#",
+        ]
+    )
+    return "\r\n".join(lines) + "\r\n"
+
+
+def expected_signals(console, scenario):
+    """
+    Return the signals expected by the scenario as a list of (name, offset)
+    where offset is the position of the end of the signal in the console.
+    """
+    data = console.encode("utf-8", errors="replace")
+    if scenario == "boot":
+        login = data.find(LOGIN_PROMPT.encode("utf-8"))
+        data = data[:login] if login >= 0 else data
+        # Same sequence as parse_failures: the first kernel message, then its
+        # end, and so on.
+        starts = [re.compile(msg["start"].encode()) for msg in KERNEL_MESSAGES]
+        ret = []
+        offset = 0
+        while True:
+            matches = []
+            for index, pattern in enumerate(starts):
+                match = pattern.search(data, offset)
+                if match is not None:
+                    matches.append((match.start(), index, match.end()))
+            if not matches:
+                return ret
+            (position, index, start_end) = min(matches)
+            end = re.compile(KERNEL_MESSAGES[index]["end"].encode()).search(
+                data, start_end
+            )
+            if end is None:
+                return ret
+            ret.append((data[position : end.end()].decode(), end.end()))
+            offset = end.end()
+    elif scenario == "test-shell":
+        pattern = TESTCASE.pattern.encode()
+        return [(m.group(1).decode(), m.end()) for m in re.finditer(pattern, data)]
+    elif scenario == "monitor":
+        start = re.search(MONITOR["start"].encode(), data)
+        if start is None:
+            return []
+        end = re.compile(MONITOR["end"].encode()).search(data, start.end())
+        pattern = re.compile(MONITOR["pattern"].encode())
+        return [
+            (re.sub(r"\W+", "_", m.group("test_case_id").decode().lower()), m.end())
+            for m in pattern.finditer(data, start.end(), end.start() if end else None)
+        ]
+    raise NotImplementedError("Unknown scenario '%s'" % scenario)
+
+
+def run_boot(job, connection):
+    action = ReplayAction()
+    action.job = job
+    action.parameters = {"namespace": "common"}
+    connection.prompt_str = LinuxKernelMessages.get_init_prompts() + [LOGIN_PROMPT]
+    results = LinuxKernelMessages.parse_failures(
+        connection, action, time.monotonic() + 300, None, auto_login=True
+    )
+    return [r["kind"] for r in results if "kind" in r]
+
+
+def run_test_shell(job, connection):
+    action = TestShellAction()
+    action.job = job
+    action.parameters = {"namespace": "common", "stage": 0, "definitions": []}
+    action.set_namespace_data(
+        action="test-definition", label="test-definition", key="testdef_index", value=[]
+    )
+    action.set_namespace_data(
+        action="repo-action", label="repo-action", key="uuid-list", value=[]
+    )
+    action._reset_patterns()
+    action.signal_director.connection = connection
+    with connection.test_connection() as test_connection:
+        try:
+            while action._keep_running(test_connection, 30, connection.check_char):
+                pass
+        except ConnectionClosedError:
+            pass
+    return list(action.report.keys())
+
+
+def run_monitor(job, connection):
+    action = TestMonitorAction()
+    action.job = job
+    action.parameters = {"namespace": "common", "monitors": [MONITOR]}
+    action.run(connection, time.monotonic() + 300)
+    return list(job.logger.received.keys())
+
+
+SCENARIOS = {"boot": run_boot, "test-shell": run_test_shell, "monitor": run_monitor}
+
+
+def replay(scenario, console, baud, late):
+    logger = logging.getLogger("dispatcher")
+    logger.reset()
+    job = Job(0, {}, logger)
+    expected = expected_signals(console, scenario)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        path = tmpdir / "console.txt"
+        path.write_text(console, encoding="utf-8")
+        command = ReplayCommand(tmpdir, path, baud, logger)
+        connection = ShellSession(job, command)
+        connection.check_char = "#"
+
+        start_cpu = time.process_time()
+        start = time.monotonic()
+        found = SCENARIOS[scenario](job, connection)
+        wall = time.monotonic() - start
+        cpu = time.process_time() - start_cpu
+        replay_start = command.started()
+        connection.finalise()
+
+    size = logger.target_size / 1024 / 1024
+    ret = {
+        "lines": logger.target_lines,
+        "size_mb": round(size, 3),
+        "wall": round(wall, 3),
+        "lines_per_second": round(logger.target_lines / wall) if wall else 0,
+        "cpu_per_mb": round(cpu / size, 3) if size else 0,
+        "log_records": logger.counter.records,
+        "log_us_per_record": round(
+            logger.log_time * 1000000 / max(1, logger.counter.records), 2
+        ),
+        "log_cpu_percent": round(100 * logger.log_time / cpu, 1) if cpu else 0,
+        "expected": len(expected),
+        "missed": len([name for (name, _) in expected if name not in found])
+        if scenario != "boot"
+        else max(0, len(expected) - len(found)),
+        "late": 0,
+    }
+
+    # Latencies can only be computed when the console is throttled
+    if baud > 0 and scenario != "boot":
+        latencies = []
+        for (name, offset) in expected:
+            if name in logger.received:
+                # the replayer writes chunks of 10ms ahead of time
+                latencies.append(
+                    max(0, logger.received[name] - replay_start - offset / (baud / 10))
+                )
+        if latencies:
+            ret["late"] = len([lat for lat in latencies if lat > late])
+            ret["latency_p50"] = round(statistics.median(latencies), 4)
+            ret["latency_max"] = round(max(latencies), 4)
+    return ret
+
+
+def check(results, baseline):
+    errors = []
+    for scenario, thresholds in baseline.items():
+        if scenario not in results:
+            continue
+        res = results[scenario]
+        for key, value in thresholds.items():
+            if key.startswith("min_") and res[key[4:]] < value:
+                errors.append(
+                    "%s: %s=%s < %s" % (scenario, key[4:], res[key[4:]], value)
+                )
+            elif key.startswith("max_") and res[key[4:]] > value:
+                errors.append(
+                    "%s: %s=%s > %s" % (scenario, key[4:], res[key[4:]], value)
+                )
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--log",
+        type=pathlib.Path,
+        default=None,
+        help="job log (output.yaml) or raw console to replay. "
+        "A console is generated when not specified.",
+    )
+    parser.add_argument(
+        "--baud",
+        type=int,
+        default=0,
+        help="baud rate of the replayed console, 0 for unthrottled",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS.keys()),
+        help="scenarios to run, default to all",
+    )
+    parser.add_argument(
+        "--test-cases",
+        type=int,
+        default=2000,
+        help="number of test cases in the generated console",
+    )
+    parser.add_argument(
+        "--noise",
+        type=int,
+        default=5,
+        help="number of output lines between test cases in the generated console",
+    )
+    parser.add_argument(
+        "--late",
+        type=float,
+        default=1.0,
+        help="signals handled after this number of seconds are late",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=argparse.FileType("r"),
+        default=None,
+        help="thresholds to check the results against",
+    )
+    parser.add_argument(
+        "--output",
+        type=argparse.FileType("w"),
+        default=None,
+        help="dump the results in this file",
+    )
+    options = parser.parse_args()
+
+    # The actions and the connection will log into a BenchmarkLogger
+    logging.setLoggerClass(BenchmarkLogger)
+
+    console = load_console(options.log)
+    if console is None:
+        console = generate_console(options.test_cases, options.noise)
+
+    results = {}
+    for scenario in options.scenario or sorted(SCENARIOS.keys()):
+        results[scenario] = replay(scenario, console, options.baud, options.late)
+    print(yaml_safe_dump(results, default_flow_style=False), end="")
+    if options.output:
+        options.output.write(yaml_safe_dump(results, default_flow_style=False))
+
+    if options.baseline:
+        errors = check(results, yaml_safe_load(options.baseline))
+        for error in errors:
+            print("REGRESSION: %s" % error)
+        if errors:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Copy generated job logs from the filesystem to an in-process fake target
+backend, that waits for a round trip on every bulk write like a remote
+database would.
+
+* before: one job after the other, reading the whole log in memory and
+  writing it line by line with the buffering of the ingestion
+* after: the job ranges are copied by a pool of processes, streaming the
+  logs and writing larger bulks, with the line count verification
+
+The peak memory used to copy the largest job is measured with tracemalloc.
+"""
+
+import argparse
+import multiprocessing
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from django.conf import settings
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+settings.configure(LAVA_LOG_BACKEND="lava_scheduler_app.logutils.LogsFilesystem")
+
+from lava_common.log import dump  # noqa: E402
+from lava_scheduler_app.logmigration import LogsCopier  # noqa: E402
+from lava_scheduler_app.logutils import LogsBulk, LogsFilesystem  # noqa: E402
+
+# Seconds, set from the command line
+ROUND_TRIP = 0.002
+
+
+class LogsFake(LogsBulk):
+    """
+    Count the documents and wait for a round trip on each request
+    """
+
+    def __init__(self):
+        self.counts = {}
+        super().__init__()
+
+    def _bulk_write(self, job, docs):
+        time.sleep(ROUND_TRIP)
+        self.counts[job.id] = self.counts.get(job.id, 0) + len(docs)
+
+    def _document(self, job, index, line):
+        return {"job_id": job.id, "idx": index, **line}
+
+    def _line_count(self, job):
+        time.sleep(ROUND_TRIP)
+        return self.counts.get(job.id, 0)
+
+
+def generate(directory, jobs, lines):
+    result = []
+    for job_id in range(1, jobs + 1):
+        path = directory / str(job_id)
+        path.mkdir()
+        # One job out of 10 is ten times larger
+        count = lines * 10 if job_id % 10 == 0 else lines
+        with (path / "output.yaml").open("w", encoding="utf-8") as f_out:
+            for i in range(count):
+                f_out.write(
+                    "- "
+                    + dump(
+                        {
+                            "dt": "2023-01-01T00:00:%02d.000000" % (i % 60),
+                            "lvl": "target",
+                            "msg": "[%8.3f] line %d of the boot log" % (i / 10, i),
+                        }
+                    )
+                    + "\n"
+                )
+        result.append(SimpleNamespace(id=job_id, output_dir=str(path)))
+    return result
+
+
+def copy_before(source, target, job):
+    lines = source.read(job)
+    for line in lines.strip("\n").split("\n"):
+        if line:
+            target.write(job, line)
+    target.flush(job)
+
+
+copier = None
+
+
+def init_worker(batch_size):
+    global copier
+    copier = LogsCopier(LogsFilesystem(), LogsFake(), batch_size)
+
+
+def copy_range(jobs):
+    return copier.copy_range(jobs[0].id, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=200, help="number of jobs")
+    parser.add_argument("--lines", type=int, default=5000, help="lines by job")
+    parser.add_argument("--processes", type=int, default=4, help="processes")
+    parser.add_argument("--chunk-size", type=int, default=10, help="jobs by range")
+    parser.add_argument("--batch-size", type=int, default=5000, help="bulk size")
+    parser.add_argument(
+        "--round-trip", type=float, default=2, help="round trip of the target (ms)"
+    )
+    options = parser.parse_args()
+    global ROUND_TRIP
+    ROUND_TRIP = options.round_trip / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = generate(pathlib.Path(tmp), options.jobs, options.lines)
+        largest = jobs[9] if len(jobs) >= 10 else jobs[0]
+        print(
+            "%d jobs, %d lines"
+            % (
+                len(jobs),
+                sum(options.lines * (10 if j.id % 10 == 0 else 1) for j in jobs),
+            )
+        )
+
+        # Before
+        source = LogsFilesystem()
+        target = LogsFake()
+        begin = time.monotonic()
+        for job in jobs:
+            copy_before(source, target, job)
+        before = time.monotonic() - begin
+        lines = sum(target.counts.values())
+
+        # After
+        ranges = [
+            jobs[i : i + options.chunk_size]
+            for i in range(0, len(jobs), options.chunk_size)
+        ]
+        begin = time.monotonic()
+        with multiprocessing.get_context("fork").Pool(
+            options.processes, init_worker, (options.batch_size,)
+        ) as pool:
+            results = pool.map(copy_range, ranges)
+        after = time.monotonic() - begin
+        assert sum(r.lines for r in results) == lines  # nosec - benchmark
+        assert not any(r.failed for r in results)  # nosec - benchmark
+
+        # Memory used to copy the largest job
+        memory = {}
+        for (name, func) in [
+            ("before", lambda: copy_before(source, LogsFake(), largest)),
+            (
+                "after",
+                lambda: LogsCopier(source, LogsFake(), options.batch_size).copy(
+                    largest
+                ),
+            ),
+        ]:
+            tracemalloc.start()
+            func()
+            memory[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    print("%-8s %10s %14s %12s" % ("", "duration", "throughput", "peak memory"))
+    for (name, duration) in [("before", before), ("after", after)]:
+        print(
+            "%-8s %9.2fs %9.0f l/s %10.1fMB"
+            % (name, duration, lines / duration, memory[name] / 1024 / 1024)
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the queries of the reports pages computed from the jobs and from the
+daily job health rollups, on generated jobs stored in an sqlite database.
+
+The tables only have the columns and the indexes used by the reports: the
+real testjob table is much wider, so the scans are slower on a production
+instance.
+
+* jobs: 17 conditional-count aggregates over the jobs for moving windows
+  (like report_data() did), with the "actual_device IN (...)" subquery for
+  the device type page
+* rollups: one query over the rollups of the last 70 days, summed by window
+  in Python (like reports_data())
+
+The cost of updating the rollups when a job finishes is also measured.
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+DAY = 86400
+COMPLETE = 1
+INCOMPLETE = 2
+CANCELED = 3
+FINISHED = 2
+
+SCHEMA = """
+CREATE TABLE device (hostname TEXT PRIMARY KEY, device_type_id TEXT);
+CREATE TABLE testjob (
+    id INTEGER PRIMARY KEY,
+    state INTEGER,
+    health INTEGER,
+    health_check INTEGER,
+    requested_device_type_id TEXT,
+    actual_device_id TEXT,
+    start_time INTEGER
+);
+CREATE INDEX testjob_health_state ON testjob (health, state, requested_device_type_id);
+CREATE INDEX testjob_actual_device ON testjob (actual_device_id);
+CREATE TABLE rollup (
+    id INTEGER PRIMARY KEY,
+    bucket INTEGER,
+    device_id TEXT,
+    device_type_id TEXT,
+    health_check INTEGER,
+    pass_count INTEGER DEFAULT 0,
+    fail_count INTEGER DEFAULT 0
+);
+CREATE UNIQUE INDEX rollup_device ON rollup (bucket, device_id, health_check);
+CREATE INDEX rollup_type ON rollup (device_type_id, bucket);
+"""
+
+REPORT = """
+SELECT
+  SUM(CASE WHEN health = 1 AND health_check = 1 THEN 1 ELSE 0 END),
+  SUM(CASE WHEN health = 1 AND health_check = 0 THEN 1 ELSE 0 END),
+  SUM(CASE WHEN health IN (2, 3) AND health_check = 1 THEN 1 ELSE 0 END),
+  SUM(CASE WHEN health IN (2, 3) AND health_check = 0 THEN 1 ELSE 0 END)
+FROM testjob
+WHERE state = 2 AND start_time BETWEEN ? AND ?
+"""
+TYPE_FILTER = (
+    " AND actual_device_id IN (SELECT hostname FROM device WHERE device_type_id = ?)"
+)
+
+ROLLUPS = """
+SELECT bucket, health_check, SUM(pass_count), SUM(fail_count)
+FROM rollup
+WHERE bucket BETWEEN ? AND ?
+"""
+
+
+def generate(db, options, rnd, now):
+    devices = [
+        ("device-%03d" % i, "type-%02d" % (i % options.device_types))
+        for i in range(options.devices)
+    ]
+    db.executemany("INSERT INTO device VALUES (?, ?)", devices)
+    batch = []
+    for job_id in range(1, options.jobs + 1):
+        (device, device_type) = rnd.choice(devices)
+        r = rnd.random()
+        health = COMPLETE if r < 0.8 else INCOMPLETE if r < 0.95 else CANCELED
+        batch.append(
+            (
+                job_id,
+                FINISHED if rnd.random() < 0.98 else 1,
+                health,
+                int(rnd.random() < 0.1),
+                device_type,
+                device,
+                now - int(rnd.random() * options.days * DAY),
+            )
+        )
+        if len(batch) == 100000:
+            db.executemany("INSERT INTO testjob VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    db.executemany("INSERT INTO testjob VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    # Same aggregate as the backfill-health-rollups command
+    db.execute(
+        """
+        INSERT INTO rollup (bucket, device_id, device_type_id, health_check,
+                            pass_count, fail_count)
+        SELECT start_time / 86400, actual_device_id, device.device_type_id,
+               health_check,
+               SUM(CASE WHEN health = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN health IN (2, 3) THEN 1 ELSE 0 END)
+        FROM testjob JOIN device ON actual_device_id = hostname
+        WHERE state = 2
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+    db.commit()
+    return devices
+
+
+def windows():
+    for day in reversed(range(7)):
+        yield (day * -1 - 1, day * -1)
+    for week in reversed(range(10)):
+        yield (week * -7 - 7, week * -7)
+
+
+def reports_jobs(db, now, device_type=None):
+    query = REPORT + (TYPE_FILTER if device_type else "")
+    result = []
+    for (start, end) in windows():
+        args = [now + start * DAY, now + end * DAY]
+        if device_type:
+            args.append(device_type)
+        result.append(tuple(v or 0 for v in db.execute(query, args).fetchone()))
+    return result
+
+
+def reports_rollups(db, now, device_type=None):
+    today = now // DAY
+    query = ROLLUPS
+    args = [today - 69, today]
+    if device_type:
+        query += " AND device_type_id = ?"
+        args.append(device_type)
+    days = {}
+    for (bucket, health_check, passed, failed) in db.execute(
+        query + " GROUP BY bucket, health_check", args
+    ):
+        days[(bucket, health_check)] = (passed, failed)
+    result = []
+    for (start, end) in windows():
+        res = {1: [0, 0], 0: [0, 0]}
+        for ((bucket, health_check), (passed, failed)) in days.items():
+            if today + start + 1 <= bucket <= today + end:
+                res[health_check][0] += passed
+                res[health_check][1] += failed
+        result.append((res[1][0], res[0][0], res[1][1], res[0][1]))
+    return result
+
+
+def record(db, job):
+    # Same queries as JobHealthRollup.record()
+    (bucket, device, device_type, health_check, health) = job
+    field = "pass_count" if health == COMPLETE else "fail_count"
+    db.execute(
+        "INSERT OR IGNORE INTO rollup (bucket, device_id, device_type_id, "
+        "health_check) VALUES (?, ?, ?, ?)",
+        (bucket, device, device_type, health_check),
+    )
+    db.execute(
+        "UPDATE rollup SET %s = %s + 1 "  # nosec - benchmark
+        "WHERE bucket = ? AND device_id = ? AND health_check = ?" % (field, field),
+        (bucket, device, health_check),
+    )
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return (statistics.median(timings), result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=3000000, help="number of jobs")
+    parser.add_argument("--devices", type=int, default=300, help="number of devices")
+    parser.add_argument(
+        "--device-types", type=int, default=30, help="number of device types"
+    )
+    parser.add_argument("--days", type=int, default=730, help="days of history")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each query")
+    options = parser.parse_args()
+
+    rnd = random.Random(42)
+    # Aligned on a day boundary so that both methods cover the same jobs
+    now = (int(time.time()) // DAY) * DAY + DAY - 1
+    with tempfile.NamedTemporaryFile(suffix=".sqlite3") as tmp:
+        db = sqlite3.connect(tmp.name)
+        db.executescript(SCHEMA)
+        start = time.monotonic()
+        devices = generate(db, options, rnd, now)
+        rollups = db.execute("SELECT COUNT(*) FROM rollup").fetchone()[0]
+        print(
+            "%d jobs, %d rollups (generated in %.1fs)"
+            % (options.jobs, rollups, time.monotonic() - start)
+        )
+
+        device_type = devices[0][1]
+        print("%-10s %14s %14s" % ("", "reports", "device type"))
+        results = {}
+        for (name, func) in [("jobs", reports_jobs), ("rollups", reports_rollups)]:
+            (all_time, all_res) = measure(lambda: func(db, now), options.repeat)
+            (type_time, type_res) = measure(
+                lambda: func(db, now, device_type), options.repeat
+            )
+            results[name] = (all_res, type_res)
+            print("%-10s %12.1fms %12.1fms" % (name, all_time * 1000, type_time * 1000))
+        assert results["jobs"] == results["rollups"]  # nosec - benchmark
+
+        # Cost of updating the rollups when the jobs finish
+        count = 20000
+        jobs = []
+        for _ in range(count):
+            (device, device_type) = rnd.choice(devices)
+            jobs.append(
+                (now // DAY, device, device_type, int(rnd.random() < 0.1), COMPLETE)
+            )
+        # The rollups are updated in the transaction that saves the job, so
+        # the commit is not part of the cost
+        start = time.perf_counter()
+        for job in jobs:
+            record(db, job)
+        duration = time.perf_counter() - start
+        db.commit()
+        print(
+            "finishing a job: %.1fus to update the rollups" % (duration / count * 1e6)
+        )
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
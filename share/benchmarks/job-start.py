@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the server CPU time needed to start jobs, with the Django test client
+calling the internal API like lava-worker does.
+
+The jobs are spread over --workers workers with --devices devices each. Each
+job is started:
+
+* before: the start bundle is rendered by the request, like before
+* after: the bundle is rendered when the job is scheduled and the workers send
+  the etags of the parts they already have
+
+Like the test suite, this requires the development database settings.
+"""
+
+import argparse
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lava_server.settings.dev")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+DEFINITION = (ROOT / "tests/lava_scheduler_app/sample_jobs/qemu.yaml").read_text(
+    encoding="utf-8"
+)
+
+
+def create_objects(tmpdir, workers, devices, jobs):
+    from django.contrib.auth.models import User
+
+    from lava_scheduler_app.models import Device, DeviceType, TestJob, Worker
+
+    user = User.objects.create(username="benchmark")
+    qemu = DeviceType.objects.create(name="qemu")
+    all_devices = []
+    for w_index in range(workers):
+        worker = Worker.objects.create(hostname="worker-%02d" % w_index)
+        for d_index in range(devices):
+            hostname = "qemu-%02d-%02d" % (w_index, d_index)
+            (tmpdir / (hostname + ".jinja2")).write_text(
+                "{%% extends 'qemu.jinja2' %%}\n"
+                "{%% set mac_addr = '52:54:00:12:%02x:%02x' %%}\n"
+                "{%% set memory = 1024 %%}\n" % (w_index, d_index),
+                encoding="utf-8",
+            )
+            all_devices.append(
+                Device.objects.create(
+                    hostname=hostname,
+                    device_type=qemu,
+                    health=Device.HEALTH_GOOD,
+                    state=Device.STATE_RESERVED,
+                    worker_host=worker,
+                )
+            )
+    return [
+        TestJob.objects.create(
+            definition=DEFINITION,
+            requested_device_type=qemu,
+            actual_device=all_devices[index % len(all_devices)],
+            state=TestJob.STATE_SCHEDULED,
+            submitter=user,
+        )
+        for index in range(jobs)
+    ]
+
+
+def start(client, job, caches):
+    from django.urls import reverse
+
+    headers = {"HTTP_LAVA_TOKEN": job.token}
+    cache = caches.get(job.actual_device.worker_host.hostname)
+    if cache:
+        headers["HTTP_IF_NONE_MATCH"] = ", ".join(cache)
+    begin = time.process_time()
+    ret = client.get(
+        reverse("lava.scheduler.internal.v1.jobs", args=[job.id]), **headers
+    )
+    duration = time.process_time() - begin
+    assert ret.status_code == 200  # nosec - benchmark
+    if cache is not None:
+        cache.update(ret.json()["etags"].values())
+    return (duration, len(ret.content))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=1000, help="number of jobs")
+    parser.add_argument("--workers", type=int, default=50, help="number of workers")
+    parser.add_argument(
+        "--devices", type=int, default=4, help="number of devices per worker"
+    )
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir / "devices").mkdir()
+        settings.DEVICES_PATH = str(tmpdir / "devices")
+        settings.MEDIA_ROOT = str(tmpdir / "media")
+        django.setup()
+
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import setup_test_environment
+
+        from lava_scheduler_app import bundle
+        from lava_scheduler_app.bundle import StartBundle
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            jobs = create_objects(
+                tmpdir / "devices", options.workers, options.devices, options.jobs
+            )
+            client = Client()
+
+            before = []
+            for job in jobs:
+                bundle._rendered.clear()
+                bundle._worker_configs.clear()
+                (pathlib.Path(job.output_dir) / bundle.INDEX).unlink(missing_ok=True)
+                before.append(start(client, job, {}))
+
+            scheduled = []
+            for job in jobs:
+                begin = time.process_time()
+                StartBundle(job).build()
+                scheduled.append(time.process_time() - begin)
+            caches = {}
+            for job in jobs:
+                caches.setdefault(job.actual_device.worker_host.hostname, set())
+            after = [start(client, job, caches) for job in jobs]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print(
+        "%d jobs, %d workers, %d devices"
+        % (options.jobs, options.workers, options.workers * options.devices)
+    )
+    print("%-10s %12s %12s %12s" % ("", "cpu/start", "scheduling", "bytes/start"))
+    for (name, results, extra) in [
+        ("before", before, None),
+        ("after", after, scheduled),
+    ]:
+        print(
+            "%-10s %10.2fms %10s %12d"
+            % (
+                name,
+                statistics.mean(r[0] for r in results) * 1000,
+                "-" if extra is None else "%.2fms" % (statistics.mean(extra) * 1000),
+                statistics.mean(r[1] for r in results),
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
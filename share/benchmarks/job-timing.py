@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compute the timing of a job with a large generated log (100MB by default).
+
+* before: read the whole log, parse it and match every line, like
+  job_timing() did
+* after: read the timing index written at ingestion
+* backfill: build the index from the log, for the jobs that finished before
+  the upgrade
+
+The cost of extracting the records at ingestion is measured on the parsed
+lines.
+"""
+
+import argparse
+import pathlib
+import re
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+settings.configure(LAVA_LOG_BACKEND="lava_scheduler_app.logutils.LogsFilesystem")
+
+from lava_common.log import dump  # noqa: E402
+from lava_common.yaml import yaml_safe_load  # noqa: E402
+from lava_scheduler_app import timing  # noqa: E402
+from lava_scheduler_app.logutils import logs_instance  # noqa: E402
+
+FINISHED = 2
+
+
+def generate(path, size):
+    lines = []
+    written = 0
+    action = 0
+    with path.open("w", encoding="utf-8") as f_out:
+        while written < size:
+            action += 1
+            level = "%d.%d" % (action // 10 + 1, action % 10 + 1)
+            block = [
+                {
+                    "lvl": "info",
+                    "msg": "start: %s action-%d (timeout 00:10:00)" % (level, action),
+                }
+            ]
+            for i in range(2000):
+                block.append(
+                    {
+                        "lvl": "target" if i % 4 else "debug",
+                        "msg": "[%10.6f] kernel message %d of action %d"
+                        % (i / 100, i, action),
+                    }
+                )
+            block.append(
+                {
+                    "lvl": "info",
+                    "msg": "end: %s action-%d (duration 00:00:%02d)"
+                    % (level, action, action % 60),
+                }
+            )
+            data = "".join(
+                "- " + dump(dict(dt="2023-01-01T00:00:00.000000", **line)) + "\n"
+                for line in block
+            )
+            f_out.write(data)
+            written += len(data)
+            lines.extend(block)
+    return (written, lines)
+
+
+def timing_before(job):
+    # job_timing() before the index
+    logs = yaml_safe_load(logs_instance.read(job))
+    pattern_start = re.compile(
+        "^start: (?P<level>[\\d.]+) (?P<action>[\\w_-]+) "
+        "\\(timeout (?P<timeout>\\d+:\\d+:\\d+)\\)"
+    )
+    pattern_end = re.compile(
+        "^end: (?P<level>[\\d.]+) (?P<action>[\\w_-]+) "
+        "\\(duration (?P<duration>\\d+:\\d+:\\d+)\\)"
+    )
+    timings = {}
+    for line in logs:
+        if line["lvl"] not in ["debug", "info"]:
+            continue
+        try:
+            match = pattern_start.match(line["msg"])
+        except TypeError:
+            continue
+        if match is not None:
+            d = match.groupdict()
+            timings[d["level"]] = {"name": d["action"]}
+            continue
+        match = pattern_end.match(line["msg"])
+        if match is not None:
+            d = match.groupdict()
+            parts = d["duration"].split(":")
+            duration = float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
+            timings.setdefault(d["level"], {})["duration"] = duration
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100, help="log size (MB)")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        job = SimpleNamespace(
+            id=1, output_dir=tmp, state=FINISHED, STATE_FINISHED=FINISHED
+        )
+        (size, lines) = generate(
+            pathlib.Path(tmp) / "output.yaml", options.size * 1024 * 1024
+        )
+        count = len(lines)
+        print("%.1fMB, %d lines" % (size / 1024 / 1024, count))
+
+        # Ingestion: extract the records from the parsed lines
+        begin = time.perf_counter()
+        records = [r for r in map(timing.parse, lines) if r is not None]
+        ingestion = time.perf_counter() - begin
+        del lines
+
+        begin = time.perf_counter()
+        before = timing_before(job)
+        duration_before = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        assert timing.load(job) == records  # nosec - benchmark
+        duration_backfill = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        data = timing.report(timing.load(job))
+        duration_after = time.perf_counter() - begin
+        assert {  # nosec - benchmark
+            level: t["duration"] for (level, t) in before.items()
+        } == {p[0]: p[2] for p in data["pipeline"]}
+
+    print("%-10s %12s" % ("", "timing"))
+    print("%-10s %10.1fms" % ("before", duration_before * 1000))
+    print("%-10s %10.1fms" % ("backfill", duration_backfill * 1000))
+    print("%-10s %10.1fms" % ("after", duration_after * 1000))
+    print(
+        "ingestion: %.2fus per line to extract the records"
+        % (ingestion / count * 1000000)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the time and memory needed by lava-run to build the pipeline of a
+job, without running it.
+
+Each run is done in a fresh interpreter which imports the parser and parses
+the job for the given device, like "lava-run --validate" does. With
+--prefork, each run is forked from a warmed interpreter instead.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import statistics
+import subprocess  # nosec - benchmark
+import sys
+import tempfile
+import time
+
+from jinja2 import ChoiceLoader, DictLoader, FileSystemLoader
+from jinja2.sandbox import SandboxedEnvironment as JinjaSandboxEnv
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+
+CHILD = """
+import time
+
+start = time.monotonic()
+
+import resource
+import sys
+
+
+def main():
+    from lava_common.yaml import yaml_safe_load
+    from lava_dispatcher.device import NewDevice
+    from lava_dispatcher.parser import JobParser
+
+    with open(sys.argv[1]) as f_device:
+        device = NewDevice(yaml_safe_load(f_device))
+    with open(sys.argv[2]) as f_job:
+        job = JobParser().parse(f_job.read(), device, "1", None, "")
+    job.describe()
+    # When forked, the time is counted from the request
+    begin = float(sys.argv[3]) if len(sys.argv) > 3 else start
+    print(
+        time.monotonic() - begin,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        len(sys.modules),
+        flush=True,
+    )
+    return 0
+
+
+if "--prefork" in sys.argv:
+    from lava_dispatcher.prefork import serve
+
+    serve(main)
+else:
+    main()
+"""
+
+
+def render_device(template):
+    path = ROOT / "tests" / "lava_scheduler_app" / "devices" / template
+    env = JinjaSandboxEnv(
+        loader=ChoiceLoader(
+            [
+                DictLoader({template: path.read_text(encoding="utf-8")}),
+                FileSystemLoader(
+                    [str(ROOT / "etc" / "dispatcher-config" / "device-types")]
+                ),
+            ]
+        ),
+        trim_blocks=True,
+        autoescape=False,
+    )
+    return env.get_template(template).render()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="qemu01.jinja2", help="device template")
+    parser.add_argument(
+        "--job",
+        default=str(ROOT / "tests" / "lava_dispatcher" / "sample_jobs" / "kvm.yaml"),
+        help="job definition",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs")
+    parser.add_argument(
+        "--prefork",
+        action="store_true",
+        default=False,
+        help="fork each run from a warmed interpreter, like lava-worker --prefork",
+    )
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        device = pathlib.Path(tmpdir) / "device.yaml"
+        device.write_text(render_device(options.device), encoding="utf-8")
+
+        results = []
+        if options.prefork:
+            server = subprocess.Popen(  # nosec - benchmark
+                [sys.executable, "-c", CHILD, "--prefork"],
+                cwd=str(ROOT),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+            )
+        for index in range(options.repeat):
+            if options.prefork:
+                stdout = pathlib.Path(tmpdir) / ("stdout.%d" % index)
+                request = {
+                    "args": [str(device), options.job, str(time.monotonic())],
+                    "env": dict(os.environ),
+                    "stdout": str(stdout),
+                    "stderr": str(stdout) + ".err",
+                }
+                server.stdin.write(json.dumps(request) + "\n")
+                server.stdin.flush()
+                json.loads(server.stdout.readline())["pid"]
+                # The job is a child of the server: wait for the results
+                out = ""
+                while not out.endswith("\n"):
+                    time.sleep(0.01)
+                    with contextlib.suppress(OSError):
+                        out = stdout.read_text(encoding="utf-8")
+            else:
+                out = subprocess.check_output(  # nosec - benchmark
+                    [sys.executable, "-c", CHILD, str(device), options.job],
+                    cwd=str(ROOT),
+                ).decode("utf-8")
+            (duration, rss, modules) = out.split()[-3:]
+            results.append((float(duration), int(rss), int(modules)))
+        if options.prefork:
+            server.stdin.close()
+            server.wait()
+
+    print("startup: %.3fs (median)" % statistics.median(r[0] for r in results))
+    print("max RSS: %.1f MB" % (max(r[1] for r in results) / 1024))
+    print("modules: %d" % results[0][2])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
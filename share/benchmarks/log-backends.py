@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the log backends against in-process fakes:
+
+* filesystem: the output.yaml and output.idx files
+* mongo: a mongomock database (skipped when mongomock is not installed)
+* elasticsearch: a local HTTP server implementing the few APIs used by LAVA
+* firestore: an in-memory client
+
+The lines are sent in requests of 1000 lines, like lava-run does, and saved
+line by line (before) or in bulk (after). Then the last lines of the job are
+read, letting the store select the lines.
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+settings.configure(
+    LAVA_LOG_BACKEND="lava_scheduler_app.logutils.LogsFilesystem",
+    ELASTICSEARCH_URI="http://127.0.0.1:9200/",
+    ELASTICSEARCH_INDEX="lava-logs",
+    ELASTICSEARCH_APIKEY="",
+)
+
+from lava_common.log import dump  # noqa: E402
+from lava_scheduler_app.logutils import (  # noqa: E402
+    LogsBulk,
+    LogsElasticsearch,
+    LogsFilesystem,
+    LogsFirestore,
+    LogsMongo,
+)
+
+REQUEST_LINES = 1000
+
+
+class Job:
+    def __init__(self, job_id, output_dir):
+        self.id = job_id
+        self.output_dir = output_dir
+        self.submit_time = datetime.datetime(2023, 1, 1)
+
+
+#################
+# Elasticsearch #
+#################
+class ElasticsearchHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, data):
+        data = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def select(self, query):
+        docs = self.server.docs
+        if "bool" in query:
+            for item in query["bool"]["filter"]:
+                docs = [d for d in docs if self.match(d, item)]
+            return docs
+        return [d for d in docs if self.match(d, query)]
+
+    def match(self, doc, query):
+        if "match" in query:
+            ((key, value),) = query["match"].items()
+            return doc.get(key) == value
+        ((key, value),) = query["range"].items()
+        return key in doc and value["gte"] <= doc[key] < value["lt"]
+
+    def do_PUT(self):
+        self.body()
+        self.reply({})
+
+    def do_POST(self):
+        data = self.body().decode("utf-8")
+        if self.path.split("?")[0].endswith("/_bulk"):
+            lines = data.splitlines()
+            self.server.docs.extend(json.loads(line) for line in lines[1::2])
+            self.reply({"errors": False})
+        else:
+            self.server.docs.append(json.loads(data))
+            self.reply({"result": "created"})
+
+    def do_GET(self):
+        params = json.loads(self.body() or "{}")
+        docs = self.select(params["query"])
+        if self.path.endswith("/_count/"):
+            self.reply({"count": len(docs)})
+            return
+        docs = sorted(docs, key=lambda d: (d.get("idx", -1), d["dt"]))
+        first = params.get("from", 0)
+        docs = docs[first : first + params.get("size", 10)]
+        source = params.get("_source", {})
+        if isinstance(source, list):
+            docs = [{k: v for (k, v) in d.items() if k in source} for d in docs]
+        else:
+            excludes = source.get("excludes", [])
+            docs = [{k: v for (k, v) in d.items() if k not in excludes} for d in docs]
+        self.reply({"hits": {"hits": [{"_source": d} for d in docs]}})
+
+
+#############
+# Firestore #
+#############
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class Query:
+    OPERATORS = {">=": lambda a, b: a >= b, "<": lambda a, b: a < b}
+
+    def __init__(self, docs, filters=(), order=None, skip=0, count=None):
+        self.docs = docs
+        self.filters = filters
+        self.order = order
+        self.skip = skip
+        self.count = count
+
+    def clone(self, **kwargs):
+        args = dict(
+            filters=self.filters, order=self.order, skip=self.skip, count=self.count
+        )
+        args.update(kwargs)
+        return Query(self.docs, **args)
+
+    def where(self, field, op, value):
+        return self.clone(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field):
+        return self.clone(order=field)
+
+    def offset(self, skip):
+        return self.clone(skip=skip)
+
+    def limit(self, count):
+        return self.clone(count=count)
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        docs = [
+            Snapshot(k, v)
+            for (k, v) in self.docs.items()
+            if all(self.OPERATORS[op](v[f], val) for (f, op, val) in self.filters)
+        ]
+        if self.order:
+            docs.sort(key=lambda d: d.data[self.order])
+        else:
+            docs.sort(key=lambda d: d.id)
+        end = None if self.count is None else self.skip + self.count
+        return iter(docs[self.skip : end])
+
+
+class Collection(Query):
+    def __init__(self):
+        super().__init__({})
+        self.children = {}
+
+    def document(self, doc_id):
+        return Document(self, doc_id)
+
+
+class Document:
+    def __init__(self, parent, doc_id):
+        self.parent = parent
+        self.id = doc_id
+
+    def collection(self, name):
+        return self.parent.children.setdefault((self.id, name), Collection())
+
+    def set(self, data):
+        self.parent.docs[self.id] = dict(data)
+
+    def get(self):
+        snapshot = Snapshot(self.id, self.parent.docs.get(self.id, {}))
+        snapshot.exists = self.id in self.parent.docs
+        return snapshot
+
+
+class Batch:
+    def __init__(self):
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append((ref, data))
+
+    def commit(self):
+        for (ref, data) in self.ops:
+            ref.set(data)
+
+
+class Firestore:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, Collection())
+
+    def batch(self):
+        return Batch()
+
+
+############
+# Backends #
+############
+def filesystem(tmpdir):
+    return LogsFilesystem()
+
+
+def mongo(tmpdir):
+    import mongomock
+
+    logs = LogsMongo.__new__(LogsMongo)
+    logs.db = mongomock.MongoClient()["lava-logs"]
+    logs.db.logs.create_index([("job_id", 1), ("idx", 1), ("dt", 1)])
+    LogsBulk.__init__(logs)
+    return logs
+
+
+def elasticsearch(tmpdir):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ElasticsearchHandler)
+    server.docs = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.ELASTICSEARCH_URI = "http://127.0.0.1:%d/" % server.server_address[1]
+    return LogsElasticsearch()
+
+
+def firestore(tmpdir):
+    logs = LogsFirestore.__new__(LogsFirestore)
+    logs.db = Firestore()
+    logs.root_collection = "logs"
+    LogsBulk.__init__(logs)
+    return logs
+
+
+BACKENDS = [
+    ("filesystem", filesystem),
+    ("mongo", mongo),
+    ("elasticsearch", elasticsearch),
+    ("firestore", firestore),
+]
+
+
+def lines(count):
+    start = datetime.datetime(2023, 1, 1)
+    for index in range(count):
+        dt = start + datetime.timedelta(milliseconds=index)
+        data = {"dt": dt.isoformat(), "lvl": "target", "msg": "line %d" % index}
+        yield ("- " + dump(data) + "\n").encode("utf-8")
+
+
+def write(logs, job, count):
+    directory = pathlib.Path(job.output_dir)
+    directory.mkdir()
+    with open(str(directory / "output.yaml"), "ab") as output, open(
+        str(directory / "output.idx"), "ab"
+    ) as index:
+        start = time.monotonic()
+        for (number, line) in enumerate(lines(count), start=1):
+            logs.write(job, line, output, index)
+            # End of the request
+            if number % REQUEST_LINES == 0:
+                logs.flush(job)
+        logs.flush(job)
+    return count / (time.monotonic() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=20000, help="lines per job")
+    parser.add_argument("--tail", type=int, default=100, help="lines to read")
+    options = parser.parse_args()
+
+    print(
+        "%-14s %14s %14s %12s"
+        % ("backend", "before lines/s", "after lines/s", "range read")
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for (name, backend) in BACKENDS:
+            try:
+                logs = backend(tmpdir)
+            except ImportError as exc:
+                print("%-14s skipped: %s" % (name, exc))
+                continue
+
+            results = []
+            for (job_id, bulk) in [(1, 1), (2, LogsBulk.BULK_LINES)]:
+                logs.BULK_LINES = bulk
+                job = Job(job_id, "%s/%s-%d" % (tmpdir, name, job_id))
+                results.append(write(logs, job, options.lines))
+
+            start = time.monotonic()
+            data = logs.read(job, options.lines - options.tail, options.lines)
+            duration = time.monotonic() - start
+            assert data.count("\n") >= options.tail - 1  # nosec - benchmark
+            print(
+                "%-14s %14d %14d %10.2fms"
+                % (name, results[0], results[1], duration * 1000)
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
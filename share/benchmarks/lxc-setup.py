@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the time taken to set up the lxc container of a job, running the lxc
+deploy actions of the bbb-lxc.yaml sample job (four packages to install):
+
+* before: lxc-create from the template, then apt-get update and install in
+  the container of every job
+* after: the base container is provisioned by the first job, the other jobs
+  get a copy-on-write clone of it
+
+By default, the lxc commands are faked like lava-lxc-mocker does, each one
+waiting for the duration measured on a worker (multiplied by --scale). The
+"first" column is the job that provisions the base container. Run as root with
+--real to use the lxc commands of the host instead.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import statistics
+import subprocess  # nosec - benchmark
+import sys
+import tempfile
+import time
+from unittest import mock
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lava_dispatcher.actions.deploy.lxc import LxcCreateAction  # noqa: E402
+from lava_dispatcher.actions.deploy.overlay import OverlayAction  # noqa: E402
+from tests.lava_dispatcher.test_lxc import LxcFactory  # noqa: E402
+
+# Seconds, measured on a worker with a local mirror
+DURATIONS = {
+    "lxc-create": 45.0,
+    "lxc-start": 1.0,
+    "lxc-stop": 1.0,
+    "lxc-copy": 0.3,
+    "lxc-destroy": 0.5,
+    "apt-get update": 10.0,
+    "apt-get install": 25.0,
+}
+
+FAKE_LXC = """#!%s
+import json
+import os
+import pathlib
+import shutil
+import sys
+import time
+
+command = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+durations = json.loads(os.environ["FAKE_LXC_DURATIONS"])
+path = pathlib.Path(args[args.index("-P") + 1] if "-P" in args else os.environ["FAKE_LXC_PATH"])
+container = path / args[args.index("-n") + 1]
+if command == "lxc-attach":
+    time.sleep(durations["apt-get " + args[args.index("apt-get") + 3]])
+    print("Reading package lists...")
+else:
+    time.sleep(durations.get(command, 0))
+
+if command == "lxc-create":
+    (container / "rootfs").mkdir(parents=True)
+    (container / "rootfs" / "data").write_bytes(bytes(1024 * 1024))
+elif command == "lxc-copy":
+    shutil.copytree(str(container), str(path / args[args.index("-N") + 1]))
+elif command == "lxc-destroy":
+    if not container.exists():
+        sys.exit(1)
+    shutil.rmtree(str(container))
+elif command == "lxc-info":
+    if "-sH" in args:
+        print("RUNNING")
+    elif "-iH" in args:
+        print("10.0.3.42")
+    elif not container.exists():
+        sys.exit(1)
+"""
+
+COMMANDS = [
+    "lxc-attach",
+    "lxc-copy",
+    "lxc-create",
+    "lxc-destroy",
+    "lxc-info",
+    "lxc-start",
+    "lxc-stop",
+    "lxc-wait",
+]
+
+
+@contextlib.contextmanager
+def fake_lxc(tmpdir, scale):
+    bindir = tmpdir / "bin"
+    bindir.mkdir()
+    script = bindir / "fake-lxc"
+    script.write_text(FAKE_LXC % sys.executable, encoding="utf-8")
+    script.chmod(0o755)
+    for command in COMMANDS:
+        (bindir / command).symlink_to(script)
+    env = {
+        "PATH": str(bindir) + ":" + os.environ["PATH"],
+        "FAKE_LXC_PATH": str(tmpdir / "lxc"),
+        "FAKE_LXC_DURATIONS": json.dumps(
+            {k: v * scale for (k, v) in DURATIONS.items()}
+        ),
+    }
+    old = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for (k, v) in old.items():
+            if v is None:
+                del os.environ[k]
+            else:
+                os.environ[k] = v
+
+
+def setup(lxc_path, cache):
+    """
+    Run the lxc deploy actions of a job, until the overlay.
+    Return the duration and the name of the container.
+    """
+    job = LxcFactory().create_bbb_lxc_job("sample_jobs/bbb-lxc.yaml")
+    job.parameters["dispatcher"] = {"lxc_path": str(lxc_path)}
+    if cache:
+        job.parameters["dispatcher"]["lxc_cache"] = True
+    deploy = job.pipeline.actions[0]
+    deploy.populate(deploy.parameters)
+    actions = []
+    for action in deploy.pipeline.actions:
+        if isinstance(action, OverlayAction):
+            break
+        if action.name != "lxc-create-udev-rule-action":
+            actions.append(action)
+    create = [a for a in actions if isinstance(a, LxcCreateAction)][0]
+    create.validate()
+    create.lxc_data["custom_lxc_path"] = False
+    start = time.monotonic()
+    for action in actions:
+        action.run(None, None)
+    return (time.monotonic() - start, create.lxc_data["lxc_name"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10, help="number of jobs")
+    parser.add_argument(
+        "--scale", type=float, default=0.1, help="scale of the fake durations"
+    )
+    parser.add_argument(
+        "--real", action="store_true", default=False, help="use the lxc commands"
+    )
+    options = parser.parse_args()
+    logging.getLogger("dispatcher").disabled = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = pathlib.Path(tmp)
+        lxc_path = pathlib.Path("/var/lib/lxc") if options.real else tmpdir / "lxc"
+        lxc_path.mkdir(exist_ok=True)
+        with contextlib.ExitStack() as stack:
+            # The bbb part of the sample job
+            for (target, value) in [
+                ("lava_dispatcher.utils.filesystem.tftpd_dir", lambda: tmp),
+                ("lava_dispatcher.job.DISPATCHER_DOWNLOAD_DIR", tmp),
+            ]:
+                stack.enter_context(mock.patch(target, value))
+            if not options.real:
+                stack.enter_context(fake_lxc(tmpdir, options.scale))
+            results = {}
+            for (name, cache) in [("before", False), ("after", True)]:
+                results[name] = []
+                for _ in range(options.jobs):
+                    (duration, container) = setup(lxc_path, cache)
+                    results[name].append(duration)
+                    subprocess.check_call(  # nosec - benchmark
+                        ["lxc-destroy", "-n", container, "-f"]
+                    )
+            # Remove the cached base containers
+            for base in lxc_path.glob("lava-cache-*/"):
+                subprocess.check_call(  # nosec - benchmark
+                    ["lxc-destroy", "-n", base.name, "-f"]
+                )
+
+    if options.real:
+        print("container setup by job (seconds)")
+    else:
+        print("container setup by job (seconds, fake durations x%s)" % options.scale)
+    print("%-8s %10s %10s %10s" % ("", "first", "median", "mean"))
+    for (name, durations) in results.items():
+        print(
+            "%-8s %10.2f %10.2f %10.2f"
+            % (
+                name,
+                durations[0],
+                statistics.median(durations[1:] or durations),
+                statistics.mean(durations),
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
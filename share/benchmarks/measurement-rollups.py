@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the trend of a test case measurement computed from the raw
+measurements and from the rollups, on a generated dataset.
+
+The dataset is generated job by job: each job runs one suite on one device
+type and reports a measurement for every test case of the suite. The
+rollups are updated after each job, like the ingestion does, but kept in
+memory: the database writes are not measured.
+
+* raw: scan every measurement, keep the ones of the test case and compute
+  the daily count, min, max, mean and percentiles (like a query over
+  TestCase joined with TestSuite and TestJob)
+* rollup: merge the daily rollups of the test case
+"""
+
+import argparse
+import array
+import datetime
+import os
+import pathlib
+import random
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lava_server.settings.dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from lava_results_app.models import MeasurementRollup  # noqa: E402
+
+
+class Dataset:
+    """
+    The raw measurements, stored in columns to keep the memory usage low
+    """
+
+    def __init__(self):
+        self.suite = array.array("H")
+        self.case = array.array("H")
+        self.device_type = array.array("H")
+        self.day = array.array("H")
+        self.value = array.array("d")
+
+    def __len__(self):
+        return len(self.value)
+
+
+def generate(options, rnd):
+    dataset = Dataset()
+    rollups = {}
+    first_day = datetime.date(2023, 1, 1)
+    ingestion = 0.0
+    while len(dataset) < options.measurements:
+        suite = rnd.randrange(options.suites)
+        device_type = rnd.randrange(options.device_types)
+        day = rnd.randrange(options.days)
+        job = []
+        for case in range(options.cases):
+            # Each test case has its own scale
+            value = rnd.lognormvariate(case % 7, 0.3)
+            dataset.suite.append(suite)
+            dataset.case.append(case)
+            dataset.device_type.append(device_type)
+            dataset.day.append(day)
+            dataset.value.append(value)
+            job.append((case, value))
+
+        # Same work as update_measurement_rollups(), without the database
+        start = time.monotonic()
+        bucket = first_day + datetime.timedelta(days=day)
+        for (case, value) in job:
+            key = (suite, case, device_type, bucket)
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = MeasurementRollup(bucket=bucket, histogram={})
+            rollup.add([value])
+        ingestion += time.monotonic() - start
+    return (dataset, rollups, ingestion)
+
+
+def trend_raw(dataset, suite, case):
+    days = {}
+    for index in range(len(dataset)):
+        if dataset.suite[index] == suite and dataset.case[index] == case:
+            days.setdefault(dataset.day[index], []).append(dataset.value[index])
+    trend = {}
+    for (day, values) in sorted(days.items()):
+        values.sort()
+        trend[day] = {
+            "count": len(values),
+            "min": values[0],
+            "max": values[-1],
+            "mean": statistics.fmean(values),
+            "percentiles": {
+                str(p): values[int(p / 100 * (len(values) - 1))]
+                for p in MeasurementRollup.PERCENTILES
+            },
+        }
+    return trend
+
+
+def trend_rollups(rollups):
+    first_day = datetime.date(2023, 1, 1)
+    days = {}
+    # The database selects the rows with the (suite, name, ...) index
+    for rollup in rollups:
+        day = (rollup.bucket - first_day).days
+        if day in days:
+            days[day].merge(rollup)
+        else:
+            merged = days[day] = MeasurementRollup(histogram={})
+            merged.merge(rollup)
+    return {
+        day: {
+            "count": r.count,
+            "min": r.minimum,
+            "max": r.maximum,
+            "mean": r.mean,
+            "percentiles": r.percentiles(),
+        }
+        for (day, r) in sorted(days.items())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--measurements", type=int, default=2000000, help="number of measurements"
+    )
+    parser.add_argument("--suites", type=int, default=10, help="number of suites")
+    parser.add_argument("--cases", type=int, default=50, help="test cases per suite")
+    parser.add_argument(
+        "--device-types", type=int, default=4, help="number of device types"
+    )
+    parser.add_argument("--days", type=int, default=60, help="number of days")
+    parser.add_argument("--queries", type=int, default=5, help="number of trends")
+    options = parser.parse_args()
+
+    rnd = random.Random(42)
+    start = time.monotonic()
+    (dataset, rollups, ingestion) = generate(options, rnd)
+    print(
+        "%d measurements, %d rollups (generated in %.1fs)"
+        % (len(dataset), len(rollups), time.monotonic() - start)
+    )
+    print(
+        "ingestion: %.2fus per measurement to update the rollups"
+        % (ingestion / len(dataset) * 1000000)
+    )
+
+    by_case = {}
+    for ((suite, case, _, _), rollup) in rollups.items():
+        by_case.setdefault((suite, case), []).append(rollup)
+
+    raw_times = []
+    rollup_times = []
+    errors = []
+    for _ in range(options.queries):
+        suite = rnd.randrange(options.suites)
+        case = rnd.randrange(options.cases)
+
+        start = time.monotonic()
+        raw = trend_raw(dataset, suite, case)
+        raw_times.append(time.monotonic() - start)
+
+        start = time.monotonic()
+        rolled = trend_rollups(by_case.get((suite, case), []))
+        rollup_times.append(time.monotonic() - start)
+
+        assert raw.keys() == rolled.keys()  # nosec - benchmark
+        for day in raw:
+            assert raw[day]["count"] == rolled[day]["count"]  # nosec - benchmark
+            for (p, value) in raw[day]["percentiles"].items():
+                errors.append(abs(rolled[day]["percentiles"][p] - value) / value)
+
+    print("%-8s %12s" % ("", "trend query"))
+    print("%-8s %10.2fms" % ("raw", statistics.median(raw_times) * 1000))
+    print("%-8s %10.2fms" % ("rollup", statistics.median(rollup_times) * 1000))
+    print(
+        "percentiles relative error: max %.3f%%, mean %.3f%%"
+        % (max(errors) * 100, statistics.fmean(errors) * 100)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
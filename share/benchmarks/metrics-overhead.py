@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the overhead of the metrics on the log ingestion.
+
+The requests of lava-run (1000 lines by default) are parsed and saved in the
+filesystem log backend like internal_v1_jobs_logs() does, with and without
+the metrics recorded by the view. The runs are interleaved to share the
+noise of the machine.
+
+As the difference is smaller than the noise of the end to end timings, the
+cost of the metrics is also measured alone and compared to the time of a
+request.
+"""
+
+import argparse
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+settings.configure(LAVA_LOG_BACKEND="lava_scheduler_app.logutils.LogsFilesystem")
+
+from lava_common.log import dump  # noqa: E402
+from lava_common.metrics import Counter, Histogram, Registry  # noqa: E402
+from lava_common.yaml import yaml_safe_load  # noqa: E402
+from lava_scheduler_app.logutils import LogsFilesystem  # noqa: E402
+
+REGISTRY = Registry()
+LOGS_LINES = REGISTRY.register(Counter("lava_logs_lines_total", "Lines"))
+LOGS_BATCH = REGISTRY.register(
+    Histogram(
+        "lava_logs_batch_lines",
+        "Lines by request",
+        buckets=(1, 5, 10, 50, 100, 500, 1000, 5000),
+    )
+)
+LOGS_DURATION = REGISTRY.register(Histogram("lava_logs_request_seconds", "Duration"))
+
+
+class Job:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+
+def build_request(lines):
+    return "\n".join(
+        "- "
+        + dump(
+            {
+                "dt": "2023-01-01T00:00:%02d" % (i % 60),
+                "lvl": "target",
+                "msg": "line %d of the boot log" % i,
+            }
+        )
+        for i in range(lines)
+    )
+
+
+def record(line_count, begin):
+    LOGS_LINES.inc(line_count)
+    LOGS_BATCH.observe(line_count)
+    LOGS_DURATION.observe(time.perf_counter() - begin)
+
+
+def ingest(logs, job, output, index, lines, instrumented):
+    begin = time.perf_counter()
+    line_count = 0
+    for (line, string) in zip(yaml_safe_load(lines), lines.split("\n")):
+        logs.write(job, (string + "\n").encode("utf-8"), output, index)
+        line_count += 1
+    if instrumented:
+        record(line_count, begin)
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines", type=int, default=1000, help="number of lines by request"
+    )
+    parser.add_argument("--requests", type=int, default=200, help="number of requests")
+    options = parser.parse_args()
+
+    lines = build_request(options.lines)
+    logs = LogsFilesystem()
+    timings = {False: [], True: []}
+    with tempfile.TemporaryDirectory() as tmp:
+        job = Job(tmp)
+        path = pathlib.Path(tmp)
+        with (path / "output.yaml").open("ab") as output, (path / "output.idx").open(
+            "ab"
+        ) as index:
+            for i in range(options.requests):
+                for instrumented in [bool(i % 2), not (i % 2)]:
+                    timings[instrumented].append(
+                        ingest(logs, job, output, index, lines, instrumented)
+                    )
+
+    # Cost of the metrics alone
+    count = 100000
+    begin = time.perf_counter()
+    for _ in range(count):
+        record(options.lines, begin)
+    metrics_cost = (time.perf_counter() - begin) / count
+
+    before = statistics.median(timings[False])
+    after = statistics.median(timings[True])
+    print("%d requests of %d lines" % (options.requests, options.lines))
+    print("%-14s %10s" % ("", "request"))
+    print("%-14s %8.2fms" % ("without", before * 1000))
+    print("%-14s %8.2fms" % ("with metrics", after * 1000))
+    print(
+        "end to end: %+.3f%% (median, includes the noise of the machine)"
+        % ((after - before) / before * 100)
+    )
+    print(
+        "metrics alone: %.2fus by request, %.4f%% of a request"
+        % (metrics_cost * 1000000, metrics_cost / before * 100)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Run a MultiNode group against a local coordinator and report how the lava_sync
+latency is distributed: the time between the last role reaching the sync and
+each role being released.
+
+The group is run with the persistent connections (the coordinator pushes the
+response) and with the previous polling, where each role asks again every
+poll_delay seconds.
+"""
+
+import argparse
+import multiprocessing
+import pathlib
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava.coordinator import LavaCoordinator  # noqa: E402
+from lava_dispatcher.protocols.multinode import MultinodeProtocol  # noqa: E402
+from tests.utils import DummyLogger  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def protocol(port, group, size, index, persistent, poll_delay):
+    parameters = {
+        "protocols": {
+            "lava-multinode": {
+                "target_group": group,
+                "role": "role%d" % index,
+                "group_size": size,
+            }
+        }
+    }
+    proto = MultinodeProtocol(parameters, "%s-%d" % (group, index))
+    proto.logger = DummyLogger()
+    proto.settings = {
+        "port": port,
+        "blocksize": 4096,
+        "poll_delay": poll_delay,
+        "coordinator_hostname": "localhost",
+        "persistent": persistent,
+    }
+    proto.base_message = {
+        "hostname": "localhost",
+        "client_name": proto.job_id,
+        "group_name": group,
+        "role": "role%d" % index,
+    }
+    return proto
+
+
+def run_group(port, group, size, rounds, persistent, poll_delay):
+    """
+    Return the list of sync latencies
+    """
+    barrier = threading.Barrier(size)
+    times = [[None] * size for _ in range(rounds)]
+
+    def job(index):
+        proto = protocol(port, group, size, index, persistent, poll_delay)
+        proto.initialise_group()
+        for sync in range(rounds):
+            barrier.wait()
+            start = time.monotonic()
+            proto.request_sync("sync-%d" % sync)
+            times[sync][index] = (start, time.monotonic())
+        proto.finalise_protocol()
+
+    threads = [threading.Thread(target=job, args=[i]) for i in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = []
+    for values in times:
+        last = max(start for (start, _) in values)
+        latencies.extend(end - last for (_, end) in values)
+    return latencies
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roles", type=int, default=64, help="size of the group")
+    parser.add_argument("--rounds", type=int, default=5, help="syncs per role")
+    parser.add_argument(
+        "--poll-delay", type=float, default=1, help="poll_delay of the coordinator"
+    )
+    options = parser.parse_args()
+
+    port = free_port()
+    coordinator = LavaCoordinator("localhost", port, 4096)
+    server = multiprocessing.Process(target=coordinator.run, daemon=True)
+    server.start()
+    try:
+        print(
+            "%-10s %8s %8s %8s %8s %8s" % ("mode", "mean", "p50", "p90", "p99", "max")
+        )
+        for (name, persistent) in [("polling", False), ("push", True)]:
+            latencies = run_group(
+                port,
+                name,
+                options.roles,
+                options.rounds,
+                persistent,
+                options.poll_delay,
+            )
+            print(
+                "%-10s %7.1fms %7.1fms %7.1fms %7.1fms %7.1fms"
+                % (
+                    name,
+                    statistics.mean(latencies) * 1000,
+                    percentile(latencies, 50) * 1000,
+                    percentile(latencies, 90) * 1000,
+                    percentile(latencies, 99) * 1000,
+                    max(latencies) * 1000,
+                )
+            )
+    finally:
+        server.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the cost of the namespace data on real pipelines built from the
+sample jobs of the test suite.
+
+For each job, the pipeline is validated with the NamespaceData store and with
+the previous behavior (a deep copy on every read). Every access made during
+the validation is recorded and replayed, to measure the cost of the reads
+done again by run() and cleanup().
+"""
+
+import argparse
+import contextlib
+import copy
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import requests
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lava_dispatcher.logical import NamespaceData  # noqa: E402
+from tests.lava_dispatcher.test_basic import Factory  # noqa: E402
+
+JOBS = [
+    ("qemu01.jinja2", "sample_jobs/kvm.yaml"),
+    ("kvm02.jinja2", "sample_jobs/qemu-nfs.yaml"),
+    ("bbb-01.jinja2", "sample_jobs/uboot-ramdisk.yaml"),
+    ("d02-01.jinja2", "sample_jobs/grub-nfs.yaml"),
+    ("hi6220-hikey-01.jinja2", "sample_jobs/fastboot.yaml"),
+    ("tc2-01.jinja2", "sample_jobs/tc2.yaml"),
+    ("x86-01.jinja2", "sample_jobs/ipxe.yaml"),
+]
+
+
+class PlainData(dict):
+    """
+    The previous storage: plain dicts and a deep copy on every read.
+    """
+
+    def get_value(self, namespace, action, label, key, deepcopy=True):
+        value = self.get(namespace, {}).get(action, {}).get(label, {}).get(key)
+        if value is None:
+            return None
+        return copy.deepcopy(value) if deepcopy else value
+
+    def set_value(self, namespace, action, label, key, value, writer=None):
+        self.setdefault(namespace, {})
+        self[namespace].setdefault(action, {})
+        self[namespace][action].setdefault(label, {})
+        self[namespace][action][label][key] = value
+
+
+def recording(cls, trace):
+    class Recording(cls):
+        def get_value(self, *args, **kwargs):
+            trace.append(("get", args, kwargs))
+            return super().get_value(*args, **kwargs)
+
+        def set_value(self, *args, **kwargs):
+            trace.append(("set", args, kwargs))
+            return super().set_value(*args, **kwargs)
+
+    return Recording
+
+
+def head(url, allow_redirects, headers, timeout):
+    res = requests.Response()
+    res.status_code = requests.codes.OK
+    res.close = lambda: None
+    return res
+
+
+@contextlib.contextmanager
+def fake_host(tmpdir):
+    """
+    Fake the network and the host tools, like the test suite, so that the
+    pipelines validate on any machine.
+    """
+    with contextlib.ExitStack() as stack:
+        for (target, value) in [
+            ("requests.head", head),
+            (
+                "lava_dispatcher.actions.deploy.download.requests_retry",
+                lambda: requests,
+            ),
+            (
+                "lava_dispatcher.utils.shell._which_check",
+                lambda path, match: "/bin/true",
+            ),
+            ("lava_dispatcher.utils.filesystem.tftpd_dir", lambda: tmpdir),
+            ("lava_dispatcher.job.DISPATCHER_DOWNLOAD_DIR", tmpdir),
+            (
+                "lava_dispatcher.actions.boot.qemu.CallQemuAction.get_raw_version",
+                lambda self, arch: "QEMU emulator version 7.2.0",
+            ),
+        ]:
+            stack.enter_context(mock.patch(target, value))
+        yield
+
+
+def validate(factory, template, job_file, cls):
+    job = factory.create_job(template, job_file)
+    # populate() already stored data
+    job.__context__.pipeline_data = cls(job.context)
+    start = time.monotonic()
+    job.pipeline.validate_actions()
+    return (time.monotonic() - start, len(job.pipeline.describe()))
+
+
+def replay(cls, trace, repeat):
+    data = cls()
+    start = time.monotonic()
+    for _ in range(repeat):
+        for (op, args, kwargs) in trace:
+            if op == "get":
+                data.get_value(*args, **kwargs)
+            else:
+                data.set_value(*args, **kwargs)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10, help="number of runs")
+    parser.add_argument(
+        "--replay", type=int, default=100, help="number of replays of the accesses"
+    )
+    options = parser.parse_args()
+
+    factory = Factory()
+    print("%-20s %8s %21s %21s" % ("", "", "validate", "replay"))
+    print(
+        "%-20s %8s %10s %10s %10s %10s"
+        % ("job", "accesses", "before", "after", "before", "after")
+    )
+    with tempfile.TemporaryDirectory() as tmpdir, fake_host(tmpdir):
+        for (template, job_file) in JOBS:
+            trace = []
+            validate(factory, template, job_file, recording(NamespaceData, trace))
+
+            results = {}
+            for cls in [PlainData, NamespaceData]:
+                results[cls] = statistics.median(
+                    validate(factory, template, job_file, cls)[0]
+                    for _ in range(options.repeat)
+                )
+                results[(cls, "replay")] = statistics.median(
+                    replay(cls, trace, options.replay) for _ in range(options.repeat)
+                )
+            print(
+                "%-20s %8d %8.2fms %8.2fms %8.2fms %8.2fms"
+                % (
+                    pathlib.Path(job_file).name,
+                    len(trace),
+                    results[PlainData] * 1000,
+                    results[NamespaceData] * 1000,
+                    results[(PlainData, "replay")] * 1000,
+                    results[(NamespaceData, "replay")] * 1000,
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
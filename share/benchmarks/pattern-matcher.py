@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare pexpect list patterns with the pre-compiled PatternMatcher on a
+synthetic, chatty, console output.
+
+The same patterns as the lava-test-shell are used, along with the kernel
+messages. The output is read through "cat" with the same settings as
+ShellCommand.
+"""
+
+import argparse
+import pathlib
+import random
+import re
+import sys
+import tempfile
+import time
+
+import pexpect
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava_dispatcher.utils.matcher import PatternMatcher  # noqa: E402
+from lava_dispatcher.utils.messages import LinuxKernelMessages  # noqa: E402
+
+PATTERNS = [
+    "<LAVA_TEST_RUNNER EXIT>",
+    "<LAVA_TEST_RUNNER INSTALL_FAIL>",
+    pexpect.EOF,
+    pexpect.TIMEOUT,
+    r"<LAVA_SIGNAL_(\S+) ([^>]+)>",
+] + LinuxKernelMessages.get_init_prompts()
+
+# Patterns without a literal prefix, as used by test definitions and monitors
+EXTRA_PATTERNS = [
+    re.compile(
+        r"(?P<test_case_id>.*-*)\s+:\s+(?P<result>(PASS|pass|FAIL|fail|SKIP|skip))",
+        re.M,
+    ),
+    r"(?P<test_case_id>\w+)\s+(?P<measurement>\d+\.\d+)\s+(?P<units>ms|MB/s)\n",
+    r"\w+ test suite (finished|aborted)",
+]
+
+
+def generate(path, size, signal_every):
+    rand = random.Random(42)
+    count = 0
+    with path.open("w") as f_out:
+        written = 0
+        while written < size:
+            count += 1
+            if count % signal_every == 0:
+                line = (
+                    "<LAVA_SIGNAL_TESTCASE TEST_CASE_ID=case-%d RESULT=pass>\n" % count
+                )
+            else:
+                line = "[ %10.6f] %s\n" % (
+                    count / 1000,
+                    " ".join(
+                        "".join(rand.choices("abcdefghijklmnopqrstuvwxyz", k=8))
+                        for _ in range(rand.randint(2, 12))
+                    ),
+                )
+            f_out.write(line)
+            written += len(line)
+
+
+def run(path, patterns, use_matcher):
+    child = pexpect.spawn(
+        "cat",
+        [str(path)],
+        encoding="utf-8",
+        searchwindowsize=4000,
+        maxread=2000,
+        codec_errors="replace",
+    )
+    matches = 0
+    start_cpu = time.process_time()
+    start = time.monotonic()
+    if use_matcher:
+        matcher = PatternMatcher(patterns)
+        while child.expect_loop(matcher, timeout=30, searchwindowsize=None) != 2:
+            matches += 1
+    else:
+        while child.expect(patterns, timeout=30) != 2:
+            matches += 1
+    return (matches, time.monotonic() - start, time.process_time() - start_cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--size", type=int, default=20, help="size of the console output in MB"
+    )
+    parser.add_argument(
+        "--signal-every",
+        type=int,
+        default=20,
+        help="one signal is emitted every N lines",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="number of runs for each method"
+    )
+    parser.add_argument(
+        "--extra-patterns",
+        action="store_true",
+        default=False,
+        help="also look for patterns without a literal prefix",
+    )
+    options = parser.parse_args()
+    patterns = PATTERNS + (EXTRA_PATTERNS if options.extra_patterns else [])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "console.txt"
+        generate(path, options.size * 1024 * 1024, options.signal_every)
+        size = path.stat().st_size / 1024 / 1024
+
+        print("%d patterns, %.1f MB of console output" % (len(patterns), size))
+        for name, use_matcher in [("pexpect", False), ("matcher", True)]:
+            results = [run(path, patterns, use_matcher) for _ in range(options.repeat)]
+            matches = {r[0] for r in results}
+            wall = min(r[1] for r in results)
+            cpu = min(r[2] for r in results)
+            print(
+                "%-8s: %s matches, %.2fs wall, %.2fs cpu, %.1f MB/s"
+                % (name, "/".join(str(m) for m in matches), wall, cpu, size / wall)
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
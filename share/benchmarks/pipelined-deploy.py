@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Measure the duration of a fastboot deploy (nexus4-minus-lxc.yaml sample job)
+with images served by a local HTTP server:
+
+* serial: every image is downloaded before the device is reset, then flashed
+* pipelined: the images are downloaded in the background ("pipelined: true"),
+  each image being flashed as soon as it's available
+
+The server sends --size MB by image at --bandwidth MB/s by connection. The
+fastboot binary is faked: "fastboot flash" writes at --flash MB/s and entering
+fastboot mode takes --reset seconds.
+"""
+
+import argparse
+import contextlib
+import http.server
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lava_common.constants import PIPELINED_DOWNLOADS  # noqa: E402
+from lava_common.yaml import yaml_safe_load  # noqa: E402
+from lava_dispatcher.actions.deploy.download import (  # noqa: E402
+    DownloaderAction,
+    DownloadQueueAction,
+    WaitDownloadAction,
+)
+from lava_dispatcher.actions.deploy.fastboot import (  # noqa: E402
+    FastbootFlashAction,
+    FastbootFlashOrderAction,
+)
+from tests.lava_dispatcher.test_fastboot import FastBootFactory  # noqa: E402
+
+MB = 1024 * 1024
+
+FAKE_FASTBOOT = """#!%s
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+if "flash" in args:
+    size = os.stat(args[-1]).st_size
+    time.sleep(size / (float(os.environ["FAKE_FASTBOOT_RATE"]) * 1024 * 1024))
+"""
+
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(self.server.size * MB))
+        self.end_headers()
+
+    def do_GET(self):
+        self.do_HEAD()
+        data = bytes(MB)
+        for _ in range(self.server.size):
+            time.sleep(1 / self.server.bandwidth)
+            self.wfile.write(data)
+
+
+@contextlib.contextmanager
+def image_server(size, bandwidth):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    server.daemon_threads = True
+    server.size = size
+    server.bandwidth = bandwidth
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def fake_fastboot(tmpdir, rate):
+    bindir = tmpdir / "bin"
+    bindir.mkdir()
+    script = bindir / "fastboot"
+    script.write_text(FAKE_FASTBOOT % sys.executable, encoding="utf-8")
+    script.chmod(0o755)
+    env = {
+        "PATH": str(bindir) + ":" + os.environ["PATH"],
+        "FAKE_FASTBOOT_RATE": str(rate),
+    }
+    old = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for (k, v) in old.items():
+            if v is None:
+                del os.environ[k]
+            else:
+                os.environ[k] = v
+
+
+def deploy(url, pipelined, options):
+    """
+    Run the download and flash actions of the fastboot deploy, the device
+    actions being replaced by a sleep.
+    """
+    path = ROOT / "tests" / "lava_dispatcher" / "sample_jobs" / "nexus4-minus-lxc.yaml"
+    job_data = yaml_safe_load(path.read_text(encoding="utf-8"))
+    params = job_data["actions"][0]["deploy"]
+    params["images"] = {
+        name: {"url": "%s/%s.img" % (url, name)}
+        for name in ["boot", "system", "userdata", "vendor", "cache"][: options.images]
+    }
+    params["timeout"] = {"minutes": 30}
+    if pipelined:
+        params["pipelined"] = True
+    job = FastBootFactory().create_custom_job("nexus4-01.jinja2", job_data)
+    action = job.pipeline.actions[0]
+
+    flash_order = action.pipeline.actions[-1]
+    assert isinstance(flash_order, FastbootFlashOrderAction)  # nosec - benchmark
+    steps = []
+    for sub in action.pipeline.actions:
+        if isinstance(sub, (DownloaderAction, DownloadQueueAction)):
+            sub.validate()
+            steps.append(sub)
+        elif sub.name == "enter-fastboot-action":
+            steps.append(None)
+    for sub in flash_order.pipeline.actions:
+        if isinstance(sub, (FastbootFlashAction, WaitDownloadAction)):
+            sub.validate()
+            steps.append(sub)
+
+    max_end_time = time.monotonic() + 1800
+    begin = time.monotonic()
+    try:
+        for step in steps:
+            if step is None:
+                time.sleep(options.reset)
+            else:
+                step.run(None, max_end_time)
+        return time.monotonic() - begin
+    finally:
+        job.cleanup(None)
+
+
+def expected_serial(options):
+    download = options.size / options.bandwidth
+    flash = options.size / options.flash
+    return options.reset + options.images * (download + flash)
+
+
+def expected_pipelined(options):
+    """
+    The downloads are running PIPELINED_DOWNLOADS at a time and every image
+    is flashed when downloaded and after the previous one.
+    """
+    download = options.size / options.bandwidth
+    flash = options.size / options.flash
+    end = options.reset
+    for index in range(options.images):
+        end = max(end, (index // PIPELINED_DOWNLOADS + 1) * download) + flash
+    return end
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=4, help="number of images")
+    parser.add_argument("--size", type=int, default=64, help="image size (MB)")
+    parser.add_argument(
+        "--bandwidth", type=float, default=32, help="download speed (MB/s)"
+    )
+    parser.add_argument("--flash", type=float, default=32, help="flash speed (MB/s)")
+    parser.add_argument(
+        "--reset", type=float, default=5, help="entering fastboot mode (s)"
+    )
+    options = parser.parse_args()
+    logging.getLogger("dispatcher").disabled = True
+
+    print(
+        "%d images of %dMB, download %sMB/s, flash %sMB/s, reset %ss"
+        % (
+            options.images,
+            options.size,
+            options.bandwidth,
+            options.flash,
+            options.reset,
+        )
+    )
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = pathlib.Path(tmp)
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                mock.patch("lava_dispatcher.job.DISPATCHER_DOWNLOAD_DIR", tmp)
+            )
+            stack.enter_context(fake_fastboot(tmpdir, options.flash))
+            url = stack.enter_context(image_server(options.size, options.bandwidth))
+            for (name, pipelined) in [("serial", False), ("pipelined", True)]:
+                results[name] = deploy(url, pipelined, options)
+
+    print("%-10s %10s %10s" % ("", "duration", "expected"))
+    for (name, expected) in [
+        ("serial", expected_serial(options)),
+        ("pipelined", expected_pipelined(options)),
+    ]:
+        print("%-10s %9.2fs %9.2fs" % (name, results[name], expected))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
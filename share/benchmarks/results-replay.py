@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+
+"""
+Compare the serial traffic needed to report the results of a test job:
+
+* before: one lava-test-case call by test case, each one printing the
+  STARTTC, TESTCASE and ENDTC signals
+* after: lava-test-results sending the compressed file in checksummed chunks,
+  the lost chunks being requested again
+
+The console is simulated: --baud bits per second with 10 bits by character,
+each line being lost with the probability --loss. The replies of the
+dispatcher are sent on the other direction of the link and are not counted.
+The dispatcher column is the time spent matching and decoding the signals.
+"""
+
+import argparse
+import base64
+import gzip
+import pathlib
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava_dispatcher.connection import SignalMatch  # noqa: E402
+from lava_dispatcher.utils.results import ResultsBatch, cksum  # noqa: E402
+
+SIGNAL = re.compile(r"<LAVA_SIGNAL_(\S+) ([^>]+)>")
+RESULTS = ["pass", "pass", "pass", "fail", "skip"]
+
+
+def generate(count, rand):
+    lines = []
+    for index in range(count):
+        case = "test-case-%05d" % index
+        if index % 10:
+            lines.append("%s %s" % (case, rand.choice(RESULTS)))
+        else:
+            lines.append("%s pass %.3f ms" % (case, rand.uniform(0, 100)))
+    return "\n".join(lines) + "\n"
+
+
+class Link:
+    def __init__(self, loss, rand):
+        self.loss = loss
+        self.rand = rand
+        self.lines = 0
+        self.sent = 0
+
+    def send(self, line):
+        self.lines += 1
+        self.sent += len(line) + 2
+        if self.rand.random() < self.loss:
+            return None
+        return SIGNAL.search(line)
+
+
+def before(text, link):
+    match = SignalMatch()
+    received = 0
+    duration = 0
+    for line in text.splitlines():
+        fields = line.split()
+        data = "TEST_CASE_ID=%s RESULT=%s" % (fields[0], fields[1])
+        if len(fields) > 2:
+            data += " MEASUREMENT=%s UNITS=%s" % (fields[2], fields[3])
+        signals = [
+            "<LAVA_SIGNAL_STARTTC %s>" % fields[0],
+            "<LAVA_SIGNAL_TESTCASE %s>" % data,
+            "<LAVA_SIGNAL_ENDTC %s>" % fields[0],
+        ]
+        for signal in signals:
+            result = link.send(signal)
+            begin = time.monotonic()
+            if result is not None and result.group(1) == "TESTCASE":
+                params = dict(param.split("=", 1) for param in result.group(2).split())
+                match.match({key.lower(): value for (key, value) in params.items()})
+                received += 1
+            duration += time.monotonic() - begin
+    return (received, duration)
+
+
+def after(text, link, size, retries):
+    data = base64.b64encode(gzip.compress(text.encode())).decode()
+    chunks = [data[index : index + size] for index in range(0, len(data), size)]
+    duration = 0
+
+    def send(line):
+        nonlocal duration
+        result = link.send(line)
+        begin = time.monotonic()
+        if result is not None:
+            params = result.group(2).split()
+            if params[0] == "START":
+                send.batch = ResultsBatch(params[2], params[3], int(params[4]))
+            elif params[0] == "CHUNK" and send.batch is not None:
+                send.batch.add(int(params[2]), int(params[3]), params[4])
+        duration += time.monotonic() - begin
+        return result
+
+    send.batch = None
+    send("<LAVA_SIGNAL_RESULTS START 42 lava gzip+base64 %d>" % len(chunks))
+    missing = range(1, len(chunks) + 1)
+    for _ in range(retries + 1):
+        for index in missing:
+            chunk = chunks[index - 1]
+            send(
+                "<LAVA_SIGNAL_RESULTS CHUNK 42 %d %d %s>"
+                % (index, cksum(chunk.encode()), chunk)
+            )
+        end = send("<LAVA_SIGNAL_RESULTS END 42>")
+        if send.batch is None:
+            # The START signal was lost: the batch is rejected
+            break
+        if end is None:
+            # No reply: lava-test-results sends END again
+            missing = []
+            continue
+        missing = send.batch.missing()
+        if not missing:
+            begin = time.monotonic()
+            received = len(send.batch.results())
+            return (received, duration + time.monotonic() - begin)
+    return (0, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=5000, help="test cases")
+    parser.add_argument("--baud", type=int, default=115200, help="serial speed")
+    parser.add_argument("--loss", type=float, default=0.001, help="lost lines")
+    parser.add_argument("--chunk-size", type=int, default=512, help="chunk size")
+    options = parser.parse_args()
+
+    rand = random.Random(options.cases)  # nosec - benchmark
+    text = generate(options.cases, rand)
+    print(
+        "%d test cases, %d baud, %.2f%% of the lines lost"
+        % (options.cases, options.baud, options.loss * 100)
+    )
+    print(
+        "%-8s %8s %10s %10s %10s %10s"
+        % ("", "lines", "bytes", "serial", "dispatcher", "received")
+    )
+    for name in ["before", "after"]:
+        link = Link(options.loss, random.Random(options.loss))  # nosec - benchmark
+        if name == "before":
+            (received, duration) = before(text, link)
+        else:
+            (received, duration) = after(text, link, options.chunk_size, 3)
+        print(
+            "%-8s %8d %10d %9.2fs %8.2fms %10d"
+            % (
+                name,
+                link.lines,
+                link.sent,
+                link.sent * 10 / options.baud,
+                duration * 1000,
+                received,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
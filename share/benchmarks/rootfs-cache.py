@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the time and the bytes written to disk when extracting a rootfs:
+
+* without the cache, like before (untar in the job directory)
+* cold: the archive is extracted in the rootfs cache
+* warm: the job gets a view of the already extracted tree
+
+The rootfs is a synthetic tarball of --size MB. Run as root to benchmark the
+overlayfs views, otherwise the tree is copied (with reflinks if supported).
+"""
+
+import argparse
+import logging
+import os
+import pathlib
+import statistics
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava_dispatcher.utils.compression import untar_file  # noqa: E402
+from lava_dispatcher.utils.rootfs import RootfsCache, RootfsView  # noqa: E402
+
+
+def make_rootfs(tmpdir, size):
+    tree = tmpdir / "tree"
+    for index in range(size):
+        directory = tree / ("usr/lib/%02d" % (index // 64))
+        directory.mkdir(parents=True, exist_ok=True)
+        # Half random data to keep some compression
+        data = os.urandom(512 * 1024) + bytes(512 * 1024)
+        (directory / ("lib%d.so" % index)).write_bytes(data)
+    archive = tmpdir / "rootfs.tar.gz"
+    with tarfile.open(str(archive), "w:gz", compresslevel=1) as tar:
+        tar.add(str(tree), arcname=".")
+    return str(archive)
+
+
+def used(path):
+    stat = os.statvfs(str(path))
+    return (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+
+
+def measure(func, path):
+    os.sync()
+    before = used(path)
+    start = time.monotonic()
+    func()
+    os.sync()
+    return (time.monotonic() - start, max(used(path) - before, 0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300, help="rootfs size in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="number of warm runs")
+    parser.add_argument("--tmpdir", default=None, help="where to store the files")
+    options = parser.parse_args()
+
+    logger = logging.getLogger("benchmark")
+    with tempfile.TemporaryDirectory(dir=options.tmpdir) as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        archive = make_rootfs(tmpdir, options.size)
+        cache = RootfsCache(tmpdir / "cache", 10 * options.size * 1024 * 1024)
+        (tmpdir / "cache").mkdir()
+
+        jobs = iter(range(1000))
+
+        def job_dir():
+            path = tmpdir / ("job-%d" % next(jobs))
+            path.mkdir()
+            return str(path)
+
+        results = {"untar": [], "cold": [], "warm": []}
+        results["untar"].append(measure(lambda: untar_file(archive, job_dir()), tmpdir))
+
+        views = []
+
+        def view():
+            views.append(RootfsView(cache, logger))
+            views[-1].create(archive, "0123", job_dir())
+
+        try:
+            results["cold"].append(measure(view, tmpdir))
+            method = "overlayfs" if views[0].mountpoint else "copy"
+            for _ in range(options.repeat):
+                results["warm"].append(measure(view, tmpdir))
+        finally:
+            for item in views:
+                item.remove()
+
+        print("rootfs: %d MB, view: %s" % (options.size, method))
+        for (name, values) in results.items():
+            print(
+                "%-6s %8.3fs %10.1f MB written"
+                % (
+                    name,
+                    statistics.median(v[0] for v in values),
+                    statistics.median(v[1] for v in values) / (1024 * 1024),
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the bytes written and the time needed to apply an overlay to an
+Android sparse image:
+
+* before: simg2img, modification of the raw image, img2simg
+* after: raw view with holes, modification, only the changes written back
+
+The sparse image is generated: --size MB of which --data MB are raw data, the
+rest being "don't care" and zero fill chunks. The modification writes --overlay
+MB of new data and changes some existing blocks, like an overlay would.
+
+When simg2img and img2simg are not installed, they are emulated: simg2img
+writes the raw and fill chunks, img2simg reads the whole raw image and writes
+every non-empty block.
+"""
+
+import argparse
+import hashlib
+import os
+import pathlib
+import random
+import shutil
+import subprocess  # nosec - benchmark
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+from lava_dispatcher.utils.sparse import (  # noqa: E402
+    BUFFER_SIZE,
+    CHUNK_TYPE_DONT_CARE,
+    CHUNK_TYPE_FILL,
+    CHUNK_TYPE_RAW,
+    ZERO,
+    SparseImage,
+    SparseWriter,
+)
+
+BLOCK = 4096
+MB = 1024 * 1024
+
+
+def generate(path, size, data):
+    """
+    Alternate raw chunks of 1MB, "don't care" and zero fill chunks.
+    """
+    rand = random.Random(size)  # nosec - benchmark
+    blocks = size * MB // BLOCK
+    raw = MB // BLOCK
+    # Each raw chunk is followed by empty blocks
+    gap = (blocks - data * raw) // data
+    with open(str(path), "wb") as f_out:
+        writer = SparseWriter(f_out.fileno(), None, BLOCK, blocks)
+        position = 0
+        for index in range(data):
+            writer.add(CHUNK_TYPE_RAW, raw, rand.randbytes(MB))
+            kind = CHUNK_TYPE_FILL if index % 2 else CHUNK_TYPE_DONT_CARE
+            writer.add(kind, gap, fill=ZERO)
+            position += raw + gap
+        writer.add(CHUNK_TYPE_DONT_CARE, blocks - position)
+        writer.close()
+
+
+def modify(path, size, overlay):
+    """
+    Write the overlay in the free space and change some existing blocks.
+    """
+    rand = random.Random(overlay)  # nosec - benchmark
+    with open(str(path), "r+b") as f_raw:
+        offset = size * MB // 2
+        for _ in range(overlay):
+            os.pwrite(f_raw.fileno(), rand.randbytes(MB), offset)
+            offset += MB
+        # Metadata updates: one block every 64MB
+        for offset in range(0, size * MB, 64 * MB):
+            os.pwrite(f_raw.fileno(), rand.randbytes(BLOCK), offset + BLOCK)
+
+
+def simg2img(image, raw):
+    if shutil.which("simg2img"):
+        subprocess.check_call(["simg2img", image, raw])  # nosec - benchmark
+        return os.stat(raw).st_blocks * 512
+    sparse = SparseImage(image)
+    written = 0
+    with open(image, "rb") as f_in, open(raw, "wb") as f_out:
+        f_out.truncate(sparse.size)
+        for chunk in sparse.chunks:
+            position = chunk.start * BLOCK
+            length = chunk.blocks * BLOCK
+            for start in range(0, length, BUFFER_SIZE):
+                count = min(BUFFER_SIZE, length - start)
+                if chunk.kind == CHUNK_TYPE_RAW:
+                    data = os.pread(f_in.fileno(), count, chunk.offset + start)
+                elif chunk.kind == CHUNK_TYPE_FILL:
+                    data = chunk.fill * (count // 4)
+                else:
+                    break
+                written += os.pwrite(f_out.fileno(), data, position + start)
+    return written
+
+
+def img2simg(raw, image):
+    if shutil.which("img2simg"):
+        subprocess.check_call(["img2simg", raw, image])  # nosec - benchmark
+        return os.stat(image).st_size
+    size = os.stat(raw).st_size
+    with open(raw, "rb") as f_in, open(image, "wb") as f_out:
+        writer = SparseWriter(f_out.fileno(), None, BLOCK, size // BLOCK)
+        while True:
+            data = f_in.read(BUFFER_SIZE)
+            if not data:
+                break
+            for index in range(0, len(data), BLOCK):
+                block = data[index : index + BLOCK]
+                if block == block[:4] * (BLOCK // 4):
+                    writer.add(CHUNK_TYPE_FILL, 1, fill=block[:4])
+                else:
+                    writer.add(CHUNK_TYPE_RAW, 1, block)
+        writer.close()
+    return writer.written
+
+
+def before(image, options):
+    raw = image + ".raw"
+    begin = time.monotonic()
+    written = simg2img(image, raw)
+    middle = time.monotonic()
+    modify(raw, options.size, options.overlay)
+    resume = time.monotonic()
+    written += img2simg(raw, image + ".sparse")
+    os.replace(image + ".sparse", image)
+    os.unlink(raw)
+    return (written, middle - begin + time.monotonic() - resume)
+
+
+def after(image, options):
+    raw = image + ".raw"
+    begin = time.monotonic()
+    sparse = SparseImage(image)
+    written = sparse.expand(raw)
+    middle = time.monotonic()
+    modify(raw, options.size, options.overlay)
+    resume = time.monotonic()
+    written += sparse.update(raw, image + ".sparse")
+    os.replace(image + ".sparse", image)
+    os.unlink(raw)
+    return (written, middle - begin + time.monotonic() - resume)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2048, help="image size (MB)")
+    parser.add_argument("--data", type=int, default=256, help="raw data (MB)")
+    parser.add_argument("--overlay", type=int, default=16, help="overlay (MB)")
+    options = parser.parse_args()
+
+    tools = shutil.which("simg2img") and shutil.which("img2simg")
+    print(
+        "%dMB image, %dMB of data, %dMB overlay (simg2img/img2simg %s)"
+        % (
+            options.size,
+            options.data,
+            options.overlay,
+            "installed" if tools else "emulated",
+        )
+    )
+    print("%-8s %14s %10s" % ("", "bytes written", "duration"))
+    digests = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        for (name, func) in [("before", before), ("after", after)]:
+            image = str(pathlib.Path(tmp) / "system.img")
+            generate(image, options.size, options.data)
+            (written, duration) = func(image, options)
+            print("%-8s %12.1fMB %9.2fs" % (name, written / MB, duration))
+
+            # Both images have the same content
+            SparseImage(image).expand(image + ".check")
+            digest = hashlib.sha256()
+            with open(image + ".check", "rb") as f_in:
+                for data in iter(lambda: f_in.read(BUFFER_SIZE), b""):
+                    digest.update(data)
+            digests.add(digest.hexdigest())
+            os.unlink(image + ".check")
+    assert len(digests) == 1  # nosec - benchmark
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
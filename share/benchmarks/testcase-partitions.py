@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Compare the queries and the purge of the test cases table, unpartitioned and
+partitioned by month of the logged time, on a generated dataset stored in a
+local PostgreSQL database (--dsn).
+
+The tables only have the columns and the indexes used by the queries:
+
+* job: the test cases of random jobs, bounded by the submission of the job
+  like the results pages
+* recent: the failures of the last 30 days, like a query with a submit_time
+  condition
+* purge: removal of the test cases older than --keep months, with DELETE and
+  VACUUM (to reuse the space) on the unpartitioned table and by dropping the
+  partitions in one transaction otherwise, like "lava-server manage partitions
+  purge"
+
+The tables are created in the "bench_heap" and "bench_partitioned" schemas,
+dropped at the end.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+SCHEMA = """
+CREATE SCHEMA {schema};
+CREATE TABLE {schema}.testjob (
+    id integer PRIMARY KEY,
+    submit_time timestamptz NOT NULL
+);
+CREATE TABLE {schema}.testsuite (
+    id integer PRIMARY KEY,
+    job_id integer NOT NULL REFERENCES {schema}.testjob (id)
+);
+CREATE INDEX ON {schema}.testsuite (job_id);
+CREATE TABLE {schema}.testcase (
+    id serial,
+    name text NOT NULL,
+    result smallint NOT NULL,
+    measurement numeric(30, 10),
+    suite_id integer NOT NULL REFERENCES {schema}.testsuite (id),
+    logged timestamptz NOT NULL
+){partition};
+ALTER TABLE {schema}.testcase ADD PRIMARY KEY ({primary});
+CREATE INDEX ON {schema}.testcase (suite_id);
+CREATE INDEX ON {schema}.testcase (result);
+"""
+
+# One job every "minutes", with "suites" suites of "cases" test cases
+GENERATE = """
+INSERT INTO {schema}.testjob
+SELECT j, %(start)s::timestamptz + j * %(minutes)s * interval '1 minute'
+FROM generate_series(1, %(jobs)s) j;
+INSERT INTO {schema}.testsuite
+SELECT (j - 1) * %(suites)s + s, j
+FROM generate_series(1, %(jobs)s) j, generate_series(1, %(suites)s) s;
+INSERT INTO {schema}.testcase (name, result, measurement, suite_id, logged)
+SELECT 'case-' || c, (c %% 7 = 0)::int, c * 1.5, s.id,
+       j.submit_time + c * interval '1 second'
+FROM {schema}.testsuite s JOIN {schema}.testjob j ON j.id = s.job_id,
+     generate_series(1, %(cases)s) c;
+ANALYZE {schema}.testjob;
+ANALYZE {schema}.testsuite;
+ANALYZE {schema}.testcase;
+"""
+
+JOB = """
+SELECT c.name, c.result, c.measurement FROM {schema}.testcase c
+JOIN {schema}.testsuite s ON s.id = c.suite_id
+WHERE s.job_id = %(job)s AND c.logged >= %(submit_time)s
+"""
+
+RECENT = """
+SELECT count(*) FROM {schema}.testcase c
+JOIN {schema}.testsuite s ON s.id = c.suite_id
+JOIN {schema}.testjob j ON j.id = s.job_id
+WHERE j.submit_time > %(since)s AND c.logged >= %(since)s AND c.result = 1
+"""
+
+
+def months(start, count):
+    ret = []
+    for index in range(count + 1):
+        year = start.year + (start.month - 1 + index) // 12
+        month = (start.month - 1 + index) % 12 + 1
+        ret.append("%04d-%02d-01 00:00:00+00" % (year, month))
+    return ret
+
+
+def create(cursor, schema, partitioned, options, bounds):
+    if partitioned:
+        cursor.execute(
+            SCHEMA.format(
+                schema=schema,
+                partition=" PARTITION BY RANGE (logged)",
+                primary="id, logged",
+            )
+        )
+        for (index, (start, end)) in enumerate(zip(bounds, bounds[1:])):
+            cursor.execute(
+                "CREATE TABLE %s.testcase_%d PARTITION OF %s.testcase "
+                "FOR VALUES FROM ('%s') TO ('%s')" % (schema, index, schema, start, end)
+            )
+    else:
+        cursor.execute(SCHEMA.format(schema=schema, partition="", primary="id"))
+    cursor.execute(
+        GENERATE.format(schema=schema),
+        {
+            "start": bounds[0],
+            "minutes": options.months * 30 * 24 * 60 / options.jobs,
+            "jobs": options.jobs,
+            "suites": options.suites,
+            "cases": options.cases,
+        },
+    )
+
+
+def timed(cursor, sql, params, repeat):
+    durations = []
+    for _ in range(repeat):
+        begin = time.monotonic()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        durations.append(time.monotonic() - begin)
+    return statistics.median(durations)
+
+
+def purge(cursor, schema, partitioned, bounds, keep):
+    limit = bounds[-1 - keep]
+    begin = time.monotonic()
+    if partitioned:
+        cursor.execute("BEGIN")
+        for (index, end) in enumerate(bounds[1:]):
+            if end > limit:
+                break
+            cursor.execute(
+                "ALTER TABLE %s.testcase DETACH PARTITION %s.testcase_%d"
+                % (schema, schema, index)
+            )
+            cursor.execute("DROP TABLE %s.testcase_%d" % (schema, index))
+        cursor.execute("COMMIT")
+    else:
+        cursor.execute("DELETE FROM %s.testcase WHERE logged < %%s" % schema, [limit])
+        cursor.execute("VACUUM %s.testcase" % schema)
+    return time.monotonic() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dsn", default="dbname=lavabench", help="database")
+    parser.add_argument("--months", type=int, default=24, help="history (months)")
+    parser.add_argument("--jobs", type=int, default=50000, help="number of jobs")
+    parser.add_argument("--suites", type=int, default=4, help="suites by job")
+    parser.add_argument("--cases", type=int, default=50, help="test cases by suite")
+    parser.add_argument("--keep", type=int, default=12, help="months to keep")
+    parser.add_argument("--repeat", type=int, default=20, help="query repetitions")
+    options = parser.parse_args()
+
+    connection = psycopg2.connect(options.dsn)
+    connection.autocommit = True
+    cursor = connection.cursor()
+    cursor.execute("SET TIME ZONE 'UTC'")
+    cursor.execute(
+        "SELECT date_trunc('month', now()) - %s * interval '1 month'", [options.months]
+    )
+    bounds = months(cursor.fetchone()[0], options.months + 1)
+    rnd = random.Random(options.jobs)  # nosec - benchmark
+    jobs = [rnd.randint(1, options.jobs) for _ in range(options.repeat)]
+
+    print(
+        "%d jobs over %d months, %d test cases"
+        % (options.jobs, options.months, options.jobs * options.suites * options.cases)
+    )
+    print("%-12s %10s %10s %10s" % ("", "job", "recent", "purge"))
+    try:
+        for (schema, partitioned) in [
+            ("bench_heap", False),
+            ("bench_partitioned", True),
+        ]:
+            cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema)
+            create(cursor, schema, partitioned, options, bounds)
+
+            durations = []
+            for job in jobs:
+                cursor.execute(
+                    "SELECT submit_time FROM %s.testjob WHERE id = %%s" % schema, [job]
+                )
+                submit_time = cursor.fetchone()[0]
+                durations.append(
+                    timed(
+                        cursor,
+                        JOB.format(schema=schema),
+                        {"job": job, "submit_time": submit_time},
+                        1,
+                    )
+                )
+            job = statistics.median(durations)
+            cursor.execute("SELECT now() - interval '30 days'")
+            recent = timed(
+                cursor,
+                RECENT.format(schema=schema),
+                {"since": cursor.fetchone()[0]},
+                options.repeat,
+            )
+            cursor.execute("SELECT count(*) FROM %s.testcase" % schema)
+            before = cursor.fetchone()[0]
+            duration = purge(cursor, schema, partitioned, bounds, options.keep)
+            cursor.execute("SELECT count(*) FROM %s.testcase" % schema)
+            after = cursor.fetchone()[0]
+            print(
+                "%-12s %9.2fms %9.2fms %9.2fs (%d rows removed)"
+                % (
+                    "partitioned" if partitioned else "heap",
+                    job * 1000,
+                    recent * 1000,
+                    duration,
+                    before - after,
+                )
+            )
+    finally:
+        for schema in ["bench_heap", "bench_partitioned"]:
+            cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
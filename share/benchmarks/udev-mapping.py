@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Replay a synthetic stream of udev events through the device sharing of
+lava-dispatcher-host:
+
+* before: the mapping files of every job are parsed for each event
+* after: the lava-dispatcher-host-server registry, with the duplicated events
+  of each device coalesced
+
+Every board reset generates one event per matching udev rule (fs label,
+serial, vendor/product of the device and of its parent). Some events come from
+devices that are not mapped to any job. The sharing itself (lxc-device and
+lxc-attach) is replaced by a counter and its cost is estimated with
+--share-cost.
+"""
+
+import argparse
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent.parent))
+
+import lava_dispatcher_host  # noqa: E402
+from lava_dispatcher_host import (  # noqa: E402
+    MappingRegistry,
+    add_device_container_mapping,
+    share_device_with_container,
+)
+
+
+def boards(jobs, per_job):
+    for job in range(jobs):
+        for index in range(per_job):
+            # Boards are identified by serial number or by vendor/product
+            if index % 2:
+                info = {"serial_number": "%08X" % (job * 100 + index)}
+            else:
+                info = {
+                    "usb_vendor_id": "18d1",
+                    "usb_product_id": "%04x" % (job * 100 + index),
+                }
+            yield (str(job), "board%d-%d" % (job, index), info)
+
+
+def events(devdir, boards, resets, unmapped, seed):
+    """
+    Generate the udev events, as the options of "devices share"
+    """
+    rng = random.Random(seed)
+    stream = []
+    for _ in range(resets):
+        (_, node, info) = rng.choice(boards)
+        stream.append(("reset", node))
+        device = os.path.join(devdir, node)
+        # fs label, serial, vendor/product of the device and of its parent
+        stream.append(("event", Namespace(device=device, fs_label="rootfs")))
+        serial_number = info.get("serial_number", "%08X" % rng.randrange(1 << 32))
+        stream.append(("event", Namespace(device=device, serial_number=serial_number)))
+        vendor_product = {
+            "usb_vendor_id": info.get("usb_vendor_id", "0403"),
+            "usb_product_id": info.get("usb_product_id", "6001"),
+        }
+        for _ in range(2):
+            stream.append(("event", Namespace(device=device, **vendor_product)))
+        for index in range(unmapped):
+            stream.append(
+                (
+                    "event",
+                    Namespace(
+                        device=os.path.join(devdir, "hub"),
+                        usb_vendor_id="1d6b",
+                        usb_product_id="%04x" % index,
+                    ),
+                )
+            )
+    return stream
+
+
+def replay(stream, devdir, registry):
+    for (kind, value) in stream:
+        if kind == "reset":
+            # The device node is created again
+            path = os.path.join(devdir, value)
+            os.unlink(path)
+            open(path, "w").close()
+        else:
+            share_device_with_container(value, registry)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=50, help="number of jobs")
+    parser.add_argument("--boards", type=int, default=2, help="boards per job")
+    parser.add_argument("--resets", type=int, default=500, help="board resets")
+    parser.add_argument(
+        "--unmapped", type=int, default=2, help="unmapped devices events per reset"
+    )
+    parser.add_argument(
+        "--share-cost", type=float, default=30, help="cost of a share in ms"
+    )
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as jobs_dir, tempfile.TemporaryDirectory(
+        dir="/dev/shm"
+    ) as devdir:
+        all_boards = list(boards(options.jobs, options.boards))
+        open(os.path.join(devdir, "hub"), "w").close()
+        with mock.patch("lava_dispatcher_host.JOBS_DIR", jobs_dir), mock.patch(
+            "lava_dispatcher_host.notify_mapping_change"
+        ):
+            for (job_id, node, info) in all_boards:
+                add_device_container_mapping(job_id, info, "lxc-" + job_id)
+                open(os.path.join(devdir, node), "w").close()
+            stream = events(
+                devdir, all_boards, options.resets, options.unmapped, seed=42
+            )
+            count = sum(1 for (kind, _) in stream if kind == "event")
+
+            print(
+                "%d events, %d jobs, %d boards" % (count, options.jobs, len(all_boards))
+            )
+            print(
+                "%-8s %12s %10s %8s %14s"
+                % ("", "lookup/event", "yaml loads", "shares", "udev backlog")
+            )
+            for (name, registry) in [("before", None), ("after", MappingRegistry())]:
+                if registry is not None:
+                    registry.refresh()
+                with mock.patch(
+                    "lava_dispatcher_host.share_device_with_container_lxc"
+                ) as share, mock.patch(
+                    "lava_dispatcher_host.load_mapping_data",
+                    wraps=lava_dispatcher_host.load_mapping_data,
+                ) as load:
+                    start = time.monotonic()
+                    replay(stream, devdir, registry)
+                    duration = time.monotonic() - start
+                print(
+                    "%-8s %10.1fus %10d %8d %13.1fs"
+                    % (
+                        name,
+                        duration / count * 1e6,
+                        load.call_count,
+                        share.call_count,
+                        duration + share.call_count * options.share_cost / 1000,
+                    )
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+"""
+Authenticated XML-RPC calls (system.whoami) per second, with the Django test
+client against a test database.
+
+* before: the token is looked up and last_used_on is saved on every call
+  (no cache and AUTH_TOKEN_LAST_USED_INTERVAL=0)
+* batched: last_used_on is saved in batches. The tokens are not cached with a
+  per-process cache (LocMemCache)
+* shared: the tokens are also cached in a cache shared by the processes (a
+  FileBasedCache here, memcached or redis in production)
+
+Requires the database configured for the tests (PostgreSQL).
+"""
+
+import argparse
+import base64
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+import xmlrpc.client
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lava_server.settings.dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+)
+
+from linaro_django_xmlrpc.models import AuthToken  # noqa: E402
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+DUMMY = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def run(client, auth, calls):
+    body = xmlrpc.client.dumps((), "system.whoami")
+    with CaptureQueriesContext(connection) as queries:
+        begin = time.perf_counter()
+        for _ in range(calls):
+            response = client.post(
+                "/RPC2/",
+                data=body,
+                content_type="text/xml",
+                HTTP_AUTHORIZATION=auth,
+            )
+            assert response.status_code == 200  # nosec - benchmark
+        duration = time.perf_counter() - begin
+    return (duration, len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000, help="number of calls")
+    options = parser.parse_args()
+
+    shared = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(),
+        }
+    }
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create(username="benchmark")
+        token = AuthToken.objects.create(user=user)
+        auth = "Basic " + base64.b64encode(
+            ("%s:%s" % (user.username, token.secret)).encode("utf-8")
+        ).decode("utf-8")
+        client = Client()
+
+        results = {}
+        for (name, caches, interval) in [
+            ("before", DUMMY, 0),
+            ("batched", LOCMEM, 60),
+            ("shared", shared, 60),
+        ]:
+            with override_settings(
+                CACHES=caches, AUTH_TOKEN_LAST_USED_INTERVAL=interval
+            ):
+                cache.clear()
+                run(client, auth, 100)
+                results[name] = run(client, auth, options.calls)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(shared["default"]["LOCATION"], ignore_errors=True)
+
+    print("%d authenticated calls" % options.calls)
+    print("%-8s %12s %14s" % ("", "calls/s", "queries/call"))
+    for (name, (duration, queries)) in results.items():
+        print(
+            "%-8s %12.0f %14.2f"
+            % (name, options.calls / duration, queries / options.calls)
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
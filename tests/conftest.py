@@ -25,7 +25,9 @@ import pytest
 import requests
 
 import lava_dispatcher.job
+import lava_dispatcher.utils.docker
 import lava_dispatcher.utils.filesystem
+import lava_dispatcher.utils.rootfs
 
 os.environ["LANGUAGE"] = "C.UTF-8"
 
@@ -36,6 +38,10 @@ def tempdir(monkeypatch, tmpdir):
     monkeypatch.setattr(
         lava_dispatcher.utils.filesystem, "tftpd_dir", lambda: str(tmpdir)
     )
+    # Do not share the docker images cache with the host
+    monkeypatch.setattr(lava_dispatcher.utils.docker, "DOCKER_IMAGES_CACHE", None)
+    # Do not share the rootfs cache with the host
+    monkeypatch.setattr(lava_dispatcher.utils.rootfs, "ROOTFS_CACHE_DIR", None)
 
 
 @pytest.fixture(autouse=True)
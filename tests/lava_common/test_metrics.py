@@ -0,0 +1,142 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import threading
+
+import pytest
+import requests
+
+from lava_common.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    parse_address,
+    serve,
+)
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    counter = registry.register(Counter("lava_lines_total", "Lines"))
+    events = registry.register(Counter("lava_events_total", "Events", ["kind"]))
+    gauge = registry.register(Gauge("lava_depth", "Depth"))
+    function = registry.register(Gauge("lava_sockets", "Sockets", ["kind"]))
+
+    counter.inc()
+    counter.inc(41)
+    events.labels("testjob").inc()
+    events.labels('a"b\\c').inc(2)
+    gauge.inc(3)
+    gauge.dec()
+    function.labels("user").set_function(lambda: 7)
+
+    assert registry.render() == "\n".join(
+        [
+            "# HELP lava_depth Depth",
+            "# TYPE lava_depth gauge",
+            "lava_depth 2.0",
+            "# HELP lava_events_total Events",
+            "# TYPE lava_events_total counter",
+            'lava_events_total{kind="a\\"b\\\\c"} 2.0',
+            'lava_events_total{kind="testjob"} 1.0',
+            "# HELP lava_lines_total Lines",
+            "# TYPE lava_lines_total counter",
+            "lava_lines_total 42.0",
+            "# HELP lava_sockets Sockets",
+            "# TYPE lava_sockets gauge",
+            'lava_sockets{kind="user"} 7.0',
+            "",
+        ]
+    )
+
+    # Same child for the same labels
+    assert events.labels("testjob") is events.labels("testjob")
+    with pytest.raises(ValueError):
+        events.labels()
+    with pytest.raises(ValueError):
+        registry.register(Counter("lava_lines_total", "Lines"))
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = registry.register(
+        Histogram("lava_batch", "Batch", ["kind"], buckets=[10, 1, 100])
+    )
+    child = histogram.labels("logs")
+    for value in [0.5, 1, 5, 50, 500]:
+        child.observe(value)
+
+    assert registry.render().split("\n")[2:] == [
+        'lava_batch_bucket{kind="logs",le="1.0"} 2.0',
+        'lava_batch_bucket{kind="logs",le="10.0"} 3.0',
+        'lava_batch_bucket{kind="logs",le="100.0"} 4.0',
+        'lava_batch_bucket{kind="logs",le="+Inf"} 5.0',
+        'lava_batch_sum{kind="logs"} 556.5',
+        'lava_batch_count{kind="logs"} 5.0',
+        "",
+    ]
+
+
+def test_histogram_concurrency():
+    histogram = Histogram("lava_duration", "Duration")
+
+    def observe():
+        for _ in range(10000):
+            with histogram.time():
+                pass
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.render()[-1] == "lava_duration_count 40000.0"
+
+
+def test_parse_address():
+    assert parse_address("127.0.0.1:9101") == ("127.0.0.1", [9101])
+    assert parse_address(":9101") == ("127.0.0.1", [9101])
+    assert parse_address("[::1]:9110-9112") == ("::1", [9110, 9111, 9112])
+    with pytest.raises(ValueError):
+        parse_address("localhost")
+
+
+def test_serve():
+    registry = Registry()
+    registry.register(Counter("lava_lines_total", "Lines")).inc(3)
+
+    # Bind the next port when the first one is used
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        server = serve("127.0.0.1:%d-%d" % (port, port + 10), registry)
+        try:
+            assert server.server_address[1] > port
+            url = "http://127.0.0.1:%d" % server.server_address[1]
+            # requests.get is patched by the no_network fixture
+            ret = requests.Session().request("GET", url + "/metrics")
+            assert ret.status_code == 200
+            assert ret.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "lava_lines_total 3.0\n" in ret.text
+
+            ret = requests.Session().request("GET", url + "/other")
+            assert ret.status_code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
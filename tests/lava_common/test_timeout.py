@@ -1,37 +1,43 @@
 import signal
+import threading
 import time
 
 import pytest
 
 from lava_common.exceptions import ConfigurationError, InfrastructureError, JobError
-from lava_common.timeout import Timeout
+from lava_common.timeout import (
+    DeadlineScheduler,
+    Timeout,
+    _Deadline,
+    _Expired,
+    scheduler,
+)
 
 
-class DummyAlarm:
-    def __init__(self, data):
-        self.data = data
-        self.previous = 0
+class DummyScheduler:
+    """
+    Deadlines that only expire when the test calls expire()
+    """
 
-    def __call__(self, duration):
-        assert (  # nosec - assert is part of the test process.
-            self.data.pop(0) == duration
-        )
-        previous = self.previous
-        self.previous = duration
-        return previous
+    def __init__(self):
+        self.stack = []
+        self.end_times = []
 
+    def push(self, deadline):
+        self.stack.append(deadline)
+        self.end_times.append(deadline.end_time)
 
-class DummySignal:
-    def __init__(self, data):
-        self.data = data
-        self.previous = 0
+    def pop(self, deadline):
+        self.stack.remove(deadline)
+        return deadline.fired
 
-    def __call__(self, sig, func):
-        assert sig == signal.SIGALRM  # nosec - assert is part of the test process.
-        assert func == self.data.pop(0)  # nosec - assert is part of the test process.
-        previous = self.previous
-        self.previous = func
-        return previous
+    def interrupted(self):
+        pass
+
+    def expire(self):
+        # Like the watcher thread for the innermost deadline
+        self.stack[-1].fired = True
+        raise _Expired()
 
 
 class ParentAction:
@@ -79,63 +85,51 @@ def test_parsing():
 
 
 def test_exception_raised(monkeypatch):
+    monkeypatch.setattr("lava_common.timeout.scheduler", DummyScheduler())
+    monkeypatch.setattr(time, "monotonic", lambda: 0)
     # 1/ default case
     t = Timeout("name", 12)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([12, 0]))
     with pytest.raises(JobError):
         with t(None, None) as max_end_time:
             t._timed_out(None, None)
 
     # 2/ another exception
     t = Timeout("name", 12, InfrastructureError)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([12, 0]))
     with pytest.raises(InfrastructureError):
         with t(None, None) as max_end_time:
             t._timed_out(None, None)
 
 
 def test_without_raising(monkeypatch):
+    dummy = DummyScheduler()
+    monkeypatch.setattr("lava_common.timeout.scheduler", dummy)
     # 1/ without parent
     # 1.1/ without max_end_time
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([200, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with t(None, None) as max_end_time:
         assert max_end_time == 200  # nosec - assert is part of the test process.
-        # signal.alarm and signal.signal were called once each
-        assert signal.alarm.data == [0]  # nosec - assert is part of the test process.
-        assert signal.signal.data == []  # nosec - assert is part of the test process.
+        assert dummy.end_times == [200]  # nosec - test process.
         monkeypatch.setattr(time, "monotonic", lambda: 23)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t.elapsed_time == 23  # nosec - assert is part of the test process.
 
-    # 1.1/ with a smaller max_end_time
+    # 1.2/ with a smaller max_end_time
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([125, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with t(None, 125) as max_end_time:
         assert max_end_time == 125  # nosec - assert is part of the test process.
-        assert signal.alarm.data == [0]  # nosec - assert is part of the test process.
-        assert signal.signal.data == []  # nosec - assert is part of the test process.
+        assert dummy.end_times[-1] == 125  # nosec - test process.
         monkeypatch.setattr(time, "monotonic", lambda: 109)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t.elapsed_time == 109  # nosec - assert is part of the test process.
 
-    # 1.2/ with a larger max_end_time
+    # 1.3/ with a larger max_end_time
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([200, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with t(None, 201) as max_end_time:
         assert max_end_time == 200  # nosec - assert is part of the test process.
-        assert signal.alarm.data == [0]  # nosec - assert is part of the test process.
-        assert signal.signal.data == []  # nosec - assert is part of the test process.
         monkeypatch.setattr(time, "monotonic", lambda: 45)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
     assert t.elapsed_time == 45  # nosec - assert is part of the test process.
 
     # 2/ with a parent
@@ -143,168 +137,193 @@ def test_without_raising(monkeypatch):
     t0 = Timeout("timeout-parent", 200)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([100, 177]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
-    with t1(parent, 200) as max_end_time:
-        assert max_end_time == 100  # nosec - assert is part of the test process.
-        assert signal.alarm.data == [177]  # nosec - assert is part of the test process.
-        assert signal.signal.data == [  # nosec - assert is part of the test process.
-            t0._timed_out
-        ]
-        monkeypatch.setattr(time, "monotonic", lambda: 23)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+    with t0(None, None) as parent_max_end_time:
+        with t1(parent, parent_max_end_time) as max_end_time:
+            assert max_end_time == 100  # nosec - assert is part of the test process.
+            assert dummy.end_times[-2:] == [200, 100]  # nosec - test process.
+            monkeypatch.setattr(time, "monotonic", lambda: 23)
+        # Only the deadline of the child was removed
+        assert dummy.stack[-1].end_time == 200  # nosec - test process.
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t1.elapsed_time == 23  # nosec - assert is part of the test process.
 
     # 2.2/ with a smaller max_end_time
     t0 = Timeout("timeout-parent", 50)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([50, 27]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with t1(parent, 50) as max_end_time:
         assert max_end_time == 50  # nosec - assert is part of the test process.
-        assert signal.alarm.data == [27]  # nosec - assert is part of the test process.
-        assert signal.signal.data == [  # nosec - assert is part of the test process.
-            t0._timed_out
-        ]
         monkeypatch.setattr(time, "monotonic", lambda: 23)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
     assert t1.elapsed_time == 23  # nosec - assert is part of the test process.
 
 
 def test_with_raising(monkeypatch):
+    dummy = DummyScheduler()
+    monkeypatch.setattr("lava_common.timeout.scheduler", dummy)
     # 1/ without parent
     # 1.1/ without max_end_time
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([200, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
-    with pytest.raises(JobError):
+    with pytest.raises(JobError, match="timeout-name timed out after 200 seconds"):
         with t(None, None) as max_end_time:
             assert max_end_time == 200  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [  # nosec - assert is part of the test process.
-                0
-            ]
-            assert (  # nosec - assert is part of the test process.
-                signal.signal.data == []
-            )
             monkeypatch.setattr(time, "monotonic", lambda: 200)
-            t._timed_out(None, None)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+            dummy.expire()
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t.elapsed_time == 200  # nosec - assert is part of the test process.
 
-    # 1.1/ with a smaller max_end_time
+    # 1.2/ with a smaller max_end_time
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([125, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with pytest.raises(JobError):
         with t(None, 125) as max_end_time:
             assert max_end_time == 125  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [  # nosec - assert is part of the test process.
-                0
-            ]
-            assert (  # nosec - assert is part of the test process.
-                signal.signal.data == []
-            )
             monkeypatch.setattr(time, "monotonic", lambda: 126)
-            t._timed_out(None, None)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+            dummy.expire()
     assert t.elapsed_time == 126  # nosec - assert is part of the test process.
 
-    # 1.2/ with a larger max_end_time
-    t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([200, 0]))
-    monkeypatch.setattr(time, "monotonic", lambda: 0)
-    with pytest.raises(JobError):
-        with t(None, 201) as max_end_time:
-            assert max_end_time == 200  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [0]  # nosec - test process.
-            assert signal.signal.data == []  # nosec - test process.
-            monkeypatch.setattr(time, "monotonic", lambda: 200)
-            t._timed_out(None, None)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
-    assert t.elapsed_time == 200  # nosec - assert is part of the test process.
-
     # 1.3/ with max_end_time <= 0
     t = Timeout("timeout-name", 200)
-    monkeypatch.setattr(signal, "signal", DummySignal([t._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with pytest.raises(JobError):
         with t(None, 0) as max_end_time:
             # Check that the exception is raised before this line
             assert 0  # nosec - assert is part of the test process.
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t.elapsed_time == 0  # nosec - assert is part of the test process.
 
+    # 1.4/ sub-second timeouts
+    t = Timeout("timeout-name", 0.2)
+    monkeypatch.setattr(time, "monotonic", lambda: 0)
+    with pytest.raises(JobError, match="timeout-name timed out after 0.2 seconds"):
+        with t(None, None):
+            monkeypatch.setattr(time, "monotonic", lambda: 0.2)
+            dummy.expire()
+
     # 2/ with a parent
-    # 2.1/ with a larger max_end_time
-    t0 = Timeout("timeout-parent", 200)
+    # 2.1/ the child timeout is raised
+    t0 = Timeout("timeout-parent", 200, InfrastructureError)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([100, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
-    with pytest.raises(JobError):
-        with t1(parent, 200) as max_end_time:
-            assert max_end_time == 100  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [0]  # nosec - test process.
-            assert signal.signal.data == [t0._timed_out]  # nosec - test process.
-            monkeypatch.setattr(time, "monotonic", lambda: 100)
-            t1._timed_out(None, None)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
-    assert signal.signal.data == [t0._timed_out]  # nosec - test process.
+    with t0(None, None) as parent_max_end_time:
+        with pytest.raises(JobError):
+            with t1(parent, parent_max_end_time):
+                monkeypatch.setattr(time, "monotonic", lambda: 100)
+                dummy.expire()
+        # The parent is still running
+        assert not dummy.stack[-1].fired  # nosec - test process.
     assert t1.elapsed_time == 100  # nosec - assert is part of the test process.
 
-    # 2.2/ with a smaller max_end_time
-    t0 = Timeout("timeout-parent", 50)
+    # 2.2/ the parent deadline is the earliest: the child raises
+    t0 = Timeout("timeout-parent", 50, InfrastructureError)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([50, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with pytest.raises(JobError):
-        with t1(parent, 50) as max_end_time:
-            assert max_end_time == 50  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [0]  # nosec - test process.
-            assert signal.signal.data == [t0._timed_out]  # nosec - test process.
-            monkeypatch.setattr(time, "monotonic", lambda: 23)
-            t1._timed_out(None, None)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
-    assert signal.signal.data == [t0._timed_out]  # nosec - test process.
-    assert t1.elapsed_time == 23  # nosec - assert is part of the test process.
+        with t0(None, None) as parent_max_end_time:
+            with t1(parent, parent_max_end_time) as max_end_time:
+                assert max_end_time == 50  # nosec - assert is part of the test process.
+                monkeypatch.setattr(time, "monotonic", lambda: 50)
+                dummy.expire()
+    assert t1.elapsed_time == 50  # nosec - assert is part of the test process.
 
     # 2.3/ with max_end_time <= 0
     t0 = Timeout("timeout-parent", 1)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with pytest.raises(JobError):
-        with t1(parent, -1) as max_end_time:
+        with t1(parent, -1):
             assert 0  # nosec - assert is part of the test process.
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
-    assert signal.signal.data == [t1._timed_out, t0._timed_out]  # nosec - test process.
     assert t1.elapsed_time == 0  # nosec - assert is part of the test process.
 
     # 2.4/ raising parent timeout
     t0 = Timeout("timeout-parent", 50, InfrastructureError)
     parent = ParentAction(t0)
     t1 = Timeout("timeout-child", 100)
-    monkeypatch.setattr(signal, "signal", DummySignal([t1._timed_out, t0._timed_out]))
-    monkeypatch.setattr(signal, "alarm", DummyAlarm([50, 0, 0]))
     monkeypatch.setattr(time, "monotonic", lambda: 0)
     with pytest.raises(InfrastructureError):
         with t1(parent, 50) as max_end_time:
             assert max_end_time == 50  # nosec - assert is part of the test process.
-            assert signal.alarm.data == [0, 0]  # nosec - test
-            assert signal.signal.data == [t0._timed_out]  # nosec - test
             monkeypatch.setattr(time, "monotonic", lambda: 50)
-    assert signal.alarm.data == []  # nosec - assert is part of the test process.
-    assert signal.signal.data == []  # nosec - assert is part of the test process.
+    assert dummy.stack == []  # nosec - assert is part of the test process.
     assert t1.elapsed_time == 50  # nosec - assert is part of the test process.
+
+
+def test_check(monkeypatch):
+    monkeypatch.setattr("lava_common.timeout.scheduler", DummyScheduler())
+    t = Timeout("timeout-name", 200, InfrastructureError)
+    monkeypatch.setattr(time, "monotonic", lambda: 0)
+    with t(None, None) as max_end_time:
+        results = []
+
+        def check():
+            t.check(max_end_time)
+            monkeypatch.setattr(time, "monotonic", lambda: 201)
+            try:
+                t.check(max_end_time)
+            except InfrastructureError as exc:
+                results.append(str(exc))
+
+        thread = threading.Thread(target=check)
+        thread.start()
+        thread.join()
+        assert results == [  # nosec - assert is part of the test process.
+            "timeout-name timed out after 201 seconds"
+        ]
+        # The main thread relies on SIGALRM
+        t.check(0)
+
+
+def test_alarm_protected():
+    sched = DeadlineScheduler()
+    main = threading.main_thread().ident
+    deadline = _Deadline(0)
+    deadline.fired = True
+    sched.stacks[main] = [deadline]
+    with sched.protect():
+        with sched.protect():
+            # Deferred until the end of the outermost block
+            sched._alarm(signal.SIGALRM, None)
+        sched._alarm(signal.SIGALRM, None)
+        assert deadline.delivered is False  # nosec - test process.
+    assert sched.protected == {}  # nosec - test process.
+    with pytest.raises(_Expired):
+        sched._alarm(signal.SIGALRM, None)
+    assert deadline.delivered is True  # nosec - test process.
+
+
+def test_in_thread():
+    # The only test with real deadlines: keep the margins wide
+    results = {}
+
+    def run(name, duration):
+        t = Timeout(name, duration, InfrastructureError)
+        try:
+            with t(None, None):
+                # The asynchronous exception is raised between two calls
+                while True:
+                    time.sleep(0.01)
+        except InfrastructureError as exc:
+            results[name] = (str(exc), t.elapsed_time)
+
+    threads = [
+        threading.Thread(target=run, args=("first", 0.5)),
+        threading.Thread(target=run, args=("second", 0.2)),
+    ]
+    for thread in threads:
+        thread.start()
+    # The main thread is not interrupted
+    main = Timeout("main", 60)
+    with main(None, None):
+        for thread in threads:
+            thread.join(30)
+    assert sorted(results) == ["first", "second"]  # nosec - test process.
+    assert results["first"][0].startswith("first timed out after ")  # nosec
+    assert 0.5 <= results["first"][1] < 30  # nosec - test process.
+    assert 0.2 <= results["second"][1] < 30  # nosec - test process.
+    assert main.elapsed_time < 30  # nosec - assert is part of the test process.
+    assert scheduler.stacks == {}  # nosec - assert is part of the test process.
@@ -0,0 +1,186 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from lava.coordinator import LavaCoordinator
+
+
+@pytest.fixture
+def coordinator():
+    coord = LavaCoordinator("localhost", 0, 4096)
+    coord.all_groups = {}
+    thread = threading.Thread(target=coord.run, daemon=True)
+    thread.start()
+    while coord.selector is None:
+        time.sleep(0.01)
+    yield coord
+    coord.running = False
+
+
+class Client:
+    def __init__(self, coord, name, group="group", size=2):
+        self.coord = coord
+        self.name = name
+        self.group = group
+        self.size = size
+        self.sock = None
+        self.connect()
+
+    def connect(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = socket.create_connection(("localhost", self.coord.group_port))
+        self.sock.settimeout(5)
+
+    def send(self, request_id, request, **kwargs):
+        msg = {
+            "request": request,
+            "group_name": self.group,
+            "group_size": self.size,
+            "client_name": self.name,
+            "hostname": "localhost",
+            "role": "role",
+        }
+        msg.update(kwargs)
+        if request_id is not None:
+            msg["requestID"] = request_id
+        data = json.dumps(msg).encode("utf-8")
+        self.sock.sendall(("%08X" % len(data)).encode("utf-8") + data)
+
+    def recv(self):
+        header = self.sock.recv(8)
+        if not header:
+            return None
+        count = int(header, 16)
+        data = b""
+        while len(data) < count:
+            data += self.sock.recv(count - len(data))
+        return json.loads(data.decode("utf-8"))
+
+    def pending(self):
+        self.sock.settimeout(0.2)
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK) == b""
+        except socket.timeout:
+            return True
+        finally:
+            self.sock.settimeout(5)
+
+
+def test_legacy_request(coordinator):
+    client = Client(coordinator, "job1")
+    client.send(None, "group_data")
+    assert client.recv() == {"response": "wait"}
+    # the connection is closed after the response
+    assert client.recv() is None
+
+
+def test_push_sync(coordinator):
+    (first, second) = (Client(coordinator, "job1"), Client(coordinator, "job2"))
+    first.send("job1.1", "group_data")
+    # blocked until the group is complete
+    assert first.pending()
+    second.send("job2.1", "group_data")
+    roles = {"job1": "role", "job2": "role"}
+    assert second.recv() == {
+        "response": "group_data",
+        "roles": roles,
+        "requestID": "job2.1",
+    }
+    assert first.recv() == {
+        "response": "group_data",
+        "roles": roles,
+        "requestID": "job1.1",
+    }
+
+    # the connections are kept open
+    first.send("job1.2", "lava_sync", messageID="booted")
+    assert first.pending()
+    second.send("job2.2", "lava_sync", messageID="booted")
+    assert second.recv()["requestID"] == "job2.2"
+    assert first.recv() == {
+        "response": "ack",
+        "message": "booted",
+        "requestID": "job1.2",
+    }
+
+
+def test_push_wait(coordinator):
+    (first, second) = (Client(coordinator, "job1"), Client(coordinator, "job2"))
+    first.send("job1.1", "lava_wait", messageID="ready")
+    assert first.pending()
+    second.send("job2.1", "lava_send", messageID="ready", message={"ip": "1.2.3.4"})
+    assert second.recv() == {"response": "ack", "requestID": "job2.1"}
+    assert first.recv() == {
+        "response": "ack",
+        "message": {"job2": {"ip": "1.2.3.4"}},
+        "requestID": "job1.1",
+    }
+
+
+def test_reconnect(coordinator):
+    (first, second) = (Client(coordinator, "job1"), Client(coordinator, "job2"))
+    first.send("job1.1", "group_data")
+    second.send("job2.1", "group_data")
+    assert second.recv()["response"] == "group_data"
+
+    # the connection was lost before receiving the response
+    first.connect()
+    first.send("job1.1", "group_data")
+    assert first.recv()["requestID"] == "job1.1"
+
+    # the request is not processed twice
+    first.send("job1.2", "clear_group")
+    assert first.recv() == {"response": "ack", "requestID": "job1.2"}
+    first.connect()
+    first.send("job1.2", "clear_group")
+    assert first.recv() == {"response": "ack", "requestID": "job1.2"}
+    assert coordinator.all_groups["group"]["complete"] == 1
+
+    # the parked requests of closed connections are dropped
+    first.send("job1.3", "lava_wait", messageID="never")
+    assert first.pending()
+    first.sock.close()
+    time.sleep(0.2)
+    assert coordinator.parked == {}
+
+
+def test_wait_not_cached(coordinator):
+    coordinator.rpc_delay = 0
+    (first, second) = (Client(coordinator, "job1"), Client(coordinator, "job2"))
+    first.send("job1.1", "aggregate", bundle="b1", sub_id="1.0")
+    assert first.recv() == {"response": "wait", "requestID": "job1.1"}
+    second.send("job2.1", "aggregate", bundle="b2", sub_id="1.1")
+    assert second.recv() == {"response": "ack", "requestID": "job2.1"}
+
+    # the request sent again is processed again
+    first.connect()
+    first.send("job1.1", "aggregate", bundle="b1", sub_id="1.0")
+    assert first.recv() == {
+        "response": "ack",
+        "message": {"bundle": {"job1": "b1", "job2": "b2"}},
+        "requestID": "job1.1",
+    }
+
+
+def test_slow_client(coordinator):
+    coordinator.read_timeout = 1
+    slow = socket.create_connection(("localhost", coordinator.group_port))
+    # only a part of the header
+    slow.sendall(b"0000")
+    time.sleep(0.1)
+
+    # the other clients are still served
+    start = time.monotonic()
+    client = Client(coordinator, "job1")
+    client.send(None, "group_data")
+    assert client.recv() == {"response": "wait"}
+    assert time.monotonic() - start < 0.5
+
+    # the incomplete request is dropped
+    slow.settimeout(5)
+    assert slow.recv(1) == b""
+    slow.close()
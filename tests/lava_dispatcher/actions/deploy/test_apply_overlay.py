@@ -1,9 +1,13 @@
 import logging
+import struct
 
 import pytest
 
 from lava_common.exceptions import JobError, LAVABug
-from lava_dispatcher.actions.deploy.apply_overlay import AppendOverlays
+from lava_dispatcher.actions.deploy.apply_overlay import (
+    AppendOverlays,
+    ApplyOverlaySparseImage,
+)
 from lava_dispatcher.job import Job
 
 
@@ -332,55 +336,106 @@ def test_append_overlays_update_guestfs_sparse(caplog, mocker, tmpdir):
         }
     }
     action.run_cmd = mocker.MagicMock()
-    replace = mocker.patch("lava_dispatcher.actions.deploy.apply_overlay.os.replace")
+    # A sparse image of 4 blocks: 1 raw block and 3 "don't care"
+    data = bytes(range(256)) * 16
+    (tmpdir / "rootfs.ext4").write_binary(
+        struct.pack("<IHHHHIIII", 0xED26FF3A, 1, 0, 28, 12, 4096, 4, 2, 0)
+        + struct.pack("<HHII", 0xCAC1, 0, 1, 12 + 4096)
+        + data
+        + struct.pack("<HHII", 0xCAC3, 0, 3, 12)
+    )
+
+    def add_drive(drive):
+        # The modifications of the raw view
+        with open(drive, "r+b") as f_raw:
+            f_raw.seek(8192)
+            f_raw.write(b"lava" * 1024)
 
     guestfs = mocker.MagicMock()
-    guestfs.add_drive = mocker.MagicMock()
+    guestfs().add_drive = mocker.MagicMock(side_effect=add_drive)
     mocker.patch(
         "lava_dispatcher.actions.deploy.apply_overlay.guestfs.GuestFS", guestfs
     )
     action.update_guestfs()
 
-    guestfs.assert_called_once_with(python_return_dict=True)
     guestfs().launch.assert_called_once_with()
     guestfs().list_devices.assert_called_once_with()
-    guestfs().add_drive.assert_called_once_with(str(tmpdir / "rootfs.ext4"))
+    guestfs().add_drive.assert_called_once_with(str(tmpdir / "rootfs.ext4.non-sparse"))
     guestfs().mount.assert_called_once_with(guestfs().list_devices()[0], "/")
     guestfs().mkdir_p.assert_called_once_with("/lib")
     guestfs().tar_in.assert_called_once_with(
         str(tmpdir / "modules.tar"), "/lib", compress=None
     )
-    assert action.run_cmd.mock_calls == [
-        mocker.call(
-            [
-                "/usr/bin/simg2img",
-                f"{tmpdir}/rootfs.ext4",
-                f"{tmpdir}/rootfs.ext4.non-sparse",
-            ],
-            error_msg=f"simg2img failed for {tmpdir}/rootfs.ext4",
-        ),
-        mocker.call(
-            [
-                "/usr/bin/img2simg",
-                f"{tmpdir}/rootfs.ext4",
-                f"{tmpdir}/rootfs.ext4.sparse",
-            ],
-            error_msg=f"img2simg failed for {tmpdir}/rootfs.ext4",
-        ),
-    ]
-    assert replace.mock_calls == [
-        mocker.call(f"{tmpdir}/rootfs.ext4.non-sparse", f"{tmpdir}/rootfs.ext4"),
-        mocker.call(f"{tmpdir}/rootfs.ext4.sparse", f"{tmpdir}/rootfs.ext4"),
-    ]
+    assert action.run_cmd.mock_calls == []
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["rootfs.ext4"]
+    # The raw block is kept and the modified block added as a fill block
+    assert (tmpdir / "rootfs.ext4").read_binary() == (
+        struct.pack("<IHHHHIIII", 0xED26FF3A, 1, 0, 28, 12, 4096, 4, 4, 0)
+        + struct.pack("<HHII", 0xCAC1, 0, 1, 12 + 4096)
+        + data
+        + struct.pack("<HHII", 0xCAC3, 0, 1, 12)
+        + struct.pack("<HHII", 0xCAC2, 0, 1, 16)
+        + b"lava"
+        + struct.pack("<HHII", 0xCAC3, 0, 1, 12)
+    )
 
     assert caplog.record_tuples == [
         ("dispatcher", 20, f"Modifying '{tmpdir}/rootfs.ext4'"),
-        ("dispatcher", 10, f"Calling simg2img on '{tmpdir}/rootfs.ext4'"),
+        ("dispatcher", 10, f"Expanding sparse image '{tmpdir}/rootfs.ext4'"),
         ("dispatcher", 10, "Overlays:"),
         ("dispatcher", 10, f"- rootfs.modules: '{tmpdir}/modules.tar' to '/lib'"),
-        ("dispatcher", 10, f"Calling img2simg on '{tmpdir}/rootfs.ext4'"),
+        ("dispatcher", 10, f"Updating sparse image '{tmpdir}/rootfs.ext4'"),
     ]
 
+    # The raw view is removed on errors
+    image = (tmpdir / "rootfs.ext4").read_binary()
+    guestfs().launch = mocker.MagicMock(side_effect=RuntimeError("no kvm"))
+    with pytest.raises(JobError, match="Unable to update image rootfs"):
+        action.update_guestfs()
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["rootfs.ext4"]
+    assert (tmpdir / "rootfs.ext4").read_binary() == image
+
+
+def test_apply_overlay_sparse_image_errors(mocker, tmpdir):
+    action = ApplyOverlaySparseImage("system")
+    action.job = Job(1234, {}, None)
+    action.parameters = {"namespace": "common"}
+    action.data = {
+        "common": {
+            "compress-overlay": {"output": {"file": str(tmpdir / "overlay.tar.gz")}},
+            "download-action": {"system": {"file": str(tmpdir / "system.img")}},
+        }
+    }
+    # A sparse image of 1 raw block
+    image = (
+        struct.pack("<IHHHHIIII", 0xED26FF3A, 1, 0, 28, 12, 4096, 1, 1, 0)
+        + struct.pack("<HHII", 0xCAC1, 0, 1, 12 + 4096)
+        + bytes(range(256)) * 16
+    )
+    (tmpdir / "system.img").write_binary(image)
+
+    # The temporary images are removed on errors
+    mocker.patch(
+        "lava_dispatcher.actions.deploy.apply_overlay.copy_overlay_to_sparse_fs",
+        side_effect=JobError("unable to mount"),
+    )
+    with pytest.raises(JobError, match="unable to mount"):
+        action.run(None, None)
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["system.img"]
+    assert (tmpdir / "system.img").read_binary() == image
+
+    mocker.patch(
+        "lava_dispatcher.actions.deploy.apply_overlay.copy_overlay_to_sparse_fs"
+    )
+    mocker.patch(
+        "lava_dispatcher.actions.deploy.apply_overlay.SparseImage.update",
+        side_effect=OSError("no space left on device"),
+    )
+    with pytest.raises(OSError, match="no space left on device"):
+        action.run(None, None)
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["system.img"]
+    assert (tmpdir / "system.img").read_binary() == image
+
 
 def test_append_lava_overlay_update_cpio(caplog, mocker, tmpdir):
     caplog.set_level(logging.DEBUG)
@@ -19,6 +19,8 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import threading
+import time
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -26,16 +28,19 @@ import pytest
 import requests
 
 from lava_common.constants import HTTP_DOWNLOAD_CHUNK_SIZE
-from lava_common.exceptions import InfrastructureError, JobError
+from lava_common.exceptions import InfrastructureError, JobError, LAVABug
+from lava_dispatcher.action import Action
 from lava_dispatcher.actions.deploy.download import (
     CopyToLxcAction,
     DownloaderAction,
     DownloadHandler,
+    DownloadQueueAction,
     FileDownloadAction,
     HttpDownloadAction,
     LxcDownloadAction,
     PreDownloadedAction,
     ScpDownloadAction,
+    WaitDownloadAction,
 )
 from lava_dispatcher.job import Job
 from tests.lava_dispatcher.test_basic import Factory
@@ -788,3 +793,100 @@ def test_copy_to_lxc_without_lxc_should_do_nothing():
     action = CopyToLxcAction()
     action.job = Job(1234, {}, None)
     action.run(None, 4242)  # no crash = success
+
+
+class BarrierAction(Action):
+    name = "barrier"
+
+    def __init__(self, barrier, exc=None):
+        super().__init__()
+        self.barrier = barrier
+        self.exc = exc
+        self.thread = None
+
+    def run(self, connection, max_end_time):
+        self.thread = threading.current_thread()
+        self.barrier.wait(timeout=5)
+        if self.exc is not None:
+            raise self.exc
+        return connection
+
+
+def download_queue(*groups):
+    queue = DownloadQueueAction(workers=2)
+    queue.job = Job(1234, {}, None)
+    queue.level = "1"
+    queue.populate({"namespace": "common"})
+    for (key, action) in groups:
+        queue.add(key, action)
+    return queue
+
+
+def test_download_queue():
+    # Both groups are running at the same time, otherwise the barrier breaks
+    barrier = threading.Barrier(2)
+    (boot, system) = (BarrierAction(barrier), BarrierAction(barrier))
+    queue = download_queue(("boot", boot), ("system", system))
+    assert [a.level for a in queue.pipeline.actions] == ["1.1", "1.2"]
+
+    queue.run(None, time.monotonic() + 30)
+    action = WaitDownloadAction(queue)
+    action.job = queue.job
+    action.run(None, time.monotonic() + 30)
+    assert boot.thread not in [system.thread, threading.main_thread()]
+    with pytest.raises(LAVABug):
+        queue.wait("rootfs")
+    queue.cleanup(None)
+    assert queue.executor is None
+
+
+def test_download_queue_errors():
+    # The error of the group is raised when waiting for it
+    barrier = threading.Barrier(1)
+    queue = download_queue(
+        ("boot", BarrierAction(barrier)),
+        ("system", BarrierAction(barrier, InfrastructureError("network"))),
+    )
+    queue.run(None, time.monotonic() + 30)
+    action = WaitDownloadAction(queue, ["boot"])
+    action.job = queue.job
+    action.run(None, time.monotonic() + 30)
+    action.keys = ["system"]
+    with pytest.raises(InfrastructureError, match="network"):
+        action.run(None, time.monotonic() + 30)
+    queue.cleanup(None)
+
+    # Timeouts are raised by the actions of the group
+    queue = download_queue(("boot", BarrierAction(barrier)))
+    queue.run(None, time.monotonic() - 1)
+    with pytest.raises(JobError, match="barrier timed out"):
+        queue.wait("boot")
+    queue.cleanup(None)
+
+
+class HangAction(Action):
+    name = "hang"
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+
+    def run(self, connection, max_end_time):
+        self.started.set()
+        # Like the downloads, between two chunks
+        while True:
+            time.sleep(0.01)
+
+
+def test_download_queue_cleanup():
+    # The running downloads are interrupted, the others are not started
+    (first, second, third) = (HangAction(), HangAction(), HangAction())
+    queue = download_queue(("boot", first), ("dtb", second), ("system", third))
+    queue.run(None, time.monotonic() + 300)
+    assert first.started.wait(5) and second.started.wait(5)
+    start = time.monotonic()
+    queue.cleanup(None)
+    assert time.monotonic() - start < 30
+    assert not third.started.is_set()
+    assert queue.running == {}
+    assert first.results == {"fail": "interrupted"}
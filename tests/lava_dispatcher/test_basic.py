@@ -473,6 +473,43 @@ class TestPipeline(StdoutTestCase):
             test_action.get_namespace_data("common", "unknown", "simple"), 1
         )
 
+    def test_namespace_data_copies(self):
+        factory = Factory()
+        job = factory.create_kvm_job("sample_jobs/kvm.yaml")
+        test_action = job.pipeline.actions[0]
+        value = {"key": {"nest": [1, 2]}, "name": "lava"}
+        test_action.set_namespace_data("common", "ns", "dict", value)
+        copied = test_action.get_namespace_data("common", "ns", "dict")
+        self.assertEqual(copied, value)
+        copied["key"]["nest"].append(3)
+        self.assertEqual(value["key"]["nest"], [1, 2])
+        # Immutable values are shared
+        self.assertIs(copied["name"], value["name"])
+        self.assertIs(
+            test_action.get_namespace_data("common", "ns", "dict", deepcopy=False),
+            value,
+        )
+
+    def test_namespace_data_journal(self):
+        factory = Factory()
+        job = factory.create_kvm_job("sample_jobs/kvm.yaml")
+        (first, second) = job.pipeline.actions[0:2]
+        first.set_namespace_data("common", "ns", "key", "one")
+        second.set_namespace_data("common", "ns", "key", ["two"])
+        data = job.context
+        self.assertEqual(data.writer("common", "common", "ns", "key"), second.name)
+        self.assertEqual(
+            [
+                (c["writer"], c["value"])
+                for c in data.journal("common", "common", "ns", "key")
+            ],
+            [(first.name, "one"), (second.name, ["two"])],
+        )
+        self.assertIsNone(data.writer("common", "common", "ns", "unknown"))
+        dump = [d for d in data.dump() if d["label"] == "ns"]
+        self.assertEqual(len(dump), 1)
+        self.assertEqual([c["value"] for c in dump[0]["changes"]], ["one", "['two']"])
+
 
 class TestFakeActions(StdoutTestCase):
     class KeepConnection(Action):
@@ -0,0 +1,193 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import re
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from lava_common.exceptions import InfrastructureError, JobError
+from lava_common.schemas import validate as validate_job
+from lava_common.timeout import Timeout, scheduler
+from lava_common.yaml import yaml_safe_load
+from lava_dispatcher.action import Action, Pipeline
+from lava_dispatcher.job import Job
+from tests.utils import DummyLogger
+
+
+class FakeCommand(Action):
+    """
+    Run the "sleep <seconds>", "fail <seconds>", "protected <seconds>" or "hang"
+    commands and record the thread and the namespace data seen by the action.
+    """
+
+    name = "fake-command"
+    description = "fake, do not use outside unit tests"
+    summary = "fake command for unit tests"
+
+    def __init__(self):
+        super().__init__()
+        self.thread = None
+        self.previous = None
+        self.protected = False
+
+    def run(self, connection, max_end_time):
+        self.thread = threading.current_thread().name
+        self.previous = self.get_namespace_data(
+            action=self.name, label="command", key="previous"
+        )
+        (command, _, arg) = self.parameters["name"].partition(" ")
+        if command == "sleep":
+            time.sleep(float(arg))
+        elif command == "fail":
+            time.sleep(float(arg))
+            raise InfrastructureError("%s failed" % self.parameters["namespace"])
+        elif command == "protected":
+            with scheduler.protect():
+                time.sleep(float(arg))
+                self.protected = True
+            while True:
+                time.sleep(0.01)
+        elif command == "hang":
+            while True:
+                time.sleep(0.01)
+        self.set_namespace_data(
+            action=self.name, label="command", key="previous", value=self.level
+        )
+        return connection
+
+
+def create_job(**overrides):
+    data = yaml_safe_load(
+        (Path(__file__).parent / "sample_jobs/concurrent-namespaces.yaml").read_text()
+    )
+    data.update(overrides)
+    validate_job(data)
+    job = Job(4212, data, DummyLogger())
+    job.timeout = Timeout("job", Timeout.parse(data["timeouts"]["job"]))
+    job.pipeline = Pipeline(job=job)
+    for action in data["actions"]:
+        job.pipeline.add_action(FakeCommand(), action["command"])
+    return job
+
+
+def run(job):
+    start = time.monotonic()
+    with job.timeout(None, None) as max_end_time:
+        job.pipeline.run_actions(None, max_end_time)
+    return time.monotonic() - start
+
+
+def test_validate():
+    create_job()
+    with pytest.raises(Exception, match="'other' is not used by any action"):
+        create_job(concurrent_namespaces=["host", "other"])
+    with pytest.raises(Exception, match="length of value must be at least 2"):
+        create_job(concurrent_namespaces=["host"])
+
+    data = yaml_safe_load(
+        (Path(__file__).parent / "sample_jobs/concurrent-namespaces.yaml").read_text()
+    )
+    data["actions"][1]["command"]["connection-namespace"] = "host"
+    with pytest.raises(Exception, match="'dut' cannot use the connection of 'host'"):
+        validate_job(data)
+
+
+def test_sequential():
+    job = create_job()
+    del job.parameters["concurrent_namespaces"]
+    assert run(job) >= 2.0
+    assert {action.thread for action in job.pipeline.actions} == {"MainThread"}
+
+
+def test_concurrent():
+    job = create_job()
+    duration = run(job)
+    # host: 0.5 + 0.5, dut: 0.3 + 0.3 + 0.3 then test: 0.1
+    assert 1.1 <= duration < 1.6
+    actions = job.pipeline.actions
+    assert [action.thread for action in actions] == [
+        "host",
+        "dut",
+        "host",
+        "dut",
+        "dut",
+        "MainThread",
+    ]
+    # The namespace data are kept by namespace
+    assert [action.previous for action in actions] == [None, None, "1", "2", "4", None]
+    assert all(action.timeout.elapsed_time > 0 for action in actions)
+
+
+def test_error():
+    job = create_job()
+    job.pipeline.actions[0].parameters["name"] = "hang"
+    job.pipeline.actions[3].parameters["name"] = "fail 0.1"
+    with pytest.raises(InfrastructureError, match="dut failed"):
+        run(job)
+    actions = job.pipeline.actions
+    assert actions[3].results == {"fail": "dut failed"}
+    # The failure of dut interrupts host
+    assert actions[0].results == {"fail": "interrupted"}
+    assert 0.4 <= actions[0].timeout.elapsed_time < 1
+    # The next actions are not run
+    assert [action.thread for action in actions[4:]] == [None, None]
+    assert actions[2].thread is None
+
+
+def test_error_protected():
+    job = create_job()
+    job.pipeline.actions[0].parameters["name"] = "protected 0.5"
+    job.pipeline.actions[1].parameters["name"] = "fail 0.1"
+    with pytest.raises(InfrastructureError, match="dut failed"):
+        run(job)
+    actions = job.pipeline.actions
+    # host is interrupted at the end of the protected block
+    assert actions[0].protected is True
+    assert actions[0].results == {"fail": "interrupted"}
+    assert 0.5 <= actions[0].timeout.elapsed_time < 1
+    assert scheduler.protected == {}
+
+
+def test_timeout():
+    job = create_job()
+    job.pipeline.actions[1].timeout.duration = 0.2
+    job.pipeline.actions[1].parameters["name"] = "hang"
+    with pytest.raises(JobError, match=r"fake-command timed out after 0\.\d+ seconds"):
+        run(job)
+    actions = job.pipeline.actions
+    assert re.fullmatch(
+        r"fake-command timed out after 0\.\d+ seconds", actions[1].results["fail"]
+    )
+    assert 0.2 <= actions[1].timeout.elapsed_time < 1
+    assert actions[0].timeout.elapsed_time < 1
+    assert actions[2].thread is None
+
+
+def test_job_timeout():
+    job = create_job()
+    job.timeout = Timeout("job", 0.5)
+    job.pipeline.actions[0].parameters["name"] = "hang"
+    job.pipeline.actions[1].parameters["name"] = "hang"
+    with pytest.raises(JobError, match="job timed out"):
+        run(job)
+    actions = job.pipeline.actions
+    assert 0.5 <= actions[0].timeout.elapsed_time < 1
+    assert 0.5 <= actions[1].timeout.elapsed_time < 1
@@ -219,6 +219,7 @@ class TestDefinitionHandlers(StdoutTestCase):
             "lava-test-event",
             "lava-test-feedback",
             "lava-test-reference",
+            "lava-test-results",
             "lava-test-runner",
             "lava-test-set",
             "lava-test-shell",
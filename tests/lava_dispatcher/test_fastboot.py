@@ -24,6 +24,8 @@ import unittest
 from unittest.mock import ANY, MagicMock, PropertyMock, patch
 
 from lava_common.exceptions import InfrastructureError, JobError
+from lava_common.yaml import yaml_safe_load
+from lava_dispatcher.actions.deploy.download import WaitDownloadAction
 from lava_dispatcher.actions.deploy.fastboot import FastbootFlashOrderAction
 from lava_dispatcher.protocols.lxc import LxcProtocol
 from lava_dispatcher.utils.adb import OptionalContainerAdbAction
@@ -540,6 +542,46 @@ class TestFastbootDeploy(StdoutTestCase):
         self.assertIsInstance(flash_order, FastbootFlashOrderAction)
         self.assertEqual(expected_flash_cmds, flash_cmds)
 
+    def test_flash_cmds_order_pipelined(self):
+        with open(
+            os.path.join(os.path.dirname(__file__), "sample_jobs/db410c.yaml")
+        ) as f_in:
+            job_data = yaml_safe_load(f_in)
+        job_data["actions"][2]["deploy"]["pipelined"] = True
+        job = FastBootFactory().create_custom_job("db410c-01.jinja2", job_data)
+        action = job.pipeline.actions[2]
+        self.assertEqual(action.name, "fastboot-deploy")
+        names = [a.name for a in action.pipeline.actions]
+        # The images are downloaded while the device is reset
+        self.assertEqual(
+            names.index("download-queue") + 1, names.index("connect-device")
+        )
+        queue = action.pipeline.actions[names.index("download-queue")]
+        self.assertEqual(
+            sorted(queue.groups.keys()),
+            sorted(job_data["actions"][2]["deploy"]["images"].keys()),
+        )
+        self.assertEqual(
+            [a.name for a in queue.pipeline.actions],
+            ["download-retry"] * len(queue.groups),
+        )
+
+        # Each image is waited for before being flashed
+        flash_order = action.pipeline.actions[-1]
+        self.assertIsInstance(flash_order, FastbootFlashOrderAction)
+        actions = flash_order.pipeline.actions
+        flash_cmds = []
+        for (index, flash) in enumerate(actions):
+            if flash.name != "fastboot-flash-action":
+                continue
+            wait = actions[index - 2]
+            self.assertIsInstance(wait, WaitDownloadAction)
+            self.assertIs(wait.downloads, queue)
+            self.assertEqual(wait.keys, [flash.command])
+            flash_cmds.append(flash.command)
+        self.assertEqual(flash_cmds[:3], ["partition", "hyp", "rpm"])
+        self.assertEqual(len(flash_cmds), len(queue.groups))
+
     @unittest.skipIf(infrastructure_error("lxc-start"), "lxc-start not installed")
     def test_hikey960_fastboot(self):
         job = self.factory.create_hikey960_job("sample_jobs/hikey960-aosp.yaml")
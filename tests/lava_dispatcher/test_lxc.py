@@ -18,14 +18,19 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import json
 import os
+import shutil
 import unittest
 
+import pytest
+
 from lava_common.exceptions import JobError
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
 from lava_dispatcher.actions.deploy.lxc import LxcCreateAction
 from lava_dispatcher.device import NewDevice
 from lava_dispatcher.parser import JobParser
+from lava_dispatcher.utils.lxc import LxcCache
 from tests.lava_dispatcher.test_basic import Factory, StdoutTestCase
 from tests.utils import DummyLogger, infrastructure_error
 
@@ -350,3 +355,166 @@ class TestLxcWithDevices(StdoutTestCase):
         )
         description_ref = self.pipeline_reference("frdm-k64f-lxc.yaml", job=job)
         self.assertEqual(description_ref, job.pipeline.describe())
+
+
+class FakeLxc:
+    """
+    Fake lxc commands, like lava-lxc-mocker, creating the containers in a
+    temporary lxc path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.commands = []
+
+    def run_cmd(self, command_list, allow_fail=False, error_msg=None, cwd=None):
+        self.commands.append(command_list[0])
+        args = command_list[1:]
+        container = self.path / args[args.index("-n") + 1]
+        ret = 0
+        if command_list[0] == "lxc-create":
+            (container / "rootfs").mkdir(parents=True)
+            (container / "rootfs" / "data").write_bytes(b"x" * 4096)
+        elif command_list[0] == "lxc-copy":
+            name = args[args.index("-N") + 1]
+            (self.path / name / "rootfs").mkdir(parents=True)
+            (container / "snapshots").mkdir(exist_ok=True)
+            (container / "snapshots" / name).touch()
+        elif command_list[0] == "lxc-destroy":
+            if not container.exists() or list(container.glob("snapshots/*")):
+                ret = 1
+            else:
+                shutil.rmtree(str(container))
+                for snapshot in self.path.glob("*/snapshots/" + container.name):
+                    snapshot.unlink()
+        elif command_list[0] == "lxc-info":
+            ret = 0 if container.exists() else 1
+        if ret and not allow_fail:
+            raise JobError(error_msg)
+        return ret
+
+    def parsed_command(self, command_list, allow_fail=False, cwd=None):
+        self.commands.append(command_list[0])
+        return "10.0.3.42\n"
+
+
+def test_lxc_cache_pipeline():
+    job = LxcFactory().create_bbb_lxc_job("sample_jobs/bbb-lxc.yaml")
+    action = [a for a in job.pipeline.actions if a.name == "lxc-deploy"][0]
+    assert "lxc-apt-install" in [a.name for a in action.pipeline.actions]
+
+    # The packages are installed in the cached base containers
+    job.parameters["dispatcher"] = {"lxc_cache": True}
+    action.populate(action.parameters)
+    assert [a.name for a in action.pipeline.actions][:2] == [
+        "lxc-create-action",
+        "lxc-create-udev-rule-action",
+    ]
+    assert "lxc-apt-install" not in [a.name for a in action.pipeline.actions]
+
+    # Not for the persistent containers
+    job.parameters["protocols"]["lava-lxc"]["persist"] = True
+    action.populate(action.parameters)
+    assert "lxc-apt-install" in [a.name for a in action.pipeline.actions]
+
+
+def test_lxc_cache(tmp_path):
+    job = LxcFactory().create_bbb_lxc_job("sample_jobs/bbb-lxc.yaml")
+    job.parameters["dispatcher"] = {
+        "lxc_path": str(tmp_path),
+        "lxc_cache": {"max_age": 3600, "max_size": 2 * 4096 / 1024**3},
+    }
+    action = [
+        a
+        for a in job.pipeline.actions[0].pipeline.actions
+        if isinstance(a, LxcCreateAction)
+    ][0]
+    action._set_lxc_data()
+    action.lxc_data["custom_lxc_path"] = False
+    fake = FakeLxc(tmp_path)
+    action.run_cmd = fake.run_cmd
+    action.parsed_command = fake.parsed_command
+    base = LxcCache.name(LxcCache.key(action.lxc_data, action.parameters["packages"]))
+
+    def destroy_container():
+        fake.run_cmd(["lxc-destroy", "-n", action.lxc_data["lxc_name"]])
+        fake.commands = []
+
+    # Provision the base container then clone it
+    action.run(None, None)
+    assert action.results["cache"] == "miss"
+    assert fake.commands == [
+        "lxc-info",
+        "lxc-create",
+        "lxc-start",
+        "lxc-wait",
+        "lxc-info",
+        "lxc-attach",
+        "lxc-attach",
+        "lxc-stop",
+        "lxc-copy",
+    ]
+    metadata = json.loads((tmp_path / base / LxcCache.METADATA).read_text())
+    assert metadata["packages"] == ["lsb-release", "procps", "usbutils", "util-linux"]
+    assert metadata["size"] >= 4096
+    assert (tmp_path / action.lxc_data["lxc_name"] / "rootfs").is_dir()
+    destroy_container()
+
+    # Only clone
+    action.run(None, None)
+    assert action.results["cache"] == "hit"
+    assert fake.commands == ["lxc-info", "lxc-copy"]
+
+    # Expired but still in use: keep it
+    metadata["created"] -= 7200
+    LxcCache(str(tmp_path), {}).save(base, metadata)
+    fake.commands = []
+    action.lxc_data["lxc_name"] = "other"
+    action.run(None, None)
+    assert action.results["cache"] == "hit"
+    assert fake.commands == ["lxc-info", "lxc-destroy", "lxc-copy"]
+    fake.run_cmd(["lxc-destroy", "-n", "other"])
+    action.lxc_data["lxc_name"] = "lxc-bbb-test-4999"
+    destroy_container()
+
+    # Expired and unused: provisioned again
+    action.run(None, None)
+    assert action.results["cache"] == "miss"
+    assert fake.commands[:3] == ["lxc-info", "lxc-destroy", "lxc-create"]
+    destroy_container()
+
+    # Over the disk budget: evict the least recently used
+    action.parameters = {"packages": ["usbutils"]}
+    action.run(None, None)
+    assert action.results["cache"] == "miss"
+    assert fake.commands[-2:] == ["lxc-copy", "lxc-destroy"]
+    assert not (tmp_path / base).exists()
+    assert len(LxcCache(str(tmp_path), {}).entries()) == 1
+
+
+def test_lxc_cache_provisioning_failure(tmp_path):
+    job = LxcFactory().create_bbb_lxc_job("sample_jobs/bbb-lxc.yaml")
+    job.parameters["dispatcher"] = {"lxc_path": str(tmp_path), "lxc_cache": True}
+    action = [
+        a
+        for a in job.pipeline.actions[0].pipeline.actions
+        if isinstance(a, LxcCreateAction)
+    ][0]
+    action._set_lxc_data()
+    action.lxc_data["custom_lxc_path"] = False
+    fake = FakeLxc(tmp_path)
+    action.run_cmd = fake.run_cmd
+    action.parsed_command = fake.parsed_command
+
+    def run_cmd(command_list, allow_fail=False, error_msg=None, cwd=None):
+        if command_list[-1] == "util-linux":
+            raise JobError(error_msg)
+        return FakeLxc.run_cmd(fake, command_list, allow_fail, error_msg, cwd)
+
+    action.run_cmd = run_cmd
+    with pytest.raises(JobError):
+        action.run(None, None)
+    # The partial base container is destroyed
+    assert fake.commands[-2:] == ["lxc-stop", "lxc-destroy"]
+    assert LxcCache(str(tmp_path), {}).entries() == {}
+    assert not list(tmp_path.glob("lava-cache-*/"))
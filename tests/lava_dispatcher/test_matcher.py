@@ -0,0 +1,191 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import re
+import threading
+from pathlib import Path
+
+import pexpect
+import pytest
+
+from lava_common.exceptions import TestError
+from lava_common.timeout import Timeout
+from lava_dispatcher.shell import ShellCommand
+from lava_dispatcher.utils.matcher import PatternMatcher, compile_patterns
+from lava_dispatcher.utils.messages import LinuxKernelMessages
+
+SIGNAL = r"<LAVA_SIGNAL_(\S+) ([^>]+)>"
+
+
+class Logger:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def expect_all(logfile, patterns):
+    # use a lookback smaller than the kernel logs to exercise the windowing
+    matcher = PatternMatcher(patterns, lookback=100)
+    shell = ShellCommand(
+        "cat %s" % logfile, Timeout("fake", duration=30), logger=Logger()
+    )
+    ret = []
+    while True:
+        index = shell.expect(matcher)
+        if index == patterns.index(pexpect.EOF):
+            return ret
+        ret.append((index, shell.after))
+
+
+def pexpect_all(logfile, patterns):
+    child = pexpect.spawn(
+        "cat", [logfile], encoding="utf-8", searchwindowsize=None, maxread=2000
+    )
+    ret = []
+    while True:
+        index = child.expect(patterns)
+        if index == patterns.index(pexpect.EOF):
+            return ret
+        ret.append((index, child.after))
+
+
+@pytest.mark.parametrize(
+    "logfile",
+    sorted((Path(__file__).parent).glob("kernel-*.txt")),
+    ids=lambda p: p.name,
+)
+def test_same_matches_as_pexpect(logfile):
+    patterns = LinuxKernelMessages.get_init_prompts() + [
+        "root@debian:~#",
+        SIGNAL,
+        pexpect.EOF,
+    ]
+    assert expect_all(str(logfile), patterns) == pexpect_all(str(logfile), patterns)
+
+
+def test_match_groups():
+    matcher = PatternMatcher(
+        [
+            "<LAVA_TEST_RUNNER EXIT>",
+            re.compile(r"(?P<test_case_id>\w+): (?P<result>pass|fail)", re.M),
+            SIGNAL,
+            pexpect.EOF,
+            pexpect.TIMEOUT,
+        ]
+    )
+    assert matcher.eof_index == 3
+    assert matcher.timeout_index == 4
+
+    buffer = "boot\n<LAVA_SIGNAL_STARTRUN 0_smoke 1234>\nls: pass\n"
+    assert matcher.search(buffer, len(buffer)) == 2
+    assert matcher.match.groups() == ("STARTRUN", "0_smoke 1234")
+    assert buffer[matcher.start : matcher.end] == "<LAVA_SIGNAL_STARTRUN 0_smoke 1234>"
+
+    buffer = buffer[matcher.end :]
+    assert matcher.search(buffer, len(buffer)) == 1
+    assert matcher.match.groupdict() == {"test_case_id": "ls", "result": "pass"}
+
+    assert matcher.search("nothing here", 12) == -1
+
+
+def test_first_pattern_wins_on_ties():
+    matcher = PatternMatcher(["abc", "abcdef", "ab"])
+    assert matcher.search("xxabcdef", 8) == 0
+    assert matcher.match.group(0) == "abc"
+
+
+def test_combined_patterns():
+    matcher = PatternMatcher(
+        [r"(?P<case>\w+)=(?P<result>pass|fail)", "<LAVA_", r"(\d+) cases", ".*FAIL"]
+    )
+    assert [index for index, _ in matcher._searches] == [1]
+    assert sorted(index for index, _ in matcher._groups.values()) == [0, 2, 3]
+
+    assert matcher.search("ran 12 cases", 12) == 2
+    assert matcher.match.groups() == ("12",)
+    assert matcher.search("x <LAVA_ ls=pass", 16) == 1
+    assert matcher.search("ls=fail <LAVA_", 14) == 0
+    assert matcher.match.groupdict() == {"case": "ls", "result": "fail"}
+    # ".*FAIL" and the first pattern both start at 0
+    assert matcher.search("ls=fail FAIL", 12) == 0
+
+
+def test_backreferences_are_not_combined():
+    matcher = PatternMatcher([r"(\w)\1", r"(a+)b"])
+    assert matcher._combined is None
+    assert matcher.search("xyab", 4) == 1
+    assert matcher.match.groups() == ("a",)
+    assert matcher.search("xyzzy", 5) == 0
+    assert matcher.match.group(0) == "zz"
+
+
+def test_lookback():
+    # A signal split across two reads is found when the lookback covers the
+    # beginning of the signal
+    buffer = "some output <LAVA_SIGNAL_TESTCASE TEST_CASE_ID=ls RESULT=pass>"
+    matcher = PatternMatcher([SIGNAL, pexpect.TIMEOUT], lookback=60)
+    assert matcher.search(buffer, 20) == 0
+    # Data older than the lookback is not searched again
+    matcher = PatternMatcher([SIGNAL, pexpect.TIMEOUT], lookback=10)
+    assert matcher.search(buffer, 20) == -1
+    # Unless the whole buffer is requested
+    matcher = PatternMatcher([SIGNAL, pexpect.TIMEOUT], lookback=None)
+    assert matcher.search(buffer, 20) == 0
+
+
+def test_invalid_regex():
+    with pytest.raises(TestError) as exc:
+        PatternMatcher(["(unbalanced", pexpect.EOF])
+    assert exc.match("Invalid regular expression")
+
+
+def test_compile_patterns_cache():
+    patterns = ["login:", SIGNAL, pexpect.EOF]
+    first = compile_patterns(patterns)
+    second = compile_patterns(list(patterns))
+    # The compiled expressions are shared, not the match state
+    assert first._searches is second._searches
+    assert first is not second
+    assert first._searches is not compile_patterns(patterns[:2])._searches
+    assert compile_patterns(patterns, lookback=None).lookback is None
+    assert compile_patterns("login:").patterns == ["login:"]
+
+
+def test_compile_patterns_threads():
+    patterns = ["login:", SIGNAL, pexpect.EOF]
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def expect(name, buffer):
+        matcher = compile_patterns(patterns)
+        barrier.wait()
+        index = matcher.search(buffer, len(buffer))
+        barrier.wait()
+        results[name] = (index, matcher.start, matcher.match.group())
+
+    threads = [
+        threading.Thread(target=expect, args=("kvm", "boot\nlogin:")),
+        threading.Thread(target=expect, args=("lxc", "<LAVA_SIGNAL_ENDRUN 0_smoke 1>")),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {
+        "kvm": (0, 5, "login:"),
+        "lxc": (1, 0, "<LAVA_SIGNAL_ENDRUN 0_smoke 1>"),
+    }
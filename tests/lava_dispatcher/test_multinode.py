@@ -21,8 +21,11 @@
 
 import json
 import os
+import threading
+import time
 import uuid
 
+from lava.coordinator import LavaCoordinator
 from lava_common.constants import LAVA_MULTINODE_SYSTEM_TIMEOUT
 from lava_common.exceptions import InfrastructureError, JobError, TestError
 from lava_common.timeout import Timeout
@@ -836,3 +839,97 @@ class TestDelayedStart(StdoutTestCase):
         )
         self.assertFalse(self.server_protocol.delayed_start)
         self.assertFalse(self.bad_protocol.valid)
+
+
+class TestPersistentConnection(StdoutTestCase):
+    class LegacyCoordinator(LavaCoordinator):
+        """
+        Coordinator without support for persistent connections
+        """
+
+        def serve(self, conn):
+            json_data = self._read(conn)
+            if json_data is None:
+                self._close(conn)
+                return
+            json_data.pop("requestID", None)
+            self.conn = conn
+            self.dataReceived(json_data)
+            self._close(conn)
+
+    def start(self, cls):
+        coord = cls("localhost", 0, 4096)
+        coord.all_groups = {}
+        threading.Thread(target=coord.run, daemon=True).start()
+        while coord.selector is None:
+            time.sleep(0.01)
+        self.addCleanup(setattr, coord, "running", False)
+        return coord
+
+    def protocols(self, coord, size):
+        protocols = []
+        for index in range(size):
+            parameters = {
+                "protocols": {
+                    "lava-multinode": {
+                        "target_group": "persistent-group",
+                        "role": "role%d" % index,
+                        "group_size": size,
+                    }
+                }
+            }
+            protocol = MultinodeProtocol(parameters, str(index))
+            protocol.logger = DummyLogger()
+            protocol.settings = {
+                "port": coord.group_port,
+                "blocksize": 4096,
+                "poll_delay": 1,
+                "coordinator_hostname": "localhost",
+                "persistent": True,
+            }
+            protocol.base_message = {
+                "hostname": "localhost",
+                "client_name": str(index),
+                "group_name": "persistent-group",
+                "role": "role%d" % index,
+            }
+            protocols.append(protocol)
+        return protocols
+
+    def run_group(self, protocols):
+        replies = {}
+
+        def job(protocol):
+            protocol.initialise_group()
+            replies[protocol.job_id] = json.loads(protocol.request_sync("booted"))
+            protocol.finalise_protocol()
+
+        threads = [threading.Thread(target=job, args=[p]) for p in protocols]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        return replies
+
+    def test_sync(self):
+        coord = self.start(LavaCoordinator)
+        protocols = self.protocols(coord, 4)
+        start = time.monotonic()
+        replies = self.run_group(protocols)
+        # pushed by the coordinator instead of polled every poll_delay
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(replies), 4)
+        for reply in replies.values():
+            self.assertEqual(reply, {"response": "ack", "message": "booted"})
+        self.assertTrue(all(p.settings["persistent"] for p in protocols))
+        self.assertTrue(all(p.connection is None for p in protocols))
+        self.assertEqual(coord.all_groups, {})
+
+    def test_legacy_coordinator(self):
+        coord = self.start(self.LegacyCoordinator)
+        protocols = self.protocols(coord, 2)
+        for protocol in protocols:
+            protocol.settings["poll_delay"] = 0.1
+        replies = self.run_group(protocols)
+        self.assertEqual(len(replies), 2)
+        self.assertFalse(any(p.settings["persistent"] for p in protocols))
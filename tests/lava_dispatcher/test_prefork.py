@@ -0,0 +1,60 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import io
+import json
+import os
+import signal
+import sys
+import time
+
+from lava_dispatcher import prefork
+
+
+def test_serve(monkeypatch, tmp_path):
+    monkeypatch.setattr(prefork, "warm_up", lambda: None)
+
+    def main():
+        os.write(1, (" ".join(sys.argv) + " " + os.environ["LAVA_VAR"]).encode())
+        return 0
+
+    request = {
+        "args": ["--job-id=1", "job.yaml"],
+        "env": {"LAVA_VAR": "hello"},
+        "stdout": str(tmp_path / "stdout"),
+        "stderr": str(tmp_path / "stderr"),
+    }
+    rfile = io.StringIO(json.dumps(request) + "\n" + "{}\n" + "invalid\n")
+    wfile = io.StringIO()
+    handler = signal.getsignal(signal.SIGCHLD)
+    try:
+        assert prefork.serve(main, rfile, wfile) == 0
+    finally:
+        signal.signal(signal.SIGCHLD, handler)
+
+    replies = [json.loads(line) for line in wfile.getvalue().splitlines()]
+    assert len(replies) == 3
+    assert replies[0]["pid"] != os.getpid()
+    assert replies[1] == {"error": "missing 'args'"}
+    assert "error" in replies[2]
+
+    for _ in range(50):
+        if (tmp_path / "stdout").exists() and (tmp_path / "stdout").read_text():
+            break
+        time.sleep(0.1)
+    assert (tmp_path / "stdout").read_text() == "lava-run --job-id=1 job.yaml hello"
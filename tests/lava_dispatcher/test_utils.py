@@ -18,6 +18,7 @@
 # along
 # with this program; if not, see <http://www.gnu.org/licenses>.
 
+import importlib
 import os
 import subprocess  # nosec - unit test support.
 import unittest
@@ -27,11 +28,8 @@ import pytest
 from lava_common.exceptions import InfrastructureError, JobError
 from lava_common.utils import debian_filename_version
 from lava_dispatcher.action import Action
-
-# pylint: disable=unused-import
-from lava_dispatcher.actions.boot import strategies as boot_strategies
-from lava_dispatcher.actions.deploy import strategies as deploy_strategies
-from lava_dispatcher.actions.test import strategies as test_strategies
+from lava_dispatcher.logical import load_strategies
+from lava_dispatcher.prefork import REGISTRIES
 from lava_dispatcher.utils import installers, vcs
 from lava_dispatcher.utils.decorator import replace_exception
 from lava_dispatcher.utils.shell import which
@@ -172,7 +170,41 @@ def test_no_history(setup, tmpdir):
 ALLOWED = ["commands", "deploy", "test"]
 
 
-def test_summary_exists():
+@pytest.fixture
+def strategies():
+    for registry in REGISTRIES:
+        load_strategies(registry)
+
+
+def test_load_strategies(monkeypatch):
+    imported = []
+    import_module = importlib.import_module
+
+    def record(name):
+        imported.append(name)
+        return import_module(name)
+
+    monkeypatch.setattr("lava_dispatcher.logical.importlib.import_module", record)
+    load_strategies("lava_dispatcher.actions.deploy.strategies", ["nfs"])
+    assert imported == [
+        "lava_dispatcher.actions.deploy.strategies",
+        "lava_dispatcher.actions.deploy.image",
+        "lava_dispatcher.actions.deploy.nfs",
+    ]
+
+    imported.clear()
+    load_strategies("lava_dispatcher.actions.test.strategies", ["unknown"])
+    assert imported == [
+        "lava_dispatcher.actions.test.strategies",
+        "lava_dispatcher.actions.test.docker",
+        "lava_dispatcher.actions.test.interactive",
+        "lava_dispatcher.actions.test.monitor",
+        "lava_dispatcher.actions.test.multinode",
+        "lava_dispatcher.actions.test.shell",
+    ]
+
+
+def test_summary_exists(strategies):
     for subclass in Action.__subclasses__():
         # TODO: is this normal?
         if not hasattr(subclass, "name"):
@@ -181,7 +213,7 @@ def test_summary_exists():
             assert hasattr(subclass, "summary")
 
 
-def test_description_exists():
+def test_description_exists(strategies):
     for subclass in Action.__subclasses__():
         if not hasattr(subclass, "name"):
             continue
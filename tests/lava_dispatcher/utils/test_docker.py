@@ -1,8 +1,9 @@
+import os
 import subprocess
 
 import pytest
 
-from lava_dispatcher.utils.docker import DockerRun
+from lava_dispatcher.utils.docker import DockerImages, DockerRun, images_from_definition
 
 
 @pytest.fixture
@@ -203,6 +204,8 @@ def test_wait(mocker):
     docker.name("foobar")
 
     sleep = mocker.patch("time.sleep")
+    # "docker events" is not available
+    mocker.patch("subprocess.Popen", side_effect=FileNotFoundError)
     inspect = mocker.patch(
         "subprocess.check_call",
         side_effect=[
@@ -220,3 +223,101 @@ def test_wait(mocker):
     )
     inspect.assert_has_calls([call, call])
     sleep.assert_called_once()
+
+
+@pytest.fixture
+def fake_docker(monkeypatch, tmp_path):
+    """
+    A fake "docker" executable recording its calls.
+    """
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    calls = tmp_path / "calls"
+    docker = bindir / "docker"
+    docker.write_text(
+        f"""#!/bin/sh
+echo "$@" >> {calls}
+case "$1 $2" in
+    "image inspect") echo sha256:0123 ;;
+    "inspect --format") echo $(arch) ;;
+    "inspect --format=.") exit 1 ;;
+    "events "*) echo create; exec sleep 10 ;;
+esac
+""",
+        encoding="utf-8",
+    )
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bindir}:{os.environ['PATH']}")
+    monkeypatch.setattr(
+        "lava_dispatcher.utils.docker.DOCKER_IMAGES_CACHE",
+        str(tmp_path / "docker-images.json"),
+    )
+
+    def get_calls():
+        if not calls.exists():
+            return []
+        return calls.read_text(encoding="utf-8").splitlines()
+
+    return get_calls
+
+
+def test_prepare_with_images_cache(fake_docker, mocker):
+    job = mocker.MagicMock()
+    job.job_id = "42"
+    for _ in range(2):
+        docker = DockerRun.from_parameters({"image": "foo"}, job)
+        docker.prepare()
+        assert docker.cmdline() == ["docker", "run", "--rm", "--init", "sha256:0123"]
+
+    assert fake_docker() == [
+        "pull foo",
+        "image inspect --format={{.Id}} foo",
+        "inspect --format {{.Architecture}} sha256:0123",
+        "image inspect --format=. sha256:0123",
+        "inspect --format {{.Architecture}} sha256:0123",
+    ]
+
+    images = DockerImages.get()
+    assert images.digest("foo") == "sha256:0123"
+    assert images.in_use() == ["foo"]
+    images.release(42)
+    assert images.in_use() == []
+
+
+def test_prepare_with_expired_images_cache(fake_docker, mocker):
+    mocker.patch("lava_dispatcher.utils.docker.DOCKER_IMAGES_TTL", -1)
+    for _ in range(2):
+        DockerRun("foo").prepare()
+    assert fake_docker().count("pull foo") == 2
+
+
+def test_wait_with_events(fake_docker, mocker):
+    sleep = mocker.patch("time.sleep")
+    docker = DockerRun("foo")
+    docker.name("bar")
+    docker.wait()
+    sleep.assert_not_called()
+    calls = fake_docker()
+    assert "inspect --format=. bar" in calls
+    assert (
+        "events --filter=container=bar --filter=event=create --filter=event=start --format={{.Status}}"
+        in calls
+    )
+
+
+def test_prefetch(fake_docker):
+    definition = {
+        "actions": [
+            {"deploy": {"to": "fastboot", "docker": {"image": "foo"}}},
+            {"boot": {"method": "qemu", "docker": {"image": "bar", "local": True}}},
+            {"test": {"docker": {"image": "foo"}, "definitions": []}},
+        ]
+    }
+    assert images_from_definition(definition) == ["foo"]
+
+    images = DockerImages.get()
+    for thread in images.prefetch(["foo"]):
+        thread.join()
+    assert images.digest("foo") == "sha256:0123"
+    assert images.prefetch(["foo"]) == []
+    assert fake_docker() == ["pull foo", "image inspect --format={{.Id}} foo"]
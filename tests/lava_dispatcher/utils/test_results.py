@@ -0,0 +1,243 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA Dispatcher.
+#
+# LAVA Dispatcher is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# LAVA Dispatcher is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along
+# with this program; if not, see <http://www.gnu.org/licenses>.
+
+import base64
+import gzip
+import os
+import re
+import shutil
+import subprocess  # nosec - unit test
+
+import pytest
+
+from lava_common.exceptions import JobError
+from lava_dispatcher.actions.test.shell import TestShellAction
+from lava_dispatcher.utils.results import (
+    ResultsBatch,
+    cksum,
+    parse_junit,
+    parse_lava,
+    parse_tap,
+)
+
+SCRIPTS = os.path.join(
+    os.path.dirname(__file__), "../../../lava_dispatcher/lava_test_shell"
+)
+
+JUNIT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuites>
+  <testsuite name="network">
+    <testcase classname="dns" name="resolve host"/>
+    <testcase classname="dns" name="reverse"><failure message="timeout"/></testcase>
+    <testcase name="ping"><skipped/></testcase>
+    <testcase name="route"><error/></testcase>
+  </testsuite>
+</testsuites>
+"""
+
+
+@pytest.mark.skipif(shutil.which("cksum") is None, reason="cksum not installed")
+@pytest.mark.parametrize("data", [b"", b"a", b"H4sIAAAAAAAAA+3OMQ6CQBBA0" * 40])
+def test_cksum(data):
+    out = subprocess.check_output(["cksum"], input=data)  # nosec - unit test
+    assert cksum(data) == int(out.split()[0])
+
+
+def test_parse_lava():
+    text = "# comment\nboot pass\n\nlatency pass 12.5 ms\nsize fail 42\n"
+    assert list(parse_lava(text)) == [
+        {"test_case_id": "boot", "result": "pass"},
+        {
+            "test_case_id": "latency",
+            "result": "pass",
+            "measurement": "12.5",
+            "units": "ms",
+        },
+        {"test_case_id": "size", "result": "fail", "measurement": "42"},
+    ]
+
+
+def test_parse_tap():
+    text = """TAP version 13
+1..5
+ok 1 - mount /proc
+not ok 2 - network up
+ok 3 - gpu # SKIP no device
+not ok 4 - suspend # TODO
+    ok 1 - indented subtest
+ok 5
+Bail out!
+"""
+    assert list(parse_tap(text)) == [
+        {"test_case_id": "mount_proc", "result": "pass"},
+        {"test_case_id": "network_up", "result": "fail"},
+        {"test_case_id": "gpu", "result": "skip"},
+        {"test_case_id": "suspend", "result": "unknown"},
+        {"test_case_id": "5", "result": "pass"},
+    ]
+
+
+def test_parse_junit():
+    assert list(parse_junit(JUNIT)) == [
+        {"test_case_id": "resolve_host", "result": "pass", "set": "dns"},
+        {"test_case_id": "reverse", "result": "fail", "set": "dns"},
+        {"test_case_id": "ping", "result": "skip", "set": "network"},
+        {"test_case_id": "route", "result": "fail", "set": "network"},
+    ]
+    with pytest.raises(JobError, match="Invalid JUnit report"):
+        list(parse_junit("<testsuite>"))
+
+
+def chunks(text, size=16):
+    data = base64.b64encode(gzip.compress(text.encode())).decode()
+    return [data[index : index + size] for index in range(0, len(data), size)]
+
+
+def test_batch():
+    with pytest.raises(JobError, match="Unknown results format"):
+        ResultsBatch("xunit", "base64", 1)
+    with pytest.raises(JobError, match="Unknown results encoding"):
+        ResultsBatch("tap", "zstd", 1)
+
+    data = chunks("ok 1 - boot\nnot ok 2 - network\n")
+    batch = ResultsBatch("tap", "gzip+base64", len(data))
+    assert batch.missing() == list(range(1, len(data) + 1))
+    for (index, chunk) in enumerate(data, start=1):
+        if index == 2:
+            # Corrupted on the serial line
+            assert not batch.add(index, cksum(chunk.encode()), chunk[::-1])
+        elif index != 3:
+            assert batch.add(index, cksum(chunk.encode()), chunk)
+    assert not batch.add(len(data) + 1, cksum(b"AAAA"), "AAAA")
+    assert batch.missing() == [2, 3]
+
+    for index in [2, 3]:
+        assert batch.add(index, cksum(data[index - 1].encode()), data[index - 1])
+    assert batch.missing() == []
+    assert batch.results() == [
+        {"test_case_id": "boot", "result": "pass"},
+        {"test_case_id": "network", "result": "fail"},
+    ]
+
+    batch = ResultsBatch("lava", "base64", 1)
+    batch.add(1, cksum(b"bm90IGd6aXA="), "bm90IGd6aXA=")
+    assert batch.results() == [{"test_case_id": "not", "result": "gzip"}]
+    batch = ResultsBatch("lava", "gzip+base64", 1)
+    batch.add(1, cksum(b"bm90IGd6aXA="), "bm90IGd6aXA=")
+    with pytest.raises(JobError, match="Unable to decode the results"):
+        batch.results()
+
+
+class Logger:
+    def __init__(self):
+        self.data = []
+
+    def results(self, data):
+        self.data.append(data)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class Connection:
+    """
+    The console of the DUT running lava-test-results, losing the first
+    transmission of some chunks.
+    """
+
+    def __init__(self, proc, drop, pattern):
+        self.proc = proc
+        self.pattern = re.compile(pattern)
+        self.drop = drop
+        self.match = None
+
+    def sendline(self, line, delay=0):
+        self.proc.stdin.write(line + "\n")
+        self.proc.stdin.flush()
+
+    def lines(self):
+        for line in self.proc.stdout:
+            self.match = self.pattern.search(line)
+            if self.match and self.match.group(2).startswith("CHUNK "):
+                index = int(self.match.group(2).split()[2])
+                if index in self.drop:
+                    self.drop.remove(index)
+                    continue
+            if self.match:
+                yield self.match
+
+
+@pytest.mark.parametrize("shell", ["/bin/bash", "/bin/sh"])
+@pytest.mark.parametrize("drop", [set(), {2, 5, 6}, set(range(1, 9))])
+def test_lava_test_results(tmp_path, shell, drop):
+    if not os.path.exists(shell):
+        pytest.skip("%s not installed" % shell)
+    (tmp_path / "results.xml").write_text(JUNIT)
+    env = dict(os.environ)
+    env["PATH"] = SCRIPTS + ":" + env["PATH"]
+    env["SHELL"] = shell
+    env["TMPDIR"] = str(tmp_path)
+    env.pop("KMSG", None)
+    proc = subprocess.Popen(  # nosec - unit test
+        [
+            shell,
+            os.path.join(SCRIPTS, "lava-test-results"),
+            "--format",
+            "junit",
+            "--chunk-size",
+            "32",
+            str(tmp_path / "results.xml"),
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+
+    action = TestShellAction()
+    action.logger = Logger()
+    action.definition = "1_smoke"
+    action.signal_director.test_uuid = "b5f1c1f4"
+    action._reset_patterns()
+    connection = Connection(proc, set(drop), action.patterns["signal"])
+    for _ in connection.lines():
+        assert action.check_patterns("signal", connection, "")
+    proc.stdin.close()
+    assert proc.wait() == 0
+    assert connection.drop == set()
+    assert action.logger.data == [
+        {
+            "definition": "1_smoke",
+            "case": case,
+            "result": result,
+            "set": test_set,
+        }
+        for (case, result, test_set) in [
+            ("resolve_host", "pass", "dns"),
+            ("reverse", "fail", "dns"),
+            ("ping", "skip", "network"),
+            ("route", "fail", "network"),
+        ]
+    ]
+    assert action.report == {
+        "resolve_host": {"set": "dns", "result": "pass"},
+        "reverse": {"set": "dns", "result": "fail"},
+        "ping": {"set": "network", "result": "skip"},
+        "route": {"set": "network", "result": "fail"},
+    }
+    assert os.listdir(str(tmp_path)) == ["results.xml"]
@@ -0,0 +1,182 @@
+import fcntl
+import logging
+import os
+import tarfile
+
+import pytest
+
+from lava_common.constants import ROOTFS_CACHE_SIZE
+from lava_dispatcher.utils.rootfs import (
+    RootfsCache,
+    RootfsView,
+    extract_rootfs,
+    rootfs_cache_config,
+)
+
+
+def make_rootfs(tmp_path, name, content):
+    tree = tmp_path / ("tree-" + name)
+    (tree / "etc").mkdir(parents=True)
+    (tree / "etc" / "hostname").write_text(content, encoding="utf-8")
+    archive = tmp_path / (name + ".tar.gz")
+    with tarfile.open(str(archive), "w:gz") as tar:
+        tar.add(str(tree), arcname=".")
+    return str(archive)
+
+
+@pytest.fixture
+def no_overlay(monkeypatch, tmp_path):
+    """
+    A "mount" executable that always fails, like when not running as root.
+    """
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    (bindir / "mount").write_text("#!/bin/sh\nexit 32\n", encoding="utf-8")
+    (bindir / "mount").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bindir}:{os.environ['PATH']}")
+
+
+def test_fetch(tmp_path):
+    cache = RootfsCache(tmp_path / "cache", 1024 * 1024)
+    (tmp_path / "cache").mkdir()
+    archive = make_rootfs(tmp_path, "rootfs", "debian")
+
+    (root, f_lock, hit) = cache.fetch(archive, "0123")
+    assert not hit
+    assert (root / "etc" / "hostname").read_text(encoding="utf-8") == "debian"
+    f_lock.close()
+
+    # The archive is not extracted again
+    os.unlink(archive)
+    (root2, f_lock, hit) = cache.fetch(archive, "0123")
+    assert hit
+    assert root2 == root
+    f_lock.close()
+    assert [name for (name, _) in cache.entries()] == ["0123"]
+
+
+def test_evict(tmp_path):
+    (tmp_path / "cache").mkdir()
+    cache = RootfsCache(tmp_path / "cache", 0)
+    used = make_rootfs(tmp_path, "used", "used")
+    unused = make_rootfs(tmp_path, "unused", "unused")
+
+    (_, f_used, _) = cache.fetch(used, "aaaa")
+    (_, f_unused, _) = cache.fetch(unused, "bbbb")
+    f_unused.close()
+    # Over budget: only the entries not used by a job are evicted
+    cache.evict()
+    assert [name for (name, _) in cache.entries()] == ["aaaa"]
+    assert not (tmp_path / "cache" / "bbbb.lock").exists()
+    f_used.close()
+
+    cache.evict()
+    assert cache.entries() == []
+
+
+def test_evict_locked(tmp_path):
+    (tmp_path / "cache").mkdir()
+    cache = RootfsCache(tmp_path / "cache", 0)
+    (_, f_lock, _) = cache.fetch(make_rootfs(tmp_path, "rootfs", "x"), "0123")
+    f_lock.close()
+    with open(str(tmp_path / "cache" / "0123.lock"), "a") as f_other:
+        fcntl.flock(f_other, fcntl.LOCK_SH)
+        cache.evict()
+        assert [name for (name, _) in cache.entries()] == ["0123"]
+
+
+def test_view_copy(no_overlay, tmp_path):
+    (tmp_path / "cache").mkdir()
+    cache = RootfsCache(tmp_path / "cache", 1024 * 1024)
+    archive = make_rootfs(tmp_path, "rootfs", "debian")
+    (tmp_path / "job").mkdir()
+
+    view = RootfsView(cache, logging.getLogger("dispatcher"))
+    root_dir = view.create(archive, "0123", str(tmp_path / "job"))
+    assert root_dir == str(tmp_path / "job" / "root")
+    assert view.mountpoint is None
+    # The copy does not hold the cache entry
+    assert view.f_lock is None
+
+    # Changes made by the job are not visible in the cache
+    with open(os.path.join(root_dir, "etc", "hostname"), "w") as f_out:
+        f_out.write("lava")
+    hostname = tmp_path / "cache" / "0123" / "root" / "etc" / "hostname"
+    assert hostname.read_text(encoding="utf-8") == "debian"
+    view.remove()
+
+
+def test_extract_rootfs_without_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr("lava_dispatcher.utils.rootfs.ROOTFS_CACHE_DIR", None)
+    archive = make_rootfs(tmp_path, "rootfs", "debian")
+    (tmp_path / "job").mkdir()
+    (root_dir, view) = extract_rootfs(
+        archive,
+        "0123",
+        str(tmp_path / "job"),
+        logging.getLogger("dispatcher"),
+        config={},
+    )
+    assert view is None
+    assert root_dir == str(tmp_path / "job")
+    assert (tmp_path / "job" / "etc" / "hostname").exists()
+
+
+def test_rootfs_cache_config(mocker, monkeypatch, tmp_path):
+    job = mocker.Mock(parameters={"dispatcher": {}})
+    assert rootfs_cache_config(job) is None
+    job.parameters["dispatcher"]["rootfs_cache"] = True
+    assert rootfs_cache_config(job) == {}
+    job.parameters["dispatcher"]["rootfs_cache"] = {"max_size": 2}
+    assert rootfs_cache_config(job) == {"max_size": 2}
+
+    monkeypatch.setattr(
+        "lava_dispatcher.utils.rootfs.ROOTFS_CACHE_DIR", str(tmp_path / "cache")
+    )
+    # Disabled by default
+    assert RootfsCache.get(None) is None
+    assert not (tmp_path / "cache").exists()
+    assert RootfsCache.get({}).size == ROOTFS_CACHE_SIZE
+    assert RootfsCache.get({"max_size": 2}).size == 2 * 1024**3
+
+
+def test_extract_rootfs_disabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        "lava_dispatcher.utils.rootfs.ROOTFS_CACHE_DIR", str(tmp_path / "cache")
+    )
+    archive = make_rootfs(tmp_path, "rootfs", "debian")
+    (tmp_path / "job").mkdir()
+    (root_dir, view) = extract_rootfs(
+        archive, "0123", str(tmp_path / "job"), logging.getLogger("dispatcher")
+    )
+    assert view is None
+    assert root_dir == str(tmp_path / "job")
+    assert not (tmp_path / "cache").exists()
+
+
+def test_extract_rootfs_with_cache(no_overlay, monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        "lava_dispatcher.utils.rootfs.ROOTFS_CACHE_DIR", str(tmp_path / "cache")
+    )
+    archive = make_rootfs(tmp_path, "rootfs", "debian")
+    for job in ["1", "2"]:
+        (tmp_path / job).mkdir()
+        (root_dir, view) = extract_rootfs(
+            archive,
+            "0123",
+            str(tmp_path / job),
+            logging.getLogger("dispatcher"),
+            config={},
+        )
+        assert root_dir == str(tmp_path / job / "root")
+        assert (tmp_path / job / "root" / "etc" / "hostname").exists()
+        view.remove()
+    assert (tmp_path / "cache" / "0123" / "size").exists()
+
+    # Without the checksum, the archive is extracted directly
+    (tmp_path / "3").mkdir()
+    (root_dir, view) = extract_rootfs(
+        archive, None, str(tmp_path / "3"), logging.getLogger("dispatcher"), config={}
+    )
+    assert view is None
+    assert root_dir == str(tmp_path / "3")
@@ -0,0 +1,155 @@
+import os
+import shutil
+import struct
+import subprocess  # nosec - unit test
+
+import pytest
+
+from lava_common.exceptions import JobError
+from lava_dispatcher.utils.sparse import (
+    CHUNK_TYPE_CRC32,
+    CHUNK_TYPE_DONT_CARE,
+    CHUNK_TYPE_FILL,
+    CHUNK_TYPE_RAW,
+    SparseImage,
+    data_ranges,
+)
+
+BLOCK = 4096
+
+
+def make_sparse(path, chunks):
+    """
+    Write a sparse image from a list of (kind, blocks, data).
+    """
+    body = b""
+    total = 0
+    for (kind, blocks, data) in chunks:
+        body += struct.pack("<HHII", kind, 0, blocks, 12 + len(data)) + data
+        total += 0 if kind == CHUNK_TYPE_CRC32 else blocks
+    header = struct.pack(
+        "<IHHHHIIII", 0xED26FF3A, 1, 0, 28, 12, BLOCK, total, len(chunks), 0
+    )
+    path.write_bytes(header + body)
+
+
+@pytest.fixture
+def image(tmp_path):
+    raw = os.urandom(3 * BLOCK)
+    make_sparse(
+        tmp_path / "image.simg",
+        [
+            (CHUNK_TYPE_RAW, 3, raw),
+            (CHUNK_TYPE_DONT_CARE, 100, b""),
+            (CHUNK_TYPE_FILL, 2, b"\x01\x02\x03\x04"),
+            (CHUNK_TYPE_CRC32, 0, b"\x00" * 4),
+            (CHUNK_TYPE_FILL, 50, bytes(4)),
+            (CHUNK_TYPE_RAW, 1, raw[:BLOCK]),
+        ],
+    )
+    expected = (
+        raw
+        + bytes(100 * BLOCK)
+        + b"\x01\x02\x03\x04" * (BLOCK // 2)
+        + bytes(50 * BLOCK)
+    ) + raw[:BLOCK]
+    return (tmp_path / "image.simg", expected)
+
+
+def test_expand(image, tmp_path):
+    (path, expected) = image
+    sparse = SparseImage(str(path))
+    assert sparse.size == 156 * BLOCK
+    assert [(c.kind, c.start, c.blocks) for c in sparse.chunks] == [
+        (CHUNK_TYPE_RAW, 0, 3),
+        (CHUNK_TYPE_DONT_CARE, 3, 100),
+        (CHUNK_TYPE_FILL, 103, 2),
+        (CHUNK_TYPE_FILL, 105, 50),
+        (CHUNK_TYPE_RAW, 155, 1),
+    ]
+
+    # The empty chunks are not written
+    assert sparse.expand(str(tmp_path / "image.raw")) == 6 * BLOCK
+    assert (tmp_path / "image.raw").read_bytes() == expected
+    with open(str(tmp_path / "image.raw"), "rb") as f_in:
+        data = sum(end - start for (start, end) in data_ranges(f_in.fileno(), 1 << 30))
+    assert data < len(expected)
+
+
+def test_update_unchanged(image, tmp_path):
+    (path, expected) = image
+    sparse = SparseImage(str(path))
+    sparse.expand(str(tmp_path / "image.raw"))
+
+    written = sparse.update(str(tmp_path / "image.raw"), str(tmp_path / "new.simg"))
+    assert written == path.stat().st_size - 16
+    new = SparseImage(str(tmp_path / "new.simg"))
+    # The crc chunk is dropped
+    assert [(c.kind, c.start, c.blocks, c.fill) for c in new.chunks] == [
+        (c.kind, c.start, c.blocks, c.fill) for c in sparse.chunks
+    ]
+    new.expand(str(tmp_path / "new.raw"))
+    assert (tmp_path / "new.raw").read_bytes() == expected
+
+
+def test_update(image, tmp_path):
+    (path, expected) = image
+    sparse = SparseImage(str(path))
+    sparse.expand(str(tmp_path / "image.raw"))
+
+    # Change a raw block, write in the "don't care" and zero the last block
+    changes = [
+        (1 * BLOCK, b"a" * BLOCK),
+        (10 * BLOCK, b"b" * 10 + bytes(BLOCK - 10)),
+        (11 * BLOCK, b"c" * BLOCK),
+        (155 * BLOCK, bytes(BLOCK)),
+    ]
+    with open(str(tmp_path / "image.raw"), "r+b") as f_raw:
+        for (offset, data) in changes:
+            f_raw.seek(offset)
+            f_raw.write(data)
+    for (offset, data) in changes:
+        expected = expected[:offset] + data + expected[offset + len(data) :]
+
+    written = sparse.update(str(tmp_path / "image.raw"), str(tmp_path / "new.simg"))
+    new = SparseImage(str(tmp_path / "new.simg"))
+    assert [(c.kind, c.start, c.blocks, c.fill) for c in new.chunks] == [
+        (CHUNK_TYPE_RAW, 0, 1, bytes(4)),
+        (CHUNK_TYPE_FILL, 1, 1, b"aaaa"),
+        (CHUNK_TYPE_RAW, 2, 1, bytes(4)),
+        (CHUNK_TYPE_DONT_CARE, 3, 7, bytes(4)),
+        (CHUNK_TYPE_RAW, 10, 1, bytes(4)),
+        (CHUNK_TYPE_FILL, 11, 1, b"cccc"),
+        (CHUNK_TYPE_DONT_CARE, 12, 91, bytes(4)),
+        (CHUNK_TYPE_FILL, 103, 2, b"\x01\x02\x03\x04"),
+        (CHUNK_TYPE_FILL, 105, 51, bytes(4)),
+    ]
+    # Two unchanged raw blocks, one new raw block and the headers
+    assert written == 3 * BLOCK + 28 + 9 * 12 + 4 * 4
+    new.expand(str(tmp_path / "new.raw"))
+    assert (tmp_path / "new.raw").read_bytes() == expected
+
+
+def test_invalid(tmp_path):
+    (tmp_path / "image.ext4").write_bytes(bytes(8192))
+    with pytest.raises(JobError, match="Image is not an Android sparse image"):
+        SparseImage(str(tmp_path / "image.ext4"))
+
+    make_sparse(tmp_path / "image.simg", [(CHUNK_TYPE_RAW, 2, bytes(BLOCK))])
+    with pytest.raises(JobError, match="Invalid raw chunk"):
+        SparseImage(str(tmp_path / "image.simg"))
+
+
+@pytest.mark.skipif(shutil.which("simg2img") is None, reason="simg2img missing")
+def test_simg2img(image, tmp_path):
+    (path, expected) = image
+    sparse = SparseImage(str(path))
+    sparse.expand(str(tmp_path / "image.raw"))
+    with open(str(tmp_path / "image.raw"), "r+b") as f_raw:
+        f_raw.seek(20 * BLOCK)
+        f_raw.write(os.urandom(BLOCK))
+    sparse.update(str(tmp_path / "image.raw"), str(tmp_path / "new.simg"))
+    subprocess.check_call(  # nosec - unit test
+        ["simg2img", str(tmp_path / "new.simg"), str(tmp_path / "new.raw")]
+    )
+    assert (tmp_path / "new.raw").read_bytes() == (tmp_path / "image.raw").read_bytes()
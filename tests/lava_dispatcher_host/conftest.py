@@ -4,3 +4,12 @@ import pytest
 @pytest.fixture(autouse=True)
 def pyudev(mocker):
     return mocker.patch("lava_dispatcher_host.pyudev")
+
+
+@pytest.fixture(autouse=True)
+def server_socket(monkeypatch, tmp_path):
+    # Never notify the server running on the host
+    monkeypatch.setattr(
+        "lava_dispatcher_host.server.SOCKET", str(tmp_path / "server.sock")
+    )
+    return tmp_path / "server.sock"
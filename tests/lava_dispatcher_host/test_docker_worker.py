@@ -36,6 +36,7 @@ def options(tmp_path):
     o.username = None
     o.token = None
     o.token_file = None
+    o.metrics_address = None
 
     return o
 
@@ -22,6 +22,7 @@ import lava_dispatcher_host
 from lava_common.exceptions import InfrastructureError
 from lava_common.yaml import yaml_safe_load
 from lava_dispatcher_host import (
+    MappingRegistry,
     add_device_container_mapping,
     load_mapping_data,
     share_device_with_container,
@@ -274,3 +275,107 @@ class TestLoadMapping:
         assert not mapping.exists()
         data = load_mapping_data(mapping)
         assert type(data) is list
+
+
+class TestMappingRegistry:
+    @pytest.fixture
+    def share(self, mocker):
+        return mocker.patch("lava_dispatcher_host.share_device_with_container_lxc")
+
+    def test_find(self, mocker):
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc1")
+        add_device_container_mapping(
+            "2", {"vendor_id": "1234", "product_id": "3456"}, "lxc2"
+        )
+        registry = MappingRegistry()
+        assert registry.refresh()
+        assert not registry.refresh()
+        load = mocker.spy(lava_dispatcher_host, "load_mapping_data")
+
+        (item, job_id) = registry.find(Namespace(serial_number="1234567890"))
+        assert (item["container"], job_id) == ("lxc1", "1")
+        (item, job_id) = registry.find(
+            Namespace(serial_number="", vendor_id="1234", product_id="3456")
+        )
+        assert (item["container"], job_id) == ("lxc2", "2")
+        assert registry.find(Namespace(vendor_id="1234")) == (None, None)
+        # No file was read again
+        load.assert_not_called()
+
+    def test_reload(self, tmpdir):
+        registry = MappingRegistry()
+        registry.refresh()
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc1")
+        registry.load("1")
+        (item, _) = registry.find(Namespace(serial_number="1234567890"))
+        assert item["container"] == "lxc1"
+
+        os.unlink(tmpdir / "1" / "usbmap.yaml")
+        registry.load("1")
+        assert registry.find(Namespace(serial_number="1234567890")) == (None, None)
+
+    def test_refresh_on_miss(self, share):
+        registry = MappingRegistry()
+        registry.refresh()
+        # The notification did not reach the server
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc1")
+        share_device_with_container(
+            Namespace(device="null", serial_number="1234567890"), registry
+        )
+        share.assert_called_once_with("lxc1", "/dev/null", job_id="1")
+
+    def test_stale_removal(self, share, tmpdir):
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc1")
+        registry = MappingRegistry()
+        registry.refresh()
+        # Job 1 is over and job 2 uses the same board, but both notifications
+        # did not reach the server
+        os.unlink(tmpdir / "1" / "usbmap.yaml")
+        add_device_container_mapping("2", {"serial_number": "1234567890"}, "lxc2")
+        share_device_with_container(
+            Namespace(device="null", serial_number="1234567890"), registry
+        )
+        share.assert_called_once_with("lxc2", "/dev/null", job_id="2")
+        assert list(registry.jobs) == ["2"]
+
+    def test_stale_update(self, tmpdir):
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc1")
+        registry = MappingRegistry()
+        registry.refresh()
+        # The job mapped the board to another container
+        mtime = os.stat(tmpdir / "1" / "usbmap.yaml").st_mtime_ns + 1000
+        add_device_container_mapping("1", {"serial_number": "1234567890"}, "lxc2")
+        os.utime(tmpdir / "1" / "usbmap.yaml", ns=(mtime, mtime))
+        (item, job_id) = registry.find(Namespace(serial_number="1234567890"))
+        assert (item["container"], job_id) == ("lxc2", "1")
+
+    def test_coalesce(self, share):
+        add_device_container_mapping(
+            "1", {"serial_number": "1234567890", "fs_label": None}, "lxc1"
+        )
+        add_device_container_mapping(
+            "1", {"vendor_id": "1234", "product_id": "3456"}, "lxc2"
+        )
+        registry = MappingRegistry()
+        registry.refresh()
+        for _ in range(3):
+            share_device_with_container(
+                Namespace(device="null", serial_number="1234567890"), registry
+            )
+        share.assert_called_once_with("lxc1", "/dev/null", job_id="1")
+        share.reset_mock()
+
+        # The same node is mapped to another container for another event
+        share_device_with_container(
+            Namespace(device="null", vendor_id="1234", product_id="3456"),
+            registry,
+        )
+        share.assert_called_once_with("lxc2", "/dev/null", job_id="1")
+        share.reset_mock()
+
+        # Mappings updated by the job
+        registry.load("1")
+        share_device_with_container(
+            Namespace(device="null", serial_number="1234567890"), registry
+        )
+        share.assert_called_once_with("lxc1", "/dev/null", job_id="1")
@@ -19,9 +19,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses>.
 
+import asyncio
+import json
+import os
+
 import pytest
 
-from lava_dispatcher_host.server import CommandHandler, ShareCommand
+import lava_dispatcher_host
+from lava_dispatcher_host import add_device_container_mapping
+from lava_dispatcher_host.server import (
+    Client,
+    CommandHandler,
+    ReloadCommand,
+    ServerWrapper,
+    ShareCommand,
+)
 
 
 @pytest.fixture
@@ -37,3 +49,49 @@ class TestCommandHandler:
         options = share_device_with_container.call_args[0][0]
         assert options.device == "/dev/foobar"
         assert options.serial == "0123456789"
+
+    def test_reload(self, monkeypatch, tmp_path, share_device_with_container):
+        monkeypatch.setattr(lava_dispatcher_host, "JOBS_DIR", str(tmp_path))
+        os.makedirs(tmp_path / "1")
+        add_device_container_mapping("1", {"serial_number": "0123456789"}, "lxc1")
+        wrapper = ServerWrapper(str(tmp_path / "server.sock"))
+        wrapper.handler.handle(ReloadCommand(job_id="1"))
+        assert list(wrapper.registry.jobs) == ["1"]
+
+        wrapper.handler.handle(ShareCommand(device="foobar", serial="0123456789"))
+        assert share_device_with_container.call_args[0][1] is wrapper.registry
+
+
+class TestServer:
+    def test_requests(self, monkeypatch, tmp_path, server_socket):
+        monkeypatch.setattr(lava_dispatcher_host, "JOBS_DIR", str(tmp_path))
+        os.makedirs(tmp_path / "1")
+        wrapper = ServerWrapper(str(server_socket))
+        responses = []
+
+        async def request(data):
+            (reader, writer) = await asyncio.open_unix_connection(str(server_socket))
+            writer.write(data)
+            writer.write_eof()
+            responses.append(json.loads(await reader.read()))
+            writer.close()
+
+        async def run():
+            server = asyncio.ensure_future(wrapper.start())
+            while not server_socket.exists():
+                await asyncio.sleep(0.01)
+            # add_device_container_mapping notifies the server
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                add_device_container_mapping,
+                "1",
+                {"serial_number": "0123456789"},
+                "lxc1",
+            )
+            await request(b"not json")
+            await request(b'{"command": "reload", "foo": "bar"}')
+            server.cancel()
+
+        asyncio.run(run())
+        assert list(wrapper.registry.jobs) == ["1"]
+        assert responses == [{"result": "INVALID_REQUEST"}] * 2
@@ -1327,6 +1327,43 @@ ok 2 bar
             == "Maintenance → Active"
         )
 
+    def test_measurements_list(self):
+        for (device_type, is_public, values) in [
+            (self.public_device_type1, True, [1, 2, 3, 4]),
+            (self.public_device_type1, False, [100]),
+            (self.restricted_device_type1, True, [10]),
+        ]:
+            rollup = result_models.MeasurementRollup(
+                suite="lava",
+                name="foo",
+                device_type=device_type,
+                is_public=is_public,
+                units="seconds",
+                bucket=timezone.now().date(),
+            )
+            rollup.add(values)
+            rollup.save()
+
+        data = self.hit(
+            self.userclient,
+            reverse("api-root", args=[self.version]) + "measurements/?name=foo",
+        )
+        # Only the public device type and jobs are visible
+        assert len(data["results"]) == 1  # nosec - unit test support
+        result = data["results"][0]
+        assert result["device_type"] == "public_device_type1"  # nosec - unit test
+        assert result["count"] == 4  # nosec - unit test support
+        assert result["minimum"] == 1  # nosec - unit test support
+        assert result["maximum"] == 4  # nosec - unit test support
+        assert result["mean"] == 2.5  # nosec - unit test support
+        assert set(result["percentiles"]) == {"50", "90", "95", "99"}  # nosec
+
+        data = self.hit(
+            self.adminclient,
+            reverse("api-root", args=[self.version]) + "measurements/?name=foo",
+        )
+        assert len(data["results"]) == 3  # nosec - unit test support
+
     def test_aliases_list(self):
         data = self.hit(
             self.userclient,
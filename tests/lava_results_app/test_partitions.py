@@ -0,0 +1,184 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from lava_results_app.models import Query, QueryCondition, TestCase, TestSuite
+from lava_scheduler_app.models import DeviceType, TestJob
+from lava_server.management.commands.partitions import _month
+
+TABLE = TestCase._meta.db_table
+
+
+def partitions():
+    out = StringIO()
+    call_command("partitions", "list", stdout=out)
+    return [line.split(":")[0][2:] for line in out.getvalue().splitlines()]
+
+
+def rows(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM %s" % name)
+        return cursor.fetchone()[0]
+
+
+def constraints(name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('f', 'p') ORDER BY 1",
+            [name],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.fixture
+def suite():
+    user = User.objects.create_user(username="user", password="pass")  # nosec
+    dt = DeviceType.objects.create(name="qemu")
+    job = TestJob.objects.create(
+        definition="{}", requested_device_type=dt, submitter=user
+    )
+    return TestSuite.objects.create(job=job, name="0_smoke")
+
+
+@pytest.mark.django_db
+def test_partitions(suite, mocker):
+    now = timezone.now()
+    TestCase.objects.create(name="old", suite=suite, result=TestCase.RESULT_PASS)
+    TestCase.objects.filter(name="old").update(logged=now - datetime.timedelta(700))
+    TestCase.objects.create(name="boot", suite=suite, result=TestCase.RESULT_PASS)
+
+    with pytest.raises(CommandError, match="not partitioned"):
+        call_command("partitions", "list")
+
+    # The existing rows are kept in the legacy partition
+    months = [_month(now, delta) for delta in range(1, 3)]
+    names = ["%s_y%04dm%02d" % (TABLE, m.year, m.month) for m in months]
+    out = StringIO()
+    call_command("partitions", "enable", "--months", "2", stdout=out)
+    assert "unused table lava_results_app_actiondata" in out.getvalue()
+    assert partitions() == [TABLE + "_default", TABLE + "_legacy"] + names
+    assert rows(TABLE + "_legacy") == 2
+    assert constraints(TABLE) == [
+        "FOREIGN KEY (suite_id) REFERENCES lava_results_app_testsuite(id) "
+        "DEFERRABLE INITIALLY DEFERRED",
+        "FOREIGN KEY (test_set_id) REFERENCES lava_results_app_testset(id) "
+        "DEFERRABLE INITIALLY DEFERRED",
+        "PRIMARY KEY (id, logged)",
+    ]
+    assert "PRIMARY KEY (id, logged)" in constraints(TABLE + "_legacy")
+    with pytest.raises(CommandError, match="already partitioned"):
+        call_command("partitions", "enable")
+
+    # New rows go to the partition of their month, or to the default one
+    case = TestCase.objects.create(
+        name="network", suite=suite, result=TestCase.RESULT_FAIL
+    )
+    TestCase.objects.filter(pk=case.pk).update(logged=months[0])
+    TestCase.objects.create(name="later", suite=suite, result=TestCase.RESULT_PASS)
+    TestCase.objects.filter(name="later").update(logged=_month(now, 5))
+    assert rows(names[0]) == 1
+    assert rows(TABLE + "_default") == 1
+    assert TestCase.objects.count() == 4
+    assert TestCase.objects.get(pk=case.pk).name == "network"
+    # The sequence of the ids is kept
+    assert case.pk > TestCase.objects.get(name="boot").pk
+
+    # The rows of the default partition are moved to the new partitions
+    call_command("partitions", "create", "--months", "6", stdout=StringIO())
+    assert len(partitions()) == 2 + 6
+    assert rows(TABLE + "_default") == 0
+    assert TestCase.objects.count() == 4
+
+    # Removing the expired partitions
+    clock = mocker.patch(
+        "django.utils.timezone.now",
+        return_value=_month(now, 2) + datetime.timedelta(days=10),
+    )
+    out = StringIO()
+    call_command("partitions", "purge", "--older-than", "1d", "--dry-run", stdout=out)
+    assert "Removing 2 partitions" in out.getvalue()
+    assert TestCase.objects.count() == 4
+
+    call_command("partitions", "purge", "--older-than", "1d", stdout=StringIO())
+    assert partitions()[:2] == [TABLE + "_default", names[1]]
+    assert list(TestCase.objects.values_list("name", flat=True)) == ["later"]
+
+    clock.return_value = _month(now, 3) + datetime.timedelta(days=10)
+    call_command(
+        "partitions", "purge", "--older-than", "1d", "--detach", stdout=StringIO()
+    )
+    assert names[1] not in partitions()
+    # The detached partitions are kept
+    assert rows(names[1]) == 0
+
+    with pytest.raises(CommandError, match="Invalid older-than format"):
+        call_command("partitions", "purge", "--older-than", "1w")
+
+
+@pytest.mark.django_db
+def test_partition_bounds(suite):
+    job = suite.job
+    TestCase.objects.create(name="boot", suite=suite, result=TestCase.RESULT_PASS)
+    testcases = TestCase.objects.filter(suite=suite).logged_since(job)
+    assert '"logged" >=' in str(testcases.query)
+    assert testcases.count() == 1
+
+    content_type = ContentType.objects.get_for_model(TestCase)
+    condition = QueryCondition(
+        table=ContentType.objects.get_for_model(TestJob),
+        field="submit_time",
+        operator=QueryCondition.GT,
+        value=(job.submit_time - datetime.timedelta(days=1)).isoformat(),
+    )
+    queryset = Query.get_queryset(content_type, [condition])
+    assert '"logged" >=' in str(queryset.query)
+    assert queryset.count() == 1
+
+    condition.field = "start_time"
+    queryset = Query.get_queryset(content_type, [condition])
+    assert '"logged" >=' not in str(queryset.query)
+
+
+@pytest.mark.django_db
+def test_partition_pruning(suite):
+    now = timezone.now()
+    job = suite.job
+    call_command("partitions", "enable", "--months", "2", stdout=StringIO())
+    (current, following) = [
+        "%s_y%04dm%02d" % (TABLE, m.year, m.month)
+        for m in [_month(now, 1), _month(now, 2)]
+    ]
+    testcases = TestCase.objects.filter(suite=suite)
+    assert TABLE + "_legacy" in testcases.explain()
+
+    # Only the partitions after the submission of the job are read
+    TestJob.objects.filter(pk=job.pk).update(submit_time=_month(now, 2))
+    job.refresh_from_db()
+    plan = testcases.logged_since(job).explain()
+    assert following in plan
+    assert current not in plan
+    assert TABLE + "_legacy" not in plan
@@ -0,0 +1,261 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import statistics
+
+import pytest
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.urls import reverse
+
+from lava_results_app.dbutils import map_scanned_results, update_measurement_rollups
+from lava_results_app.models import MeasurementRollup, TestCase
+from lava_scheduler_app.models import (
+    Device,
+    DeviceType,
+    GroupDevicePermission,
+    TestJob,
+)
+
+
+def test_rollup_percentiles():
+    rnd = random.Random(42)
+    values = [rnd.lognormvariate(3, 1) for _ in range(10000)]
+    values += [-v for v in values[:100]] + [0] * 10
+
+    rollup = MeasurementRollup(histogram={})
+    rollup.add(values)
+    assert rollup.count == len(values)
+    assert rollup.minimum == min(values)
+    assert rollup.maximum == max(values)
+    assert rollup.mean == pytest.approx(statistics.mean(values))
+
+    values.sort()
+    for percent in MeasurementRollup.PERCENTILES:
+        expected = values[int(percent / 100 * (len(values) - 1))]
+        assert rollup.percentile(percent) == pytest.approx(
+            expected, rel=MeasurementRollup.ACCURACY
+        )
+    assert rollup.percentile(0) == min(values)
+    assert rollup.percentile(100) == max(values)
+
+    # Merging the rollups gives the same results
+    first = MeasurementRollup(histogram={})
+    first.add(values[::2])
+    second = MeasurementRollup(histogram={})
+    second.add(values[1::2])
+    first.merge(second)
+    assert first.count == rollup.count
+    assert first.minimum == rollup.minimum
+    assert first.maximum == rollup.maximum
+    assert first.percentiles() == rollup.percentiles()
+
+    assert MeasurementRollup(histogram={}).percentile(50) is None
+    assert MeasurementRollup(histogram={}).mean is None
+
+
+@pytest.mark.django_db
+def test_update_measurement_rollups(client):
+    user = User.objects.create_user(username="user", password="pass")  # nosec
+    dt = DeviceType.objects.create(name="qemu")
+    for index in range(3):
+        job = TestJob.objects.create(
+            definition="{}", requested_device_type=dt, submitter=user, is_public=True
+        )
+        test_cases = []
+        for (case, measurement) in [("boot", 10 + index), ("network", 100)]:
+            test_cases.append(
+                map_scanned_results(
+                    {
+                        "definition": "0_smoke",
+                        "case": case,
+                        "result": "pass",
+                        "measurement": measurement,
+                        "units": "s",
+                    },
+                    job,
+                    None,
+                    None,
+                    None,
+                )
+            )
+        test_cases.append(
+            map_scanned_results(
+                {"definition": "0_smoke", "case": "other", "result": "pass"},
+                job,
+                None,
+                None,
+                None,
+            )
+        )
+        TestCase.objects.bulk_create(test_cases)
+        update_measurement_rollups(job, test_cases)
+
+    assert MeasurementRollup.objects.count() == 2
+    rollup = MeasurementRollup.objects.get(name="boot")
+    assert rollup.suite == "0_smoke"
+    assert rollup.device_type == dt
+    assert rollup.units == "s"
+    assert rollup.bucket == job.submit_time.date()
+    assert rollup.count == 3
+    assert (rollup.minimum, rollup.maximum, rollup.mean) == (10, 12, 11)
+
+    # The backfill gives the same rollups
+    call_command("backfill_measurement_rollups")
+    assert MeasurementRollup.objects.count() == 2
+    backfilled = MeasurementRollup.objects.get(name="boot")
+    assert backfilled.count == 3
+    assert backfilled.histogram == rollup.histogram
+
+    # Chart data
+    client.login(username="user", password="pass")  # nosec
+    ret = client.get(
+        reverse("lava.results.chart_measurements"),
+        {"suite": "0_smoke", "case": "boot"},
+    )
+    assert ret.status_code == 200
+    data = ret.json()["data"]
+    assert len(data) == 1
+    assert data[0]["count"] == 3
+    assert data[0]["percentiles"]["50"] == pytest.approx(11, rel=0.01)
+
+    ret = client.get(reverse("lava.results.chart_measurements"), {"suite": "0_smoke"})
+    assert ret.status_code == 400
+    ret = client.get(
+        reverse("lava.results.chart_measurements"),
+        {"suite": "0_smoke", "case": "boot", "since": "yesterday"},
+    )
+    assert ret.status_code == 400
+
+
+def add_measurement(job, case, measurement):
+    test_case = map_scanned_results(
+        {
+            "definition": "0_smoke",
+            "case": case,
+            "result": "pass",
+            "measurement": measurement,
+            "units": "s",
+        },
+        job,
+        None,
+        None,
+        None,
+    )
+    test_case.save()
+    update_measurement_rollups(job, [test_case])
+
+
+@pytest.mark.django_db
+def test_measurement_rollups_of_private_jobs(client):
+    user = User.objects.create_user(username="user", password="pass")  # nosec
+    other = User.objects.create_user(username="other", password="pass")  # nosec
+    admin = User.objects.create_superuser(
+        username="admin", email="admin@example.com", password="pass"  # nosec
+    )
+    group = Group.objects.create(name="group")
+    user.groups.add(group)
+    dt = DeviceType.objects.create(name="qemu")
+    device = Device.objects.create(hostname="qemu-01", device_type=dt)
+    restricted = Device.objects.create(hostname="qemu-02", device_type=dt)
+    GroupDevicePermission.objects.assign_perm(Device.VIEW_PERMISSION, group, restricted)
+
+    public = TestJob.objects.create(
+        definition="{}",
+        requested_device_type=dt,
+        actual_device=device,
+        submitter=user,
+        is_public=True,
+    )
+    private = TestJob.objects.create(
+        definition="{}", requested_device_type=dt, submitter=user, is_public=False
+    )
+    grouped = TestJob.objects.create(
+        definition="{}", requested_device_type=dt, submitter=user, is_public=True
+    )
+    grouped.viewing_groups.add(group)
+    on_restricted = TestJob.objects.create(
+        definition="{}",
+        requested_device_type=dt,
+        actual_device=restricted,
+        submitter=user,
+        is_public=True,
+    )
+    for (job, measurement) in [
+        (public, 1),
+        (private, 1000),
+        (grouped, 2000),
+        (on_restricted, 3000),
+    ]:
+        add_measurement(job, "boot", measurement)
+
+    def rollups():
+        return sorted(
+            MeasurementRollup.objects.values_list("is_public", "count", "maximum")
+        )
+
+    assert rollups() == [(False, 3, 3000), (True, 1, 1)]
+    call_command("backfill_measurement_rollups")
+    assert rollups() == [(False, 3, 3000), (True, 1, 1)]
+
+    def chart(username):
+        client.login(username=username, password="pass")  # nosec
+        ret = client.get(
+            reverse("lava.results.chart_measurements"),
+            {"suite": "0_smoke", "case": "boot"},
+        )
+        assert ret.status_code == 200
+        return [(d["count"], d["max"]) for d in ret.json()["data"]]
+
+    # The private values are not leaked to the other users
+    assert chart("other") == [(1, 1)]
+    assert chart("user") == [(1, 1)]
+    assert chart("admin") == [(4, 3000)]
+
+
+@pytest.mark.django_db
+def test_measurement_rollups_of_resent_lines(client, mocker, tmpdir):
+    mocker.patch(
+        "lava_scheduler_app.models.TestJob.output_dir", str(tmpdir / "job-output")
+    )
+    user = User.objects.create_user(username="user", password="pass")  # nosec
+    dt = DeviceType.objects.create(name="qemu")
+    job = TestJob.objects.create(
+        definition="{}", requested_device_type=dt, submitter=user
+    )
+
+    def send(index, lines):
+        ret = client.post(
+            reverse("lava.scheduler.internal.v1.jobs.logs", args=[job.id]),
+            data={
+                "index": index,
+                "lines": "\n".join(
+                    '- {"lvl": "results", "msg": {"definition": "0_smoke", '
+                    '"case": "boot", "result": "pass", "measurement": %d}}' % value
+                    for value in lines
+                ),
+            },
+            HTTP_LAVA_TOKEN=job.token,
+        )
+        assert ret.status_code == 200
+
+    send(0, [10, 20])
+    # The lines are resent when lava-run did not get the answer
+    send(0, [10, 20])
+    send(1, [20, 30])
+    rollup = MeasurementRollup.objects.get()
+    assert (rollup.count, rollup.total) == (3, 60)
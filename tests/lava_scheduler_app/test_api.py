@@ -720,6 +720,24 @@ def test_devices_list(setup):
     ]
 
 
+@pytest.mark.django_db
+def test_devices_list_cache(setup, settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    assert server().scheduler.devices.list() == []  # nosec
+
+    dt = DeviceType.objects.create(name="black")
+    Device.objects.create(hostname="device01", device_type=dt)
+    # The result is cached for the same user and arguments
+    assert server().scheduler.devices.list() == []  # nosec
+    assert len(server().scheduler.devices.list(True)) == 1  # nosec
+    assert len(server("admin", "admin").scheduler.devices.list()) == 1  # nosec
+
+    settings.XMLRPC_CACHE_TIMEOUT = 0
+    assert len(server().scheduler.devices.list()) == 1  # nosec
+
+
 @pytest.mark.django_db
 def test_devices_show(setup):
     assert server().scheduler.devices.list() == []  # nosec
@@ -0,0 +1,263 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import simplejson
+from django.contrib.auth.models import User
+from django.utils import timezone
+from requests.models import RequestEncodingMixin
+
+from lava_scheduler_app import delivery
+from lava_scheduler_app.delivery import (
+    DeliveryPool,
+    Outbox,
+    deliver_callback,
+    form_chunks,
+    json_chunks,
+    retry_delay,
+)
+from lava_scheduler_app.models import (
+    DeviceType,
+    Notification,
+    NotificationCallback,
+    NotificationDelivery,
+    TestJob,
+)
+from lava_scheduler_app.notifications import send_notifications
+
+LOG = "- {dt: 2023-01-01T00:00:00, lvl: info, msg: 'héllo ☃'}\n" * 50
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        server = self.server
+        with server.lock:
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        time.sleep(server.latency)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.running -= 1
+            server.requests.append((self.command, self.path, self.headers, body))
+            failing = server.failures > 0
+            server.failures -= 1 if failing else 0
+        self.send_response(500 if failing else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = reply
+    do_POST = reply
+
+
+@pytest.fixture
+def sink():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+    server.lock = threading.Lock()
+    server.latency = 0
+    server.failures = 0
+    server.running = 0
+    server.max_running = 0
+    server.requests = []
+    server.url = "http://127.0.0.1:%d" % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_retry_delay(settings):
+    settings.NOTIFICATION_RETRY_DELAY = 30
+    assert retry_delay(1) == 30
+    assert retry_delay(2) == 60
+    assert retry_delay(5) == 480
+    assert retry_delay(20) == delivery.RETRY_MAX_DELAY
+
+
+def test_json_chunks(monkeypatch):
+    # Split the multi-bytes characters between chunks
+    monkeypatch.setattr(delivery, "CHUNK_SIZE", 7)
+    data = {"id": 1, "description": "café", "token": None}
+    results = [("lava", "- {name: job}\n"), ("0_smoke", "[]\n")]
+
+    body = "".join(json_chunks(data))
+    assert body == simplejson.dumps(data)
+
+    body = "".join(json_chunks(data, io.BytesIO(LOG.encode("utf-8")), iter(results)))
+    assert body == simplejson.dumps(dict(data, log=LOG, results=dict(results)))
+    assert json.loads(body)["log"] == LOG
+
+    body = "".join(json_chunks(data, None, iter([])))
+    assert body == simplejson.dumps(dict(data, results={}))
+
+
+def test_form_chunks(monkeypatch):
+    monkeypatch.setattr(delivery, "CHUNK_SIZE", 7)
+    data = {"id": 1, "description": "café & crème", "token": None}
+    results = [("lava", "- {name: job}\n"), ("0_smoke", "[]\n")]
+
+    body = "".join(form_chunks(data, io.BytesIO(LOG.encode("utf-8")), iter(results)))
+    assert body == RequestEncodingMixin._encode_params(
+        dict(data, log=LOG, results=dict(results))
+    )
+
+
+def test_pool_per_host(sink):
+    sink.latency = 0.1
+    pool = DeliveryPool(workers=8, per_host=2)
+    pending = list(range(6))
+    finished = []
+    while len(finished) < 6:
+        while pending and pool.available("sink"):
+            key = pending.pop(0)
+            pool.submit("sink", key, requests.post, sink.url + "/%d" % key)
+            # Other hosts are not limited by the sink
+            assert pool.available("other") == (len(pool.running) < 8)
+        finished.extend(key for (key, future) in pool.done() if future.result().ok)
+        time.sleep(0.01)
+    pool.shutdown()
+    assert sorted(finished) == list(range(6))
+    assert sink.max_running == 2
+
+
+def test_deliver_callback(mocker, sink, tmp_path):
+    (tmp_path / "output.yaml").write_text(LOG, encoding="utf-8")
+    job = mocker.Mock()
+    job.output_dir = str(tmp_path)
+    job.create_job_data.return_value = {"id": 1, "token": "abc"}
+    job.testsuite_set.all.return_value = []
+    callback = mocker.Mock(
+        url=sink.url + "/callback",
+        method=NotificationCallback.POST,
+        token="abc",
+        header="Authorization",
+        dataset=NotificationCallback.ALL,
+        content_type=NotificationCallback.JSON,
+    )
+
+    deliver_callback(callback, job)
+    (method, path, headers, body) = sink.requests[0]
+    assert method == "POST"
+    assert path == "/callback"
+    assert headers["Authorization"] == "abc"
+    assert headers["Content-Type"] == "application/json"
+    assert json.loads(body) == {"id": 1, "token": "abc", "log": LOG, "results": {}}
+    with gzip.open(str(tmp_path / "job_data.gz"), "rb") as f_in:
+        assert f_in.read() == body
+    assert not (tmp_path / "job_data.gz.tmp").exists()
+
+    # Failures are raised
+    sink.failures = 1
+    with pytest.raises(requests.HTTPError):
+        deliver_callback(callback, job)
+
+    # urlencoded
+    callback.content_type = NotificationCallback.URLENCODED
+    callback.dataset = NotificationCallback.MINIMAL
+    deliver_callback(callback, job)
+    (method, path, headers, body) = sink.requests[-1]
+    assert headers["Content-Type"] == "application/x-www-form-urlencoded"
+    assert body == b"id=1&token=abc"
+
+
+def run_outbox(outbox):
+    outbox.step()
+    while outbox.pool.running:
+        time.sleep(0.01)
+        outbox.step()
+
+
+@pytest.mark.django_db
+def test_outbox(mocker, settings, sink):
+    settings.NOTIFICATION_RETRY_DELAY = 30
+    # The threads of the pool do not see the rows of the test transaction
+    mocker.patch.object(
+        TestJob,
+        "create_job_data",
+        autospec=True,
+        side_effect=lambda job, token=None: {"id": job.id},
+    )
+    sink.latency = 0.05
+    user = User.objects.create(username="user-01")
+    dt = DeviceType.objects.create(name="qemu")
+    jobs = [
+        TestJob.objects.create(
+            definition="{}",
+            requested_device_type=dt,
+            submitter=user,
+            state=TestJob.STATE_FINISHED,
+            health=TestJob.HEALTH_COMPLETE,
+        )
+        for _ in range(4)
+    ]
+    for job in jobs:
+        notification = Notification.objects.create(test_job=job)
+        NotificationCallback.objects.create(
+            notification=notification,
+            url=sink.url + "/job/%d" % job.id,
+            method=NotificationCallback.POST,
+            dataset=NotificationCallback.MINIMAL,
+            content_type=NotificationCallback.JSON,
+        )
+        send_notifications(job)
+    assert NotificationDelivery.objects.count() == 4
+    assert set(NotificationDelivery.objects.values_list("host", flat=True)) == {
+        sink.url[len("http://") :]
+    }
+
+    # The first request fails
+    sink.failures = 1
+    outbox = Outbox(logging.getLogger("test"), workers=4, per_host=1)
+    for _ in range(4):
+        run_outbox(outbox)
+    assert sink.max_running == 1
+    assert len(sink.requests) == 4
+    failed = NotificationDelivery.objects.get(state=NotificationDelivery.STATE_PENDING)
+    assert failed.attempts == 1
+    assert failed.last_error.startswith("500 Server Error")
+    assert failed.next_attempt > timezone.now() + datetime.timedelta(seconds=20)
+    assert (
+        NotificationDelivery.objects.filter(
+            state=NotificationDelivery.STATE_SENT
+        ).count()
+        == 3
+    )
+
+    # Not retried before the delay
+    run_outbox(outbox)
+    assert len(sink.requests) == 4
+
+    failed.next_attempt = timezone.now()
+    failed.save()
+    run_outbox(outbox)
+    outbox.close()
+    assert len(sink.requests) == 5
+    failed.refresh_from_db()
+    assert failed.state == NotificationDelivery.STATE_SENT
+    assert failed.attempts == 1
@@ -0,0 +1,208 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import F
+from django.utils import timezone
+
+from lava_scheduler_app.models import Device, DeviceType, JobHealthRollup, TestJob
+from lava_scheduler_app.views import (
+    device_report_data,
+    job_report_data,
+    reports_data,
+    type_report_data,
+)
+
+
+def rollups():
+    query = JobHealthRollup.objects.order_by(
+        "bucket",
+        F("device").asc(nulls_first=True),
+        F("device_type").asc(nulls_first=True),
+        "health_check",
+        "pass_count",
+    )
+    return [
+        (r.bucket, r.device_id, r.device_type_id, r.health_check)
+        + (r.pass_count, r.fail_count)
+        for r in query
+    ]
+
+
+@pytest.fixture
+def setup(db):
+    user = User.objects.create(username="user-01")
+    dt = DeviceType.objects.create(name="qemu")
+    device = Device.objects.create(hostname="qemu-01", device_type=dt)
+    return (user, dt, device)
+
+
+def finish(job, health):
+    job.go_state_finished(health)
+    job.save()
+
+
+@pytest.mark.django_db
+def test_rollups_updated_when_jobs_finish(setup):
+    (user, dt, device) = setup
+    today = timezone.now().date()
+
+    jobs = [
+        TestJob.objects.create(
+            definition="{}",
+            submitter=user,
+            requested_device_type=dt,
+            actual_device=device,
+            state=TestJob.STATE_RUNNING,
+            start_time=timezone.now(),
+            health_check=(i == 0),
+        )
+        for i in range(4)
+    ]
+    assert rollups() == []
+
+    finish(jobs[0], TestJob.HEALTH_COMPLETE)
+    finish(jobs[1], TestJob.HEALTH_COMPLETE)
+    finish(jobs[2], TestJob.HEALTH_INCOMPLETE)
+    jobs[3].go_state_canceling()
+    jobs[3].save()
+    finish(jobs[3], TestJob.HEALTH_INCOMPLETE)
+    # Canceled before being scheduled
+    job = TestJob.objects.create(definition="{}", submitter=user)
+    finish(job, TestJob.HEALTH_CANCELED)
+    # Counted once
+    jobs[1].save()
+    TestJob.objects.get(pk=jobs[1].pk).save()
+
+    assert rollups() == [
+        (today, None, None, False, 0, 1),
+        (today, "qemu-01", "qemu", False, 1, 2),
+        (today, "qemu-01", "qemu", True, 1, 0),
+    ]
+    assert job_report_data(-1, 0)[1] == {
+        "pass": 1,
+        "fail": 3,
+        "date": today.strftime("%m-%d"),
+        "failure_url": "/scheduler/reports/failures?start=-1&end=0&health_check=0",
+    }
+    assert type_report_data(-1, 0, dt)[0]["pass"] == 1
+    assert device_report_data(-1, 0, device)[1]["fail"] == 2
+
+    # Removing the jobs updates the rollups
+    TestJob.objects.get(pk=jobs[2].pk).delete()
+    job.delete()
+    assert rollups() == [
+        (today, None, None, False, 0, 0),
+        (today, "qemu-01", "qemu", False, 1, 1),
+        (today, "qemu-01", "qemu", True, 1, 0),
+    ]
+
+
+@pytest.mark.django_db
+def test_rollups_kept_when_devices_are_removed(setup):
+    (user, dt, device) = setup
+    other = Device.objects.create(hostname="qemu-02", device_type=dt)
+    today = timezone.now().date()
+    for (dev, health) in [
+        (device, TestJob.HEALTH_COMPLETE),
+        (other, TestJob.HEALTH_INCOMPLETE),
+        (None, TestJob.HEALTH_CANCELED),
+    ]:
+        TestJob.objects.create(
+            definition="{}",
+            submitter=user,
+            requested_device_type=dt,
+            actual_device=dev,
+            state=TestJob.STATE_FINISHED,
+            health=health,
+            start_time=timezone.now(),
+        )
+
+    # The jobs are removed with their device, not the rollups
+    device.delete()
+    other.delete()
+    assert TestJob.objects.count() == 1
+    assert rollups() == [
+        (today, None, None, False, 0, 1),
+        (today, None, "qemu", False, 0, 1),
+        (today, None, "qemu", False, 1, 0),
+    ]
+    assert type_report_data(-1, 0, dt)[1]["pass"] == 1
+    assert type_report_data(-1, 0, dt)[1]["fail"] == 1
+
+    # Only the rows without device type are updated and rebuilt
+    TestJob.objects.get().delete()
+    call_command("backfill-health-rollups")
+    assert rollups() == [
+        (today, None, "qemu", False, 0, 1),
+        (today, None, "qemu", False, 1, 0),
+    ]
+
+
+@pytest.mark.django_db
+def test_reports_data(setup):
+    (user, dt, device) = setup
+    now = timezone.now()
+    for days in [0, 1, 1, 8, 100]:
+        TestJob.objects.create(
+            definition="{}",
+            submitter=user,
+            requested_device_type=dt,
+            actual_device=device,
+            state=TestJob.STATE_FINISHED,
+            health=TestJob.HEALTH_COMPLETE,
+            start_time=now - datetime.timedelta(days=days),
+        )
+
+    data = reports_data(JobHealthRollup.objects.filter(device_type=dt), "")
+    assert [d["pass"] for d in data["job_day_report"]] == [0, 0, 0, 0, 0, 2, 1]
+    assert [d["pass"] for d in data["job_week_report"]] == [0] * 8 + [1, 3]
+    assert [d["pass"] for d in data["health_day_report"]] == [0] * 7
+
+
+@pytest.mark.django_db
+def test_backfill_health_rollups(setup):
+    (user, dt, device) = setup
+    now = timezone.now()
+    for (days, health) in [
+        (0, TestJob.HEALTH_COMPLETE),
+        (0, TestJob.HEALTH_INCOMPLETE),
+        (2, TestJob.HEALTH_CANCELED),
+    ]:
+        TestJob.objects.create(
+            definition="{}",
+            submitter=user,
+            requested_device_type=dt,
+            actual_device=device,
+            state=TestJob.STATE_FINISHED,
+            health=health,
+            start_time=now - datetime.timedelta(days=days),
+        )
+    expected = rollups()
+    assert len(expected) == 2
+
+    JobHealthRollup.objects.update(pass_count=10)
+    call_command("backfill-health-rollups")
+    assert rollups() == expected
+
+    JobHealthRollup.objects.update(pass_count=10)
+    call_command("backfill-health-rollups", "--since", str(now.date()))
+    assert rollups()[0][4] == 10
+    assert rollups()[1] == expected[1]
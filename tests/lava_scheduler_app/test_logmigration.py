@@ -0,0 +1,194 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import lzma
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from lava_common.log import dump
+from lava_common.yaml import yaml_safe_dump
+from lava_scheduler_app import logmigration
+from lava_scheduler_app.logmigration import Checkpoint, LogsCopier, RangeResult
+from lava_scheduler_app.logutils import LogsBulk, LogsFilesystem
+from lava_scheduler_app.models import DeviceType, TestJob
+
+
+class LogsMemory(LogsBulk):
+    def __init__(self):
+        self.docs = {}
+        self.failures = 0
+        self.bulks = 0
+        super().__init__()
+
+    def _bulk_write(self, job, docs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("unavailable")
+        self.bulks += 1
+        self.docs.setdefault(job.id, []).extend(docs)
+
+    def _document(self, job, index, line):
+        return {"idx": index, "dt": line["dt"], "lvl": line["lvl"], "msg": line["msg"]}
+
+    def _line_count(self, job):
+        return len(self.docs.get(job.id, []))
+
+    def read(self, job, start=0, end=None):
+        docs = self.docs.get(job.id, [])[start:end]
+        return yaml_safe_dump(
+            [{k: v for (k, v) in d.items() if k != "idx"} for d in docs]
+        )
+
+
+def write_logs(path, count, compressed=False):
+    lines = [
+        "- "
+        + dump(
+            {
+                "dt": "2023-01-01T00:00:%02d.123456" % (i % 60),
+                "lvl": "results" if i % 10 == 9 else "target",
+                "msg": {"case": "c%d" % i, "result": "pass"}
+                if i % 10 == 9
+                else "line %d" % i,
+            }
+        )
+        for i in range(count)
+    ]
+    # Invalid line are skipped
+    lines.insert(5, "- {invalid")
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    if compressed:
+        with lzma.open(str(path / "output.yaml.xz"), "wb") as f_out:
+            f_out.write(data)
+    else:
+        (path / "output.yaml").write_bytes(data)
+    return lines
+
+
+def test_copy(tmp_path):
+    job = SimpleNamespace(id=1, output_dir=str(tmp_path))
+    lines = write_logs(tmp_path, 120, compressed=True)
+    target = LogsMemory()
+    copier = LogsCopier(LogsFilesystem(), target, batch_size=50, verify="checksum")
+
+    assert copier.copy(job) == (120, sum(len(line) + 1 for line in lines))
+    assert [d["idx"] for d in target.docs[1]] == list(range(120))
+    assert target.docs[1][9]["msg"] == {"case": "c9", "result": "pass"}
+    assert target.bulks == 3
+
+    # Already copied
+    assert copier.copy(job)[0] == 120
+    assert len(target.docs[1]) == 120
+
+    # Between backends
+    other = LogsMemory()
+    copier = LogsCopier(target, other, batch_size=50, verify="checksum")
+    assert copier.copy(job)[0] == 120
+    assert other.docs == target.docs
+
+
+def test_copy_resume(mocker, tmp_path):
+    sleep = mocker.patch("lava_scheduler_app.logmigration.time.sleep")
+    job = SimpleNamespace(id=1, output_dir=str(tmp_path))
+    write_logs(tmp_path, 120)
+    target = LogsMemory()
+    copier = LogsCopier(LogsFilesystem(), target, batch_size=50, verify="checksum")
+
+    # The second bulk fails and is dropped
+    target.failures = 1
+    result = copier.copy_range(0, [job])
+    assert result.failed == {}
+    assert result.copied == [1]
+    assert [d["idx"] for d in target.docs[1]] == list(range(120))
+    assert [d["msg"] for d in target.docs[1][:3]] == ["line 0", "line 1", "line 2"]
+    assert sleep.mock_calls == [mocker.call(1)]
+
+    # Too many failures
+    job = SimpleNamespace(id=2, output_dir=str(tmp_path))
+    sleep.reset_mock()
+    target.failures = logmigration.ATTEMPTS
+    result = copier.copy_range(0, [job, SimpleNamespace(id=3, output_dir="/none")])
+    assert result.failed == {
+        2: "Giving up after 3 attempts: Unable to save 50 log lines"
+    }
+    assert result.skipped == 1
+    # With a bounded backoff between the attempts
+    assert sleep.mock_calls == [mocker.call(1), mocker.call(2)]
+
+    # Corrupted target
+    target.docs[2] = target.docs[1][:50]
+    target.docs[2][0] = dict(target.docs[2][0], msg="other")
+    result = copier.copy_range(0, [job])
+    assert result.failed == {2: "Checksum mismatch"}
+
+
+def test_checkpoint(tmp_path):
+    path = str(tmp_path / "copy-logs.json")
+    checkpoint = Checkpoint.load(path, "LogsFilesystem", "LogsMongo", 1000)
+    checkpoint.update(RangeResult(start=0, copied=[1, 2], failed={3: "error"}))
+    checkpoint.update(RangeResult(start=2000))
+    checkpoint.update(RangeResult(start=None, copied=[3]))
+    checkpoint.update(RangeResult(start=1000, failed={1500: "error"}))
+    assert json.loads((tmp_path / "copy-logs.json").read_text(encoding="utf-8")) == {
+        "source": "LogsFilesystem",
+        "target": "LogsMongo",
+        "chunk_size": 1000,
+        "done": [0, 1000, 2000],
+        "failed": {"1500": "error"},
+    }
+
+    checkpoint = Checkpoint.load(path, "LogsFilesystem", "LogsMongo", 1000)
+    assert checkpoint.done == {0, 1000, 2000}
+    assert checkpoint.failed == {1500: "error"}
+    with pytest.raises(ValueError):
+        Checkpoint.load(path, "LogsFilesystem", "LogsElasticsearch", 1000)
+
+
+@pytest.mark.django_db
+def test_copy_logs_command(mocker, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    # One directory by job
+    mocker.patch.object(
+        TestJob, "output_dir", property(lambda job: str(tmp_path / str(job.id)))
+    )
+    user = User.objects.create(username="user-01")
+    dt = DeviceType.objects.create(name="qemu")
+    jobs = [
+        TestJob.objects.create(
+            definition="{}", requested_device_type=dt, submitter=user
+        )
+        for _ in range(3)
+    ]
+    for job in jobs[:2]:
+        path = tmp_path / job.output_dir
+        path.mkdir()
+        write_logs(path, 20)
+
+    target = LogsMemory()
+    backends = {"LogsFilesystem": LogsFilesystem(), "LogsMongo": target}
+    mocker.patch.object(logmigration, "logs_backend", backends.get)
+    call_command("copy-logs", "LogsMongo", "--jobs", "1", "--chunk-size", "2")
+    assert {k: len(v) for (k, v) in target.docs.items()} == {
+        jobs[0].id: 20,
+        jobs[1].id: 20,
+    }
+    checkpoint = json.loads((tmp_path / "copy-logs.json").read_text(encoding="utf-8"))
+    assert checkpoint["failed"] == {}
+    assert len(checkpoint["done"]) == len({job.id // 2 for job in jobs})
@@ -17,14 +17,24 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
+import json
 import lzma
 import unittest
 
 import pytest
+import requests
 from django.conf import settings
 
 from lava_common.yaml import yaml_safe_dump, yaml_safe_load
-from lava_scheduler_app.logutils import LogsElasticsearch, LogsFilesystem, LogsMongo
+from lava_scheduler_app.logutils import (
+    LogsBackPressure,
+    LogsBulk,
+    LogsElasticsearch,
+    LogsFilesystem,
+    LogsFirestore,
+    LogsMongo,
+)
 
 
 def check_pymongo():
@@ -124,7 +134,7 @@ def test_mongo_logs(mocker):
     job = mocker.Mock()
     job.id = 1
 
-    insert_one = mocker.MagicMock()
+    insert_many = mocker.MagicMock()
     find = mocker.MagicMock()
     find_ret_val = [
         {"dt": "2020-03-25T19:44:36.209548", "lvl": "info", "msg": "first message"},
@@ -133,19 +143,27 @@ def test_mongo_logs(mocker):
     find.return_value = find_ret_val
 
     mocker.patch("pymongo.collection.Collection.find", find)
-    mocker.patch("pymongo.collection.Collection.insert_one", insert_one)
+    mocker.patch("pymongo.collection.Collection.insert_many", insert_many)
+    mocker.patch(
+        "pymongo.collection.Collection.count_documents", mocker.Mock(return_value=3)
+    )
 
     logs_mongo.write(
         job,
         '- {"dt": "2020-03-25T19:44:36.209548", "lvl": "info", "msg": "lava-dispatcher, installed at version: 2020.02"}',
     )
-    insert_one.assert_called_with(
-        {
-            "job_id": 1,
-            "dt": "2020-03-25T19:44:36.209548",
-            "lvl": "info",
-            "msg": "lava-dispatcher, installed at version: 2020.02",
-        }
+    insert_many.assert_not_called()
+    logs_mongo.flush(job)
+    insert_many.assert_called_with(
+        [
+            {
+                "job_id": 1,
+                "idx": 3,
+                "dt": "2020-03-25T19:44:36.209548",
+                "lvl": "info",
+                "msg": "lava-dispatcher, installed at version: 2020.02",
+            }
+        ]
     )  # nosec
     result = yaml_safe_load(logs_mongo.read(job))
 
@@ -178,13 +196,18 @@ def test_elasticsearch_logs(mocker, logs_elasticsearch):
 
     mocker.patch("requests.get", get)
     mocker.patch("requests.post", post)
+    post.return_value.text = '{"errors": false}'
 
     line = '- {"dt": "2020-03-25T19:44:36.209", "lvl": "info", "msg": "lava-dispatcher, installed at version: 2020.02"}'
     logs_elasticsearch.write(job, line)
+    # The lines are saved in bulk
+    post.assert_not_called()
+    logs_elasticsearch.flush(job)
     post.assert_called_with(
-        "%s%s/_doc/" % (settings.ELASTICSEARCH_URI, settings.ELASTICSEARCH_INDEX),
-        data='{"dt": 1585165476209, "lvl": "info", "msg": "lava-dispatcher, installed at version: 2020.02", "job_id": 1}',
-        headers={"Content-type": "application/json"},
+        "%s%s/_bulk?refresh=wait_for"
+        % (settings.ELASTICSEARCH_URI, settings.ELASTICSEARCH_INDEX),
+        data=b'{"index": {}}\n{"dt": 1585165476209, "lvl": "info", "msg": "lava-dispatcher, installed at version: 2020.02", "job_id": 1, "idx": 0}\n',
+        headers={"Content-type": "application/x-ndjson"},
     )  # nosec
     result = yaml_safe_load(logs_elasticsearch.read(job))
 
@@ -210,3 +233,76 @@ def test_elasticsearch_logs(mocker, logs_elasticsearch):
             },
         ]
     ).encode("utf-8")
+
+
+def test_elasticsearch_logs_bulk(mocker, logs_elasticsearch):
+    job = mocker.Mock()
+    job.id = 1
+    get = mocker.patch("requests.get")
+    get.return_value.text = '{"count": 10}'
+    post = mocker.patch("requests.post")
+    post.return_value.text = '{"errors": false}'
+    mocker.patch.object(logs_elasticsearch, "BULK_LINES", 2)
+
+    line = '- {"dt": "2020-03-25T19:44:36.209", "lvl": "info", "msg": "hello"}'
+    for _ in range(3):
+        logs_elasticsearch.write(job, line)
+    # Saved when the third line is buffered
+    assert post.call_count == 1  # nosec
+    data = post.call_args[1]["data"].decode("utf-8").split("\n")
+    assert [json.loads(doc)["idx"] for doc in data[1:4:2]] == [10, 11]  # nosec
+    assert logs_elasticsearch.line_count(job) == 11  # nosec
+
+    # Dropped when the store is not reachable
+    post.side_effect = requests.ConnectionError
+    with pytest.raises(LogsBackPressure) as exc:
+        logs_elasticsearch.flush(job)
+    assert exc.value.lines == 1  # nosec
+    assert logs_elasticsearch.buffers == {}  # nosec
+
+
+def test_elasticsearch_logs_range(mocker, logs_elasticsearch):
+    job = mocker.Mock()
+    job.id = 1
+    get = mocker.patch("requests.get")
+    get.return_value.text = '{"hits":{"hits":[{"_source":{"dt": 1585165476209, "lvl": "info", "msg": "hello", "idx": 0}}]}}'
+
+    logs_elasticsearch.read(job, start=2, end=4)
+    params = json.loads(get.call_args[1]["data"])
+    # The lines are selected by the store
+    assert params["from"] == 0  # nosec
+    assert params["size"] == 2  # nosec
+    assert params["query"]["bool"]["filter"][1] == {
+        "range": {"idx": {"gte": 2, "lt": 4}}
+    }  # nosec
+
+
+def test_firestore_logs_line_count(mocker):
+    logs = LogsFirestore.__new__(LogsFirestore)
+    logs.db = mocker.MagicMock()
+    logs.root_collection = "logs"
+    LogsBulk.__init__(logs)
+    job = mocker.Mock()
+    job.id = 1
+    job.submit_time = datetime.datetime(2023, 3, 25)
+    counter = logs.db.collection.return_value.document.return_value
+    counter.get.return_value.exists = True
+    counter.get.return_value.to_dict.return_value = {"count": 42}
+    lines = counter.collection.return_value
+
+    line = '- {"dt": "2020-03-25T19:44:36.209", "lvl": "info", "msg": "hello"}'
+    logs.write(job, line)
+    logs.write(job, line)
+    assert logs.line_count(job) == 44  # nosec
+    logs.flush(job)
+    # The counter is saved with the lines
+    batch = logs.db.batch.return_value
+    assert batch.set.call_args_list[-1] == mocker.call(counter, {"count": 44})  # nosec
+    batch.commit.assert_called_once_with()
+    # The lines are not read back
+    lines.select.assert_not_called()
+
+    # Lines saved by older versions
+    counter.get.return_value.exists = False
+    lines.select.return_value.stream.return_value = iter([None] * 3)
+    assert logs.line_count(job) == 3  # nosec
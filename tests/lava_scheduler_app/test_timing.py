@@ -0,0 +1,107 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+
+from lava_common.log import dump
+from lava_scheduler_app import timing
+from lava_scheduler_app.models import TestJob
+
+LINES = [
+    {"lvl": "info", "msg": "start: 1 deploy (timeout 00:10:00) [common]"},
+    {"lvl": "debug", "msg": "start: 1.1 download-retry (timeout 00:10:00) [common]"},
+    {"lvl": "debug", "msg": "end: 1.1 download-retry (duration 00:01:30) [common]"},
+    {"lvl": "target", "msg": "start: 1.2 not an action"},
+    {"lvl": "debug", "msg": {"start": "a python object"}},
+    {"lvl": "info", "msg": "end: 1 deploy (duration 00:02:00) [common]"},
+    {"lvl": "info", "msg": "end: 2 validate (duration 00:00:01) [common]"},
+    {"lvl": "info", "msg": "start: 2 boot (timeout 00:01:00) [common]"},
+    {"lvl": "info", "msg": "end: 2 boot (duration 00:00:58) [common]"},
+]
+
+
+def job(tmp_path, state=TestJob.STATE_FINISHED):
+    return SimpleNamespace(
+        id=1,
+        output_dir=str(tmp_path),
+        state=state,
+        STATE_FINISHED=TestJob.STATE_FINISHED,
+    )
+
+
+def test_parse():
+    assert [timing.parse(line) for line in LINES] == [
+        ["start", "1", "deploy", 600.0],
+        ["start", "1.1", "download-retry", 600.0],
+        ["end", "1.1", "download-retry", 90.0],
+        None,
+        None,
+        ["end", "1", "deploy", 120.0],
+        ["end", "2", "validate", 1.0],
+        ["start", "2", "boot", 60.0],
+        ["end", "2", "boot", 58.0],
+    ]
+
+
+def test_report():
+    data = timing.report([r for r in map(timing.parse, LINES) if r is not None])
+    assert data["pipeline"] == [
+        ("1", "deploy", 120.0, 600.0, False),
+        ("1.1", "download-retry", 90.0, 600.0, False),
+        ("2", "boot", 58.0, 60.0, True),
+    ]
+    assert data["summary"] == [
+        ["deploy", 120.0, 120 / 178 * 100],
+        ["boot", 58.0, 58 / 178 * 100],
+    ]
+    assert data["total_duration"] == 178.0
+    assert data["max_duration"] == 120.0
+    assert timing.report([])["pipeline"] == []
+
+
+def test_append_and_load(tmp_path):
+    records = [r for r in map(timing.parse, LINES) if r is not None]
+    running = job(tmp_path, TestJob.STATE_RUNNING)
+
+    # Only created with the first lines of the job
+    timing.append(running, records[:2])
+    assert not (tmp_path / "output.timing").exists()
+    timing.append(running, records[:2], create=True)
+    timing.append(running, [])
+    timing.append(running, records[2:])
+    assert timing.load(running) == records
+
+
+def test_build(tmp_path):
+    (tmp_path / "output.yaml").write_text(
+        "".join(
+            "- " + dump(dict(dt="2023-01-01T00:00:00", **line)) + "\n" for line in LINES
+        )
+        + "- {invalid: start: \n",
+        encoding="utf-8",
+    )
+    records = [r for r in map(timing.parse, LINES) if r is not None]
+
+    # The index of the running jobs is not saved
+    assert timing.load(job(tmp_path, TestJob.STATE_RUNNING)) == records
+    assert not (tmp_path / "output.timing").exists()
+
+    finished = job(tmp_path)
+    assert timing.load(finished) == records
+    assert (tmp_path / "output.timing").exists()
+    # Read from the index
+    (tmp_path / "output.yaml").unlink()
+    assert timing.load(finished) == records
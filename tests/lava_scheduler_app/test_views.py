@@ -17,6 +17,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
 
+from datetime import timedelta
+
 import pytest
 import simplejson
 from django.contrib.auth.models import Group, User
@@ -823,6 +825,73 @@ def test_jobs(client, setup):
     assert ret.context["alljobs_table"].data[4].description == "test job 01"  # nosec
 
 
+@pytest.mark.django_db
+def test_jobs_keyset_pagination(client, setup):
+    ret = client.get(reverse("lava.scheduler.job.list") + "?length=2")
+    assert ret.status_code == 200  # nosec
+    page = ret.context["alljobs_table"].page
+    assert [r.record.description for r in page.object_list] == [  # nosec
+        "test job 06",
+        "test job 05",
+    ]
+    cursor = page.next_cursor
+    assert cursor is not None  # nosec
+
+    # The cursor and the offset give the same page
+    url = reverse("lava.scheduler.job.list") + "?length=2&page=2"
+    for query in ["&cursor=%s" % cursor, ""]:
+        ret = client.get(url + query)
+        assert ret.status_code == 200  # nosec
+        page = ret.context["alljobs_table"].page
+        assert [r.record.description for r in page.object_list] == [  # nosec
+            "test job 04",
+            "test job 02",
+        ]
+
+    # Invalid or mismatching cursors fall back to the offset
+    ret = client.get(url + "&cursor=invalid")
+    assert ret.status_code == 200  # nosec
+    page = ret.context["alljobs_table"].page
+    assert page.object_list[0].record.description == "test job 04"  # nosec
+    ret = client.get(url.replace("page=2", "page=3") + "&cursor=%s" % cursor)
+    assert ret.status_code == 200  # nosec
+    page = ret.context["alljobs_table"].page
+    assert page.object_list[0].record.description == "test job 01"  # nosec
+    assert page.next_cursor is None  # nosec
+
+
+@pytest.mark.django_db
+def test_jobs_keyset_pagination_nulls(client, setup):
+    # end_time is NULL for the jobs that are not finished
+    now = timezone.now()
+    TestJob.objects.filter(description="test job 01").update(end_time=now)
+    TestJob.objects.filter(description="test job 04").update(
+        end_time=now - timedelta(hours=1)
+    )
+    # NULLs are greater than any value, the ties are sorted by id
+    for (sort, expected) in [
+        ("end_time", ["04", "01", "02", "05", "06"]),
+        ("-end_time", ["06", "05", "02", "01", "04"]),
+    ]:
+        url = reverse("lava.scheduler.job.list") + "?length=2&sort=%s" % sort
+        (offsets, cursors) = ([], [])
+        cursor = None
+        for number in [1, 2, 3]:
+            ret = client.get(url + "&page=%d" % number)
+            assert ret.status_code == 200  # nosec
+            page = ret.context["alljobs_table"].page
+            offsets.extend(r.record.description[-2:] for r in page.object_list)
+            if number > 1:
+                # Also given after a NULL
+                assert cursor is not None  # nosec
+                ret = client.get(url + "&page=%d&cursor=%s" % (number, cursor))
+                page = ret.context["alljobs_table"].page
+            cursors.extend(r.record.description[-2:] for r in page.object_list)
+            cursor = page.next_cursor
+        assert offsets == expected  # nosec
+        assert cursors == expected  # nosec
+
+
 @pytest.mark.django_db
 def test_jobs_active(client, setup):
     ret = client.get(reverse("lava.scheduler.job.active"))
@@ -27,6 +27,7 @@ from django.utils import timezone
 from lava_common.version import __version__
 from lava_common.yaml import yaml_safe_load
 from lava_results_app.models import TestCase
+from lava_scheduler_app.bundle import StartBundle
 from lava_scheduler_app.models import Device, DeviceType, TestJob, Worker
 
 
@@ -154,6 +155,7 @@ def test_internal_v1_jobs_get(client, mocker, settings):
         "dispatcher",
         "env",
         "env-dut",
+        "etags",
     ]
     print(ret.json())
     assert yaml_safe_load(ret.json()["definition"]) == {
@@ -174,6 +176,7 @@ def test_internal_v1_jobs_get(client, mocker, settings):
         "dispatcher",
         "env",
         "env-dut",
+        "etags",
     ]
     assert yaml_safe_load(ret.json()["definition"]) == {
         "compatibility": 0,
@@ -184,6 +187,49 @@ def test_internal_v1_jobs_get(client, mocker, settings):
     assert "available_architectures:" not in ret.json()["device"]
 
 
+@pytest.mark.django_db
+def test_internal_v1_jobs_get_bundle(client, mocker, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    objs = create_objects(Worker.objects.create(hostname="worker-01"))
+    (j1, j2, j3, j4, j5, j6) = objs["jobs"]
+    url = reverse("lava.scheduler.internal.v1.jobs", args=[j1.id])
+
+    # The bundle is rendered when the job is scheduled
+    StartBundle(j1).build()
+    assert (Path(j1.output_dir) / "start.yaml").exists()
+    load_configuration = mocker.patch(
+        "lava_scheduler_app.models.Device.load_configuration"
+    )
+    ret = client.get(url, HTTP_LAVA_TOKEN=j1.token)
+    assert ret.status_code == 200
+    load_configuration.assert_not_called()
+    data = ret.json()
+    assert "available_architectures:" in data["device"]
+    assert list(data["etags"].keys()) == ["device", "dispatcher", "env", "env-dut"]
+
+    # The parts already cached by the worker are not sent again
+    ret = client.get(
+        url,
+        HTTP_LAVA_TOKEN=j1.token,
+        HTTP_IF_NONE_MATCH=", ".join(data["etags"].values()),
+    )
+    assert ret.status_code == 200
+    assert ret.json()["definition"] == data["definition"]
+    assert ret.json()["device"] is None
+    assert ret.json()["etags"] == data["etags"]
+
+    ret = client.get(url, HTTP_LAVA_TOKEN=j1.token, HTTP_IF_NONE_MATCH=ret["ETag"])
+    assert ret.status_code == 304
+
+    # The bundle is rendered again when the definition changes
+    j1.definition = "device_type: qemu\njob_name: updated\n"
+    j1.save()
+    mocker.stop(load_configuration)
+    ret = client.get(url, HTTP_LAVA_TOKEN=j1.token, HTTP_IF_NONE_MATCH=ret["ETag"])
+    assert ret.status_code == 200
+    assert yaml_safe_load(ret.json()["definition"])["job_name"] == "updated"
+
+
 @pytest.mark.django_db
 def test_internal_v1_jobs_post(client, mocker, settings):
     # Create objects
@@ -325,6 +371,8 @@ def test_internal_v1_jobs_logs(client, mocker, settings):
 - {"lvl": "debug", "msg": "a debug message"}
 """
     )
+    # The timing index is created with the first lines
+    assert (Path(j1.output_dir) / "output.timing").read_text() == ""
 
     # Resend the exact same lines: nothing should change on the FS
     ret = client.post(
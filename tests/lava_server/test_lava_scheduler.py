@@ -111,12 +111,15 @@ def test_main_loop(mocker):
     cmd = Command()
     cmd.logger = mocker.Mock()
     cmd.poller = mocker.Mock()
+    cmd.outbox = mocker.Mock()
     cmd.check_workers = mocker.Mock()
     cmd.get_available_dts = mocker.Mock(side_effect=[set(["qemu", "docker"]), KeyError])
 
     with pytest.raises(KeyError):
         cmd.main_loop()
     assert len(cmd.get_available_dts.mock_calls) == 2
+    # The notifications are delivered while waiting for the events
+    assert len(cmd.outbox.step.mock_calls) == 2
     assert len(schedule.mock_calls) == 2
     assert schedule.mock_calls[0][1][1] == set()
     assert schedule.mock_calls[1][1][1] == set(["qemu", "docker"])
@@ -137,4 +140,5 @@ def test_handle(mocker):
         group="lavaserver",
         event_url="tcp://localhost:5500",
         ipv6=False,
+        metrics_address=None,
     )
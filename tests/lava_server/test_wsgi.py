@@ -0,0 +1,47 @@
+# Copyright (C) 2023 Linaro Limited
+#
+# This file is part of LAVA.
+#
+# LAVA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3
+# as published by the Free Software Foundation
+#
+# LAVA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with LAVA.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+import pytest
+
+from lava_server import wsgi
+
+
+def test_serve_metrics(caplog, mocker):
+    serve = mocker.patch("lava_common.metrics.serve")
+    wsgi.serve_metrics(None)
+    wsgi.serve_metrics("")
+    assert serve.mock_calls == []
+
+    wsgi.serve_metrics("localhost:9100-9101")
+    serve.assert_called_once_with("localhost:9100-9101")
+
+
+@pytest.mark.parametrize(
+    "exc", [OSError("No port to bind to"), ValueError("Invalid port range")]
+)
+def test_serve_metrics_errors(caplog, mocker, exc):
+    mocker.patch("lava_common.metrics.serve", side_effect=exc)
+    # The gunicorn worker should still boot
+    wsgi.serve_metrics("localhost:9100-9101")
+    assert caplog.record_tuples == [
+        (
+            "django",
+            logging.ERROR,
+            "Unable to expose the metrics on 'localhost:9100-9101': %s" % exc,
+        )
+    ]
@@ -19,11 +19,17 @@
 """
 Unit tests for Linaro Django XML-RPC Application
 """
+import os
 import re
+import tempfile
 import xmlrpc.client
+from unittest import mock
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
 
 from lava_common.decorators import nottest
 from linaro_django_xmlrpc.models import (
@@ -37,6 +43,19 @@ from linaro_django_xmlrpc.models import (
     xml_rpc_signature,
 )
 
+LOCAL_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "lava-tests",
+    }
+}
+SHARED_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "lava-tests-cache"),
+    }
+}
+
 
 class MockUser:
     """
@@ -611,3 +630,70 @@ class AuthTokenTests(TestCase):
         # Refresh token
         token = AuthToken.objects.get(id=token.id, user=self.user)
         self.assertNotEqual(token.last_used_on, None)
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_get_for_secret_is_cached(self):
+        cache.clear()
+        token = AuthToken.objects.create(user=self.user)
+        self.assertEqual(AuthToken.get_for_secret(token.secret), token)
+        with self.assertNumQueries(0):
+            self.assertEqual(AuthToken.get_for_secret(token.secret).user, self.user)
+        self.assertIsNone(cache.get("auth-token:" + token.secret))
+
+        # Modifying the token or the user invalidates the cache
+        old_secret = token.secret
+        token = AuthToken.objects.get(id=token.id)
+        token.secret = "new-secret"
+        token.save()
+        self.assertIsNone(AuthToken.get_for_secret(old_secret))
+        self.assertEqual(AuthToken.get_for_secret("new-secret"), token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(AuthToken.get_for_secret("new-secret").user.is_active)
+        token.delete()
+        self.assertIsNone(AuthToken.get_for_secret("new-secret"))
+
+    def test_get_for_secret_revoked_in_another_process(self):
+        # Cache of another process
+        for (caches, other) in [
+            (LOCAL_CACHE, LocMemCache("other-process", {})),
+            (SHARED_CACHE, FileBasedCache(SHARED_CACHE["default"]["LOCATION"], {})),
+        ]:
+            with override_settings(CACHES=caches):
+                cache.clear()
+                token = AuthToken.objects.create(user=self.user)
+                self.assertEqual(AuthToken.get_for_secret(token.secret), token)
+
+                with mock.patch("linaro_django_xmlrpc.models.cache", other):
+                    self.user.is_active = False
+                    self.user.save()
+                self.assertFalse(AuthToken.get_for_secret(token.secret).user.is_active)
+                with mock.patch("linaro_django_xmlrpc.models.cache", other):
+                    AuthToken.objects.filter(user=self.user).delete()
+                self.assertIsNone(AuthToken.get_for_secret(token.secret))
+                self.user.is_active = True
+                self.user.save()
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_get_for_secret_per_process_cache(self):
+        # The tokens are not cached when the cache is not shared
+        token = AuthToken.objects.create(user=self.user)
+        AuthToken.get_for_secret(token.secret)
+        with self.assertNumQueries(1):
+            self.assertEqual(AuthToken.get_for_secret(token.secret), token)
+
+    @override_settings(AUTH_TOKEN_LAST_USED_INTERVAL=3600)
+    def test_get_user_for_secret_defers_last_used_on(self):
+        token = AuthToken.objects.create(user=self.user)
+        AuthToken.get_user_for_secret(self.user.username, token.secret)
+        token.refresh_from_db()
+        last_used_on = token.last_used_on
+
+        # Saved in the next batch
+        AuthToken.get_user_for_secret(self.user.username, token.secret)
+        token.refresh_from_db()
+        self.assertEqual(token.last_used_on, last_used_on)
+        with override_settings(AUTH_TOKEN_LAST_USED_INTERVAL=0):
+            AuthToken.get_user_for_secret(self.user.username, token.secret)
+        token.refresh_from_db()
+        self.assertGreater(token.last_used_on, last_used_on)